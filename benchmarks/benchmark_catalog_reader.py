@@ -0,0 +1,110 @@
+"""
+Benchmark: catalog work of harvest step 1 for a schema of many tables, per-object queries (the previous path) vs the
+bulk CatalogReader.
+
+A SQLite catalog with --tables tables of --columns columns is generated. The per-object variant runs the [sqlite]
+get_ddl and get_columns queries of harvester_queries.conf for every table, hashes each DDL and finds the stored
+metadata row of every table by scanning the list of existing rows. The bulk variant reads the whole catalog with
+CatalogReader and uses dict lookups. Both must produce the same DDL, hashes and columns. --latency-ms adds a simulated
+round trip to every catalog query, as for a remote warehouse.
+
+    python -m benchmarks.benchmark_catalog_reader --tables 10000 --columns 20 --latency-ms 20
+"""
+import argparse
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from genesis_bots.schema_explorer.catalog_reader import CatalogReader
+
+GET_DDL = "SELECT sql FROM sqlite_master WHERE type='table' AND name='!table_name!'"
+GET_COLUMNS = "SELECT name FROM pragma_table_info('!table_name!')"
+
+
+def _make_catalog(path, n_tables, n_columns):
+    conn = sqlite3.connect(path)
+    for t in range(n_tables):
+        columns = ", ".join(f"col_{c} {'TEXT' if c % 2 else 'INTEGER'}{' NOT NULL' if c == 0 else ''}"
+                            for c in range(n_columns))
+        conn.execute(f"CREATE TABLE table_{t:05d} ({columns})")
+    conn.commit()
+    conn.close()
+
+
+class _Catalog:
+
+    def __init__(self, path, latency_s):
+        self.conn = sqlite3.connect(path)
+        self.latency_s = latency_s
+        self.queries = 0
+
+    def query(self, sql):
+        self.queries += 1
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        cursor = self.conn.execute(sql)
+        columns = [d[0] for d in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+
+def _existing_rows(tables):
+    return [{'QUALIFIED_TABLE_NAME': f'"db"."main"."{t}"', 'DDL_HASH': None} for t in tables]
+
+
+def run_per_object(catalog, tables):
+    existing = _existing_rows(tables)
+    result = {}
+    for table in tables:
+        ddl = catalog.query(GET_DDL.replace('!table_name!', table))[0]['sql']
+        columns = [row['name'] for row in catalog.query(GET_COLUMNS.replace('!table_name!', table))]
+        qualified_name = f'"db"."main"."{table}"'
+        stored = next(info for info in existing if info['QUALIFIED_TABLE_NAME'] == qualified_name)
+        result[table] = (ddl, hashlib.sha256(ddl.encode()).hexdigest(), columns, stored is not None)
+    return result
+
+
+def run_bulk(catalog, tables):
+    existing_by_name = {info['QUALIFIED_TABLE_NAME']: info for info in _existing_rows(tables)}
+    reader = CatalogReader(lambda dataset, sql: catalog.query(sql))
+    schema = reader.get_schema({'source_name': 'local', 'database_name': 'db', 'schema_name': 'main'}, 'sqlite')
+    result = {}
+    for table in tables:
+        entry = schema[table]
+        stored = existing_by_name[f'"db"."main"."{table}"']
+        result[table] = (entry['ddl'], entry['ddl_hash'], entry['columns'], stored is not None)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tables', type=int, default=5000)
+    parser.add_argument('--columns', type=int, default=20)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='bench_catalog_')
+    try:
+        path = os.path.join(work_dir, 'catalog.sqlite')
+        _make_catalog(path, args.tables, args.columns)
+        tables = [f"table_{t:05d}" for t in range(args.tables)]
+
+        print(f"Harvest step 1 catalog work: {args.tables} tables x {args.columns} columns, "
+              f"{args.latency_ms} ms per catalog query")
+        results = {}
+        for name, variant in (('per-object', run_per_object), ('bulk', run_bulk)):
+            catalog = _Catalog(path, args.latency_ms / 1000)
+            start = time.perf_counter()
+            results[name] = variant(catalog, tables)
+            elapsed = time.perf_counter() - start
+            print(f"  {name:>10}: {elapsed:8.2f} s  {catalog.queries:>7} catalog queries")
+            catalog.conn.close()
+        assert results['per-object'] == results['bulk']
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
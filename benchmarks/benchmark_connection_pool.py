@@ -0,0 +1,112 @@
+"""
+Benchmark: ad hoc create_engine() per query vs. the ConnectionPoolRegistry used by DatabaseConnector.query_database.
+
+Several threads (bots) run short queries against one connection. By default the target is a local SQLite file with a
+simulated connect latency standing in for the TCP/TLS handshake of a remote Postgres / Redshift; pass --url to run
+against a real database.
+
+    python -m benchmarks.benchmark_connection_pool --threads 8 --queries 50 --connect-latency-ms 20
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, event, text
+
+from genesis_bots.connectors.connection_pool import ConnectionPoolRegistry
+
+
+def _engine_factory(connect_latency_s, connects):
+    def factory(url, **kwargs):
+        engine = create_engine(url, **kwargs)
+
+        @event.listens_for(engine, "connect")
+        def _on_connect(dbapi_connection, connection_record):
+            connects.append(1)
+            if connect_latency_s:
+                time.sleep(connect_latency_s)
+        return engine
+    return factory
+
+
+def _run_threads(n_threads, n_queries, run_query):
+    latencies = []
+    lock = threading.Lock()
+
+    def worker():
+        local = []
+        for _ in range(n_queries):
+            start = time.perf_counter()
+            run_query()
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(n_threads)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default=None, help='SQLAlchemy URL of the database to query (default: temp SQLite file)')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--queries', type=int, default=50, help='queries per thread')
+    parser.add_argument('--connect-latency-ms', type=float, default=20.0, help='simulated handshake latency per new connection')
+    args = parser.parse_args()
+
+    work_dir = None
+    url = args.url
+    if url is None:
+        work_dir = tempfile.mkdtemp(prefix='bench_pool_')
+        url = f"sqlite:///{os.path.join(work_dir, 'bench.db')}"
+    latency = args.connect_latency_ms / 1000
+    query = text('SELECT 1')
+
+    try:
+        # previous behaviour of add_connection / the _test_* helpers: a new engine (and connection) per call
+        adhoc_connects = []
+        adhoc_factory = _engine_factory(latency, adhoc_connects)
+
+        def adhoc_query():
+            engine = adhoc_factory(url)
+            with engine.connect() as conn:
+                conn.execute(query).fetchall()
+            engine.dispose()
+
+        adhoc = _run_threads(args.threads, args.queries, adhoc_query)
+
+        pooled_connects = []
+        registry = ConnectionPoolRegistry(engine_factory=_engine_factory(latency, pooled_connects))
+        registry.create_engine(('bench', None), url)
+
+        def pooled_query():
+            with registry.connect(('bench', None)) as conn:
+                conn.execute(query).fetchall()
+
+        pooled = _run_threads(args.threads, args.queries, pooled_query)
+        metrics = registry.metrics()['bench']
+        registry.dispose_all()
+    finally:
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    total = args.threads * args.queries
+    print(f"{args.threads} threads x {args.queries} queries, connect latency {args.connect_latency_ms}ms")
+    for name, (elapsed, p50, p99), connects in (('ad hoc engines', adhoc, adhoc_connects), ('pooled', pooled, pooled_connects)):
+        print(f"{name:>15}: {total / elapsed:8.0f} queries/s, p50 {p50 * 1000:6.2f}ms, p99 {p99 * 1000:6.2f}ms, "
+              f"{len(connects)} new connections")
+    print(f"pool metrics: {metrics}")
+
+
+if __name__ == "__main__":
+    main()
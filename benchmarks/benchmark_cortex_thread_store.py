@@ -0,0 +1,95 @@
+"""
+Micro-benchmark: per-turn bookkeeping overhead of a Cortex thread, plain list vs CortexThread.
+
+One turn appends a user message to a thread of the given size, renders the prompt (make_messages), appends the
+assistant reply with the same timestamp and looks both up again as check_runs does; the two messages are then removed
+again (not timed). The list variant is the previous implementation: a linear scan for the lookups and a full
+re-render of the prompt every turn. Every third message is a tool output (a 'user' message following a user
+message), so user-message consolidation is exercised.
+
+    python -m benchmarks.benchmark_cortex_thread_store --sizes 10 100 1000 --turns 200
+"""
+import argparse
+import datetime
+import time
+
+from genesis_bots.llm.llm_cortex.cortex_thread_store import CortexThread
+
+
+def _list_make_messages(thread):
+    newarray = [{"role": message["message_type"], "content": message["content"]} for message in thread]
+    consolidated_array = []
+    current_user_content = []
+    for message in newarray:
+        if message["role"] == "user":
+            current_user_content.append(message["content"])
+        else:
+            if current_user_content:
+                consolidated_array.append({"role": "user", "content": "\n".join(current_user_content)})
+                current_user_content = []
+            consolidated_array.append(message)
+    if current_user_content:
+        consolidated_array.append({"role": "user", "content": "\n".join(current_user_content)})
+    return consolidated_array
+
+
+def _list_find(thread, ts):
+    user_message = next((msg for msg in thread if msg.get("message_type") in ("user", "ipython") and msg.get("timestamp") == ts), None)
+    assistant_message = next((msg for msg in reversed(thread) if msg.get("message_type") == "assistant" and msg.get("timestamp") == ts), None)
+    return user_message, assistant_message
+
+
+def _store_find(thread, ts):
+    return thread.find(ts, ("user", "ipython")), thread.find(ts, ("assistant",), last=True)
+
+
+def _messages(count, start):
+    messages = [{"message_type": "system", "content": "You are a helpful bot. " * 50, "timestamp": start.isoformat()}]
+    for i in range(1, count):
+        ts = (start + datetime.timedelta(seconds=i)).isoformat()
+        message_type = "assistant" if i % 3 == 2 else "user"
+        messages.append({"message_type": message_type, "content": f"message {i} " * 40, "timestamp": ts})
+    return messages
+
+
+def _run(thread, size, turns, make_messages, find):
+    start = datetime.datetime(2024, 1, 1)
+    for message in _messages(size, start):
+        thread.append(message)
+    make_messages(thread)   # warm up (the cached prompt of a live thread already covers its history)
+    elapsed = 0.0
+    for turn in range(turns):
+        ts = (start + datetime.timedelta(days=1, seconds=turn)).isoformat()
+        t0 = time.perf_counter()
+        thread.append({"message_type": "user", "content": f"question {turn}", "timestamp": ts, "metadata": "{}"})
+        prompt = make_messages(thread)
+        thread.append({"message_type": "assistant", "content": f"answer {turn}", "timestamp": ts})
+        user_message, assistant_message = find(thread, ts)
+        elapsed += time.perf_counter() - t0
+        assert user_message is not None and assistant_message is not None and len(prompt) > 1
+        # back to `size` messages for the next turn
+        thread.pop()
+        thread.pop()
+    return elapsed * 1e6 / turns
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--turns', type=int, default=200)
+    args = parser.parse_args()
+
+    # both variants must render the same prompt
+    reference = _messages(50, datetime.datetime(2024, 1, 1))
+    assert CortexThread(reference).render() == _list_make_messages(reference)
+
+    print(f"Per-turn overhead, {args.turns} turns per thread size")
+    print(f"  {'messages':>8}  {'list (us)':>10}  {'store (us)':>10}  speedup")
+    for size in args.sizes:
+        list_us = _run([], size, args.turns, _list_make_messages, _list_find)
+        store_us = _run(CortexThread(), size, args.turns, CortexThread.render, _store_find)
+        print(f"  {size:>8}  {list_us:>10.1f}  {store_us:>10.1f}  {list_us / store_us:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Benchmark: full Annoy rebuild of the metadata index (make_and_save_index) vs. the IncrementalAnnoyIndex.
+
+For each scenario it reports build / refresh time, query latency and resident memory. Every variant runs in its own
+process so RSS numbers are not polluted by the other variant.
+
+    python -m benchmarks.benchmark_metadata_index --n-vectors 20000 --dimension 768 --changed 10
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from annoy import AnnoyIndex
+
+from genesis_bots.schema_explorer.metadata_vector_index import IncrementalAnnoyIndex
+
+
+def _rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _vectors(n, dimension, seed):
+    rng = np.random.default_rng(seed)
+    v = rng.standard_normal((n, dimension), dtype=np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def _query_latency_ms(index, queries, n=1000):
+    # one warm-up query so that page-ins of a freshly mapped index file are not counted
+    index.get_nns_by_vector(queries[0].tolist(), n)
+    start = time.perf_counter()
+    for q in queries:
+        index.get_nns_by_vector(q.tolist(), n, include_distances=True)
+    return (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def _full_rebuild(vectors, path, n_trees):
+    # mirrors embeddings_index_handler.make_and_save_index: add every item, build, save
+    index = AnnoyIndex(vectors.shape[1], 'angular')
+    for i, v in enumerate(vectors):
+        index.add_item(i, v)
+    index.build(n_trees)
+    index.save(path)
+    return index
+
+
+def run_annoy_full_rebuild(args, out):
+    work_dir = tempfile.mkdtemp(prefix='bench_annoy_')
+    try:
+        vectors = _vectors(args.n_vectors, args.dimension, seed=0)
+        queries = _vectors(args.queries, args.dimension, seed=1)
+        rss_before = _rss_mb()
+        start = time.perf_counter()
+        _full_rebuild(vectors, os.path.join(work_dir, 'v1.ann'), args.n_trees)
+        build_s = time.perf_counter() - start
+
+        # a harvest touches `changed` tables: the old path rebuilds everything
+        vectors[:args.changed] = _vectors(args.changed, args.dimension, seed=2)
+        start = time.perf_counter()
+        index = _full_rebuild(vectors, os.path.join(work_dir, 'v2.ann'), args.n_trees)
+        refresh_s = time.perf_counter() - start
+        del vectors
+        out.put(dict(variant='annoy full rebuild', build_s=build_s, refresh_s=refresh_s,
+                     query_ms=_query_latency_ms(index, queries), rss_mb=_rss_mb() - rss_before))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def run_incremental(args, out):
+    work_dir = tempfile.mkdtemp(prefix='bench_incremental_')
+    try:
+        vectors = _vectors(args.n_vectors, args.dimension, seed=0)
+        queries = _vectors(args.queries, args.dimension, seed=1)
+        keys = [f'table_{i}' for i in range(args.n_vectors)]
+        rss_before = _rss_mb()
+        start = time.perf_counter()
+        index = IncrementalAnnoyIndex(work_dir, args.dimension, n_trees=args.n_trees)
+        index.upsert(keys, vectors)
+        index = index.compact()
+        build_s = time.perf_counter() - start
+        del vectors
+
+        start = time.perf_counter()
+        index.upsert(keys[:args.changed], _vectors(args.changed, args.dimension, seed=2))
+        index.save()
+        refresh_s = time.perf_counter() - start
+
+        # a second process / bot opening the same index only maps the file
+        start = time.perf_counter()
+        reopened = IncrementalAnnoyIndex.open(work_dir, args.dimension)
+        open_s = time.perf_counter() - start
+        out.put(dict(variant='incremental', build_s=build_s, refresh_s=refresh_s, open_s=open_s,
+                     query_ms=_query_latency_ms(reopened, queries), rss_mb=_rss_mb() - rss_before))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--n-vectors', type=int, default=20000)
+    parser.add_argument('--dimension', type=int, default=768)
+    parser.add_argument('--n-trees', type=int, default=10)
+    parser.add_argument('--changed', type=int, default=10, help='number of re-crawled tables per refresh')
+    parser.add_argument('--queries', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"Vectors: {args.n_vectors}, Dimension: {args.dimension}, Trees: {args.n_trees}, Changed per refresh: {args.changed}")
+    results = []
+    for target in (run_annoy_full_rebuild, run_incremental):
+        out = multiprocessing.Queue()
+        p = multiprocessing.Process(target=target, args=(args, out))
+        p.start()
+        results.append(out.get())
+        p.join()
+
+    for r in results:
+        print(f"{r['variant']:>20}: build {r['build_s']:.2f}s, refresh {r['refresh_s']:.3f}s"
+              f"{', reopen %.3fs' % r['open_s'] if 'open_s' in r else ''}"
+              f", query {r['query_ms']:.2f}ms, rss +{r['rss_mb']:.0f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark: process RSS as bots are added, one metadata index per bot (the previous path) vs the shared
+MetadataSearchService.
+
+A harvest results table of --tables rows with --dimension embeddings, spread over a few connections, is generated in
+memory. Every bot may see Snowflake and all but one of the other connections. The per-bot variant syncs an
+IncrementalAnnoyIndex per bot into its own directory; the shared variant syncs one index and filters per bot at query
+time. After each bot is added it runs --queries searches for that bot and reports the RSS. Each variant runs in its
+own process.
+
+    python -m benchmarks.benchmark_metadata_search --bots 40 --tables 5000 --dimension 3072
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from genesis_bots.schema_explorer import embeddings_index_handler
+from genesis_bots.schema_explorer.metadata_search_service import MetadataSearchService
+from genesis_bots.schema_explorer.metadata_vector_index import IncrementalAnnoyIndex
+
+SOURCES = ['Snowflake', 'pg_sales', 'pg_hr', 'mysql_ops', 'redshift_dw']
+TABLE_ID = 'GENESIS.APP.HARVEST_RESULTS'
+
+
+def _rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+class _HarvestResults:
+
+    def __init__(self, n_tables, dimension):
+        rng = np.random.default_rng(0)
+        self.keys = [f'{SOURCES[i % len(SOURCES)]}."DB"."S"."T{i}"' for i in range(n_tables)]
+        self.vectors = rng.standard_normal((n_tables, dimension)).astype(np.float32)
+        self.position = {k: i for i, k in enumerate(self.keys)}
+
+    def get_embedding_visible_sources(self, bot_id):
+        hidden = SOURCES[1 + int(bot_id.split('_')[1]) % (len(SOURCES) - 1)]
+        return [s for s in SOURCES if s != hidden]
+
+    def _visible(self, bot_id):
+        if bot_id is None:
+            return self.keys
+        sources = set(self.get_embedding_visible_sources(bot_id))
+        return [k for k in self.keys if k.partition('.')[0] in sources]
+
+    def generate_filename_from_last_modified(self, table_id, bot_id=None):
+        return 'v1', None
+
+    def fetch_embedding_versions(self, table_id, bot_id=None):
+        return {k: 'v1' for k in self._visible(bot_id)}
+
+    def fetch_embeddings(self, table_id, bot_id=None, keys=None):
+        keys = list(keys) if keys is not None else self._visible(bot_id)
+        return keys, self.vectors[[self.position[k] for k in keys]]
+
+
+def run_variant(variant, args):
+    work_dir = tempfile.mkdtemp(prefix='bench_metadata_search_')
+    embeddings_index_handler.index_file_path = work_dir
+    harvest = _HarvestResults(args.tables, args.dimension)
+    queries = np.random.default_rng(1).standard_normal((args.queries, args.dimension)).astype(np.float32)
+    try:
+        baseline = _rss_mb()
+        shared = None
+        if variant == 'shared':
+            shared = MetadataSearchService(TABLE_ID, db_adapter=harvest, index_dir=os.path.join(work_dir, 'shared'))
+        indexes = {}
+        start = time.perf_counter()
+        for b in range(args.bots):
+            bot_id = f'bot_{b}'
+            if shared is not None:
+                shared.refresh()
+                for q in queries:
+                    shared.search(q, 1000, bot_id=bot_id)
+            else:
+                index = IncrementalAnnoyIndex.open(os.path.join(work_dir, bot_id), args.dimension)
+                index = embeddings_index_handler.sync_embeddings_index(index, TABLE_ID, bot_id, db_adapter=harvest)
+                indexes[bot_id] = index
+                for q in queries:
+                    index.get_nns_by_vector(q, 1000, include_distances=True)
+            if b + 1 in (1, 5, 10, 20, 40, 80) or b + 1 == args.bots:
+                print(f"{variant} {b + 1} {_rss_mb() - baseline:.1f} {time.perf_counter() - start:.2f}", flush=True)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bots', type=int, default=20)
+    parser.add_argument('--tables', type=int, default=2000)
+    parser.add_argument('--dimension', type=int, default=768)
+    parser.add_argument('--queries', type=int, default=5)
+    parser.add_argument('--variant', choices=['per-bot', 'shared'])
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(args.variant, args)
+        return
+
+    print(f"Metadata search RSS: {args.tables} tables x {args.dimension} dimensions, {args.queries} searches per bot")
+    print(f"  {'variant':>8} {'bots':>5} {'RSS growth MB':>14} {'seconds':>8}")
+    for variant in ('per-bot', 'shared'):
+        out = subprocess.run([sys.executable, '-m', 'benchmarks.benchmark_metadata_search',
+                              '--variant', variant, '--bots', str(args.bots), '--tables', str(args.tables),
+                              '--dimension', str(args.dimension), '--queries', str(args.queries)],
+                             capture_output=True, text=True, check=True).stdout
+        for line in out.splitlines():
+            if not line.startswith(variant + ' '):
+                continue
+            name, bots, rss, seconds = line.split()
+            print(f"  {name:>8} {bots:>5} {float(rss):>14.1f} {float(seconds):>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Micro-benchmark: Snowflake-to-SQLite query translation with and without the SQLiteCursorWrapper translation cache.
+
+The corpus holds the statements the connectors issue most often in SQLite mode (chat history inserts, LLM result
+polling, bot / token / process lookups, harvest reads). Each round translates every statement once, as a running
+server does over and over.
+
+    python -m benchmarks.benchmark_sqlite_query_cache --rounds 2000
+"""
+import argparse
+import os
+import time
+
+SCHEMA = 'GENESIS_BOTS.APP1'
+
+CORPUS = [
+    # insert_chat_history_row
+    f"""
+            INSERT INTO {SCHEMA}.MESSAGE_LOG
+                (timestamp, bot_id, bot_name, thread_id, message_type, message_payload, message_metadata, tokens_in, tokens_out, files, channel_type, channel_name, primary_user, task_id)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """,
+    # db_insert_llm_results / db_update_llm_results / db_get_llm_results
+    f"""
+            INSERT INTO {SCHEMA}.LLM_RESULTS (uu, message, created)
+            VALUES (%s, %s, CURRENT_TIMESTAMP)
+        """,
+    f"""
+            UPDATE {SCHEMA}.LLM_RESULTS
+            SET message = %s
+            WHERE uu = %s
+        """,
+    f"""
+            SELECT message
+            FROM {SCHEMA}.LLM_RESULTS
+            WHERE uu = %s
+        """,
+    # db_get_active_llm_key
+    f"""
+            SELECT llm_key, llm_type, llm_endpoint, model_name, embedding_model_name
+            FROM {SCHEMA}.llm_tokens
+            WHERE runner_id = %s and active = True
+        """,
+    # bot lookups
+    f"SELECT BOT_NAME, BOT_AVATAR_IMAGE FROM {SCHEMA}.BOT_SERVICING WHERE BOT_ID = %s",
+    f"SELECT * FROM {SCHEMA}.BOT_SERVICING WHERE RUNNER_ID = %s",
+    # processes / tasks
+    f"SELECT process_id, bot_id, process_name, process_instructions FROM {SCHEMA}.PROCESSES WHERE upper(bot_id) = upper(%s)",
+    f"""SELECT task_id, bot_id, task_name, next_check_ts, action_trigger_type, task_active
+            FROM {SCHEMA}.TASKS WHERE task_active = True AND next_check_ts <= CURRENT_TIMESTAMP()""",
+    # harvest reads
+    f"""SELECT qualified_table_name, embedding, source_name
+                    FROM {SCHEMA}.HARVEST_RESULTS
+                    WHERE embedding IS NOT NULL
+                    AND (source_name IN ('Snowflake'))
+                    ORDER BY source_name, qualified_table_name
+                    LIMIT 5000""",
+    f"SELECT MAX(LAST_CRAWLED_TIMESTAMP) AS last_crawled_time FROM {SCHEMA}.HARVEST_RESULTS",
+    # insert_table_summary (SQLite branch, named params)
+    f"""
+                SELECT COUNT(*)
+                FROM {SCHEMA}.HARVEST_RESULTS
+                WHERE source_name = %(source_name)s
+                AND qualified_table_name = %(qualified_table_name)s
+            """,
+]
+
+
+def _time_rounds(translate, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for query in CORPUS:
+            translate(query, '%(' in query)
+    return (time.perf_counter() - start) * 1e6 / (rounds * len(CORPUS))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=2000)
+    args = parser.parse_args()
+
+    os.environ.setdefault('GENESIS_INTERNAL_DB_SCHEMA', SCHEMA)
+    from genesis_bots.connectors.sqlite_adapter import SQLiteCursorWrapper
+
+    wrapper = SQLiteCursorWrapper(None)
+    SQLiteCursorWrapper.clear_translation_cache()
+    for query in CORPUS:
+        # the cache must not change the translation
+        named = '%(' in query
+        uncached = wrapper._translate_uncached(query, named)
+        cached = wrapper._translate(query, named)
+        assert (tuple(uncached) if isinstance(uncached, list) else uncached) == cached, query
+
+    uncached_us = _time_rounds(wrapper._translate_uncached, args.rounds)
+    SQLiteCursorWrapper.clear_translation_cache()
+    cached_us = _time_rounds(wrapper._translate, args.rounds)
+    info = SQLiteCursorWrapper.translation_cache_info()
+
+    print(f"Corpus: {len(CORPUS)} statements, {args.rounds} rounds")
+    print(f"  uncached translation: {uncached_us:8.2f} us/statement")
+    print(f"  cached translation:   {cached_us:8.2f} us/statement ({uncached_us / cached_us:.0f}x)")
+    print(f"  cache: {info['hits']} hits, {info['misses']} misses, {info['size']} entries")
+
+
+if __name__ == "__main__":
+    main()
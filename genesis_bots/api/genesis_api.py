@@ -12,6 +12,8 @@ from   genesis_bots.api.server_proxy \
 
 class GenesisAPI:
 
+    STREAM_WAIT_SECONDS = 10.0 # how long the server may hold a response read open waiting for new text
+
     def __init__(self,
                  server_proxy: GenesisServerProxyBase,
                  ):
@@ -61,32 +63,67 @@ class GenesisAPI:
 
 
     def get_response(self, bot_id, request_id=None, timeout_seconds=None, print_stream=False) -> str:
+        response, thread_id = self.get_response_with_thread_id(bot_id, request_id, timeout_seconds, print_stream)
+        return response
+
+
+    def get_response_with_thread_id(self, bot_id, request_id=None, timeout_seconds=None, print_stream=False) -> tuple[str, str]:
+        # The server sends only the text added since our last read and holds each read open (long poll) until there
+        # is something new, so a long response is transferred once instead of on every poll.
         time_start = time.time()
-        done = False
-        last_response = "" # contains the full (cumulated) response, cleaned up from the trailing "chat" suffix ('💬')
+        response = "" # the full response so far, without the trailing "chat" suffix ('💬')
+        offset, epoch = 0, 0
+        thread_id = None
         while timeout_seconds is None or time.time() - time_start < timeout_seconds:
-            response, thread_id = self._server_proxy.get_message(bot_id, request_id)
-            if response is not None:
-                if len(response) > 2 and response.endswith(' 💬'): # remove trailing chat bubble
-                    response = response[:-2]
-                else:
-                    done = True
-                # Store the new content before any formatting
-                new_content = response[len(last_response):]
-                last_response = response  # Update last_response before formatting
+            wait_seconds = self.STREAM_WAIT_SECONDS
+            if timeout_seconds is not None:
+                wait_seconds = max(0.0, min(wait_seconds, timeout_seconds - (time.time() - time_start)))
+            delta = self._server_proxy.get_message_delta(bot_id, request_id, offset, epoch, wait_seconds)
+            if delta is None: # server without streaming support
+                remaining = None if timeout_seconds is None else timeout_seconds - (time.time() - time_start)
+                return self._poll_response(bot_id, request_id, remaining, print_stream)
+            thread_id = delta.get("thread_id") or thread_id
+            if delta["reset"]:
+                # earlier text was rewritten: replace it (and start a new line when printing)
+                new_content = ("\n" if response else "") + delta["text"]
+                response = delta["text"]
+            else:
+                new_content = delta["text"]
+                response += new_content
+            offset, epoch = delta["offset"], delta["epoch"]
 
-                # Format the new content for display only
-                if print_stream:
-                    display_content = re.sub(r'(?<!\n)(🤖|🧰)', r'\n\1', new_content)
-                    print(f"\033[96m{display_content}\033[0m", end='', flush=True)  # Cyan text
+            if print_stream and new_content:
+                display_content = re.sub(r'(?<!\n)(🤖|🧰)', r'\n\1', new_content)
+                print(f"\033[96m{display_content}\033[0m", end='', flush=True)  # Cyan text
 
-                if done:
-                    return response
+            if delta["done"]:
+                return response, thread_id
+        return  None, None
+
+
+    def get_responses(self, bot_id, request_ids, timeout_seconds=None) -> dict[str, tuple[str, str]]:
+        """
+        Waits for the responses to several requests submitted to the same bot, polling for all pending requests with
+        a single server round trip.
 
+        Returns a dict mapping each request_id to (response, thread_id); (None, None) for requests that did not
+        complete within timeout_seconds.
+        """
+        time_start = time.time()
+        results = {request_id: (None, None) for request_id in request_ids}
+        pending = list(results)
+        while pending and (timeout_seconds is None or time.time() - time_start < timeout_seconds):
+            for request_id, (response, thread_id) in self._server_proxy.get_messages(bot_id, pending).items():
+                if response is not None and not (len(response) > 2 and response.endswith(' 💬')):
+                    results[request_id] = (response, thread_id)
+            pending = [request_id for request_id in pending if results[request_id][0] is None]
+            if pending:
                 time.sleep(0.2)
-        return  None
+        return results
 
-    def get_response_with_thread_id(self, bot_id, request_id=None, timeout_seconds=None, print_stream=False) -> tuple[str, str]:
+
+    def _poll_response(self, bot_id, request_id, timeout_seconds, print_stream) -> tuple[str, str]:
+        # polls for the full (cumulative) response text; used with servers that do not support get_message_delta
         time_start = time.time()
         done = False
         last_response = "" # contains the full (cumulated) response, cleaned up from the trailing "chat" suffix ('💬')
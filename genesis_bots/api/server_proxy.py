@@ -8,8 +8,10 @@ from   genesis_bots.demo.app.genesis_app \
                                 import DEFAULT_HTTP_ENDPOINT_PORT, genesis_app
 
 import json
+import os
 import requests
 from   requests                 import Response
+from   requests.adapters        import HTTPAdapter
 
 from   abc                      import ABC, abstractmethod
 import collections
@@ -25,6 +27,14 @@ from  getpass                  import getpass
 
 DEFAULT_GENESIS_DB = "GENESIS_BOTS"
 
+# message of the endpoint router for endpoints that the server does not have
+_UNREGISTERED_ENDPOINT_MSG = "is not registered with Flask app"
+
+
+class EndpointNotFoundError(Exception):
+    """The server does not have the requested endpoint (e.g. a server older than the client)."""
+
+
 class GenesisServerProxyBase(ABC):
     """
     GenesisServerProxyBase is an abstract base class that defines the interface for connecting to a Genesis server.
@@ -43,6 +53,7 @@ class GenesisServerProxyBase(ABC):
         self._client_tool_func_map: Dict[str, callable] = {} # maps function names to the tool functions (callable)
         self._client_tool_func_to_bots_map: Dict[str, Dict[str, set]] = {} # # maps function names to teh set of bots to which  was assigned
         self._is_connected = False
+        self._stream_supported = True # cleared if the server does not have the udf_proxy/lookup_stream endpoint
 
 
     @abstractmethod
@@ -117,18 +128,23 @@ class GenesisServerProxyBase(ABC):
 
 
     def _get_raw_message(self, bot_id, request_id) -> str:
-        # poll for responses through the end point.
-        data = json.dumps({"data": [[1, request_id, bot_id]]})
+        return self._get_raw_messages(bot_id, [request_id])[0]
+
+
+    def _get_raw_messages(self, bot_id, request_ids) -> list[tuple[str, str]]:
+        # poll for the responses of several requests through the end point, one row per request.
+        data = json.dumps({"data": [[i, request_id, bot_id] for i, request_id in enumerate(request_ids)]})
         response = self._send_REST_request("post", "udf_proxy/lookup_udf", data)
+        results = [(None, None)] * len(request_ids)
         if response.status_code == 200:
-            response_data = response.json()["data"][0][1]
-            if len(response.json()["data"]) > 0 and len(response.json()["data"][0]) > 2:
-                response_thread = response.json()["data"][0][2]
-            else:
-                response_thread = None
-            if response_data.lower() != "not found":
-                return response_data, response_thread
-        return None, None
+            for row in response.json()["data"]:
+                if not (isinstance(row[0], int) and 0 <= row[0] < len(results)):
+                    continue
+                response_data = row[1]
+                response_thread = row[2] if len(row) > 2 else None
+                if response_data.lower() != "not found":
+                    results[row[0]] = (response_data, response_thread)
+        return results
 
 
     def get_message(self, bot_id, request_id) -> tuple[str, str]:
@@ -137,39 +153,90 @@ class GenesisServerProxyBase(ABC):
         Returns:
             The message, or None if no message is found.
         """
-        msg, thread_id = self._get_raw_message(bot_id, request_id)
+        return self.get_messages(bot_id, [request_id])[request_id]
 
-        if msg is None:
-            return None, None
 
-        # check is this is a special action message
-        try:
-            action_msg = UDFBotOsInputAdapter.parse_action_msg(msg)
-        except ValueError as e:
-            pass # not an action message - regular chat response message
-        else:
-            if action_msg["action_type"] == "action_required":
-                # LLM requesting us to call a client tool.
-                # We expect all the following fields to be present in the action_msg:
-                invocation_id = action_msg["invocation_id"]
-                tool_func_name = action_msg["tool_func_name"]
-                invocation_kwargs = action_msg["invocation_kwargs"]
-                # invoke the tool and return the result
-                try:
-                    func_result = self._invoke_client_tool(tool_func_name, invocation_kwargs)
-                except Exception as e:
-                    func_result = f"Error invoking client tool: {str(e)}"
-                # send the result back to the LLM
-                result_msg = UDFBotOsInputAdapter.format_action_msg("action_result",
-                                                                    invocation_id=invocation_id,
-                                                                    func_result=func_result)
-                self.submit_message(bot_id, result_msg)
-                msg = None # this is an internal message. Hide it from the client.
+    def get_messages(self, bot_id, request_ids) -> dict[str, tuple[str, str]]:
+        """
+        Get the response messages of several requests to the same bot from the BotOsServer in one round trip.
+        Returns:
+            A dict mapping each request_id to (message, thread_id); (None, None) for requests without a response yet.
+        """
+        request_ids = list(request_ids)
+        results = {}
+        for request_id, (msg, thread_id) in zip(request_ids, self._get_raw_messages(bot_id, request_ids)):
+            if msg is None:
+                results[request_id] = (None, None)
+                continue
+
+            # check is this is a special action message
+            try:
+                action_msg = UDFBotOsInputAdapter.parse_action_msg(msg)
+            except ValueError as e:
+                pass # not an action message - regular chat response message
             else:
-                # We do not recognize this action message.
-                raise ValueError(f"Internal error:Unrecognized action message: {action_msg}")
+                self._handle_action_msg(bot_id, action_msg)
+                msg = None # this is an internal message. Hide it from the client.
+            results[request_id] = (msg, thread_id)
+        return results
+
+
+    def _handle_action_msg(self, bot_id, action_msg):
+        if action_msg["action_type"] == "action_required":
+            # LLM requesting us to call a client tool.
+            # We expect all the following fields to be present in the action_msg:
+            invocation_id = action_msg["invocation_id"]
+            tool_func_name = action_msg["tool_func_name"]
+            invocation_kwargs = action_msg["invocation_kwargs"]
+            # invoke the tool and return the result
+            try:
+                func_result = self._invoke_client_tool(tool_func_name, invocation_kwargs)
+            except Exception as e:
+                func_result = f"Error invoking client tool: {str(e)}"
+            # send the result back to the LLM
+            result_msg = UDFBotOsInputAdapter.format_action_msg("action_result",
+                                                                invocation_id=invocation_id,
+                                                                func_result=func_result)
+            self.submit_message(bot_id, result_msg)
+        else:
+            # We do not recognize this action message.
+            raise ValueError(f"Internal error:Unrecognized action message: {action_msg}")
+
+
+    def get_message_delta(self, bot_id, request_id, offset=0, epoch=0, wait_seconds=0.0) -> dict:
+        """
+        Incremental read of a response message from the BotOsServer (udf_proxy/lookup_stream endpoint).
+
+        Only the text added since `offset`/`epoch` (taken from the previous result, 0/0 initially) is transferred, and
+        the server waits up to `wait_seconds` for something new before answering. Client tool invocations requested
+        by the server are run here, before returning.
 
-        return msg, thread_id
+        Returns:
+            The delta dict (see UDFBotOsInputAdapter.lookup_stream), or None if the server does not support streaming.
+        """
+        if not self._stream_supported:
+            return None
+        data = json.dumps({"data": [[1, request_id, bot_id, offset, epoch, wait_seconds]]})
+        try:
+            response = self._send_REST_request("post", "udf_proxy/lookup_stream", data)
+        except EndpointNotFoundError:
+            # older server without the streaming endpoint: callers fall back to polling get_message from now on
+            self._stream_supported = False
+            return None
+        except Exception:
+            # transient failure (timeout, server error): only this call falls back to polling
+            return None
+        try:
+            delta = response.json()["data"][0][1]
+        except (ValueError, KeyError, IndexError, TypeError):
+            if _UNREGISTERED_ENDPOINT_MSG in response.text:
+                self._stream_supported = False
+            return None
+        if not isinstance(delta, dict) or "offset" not in delta:
+            return None # e.g. no input adapter for bot_id on the server
+        for action in delta.get("actions") or []:
+            self._handle_action_msg(bot_id, UDFBotOsInputAdapter.parse_action_msg(action))
+        return delta
 
 
     def run_genesis_tool(self, tool_name, params, bot_id) -> Union[dict, list, str]:
@@ -316,6 +383,11 @@ class RESTGenesisServerProxy(GenesisServerProxyBase):
         super().__init__()
         self.server_url = server_url
         self._use_endpoint_router = _use_endpoint_router
+        # keep-alive connections, reused by all requests (and threads) of this proxy
+        pool_size = int(os.getenv("GENESIS_API_HTTP_POOL_SIZE", "16"))
+        self._session = requests.Session()
+        self._session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self._session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
 
 
     def _connect(self):
@@ -346,8 +418,10 @@ class RESTGenesisServerProxy(GenesisServerProxyBase):
             headers_dict.update(extra_headers)
         op_name = str(op_name).lower()
         assert op_name in ["post", "get", "put", "delete"]
-        op_func = getattr(requests, op_name)
+        op_func = getattr(self._session, op_name)
         response = op_func(url, headers=headers_dict, data=payload)
+        if response.status_code == 404:
+            raise EndpointNotFoundError(f"Endpoint {endpoint_name} not found on the server")
         if response.status_code != 200:
             raise Exception(f"Failed to submit message to endpoint {endpoint_name}: {response.text}")
         return response
@@ -371,10 +445,12 @@ class RESTGenesisServerProxy(GenesisServerProxyBase):
 
         # Send the request to the endpoint router
         url = self.server_url + "/udf_proxy/endpoint_router"
-        response = requests.post(url, headers={"Content-Type": "application/json"}, data=request_data)
+        response = self._session.post(url, headers={"Content-Type": "application/json"}, data=request_data)
 
         # Check the response status
         if response.status_code != 200:
+            if _UNREGISTERED_ENDPOINT_MSG in response.text:
+                raise EndpointNotFoundError(f"Endpoint {endpoint_name} not found on the server")
             raise Exception(f"Failed to submit message to UDF proxy: {response.text}")
 
         return response
@@ -395,6 +471,11 @@ class RESTGenesisServerProxy(GenesisServerProxyBase):
             time.sleep(0.1)
 
 
+    def shutdown(self):
+        super().shutdown()
+        self._session.close()
+
+
 class SPCSServerProxy(GenesisServerProxyBase):
     """
     SPCSServerProxy is a concrete subclass of GenesisServerProxyBase that connects to the Genesis server
@@ -417,13 +498,17 @@ class SPCSServerProxy(GenesisServerProxyBase):
         self._engine = None
         self._genesis_db = genesis_db
         self._genesis_schema = "APP1"
-        self._connect_args = connect_args or {}
+        self._connect_args = dict(connect_args or {})
+        # keep the pooled Snowflake sessions alive between polls instead of re-authenticating
+        self._connect_args.setdefault("client_session_keep_alive", True)
 
 
     def _connect(self):
         # Create an engine and test the connection
         try:
-            self._engine = sqla.create_engine(self._connection_url, connect_args=self._connect_args)
+            self._engine = sqla.create_engine(self._connection_url, connect_args=self._connect_args,
+                                              pool_size=int(os.getenv("GENESIS_API_SQL_POOL_SIZE", "5")),
+                                              pool_pre_ping=True)
             with self._engine.connect() as conn:
                 conn.execute(sqla.text("SELECT current_version()"))
         except Exception as e:
@@ -456,6 +541,8 @@ class SPCSServerProxy(GenesisServerProxyBase):
             else:
                 result = list(row)[0]
         except Exception as e:
+            if _UNREGISTERED_ENDPOINT_MSG in str(e):
+                raise EndpointNotFoundError(f"Endpoint {endpoint_name} not found on the server")
             raise RuntimeError(f"Failed to execute the ENDPOINT_ROUTER UDF: {str(e)}")
         resp = requests.Response()
         resp._content = result.encode('utf-8')
@@ -0,0 +1,143 @@
+"""
+Process-wide read-through cache of the bot configurations in the BOT_SERVICING table.
+
+get_bot_details and list_all_bots are called on hot paths (tool submission, session creation, every cycle of the task
+loop), and each call used to be a round trip to BOT_SERVICING. BotConfigCache serves them from memory:
+
+* bot details (SELECT * per bot) are loaded in bulk, one query for all the bots, and kept by upper-case bot_id
+* the results of db_list_all_bots are kept per combination of arguments
+
+Every mutation of BOT_SERVICING made through make_baby_bot calls invalidate(), which increments the cache version and
+drops the affected entries; loads that were started under an older version are not stored. Entries also expire after
+BOT_CONFIG_CACHE_TTL_SECONDS, which bounds how long a change made by another process (e.g. the task server) stays
+unnoticed.
+"""
+
+import os
+import threading
+import time
+
+from   genesis_bots.connectors  import get_global_db_connector
+
+DEFAULT_TTL_SECONDS = 30
+
+
+class BotConfigCache:
+    """
+    :param db_adapter: connector holding the BOT_SERVICING table (default: the global db connector).
+    :param ttl_seconds: lifetime of the cached entries (default: env BOT_CONFIG_CACHE_TTL_SECONDS or 30).
+    """
+
+    def __init__(self, db_adapter=None, ttl_seconds=None):
+        self._db_adapter = db_adapter
+        if ttl_seconds is None:
+            ttl_seconds = float(os.getenv('BOT_CONFIG_CACHE_TTL_SECONDS', DEFAULT_TTL_SECONDS))
+        self.ttl_seconds = ttl_seconds
+        self.version = 0
+        self.stats = {'hits': 0, 'misses': 0, 'bulk_loads': 0, 'invalidations': 0}
+        self._lock = threading.Lock()
+        self._details = {}          # upper(bot_id) -> BOT_SERVICING row
+        self._loaded_at = None      # time of the last bulk load of _details, None when one is due
+        self._lists = {}            # db_list_all_bots arguments -> (loaded_at, rows)
+
+
+    @property
+    def db_adapter(self):
+        if self._db_adapter is None:
+            self._db_adapter = get_global_db_connector()
+        return self._db_adapter
+
+
+    def _table_args(self):
+        db_adapter = self.db_adapter
+        project_id, dataset_name = db_adapter.genbot_internal_project_and_schema.split('.')
+        return dict(project_id=project_id, dataset_name=dataset_name,
+                    bot_servicing_table=db_adapter.bot_servicing_table_name)
+
+
+    def _fresh(self, loaded_at, now):
+        return loaded_at is not None and now - loaded_at < self.ttl_seconds
+
+
+    def get(self, bot_id):
+        """The BOT_SERVICING row of `bot_id` as a dict (a copy, callers may modify it), or None if there is no such bot."""
+        key = (bot_id or '').upper()
+        now = time.monotonic()
+        with self._lock:
+            bulk = not self._fresh(self._loaded_at, now)
+            row = None if bulk else self._details.get(key)
+            self.stats['hits' if row is not None else 'misses'] += 1
+            version = self.version
+        if row is not None:
+            return dict(row)
+
+        if bulk:
+            rows = self.db_adapter.db_get_all_bot_details(**self._table_args())
+            if rows is not None:
+                details = {r['bot_id'].upper(): r for r in rows if r.get('bot_id')}
+                with self._lock:
+                    if self.version == version:
+                        self._details, self._loaded_at = details, now
+                    self.stats['bulk_loads'] += 1
+                row = details.get(key)
+                return dict(row) if row is not None else None
+
+        # a bot invalidated (or created) since the last bulk load, or the bulk load failed
+        row = self.db_adapter.db_get_bot_details(bot_id=bot_id, **self._table_args())
+        if row is None:
+            return None
+        with self._lock:
+            if self.version == version and self._loaded_at is not None:
+                self._details[key] = row
+        return dict(row)
+
+
+    def list_bots(self, runner_id=None, full=False, slack_details=False, with_instructions=False):
+        """Cached db_list_all_bots (same arguments and result)."""
+        if isinstance(with_instructions, str):
+            with_instructions = with_instructions.lower() == 'true'
+        key = (runner_id, bool(full), bool(slack_details), bool(with_instructions))
+        now = time.monotonic()
+        with self._lock:
+            loaded_at, rows = self._lists.get(key, (None, None))
+            hit = self._fresh(loaded_at, now)
+            self.stats['hits' if hit else 'misses'] += 1
+            version = self.version
+        if not hit:
+            rows = self.db_adapter.db_list_all_bots(runner_id=runner_id, full=full, slack_details=slack_details,
+                                                    with_instructions=with_instructions, **self._table_args())
+            with self._lock:
+                if self.version == version:
+                    self._lists[key] = (now, rows)
+        return [dict(r) for r in rows]
+
+
+    def invalidate(self, bot_id=None):
+        """Drops the cached configuration of `bot_id` (of every bot when None) and all cached bot lists."""
+        with self._lock:
+            self.version += 1
+            self.stats['invalidations'] += 1
+            self._lists.clear()
+            if bot_id is None:
+                self._details.clear()
+                self._loaded_at = None
+            else:
+                self._details.pop(bot_id.upper(), None)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_bot_config_cache():
+    """The process-wide BotConfigCache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = BotConfigCache()
+        return _cache
+
+
+def invalidate_bot_config(bot_id=None):
+    """Called after BOT_SERVICING is modified; see BotConfigCache.invalidate."""
+    get_bot_config_cache().invalidate(bot_id)
@@ -1,5 +1,7 @@
 # make_baby_bot.py
 
+import functools
+import inspect
 import json
 import os
 import requests
@@ -8,6 +10,8 @@ import uuid
 import threading
 from   typing                   import Dict, Mapping
 
+from   genesis_bots.bot_genesis.bot_config_cache \
+                                import get_bot_config_cache, invalidate_bot_config
 from   genesis_bots.connectors  import get_global_db_connector
 from   genesis_bots.connectors.connector_helpers \
                                 import llm_keys_and_types_struct
@@ -22,25 +26,35 @@ def _get_project_id_and_dataset_name(bb_db_connector):
     project_id, dataset_name = bb_db_connector.genbot_internal_project_and_schema.split('.')
     return project_id, dataset_name
 
+def _invalidates_bot_config(func):
+    # decorator for the functions below that modify BOT_SERVICING: when they return, drop the cached configuration of
+    # the bot they modified (of all bots when they have no bot_id argument) from the bot config cache
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            try:
+                bot_id = signature.bind_partial(*args, **kwargs).arguments.get('bot_id')
+            except TypeError:
+                bot_id = None
+            invalidate_bot_config(bot_id)
+    return wrapper
+
+# bot configuration reads are served by the process-wide bot config cache (see bot_config_cache.py)
+
 def list_all_bots(runner_id=None, slack_details=False, with_instructions=False, thread_id=None, bot_id=None):
-    bb_db_connector = get_global_db_connector()
-    project_id, dataset_name = _get_project_id_and_dataset_name(bb_db_connector)
-    bot_servicing_table = bb_db_connector.bot_servicing_table_name
-    return bb_db_connector.db_list_all_bots(project_id=project_id, dataset_name=dataset_name, bot_servicing_table=bot_servicing_table, runner_id=runner_id, full=False, slack_details=slack_details, with_instructions=with_instructions)
+    return get_bot_config_cache().list_bots(runner_id=runner_id, full=False, slack_details=slack_details, with_instructions=with_instructions)
 
 def list_all_bots_wrap(runner_id=None, slack_details=False, with_instructions=False, thread_id=None, bot_id=None):
-    bb_db_connector = get_global_db_connector()
-    bot_servicing_table = bb_db_connector.bot_servicing_table_name
-    project_id, dataset_name = _get_project_id_and_dataset_name(bb_db_connector)
-    result = bb_db_connector.db_list_all_bots(project_id=project_id, dataset_name=dataset_name, bot_servicing_table=bot_servicing_table, runner_id=runner_id, full=False, slack_details=slack_details, with_instructions=with_instructions)
+    result = get_bot_config_cache().list_bots(runner_id=runner_id, full=False, slack_details=slack_details, with_instructions=with_instructions)
     result = json.loads(json.dumps(result).replace('!NO_RESPONSE_REQUIRED', '(exclamation point)NO_RESPONSE_REQUIRED'))
     return result
 
 def get_all_bots_full_details(runner_id):
-    bb_db_connector = get_global_db_connector()
-    bot_servicing_table = bb_db_connector.bot_servicing_table_name
-    project_id, dataset_name = _get_project_id_and_dataset_name(bb_db_connector)
-    return bb_db_connector.db_list_all_bots(project_id=project_id, dataset_name=dataset_name, bot_servicing_table=bot_servicing_table, runner_id=runner_id, full=True, with_instructions=True)
+    return get_bot_config_cache().list_bots(runner_id=runner_id, full=True, with_instructions=True)
 
 def set_slack_config_tokens(slack_app_config_token, slack_app_config_refresh_token):
     #test
@@ -404,6 +418,7 @@ def create_slack_bot_with_manifest(token, manifest):
     else:
         raise Exception(f"Failed to create Slack bot, status code: {response.status_code}")
 
+@_invalidates_bot_config
 def insert_new_bot(api_app_id, bot_slack_user_id, bot_id, bot_name, bot_instructions, runner_id, slack_signing_secret,
                    slack_channel_id, available_tools, auth_url, auth_state, client_id, client_secret, udf_active,
                    slack_active, files, bot_implementation, bot_avatar_image, bot_intro_prompt="Hello, how can I help you?", slack_user_allow=True):
@@ -436,6 +451,7 @@ def insert_new_bot(api_app_id, bot_slack_user_id, bot_id, bot_name, bot_instruct
 
 
 modify_lock = threading.Lock()
+@_invalidates_bot_config
 def modify_slack_allow_list(bot_id, action, user_name=None, user_identifier=None, thread_id=None, confirmed=None):
 
     """
@@ -617,6 +633,7 @@ def modify_slack_allow_list(bot_id, action, user_name=None, user_identifier=None
 
 
 
+@_invalidates_bot_config
 def add_new_tools_to_bot(bot_id, new_tools):
     """
     Adds new (non-ephemeral) tools to an existing bot's available_tools list if they are not already present.
@@ -753,6 +770,7 @@ def validate_potential_files(new_file_ids=None):
     # Proceed if all files are present in the stage
     return {"success": True, "message": "All files are valid"}
 
+@_invalidates_bot_config
 def add_bot_files(bot_id, new_file_names=None, new_file_ids=None):
     """
     Adds a new file ID to the existing files list for the bot and saves it to the database.
@@ -804,6 +822,7 @@ def add_bot_files(bot_id, new_file_names=None, new_file_ids=None):
     bot_servicing_table = bb_db_connector.bot_servicing_table_name
     return bb_db_connector.db_update_bot_files(project_id=project_id, dataset_name=dataset_name, bot_servicing_table=bot_servicing_table, bot_id=bot_id, updated_files_str=updated_files_str, current_files=current_files, new_file_ids=new_file_ids)
 
+@_invalidates_bot_config
 def remove_bot_files(bot_id, file_ids_to_remove):
     """
     Removes a file ID from the existing files list for the bot and saves it to the database.
@@ -858,6 +877,7 @@ def remove_bot_files(bot_id, file_ids_to_remove):
     return bb_db_connector.db_update_bot_files(project_id=project_id, dataset_name=dataset_name, bot_servicing_table=bot_servicing_table, bot_id=bot_id, updated_files_str=updated_files_str, current_files=current_files, new_file_ids=file_ids_to_remove)
 
 
+@_invalidates_bot_config
 def update_bot_instructions(bot_id, new_instructions=None, bot_instructions=None, confirmed=None, thread_id = None):
 
     """
@@ -943,6 +963,7 @@ def test_slack_app_level_token(app_level_token):
         # The token is not valid
         return {"success": False, "error": "The token is invalid.  Make sure you provide an App Level Token with connection-write scope.  It should start with xapp-."}
 
+@_invalidates_bot_config
 def update_bot_details(bot_id, bot_slack_user_id, slack_app_token):
     bb_db_connector = get_global_db_connector()
     bot_servicing_table = bb_db_connector.bot_servicing_table_name
@@ -950,6 +971,7 @@ def update_bot_details(bot_id, bot_slack_user_id, slack_app_token):
     return bb_db_connector.db_update_bot_details(bot_id, bot_slack_user_id, slack_app_token, project_id, dataset_name, bot_servicing_table)
 
 
+@_invalidates_bot_config
 def update_slack_app_level_key(bot_id, slack_app_level_key):
     """
     Wrapper function to update the Slack app level key for a specific bot after verifying it is a valid app level token.
@@ -1005,6 +1027,7 @@ def update_slack_app_level_key(bot_id, slack_app_level_key):
         return {"success": False, "error": str(e)}
 
 
+@_invalidates_bot_config
 def update_existing_bot(api_app_id, bot_id, bot_slack_user_id, client_id, client_secret, slack_signing_secret,
                         auth_url, auth_state, udf_active, slack_active, files, bot_implementation):
     files_json = json.dumps(files) if files else None
@@ -1029,10 +1052,7 @@ def get_bot_details(bot_id):
     Returns:
         dict: A dictionary containing the bot details if found, otherwise None.
     """
-    bb_db_connector = get_global_db_connector()
-    bot_servicing_table = bb_db_connector.bot_servicing_table_name
-    project_id, dataset_name = _get_project_id_and_dataset_name(bb_db_connector)
-    return bb_db_connector.db_get_bot_details(project_id=project_id, dataset_name=dataset_name, bot_servicing_table=bot_servicing_table, bot_id=bot_id)
+    return get_bot_config_cache().get(bot_id)
 
 
 def get_available_tools() -> Dict[str, str]:
@@ -1051,6 +1071,7 @@ def get_default_avatar():
     return bb_db_connector.db_get_default_avatar()
 
 
+@_invalidates_bot_config
 def make_baby_bot(
     bot_id: str,
     bot_name: str,
@@ -1395,6 +1416,7 @@ def deploy_to_slack(bot_id=None, thread_id=None):
     return deploy_result
 
 
+@_invalidates_bot_config
 def _remove_bot(bot_id, thread_id=None, confirmed=None):
 
     """
@@ -1483,6 +1505,7 @@ def _remove_bot(bot_id, thread_id=None, confirmed=None):
         return {"success": True, "message": f"Successfully deleted bot with bot_id: {bot_id}."}
 
 
+@_invalidates_bot_config
 def update_bot_implementation(bot_id, bot_implementation, thread_id=None):
     """
     Updates the bot_implementation field in the BOT_SERVICING table for a given bot_id.
@@ -1960,6 +1983,7 @@ def update_slack_bot_endpoint(bot_id, api_app_id, request_url, redirect_url, sla
 
 #update_bot_endpoints(new_base_url='https://9942-141-239-172-58.ngrok-free.app',runner_id='jl-local-runner')
 
+@_invalidates_bot_config
 def remove_tools_from_bot(bot_id, remove_tools):
     """
     Remove existing tools from an existing bot's available_tools list if they are present.
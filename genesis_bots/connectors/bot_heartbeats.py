@@ -0,0 +1,141 @@
+"""
+Liveness heartbeats of the bots, replacing the BOTS_ACTIVE table.
+
+Bot sessions used to record that the bots were in use by running CREATE OR REPLACE TABLE bots_active ("<timestamp>"
+STRING) from the message path, and the task server, knowledge server and harvester parsed the timestamp back out of
+DESCRIBE TABLE: one DDL statement per heartbeat, which on Snowflake is slow and wakes up the warehouse.
+
+A heartbeat is now a dict update in the HeartbeatRegistry of the connector. A background thread writes the latest
+timestamp of every bot that beat since its previous write to the BOT_HEARTBEATS table (BOT_ID, RUNNER_ID, LAST_ACTIVE
+in UTC, one row per bot and runner) with a single upsert every `flush_interval` seconds, however many messages there
+were. Readers get the bots that were active in the last N minutes with one query (db_get_active_bots of the connector).
+The row with BOT_ID RUNNER_BOT_ID is the heartbeat of the runner itself, written when it starts.
+"""
+
+import atexit
+from   datetime                 import datetime, timezone
+import os
+import threading
+
+from   genesis_bots.core.logging_config \
+                                import logger
+
+RUNNER_BOT_ID = '*'
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def utc_now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class HeartbeatRegistry:
+    """
+    :param write_rows: callable that upserts and commits a list of (bot_id, runner_id, last_active) rows.
+    :param runner_id: runner the heartbeats of this process are recorded for.
+    :param flush_interval: seconds between two writes of the beats received in the meantime.
+    """
+
+    def __init__(self, write_rows, runner_id, flush_interval=60.0):
+        self.write_rows = write_rows
+        self.runner_id = runner_id
+        self.flush_interval = flush_interval
+        self.stats = {'beats': 0, 'writes': 0, 'rows_written': 0, 'failed_writes': 0}
+        self._cond = threading.Condition()
+        self._beats = {}            # bot_id -> last heartbeat (UTC)
+        self._dirty = set()         # bot_ids with a heartbeat not written yet
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="bot_heartbeats", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+
+    def beat(self, bot_id=RUNNER_BOT_ID):
+        """Records that `bot_id` is active now. Only updates memory; the write happens in the background."""
+        with self._cond:
+            self._beats[bot_id] = utc_now()
+            self._dirty.add(bot_id)
+            self.stats['beats'] += 1
+            if len(self._dirty) == 1:
+                self._cond.notify_all()
+
+
+    def last_active(self, bot_id=None):
+        """The last heartbeat (UTC) of `bot_id` in this process, of any bot when None; None if there was none."""
+        with self._cond:
+            if bot_id is not None:
+                return self._beats.get(bot_id)
+            return max(self._beats.values(), default=None)
+
+
+    def flush(self):
+        """Writes the pending heartbeats now, in the calling thread."""
+        with self._cond:
+            rows = self._take_dirty()
+        if rows:
+            self._write(rows)
+
+
+    def close(self):
+        if self._closed:
+            return
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(5)
+        self.flush()
+
+
+    def _take_dirty(self):
+        rows = [(bot_id, self.runner_id, self._beats[bot_id].strftime(TIMESTAMP_FORMAT)) for bot_id in self._dirty]
+        self._dirty.clear()
+        return rows
+
+
+    def _write(self, rows):
+        try:
+            self.write_rows(rows)
+        except Exception as e:
+            logger.info(f"Failed to write {len(rows)} bot heartbeats: {e}")
+            with self._cond:
+                self.stats['failed_writes'] += 1
+                self._dirty.update(bot_id for bot_id, _, _ in rows)     # retried with the next write
+            return
+        with self._cond:
+            self.stats['writes'] += 1
+            self.stats['rows_written'] += len(rows)
+
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._dirty and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                rows = self._take_dirty()
+            self._write(rows)
+            with self._cond:
+                # beats arriving until the next write are only kept in memory
+                self._cond.wait_for(lambda: self._closed, self.flush_interval)
+
+
+_registries_lock = threading.Lock()
+
+
+def get_heartbeat_registry(connector):
+    """
+    Returns the HeartbeatRegistry of a database connector (created on first use around its _write_bot_heartbeats), or
+    None if the connector does not keep heartbeats. Tuning: BOT_HEARTBEAT_FLUSH_SECONDS; the runner is RUNNER_ID.
+    """
+    registry = getattr(connector, '_heartbeat_registry', False)
+    if registry is False:
+        with _registries_lock:
+            registry = getattr(connector, '_heartbeat_registry', False)
+            if registry is False:
+                registry = None
+                if hasattr(connector, '_write_bot_heartbeats'):
+                    registry = HeartbeatRegistry(connector._write_bot_heartbeats,
+                                                 runner_id=os.getenv('RUNNER_ID', 'jl-local-runner'),
+                                                 flush_interval=float(os.getenv('BOT_HEARTBEAT_FLUSH_SECONDS', '60')))
+                connector._heartbeat_registry = registry
+    return registry
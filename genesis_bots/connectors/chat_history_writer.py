@@ -0,0 +1,192 @@
+"""
+Write-behind writer for the chat history (message log) table.
+
+insert_chat_history_row() used to run one INSERT and one COMMIT per message, synchronously on the response path of
+every turn. With a ChatHistoryWriter the row is only appended to a bounded in-memory queue; a background thread writes
+queued rows in batches (one executemany + commit per batch) when `max_batch_rows` rows are queued or `flush_interval`
+seconds after the oldest unwritten row arrived, whichever comes first.
+
+  * Backpressure: when `max_queue_rows` rows are waiting, enqueue() blocks until the writer catches up; the number of
+    blocked calls and the time spent blocked are reported by metrics().
+  * Durability: flush() returns once every row enqueued before the call has been committed (or has failed); close()
+    flushes and stops the thread, and runs automatically at interpreter exit.
+  * A batch that fails as a whole is retried row by row, so one bad row does not lose its neighbours.
+"""
+
+import atexit
+from   collections              import deque
+import os
+import threading
+import time
+
+from   genesis_bots.core.logging_config \
+                                import logger
+
+
+class ChatHistoryWriter:
+    """
+    :param write_rows: callable that durably writes (inserts and commits) a list of row tuples, and leaves nothing
+                       written (rolls back) when it raises.
+    :param max_batch_rows: size-based flush trigger and maximum rows per write.
+    :param flush_interval: time-based flush trigger, in seconds.
+    :param max_queue_rows: bound of the queue; enqueue() blocks while it is full.
+    """
+
+    def __init__(self, write_rows, max_batch_rows=200, flush_interval=0.5, max_queue_rows=10000, name="chat_history"):
+        self.write_rows = write_rows
+        self.max_batch_rows = max(1, max_batch_rows)
+        self.flush_interval = flush_interval
+        self.max_queue_rows = max(self.max_batch_rows, max_queue_rows)
+        self.name = name
+
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._oldest_enqueued_at = None
+        self._enqueued_seq = 0       # rows ever enqueued
+        self._done_seq = 0           # rows written or failed, in enqueue order
+        self._flush_requested = 0    # seq up to which a flush() caller is waiting
+        self._closed = False
+        self._stats = {'rows_enqueued': 0, 'rows_written': 0, 'rows_failed': 0, 'batches': 0,
+                       'blocked_enqueues': 0, 'blocked_seconds': 0.0, 'max_queue_depth': 0,
+                       'last_batch_seconds': 0.0}
+        self._thread = threading.Thread(target=self._run, name=f"{name}_writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+
+    def enqueue(self, row):
+        """Queues one row for writing. Blocks while the queue is full; writes inline if the writer was closed."""
+        with self._cond:
+            if len(self._queue) >= self.max_queue_rows and not self._closed:
+                self._stats['blocked_enqueues'] += 1
+                start = time.monotonic()
+                while len(self._queue) >= self.max_queue_rows and not self._closed:
+                    self._cond.wait()
+                self._stats['blocked_seconds'] += time.monotonic() - start
+            if not self._closed:
+                was_empty = not self._queue
+                if was_empty:
+                    self._oldest_enqueued_at = time.monotonic()
+                self._queue.append(row)
+                self._enqueued_seq += 1
+                self._stats['rows_enqueued'] += 1
+                self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], len(self._queue))
+                if was_empty or len(self._queue) >= self.max_batch_rows:
+                    self._cond.notify_all()   # start the flush timer / flush a full batch
+                return
+        self._write([row])
+
+
+    def flush(self, timeout=None):
+        """Writes all rows enqueued so far and waits until they are committed. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            target = self._enqueued_seq
+            self._flush_requested = max(self._flush_requested, target)
+            self._cond.notify_all()
+            while self._done_seq < target:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+
+    def close(self, timeout=30):
+        """Flushes pending rows and stops the writer thread."""
+        if self._closed:
+            return
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+
+    def _next_batch(self):
+        with self._cond:
+            while True:
+                if self._queue:
+                    due = self._oldest_enqueued_at + self.flush_interval
+                    now = time.monotonic()
+                    if (len(self._queue) >= self.max_batch_rows or now >= due or self._closed
+                            or self._flush_requested > self._done_seq):
+                        break
+                    self._cond.wait(due - now)
+                elif self._closed:
+                    return None
+                else:
+                    self._cond.wait()
+            batch = [self._queue.popleft() for _ in range(min(self.max_batch_rows, len(self._queue)))]
+            self._oldest_enqueued_at = time.monotonic() if self._queue else None
+            self._cond.notify_all()     # wake enqueuers blocked on a full queue
+            return batch
+
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            _, elapsed = self._write(batch)
+            with self._cond:
+                self._done_seq += len(batch)
+                self._stats['batches'] += 1
+                self._stats['last_batch_seconds'] = elapsed
+                self._cond.notify_all()
+
+
+    def _write(self, rows):
+        start = time.monotonic()
+        written = 0
+        try:
+            self.write_rows(rows)
+            written = len(rows)
+        except Exception as e:
+            if len(rows) > 1:
+                logger.info(f"{self.name}: batch insert of {len(rows)} rows failed ({e}), retrying row by row")
+                for row in rows:
+                    try:
+                        self.write_rows([row])
+                        written += 1
+                    except Exception as row_error:
+                        logger.info(f"Encountered errors while inserting into chat history table row: {row_error}")
+            else:
+                logger.info(f"Encountered errors while inserting into chat history table row: {e}")
+        with self._cond:
+            self._stats['rows_written'] += written
+            self._stats['rows_failed'] += len(rows) - written
+        return written, time.monotonic() - start
+
+
+    def metrics(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['queued'] = len(self._queue)
+            stats['max_queue_rows'] = self.max_queue_rows
+        stats['avg_batch_rows'] = round((stats['rows_written'] + stats['rows_failed']) / stats['batches'], 2) if stats['batches'] else 0.0
+        return stats
+
+
+_writers_lock = threading.Lock()
+
+
+def get_chat_history_writer(connector):
+    """
+    Returns the ChatHistoryWriter of a database connector (created on first use around its _write_chat_history_rows),
+    or None if write-behind is disabled (env CHAT_HISTORY_WRITE_BEHIND=False), in which case rows are written inline.
+    Tuning: CHAT_HISTORY_BATCH_ROWS, CHAT_HISTORY_FLUSH_SECONDS, CHAT_HISTORY_QUEUE_ROWS.
+    """
+    writer = getattr(connector, '_chat_history_writer', False)
+    if writer is False:
+        with _writers_lock:
+            writer = getattr(connector, '_chat_history_writer', False)
+            if writer is False:
+                writer = None
+                if os.getenv("CHAT_HISTORY_WRITE_BEHIND", "True").lower() != 'false':
+                    writer = ChatHistoryWriter(connector._write_chat_history_rows,
+                                               max_batch_rows=int(os.getenv("CHAT_HISTORY_BATCH_ROWS", "200")),
+                                               flush_interval=float(os.getenv("CHAT_HISTORY_FLUSH_SECONDS", "0.5")),
+                                               max_queue_rows=int(os.getenv("CHAT_HISTORY_QUEUE_ROWS", "10000")))
+                connector._chat_history_writer = writer
+    return writer
@@ -0,0 +1,239 @@
+from   contextlib               import contextmanager
+from   genesis_bots.core.logging_config \
+                                import logger
+import os
+from   sqlalchemy               import create_engine
+from   sqlalchemy.exc           import ArgumentError
+import threading
+import time
+
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class ConnectionPoolTimeout(Exception):
+    """Raised when a pool has no free connection slot within its pool timeout."""
+
+
+class _PoolEntry:
+    def __init__(self, key, engine, connection_string, max_concurrency, expires_at=None):
+        self.key = key
+        self.engine = engine
+        self.connection_string = connection_string
+        self.expires_at = expires_at          # e.g. expiry of temporary (IAM) credentials in the connection string
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.max_concurrency = max_concurrency
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.active = 0
+        self.peak_active = 0
+        self.checkouts = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.retired = None                  # reason, once the entry was removed from the registry
+
+    def expired(self, now):
+        return self.expires_at is not None and self.expires_at < now
+
+
+class ConnectionPoolRegistry:
+    """
+    Registry of pooled SQLAlchemy engines for external database connections, keyed by
+    (connection_id, database_name).
+
+    Each engine keeps a bounded pool of warm connections that are pre-pinged before use and recycled after
+    `pool_recycle` seconds. Checkouts are additionally limited per pool by `max_concurrency` so that many bots hitting
+    one connection queue up instead of opening a connection storm. Engines that have been idle for `idle_timeout`
+    seconds, or whose credentials expired, are disposed.
+
+    Defaults come from the environment:
+        DB_POOL_SIZE (5), DB_POOL_MAX_OVERFLOW (5), DB_POOL_TIMEOUT_SECONDS (30),
+        DB_POOL_RECYCLE_SECONDS (1800), DB_POOL_IDLE_TIMEOUT_SECONDS (900),
+        DB_POOL_MAX_CONCURRENCY (pool size + max overflow)
+    """
+
+    def __init__(self, pool_size=None, max_overflow=None, pool_timeout=None, pool_recycle=None,
+                 idle_timeout=None, max_concurrency=None, engine_factory=None):
+        self.pool_size = pool_size if pool_size is not None else _env_int('DB_POOL_SIZE', 5)
+        self.max_overflow = max_overflow if max_overflow is not None else _env_int('DB_POOL_MAX_OVERFLOW', 5)
+        self.pool_timeout = pool_timeout if pool_timeout is not None else _env_int('DB_POOL_TIMEOUT_SECONDS', 30)
+        self.pool_recycle = pool_recycle if pool_recycle is not None else _env_int('DB_POOL_RECYCLE_SECONDS', 1800)
+        self.idle_timeout = idle_timeout if idle_timeout is not None else _env_int('DB_POOL_IDLE_TIMEOUT_SECONDS', 900)
+        self.max_concurrency = max_concurrency if max_concurrency is not None else \
+            _env_int('DB_POOL_MAX_CONCURRENCY', self.pool_size + self.max_overflow)
+        self._engine_factory = engine_factory or create_engine
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._last_eviction = time.time()
+
+
+    def _new_engine(self, connection_string):
+        pooled_kwargs = dict(pool_pre_ping=True, pool_recycle=self.pool_recycle, pool_size=self.pool_size,
+                             max_overflow=self.max_overflow, pool_timeout=self.pool_timeout)
+        try:
+            return self._engine_factory(connection_string, **pooled_kwargs)
+        except (ArgumentError, TypeError):
+            # dialects whose default pool is not a QueuePool (e.g. SQLite on SQLAlchemy 1.4) reject the sizing
+            # arguments; they still get pre-ping and recycling
+            return self._engine_factory(connection_string, pool_pre_ping=True, pool_recycle=self.pool_recycle)
+
+
+    def get_engine(self, key):
+        """Returns the live engine for `key`, or None if there is none or its credentials expired."""
+        self._maybe_evict_idle()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if not entry.expired(time.time()):
+                return entry.engine
+            self._entries.pop(key)
+        self._retire(entry, 'credentials expired')
+        return None
+
+
+    def create_engine(self, key, connection_string, expires_at=None):
+        """Creates (or replaces) the pooled engine for `key` and returns it."""
+        engine = self._new_engine(connection_string)
+        entry = _PoolEntry(key, engine, connection_string, self.max_concurrency, expires_at=expires_at)
+        with self._lock:
+            old = self._entries.get(key)
+            self._entries[key] = entry
+        if old is not None:
+            self._retire(old, 'replaced')
+        return engine
+
+
+    @contextmanager
+    def connect(self, key):
+        """
+        Checks out a connection from the pool for `key`. Waits up to the pool timeout for a free slot and raises
+        ConnectionPoolTimeout if there is none.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            raise KeyError(f"No connection pool for {key}")
+        start = time.time()
+        if not entry.slots.acquire(timeout=self.pool_timeout):
+            with self._lock:
+                entry.timeouts += 1
+            raise ConnectionPoolTimeout(f"All {entry.max_concurrency} connections to {key[0]} are busy, try again later")
+        try:
+            with self._lock:
+                entry.wait_seconds += time.time() - start
+                entry.active += 1
+                entry.peak_active = max(entry.peak_active, entry.active)
+                entry.checkouts += 1
+            try:
+                with entry.engine.connect() as conn:
+                    yield conn
+            except Exception:
+                with self._lock:
+                    entry.errors += 1
+                raise
+        finally:
+            with self._lock:
+                entry.active -= 1
+                entry.last_used = time.time()
+                dispose_now = entry.retired is not None and entry.active == 0
+            entry.slots.release()
+            if dispose_now:
+                self._dispose_entry(entry, entry.retired)
+
+
+    def adopt(self, other):
+        """Moves every pool of another registry (e.g. one used to test a new connection) into this one."""
+        with other._lock:
+            entries = list(other._entries.values())
+            other._entries.clear()
+        for entry in entries:
+            with self._lock:
+                old = self._entries.get(entry.key)
+                self._entries[entry.key] = entry
+            if old is not None:
+                self._retire(old, 'replaced')
+
+
+    def dispose(self, connection_id):
+        """Disposes every pool of `connection_id` (e.g. after the connection was updated or deleted)."""
+        with self._lock:
+            keys = [k for k in self._entries if k[0] == connection_id]
+            entries = [self._entries.pop(k) for k in keys]
+        for entry in entries:
+            self._retire(entry, 'removed')
+
+
+    def dispose_all(self):
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            self._retire(entry, 'shutdown')
+
+
+    def evict_idle(self):
+        """Disposes engines that have not been used for `idle_timeout` seconds or whose credentials expired."""
+        now = time.time()
+        with self._lock:
+            self._last_eviction = now
+            stale = [k for k, e in self._entries.items()
+                     if e.active == 0 and (now - e.last_used > self.idle_timeout or e.expired(now))]
+            entries = [self._entries.pop(k) for k in stale]
+        for entry in entries:
+            self._dispose_entry(entry, 'idle' if not entry.expired(now) else 'credentials expired')
+        return len(entries)
+
+
+    def _maybe_evict_idle(self):
+        if time.time() - self._last_eviction > min(60, self.idle_timeout):
+            self.evict_idle()
+
+
+    def _retire(self, entry, reason):
+        # connections checked out of a retired pool stay usable; the engine is disposed once the last one returns
+        with self._lock:
+            entry.retired = reason
+            dispose_now = entry.active == 0
+        if dispose_now:
+            self._dispose_entry(entry, reason)
+
+
+    def _dispose_entry(self, entry, reason):
+        try:
+            entry.engine.dispose()
+            logger.info(f"Disposed connection pool for {entry.key[0]} ({reason})")
+        except Exception as e:
+            logger.info(f"Error disposing connection pool for {entry.key[0]}: {e}")
+
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+
+    def metrics(self):
+        """Returns per-pool usage metrics, keyed by 'connection_id' or 'connection_id/database_name'."""
+        with self._lock:
+            entries = list(self._entries.values())
+        result = {}
+        for e in entries:
+            name = e.key[0] if not e.key[1] else f"{e.key[0]}/{e.key[1]}"
+            result[name] = {
+                'active': e.active,
+                'peak_active': e.peak_active,
+                'max_concurrency': e.max_concurrency,
+                'checkouts': e.checkouts,
+                'errors': e.errors,
+                'timeouts': e.timeouts,
+                'avg_wait_ms': round(1000 * e.wait_seconds / e.checkouts, 3) if e.checkouts else 0.0,
+                'age_seconds': round(time.time() - e.created_at, 1),
+                'idle_seconds': round(time.time() - e.last_used, 1),
+                'pool_status': e.engine.pool.status(),
+            }
+        return result
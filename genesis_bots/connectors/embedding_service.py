@@ -0,0 +1,335 @@
+"""
+Shared embedding service: batched provider calls, request coalescing and a content-addressed on-disk cache.
+
+Every embedding request (metadata search, knowledge lookups, harvester table summaries) goes through one
+EmbeddingService per (provider, model):
+
+  * vectors are cached by sha256(model, text) in a local SQLite file with LRU eviction, so identical DDL, summaries
+    and queries are embedded once;
+  * cache misses from concurrent callers are coalesced: they are queued and a worker sends them to the provider in
+    batches of up to `max_batch_size` texts (one OpenAI embeddings call or one Cortex EMBED_TEXT_768 statement per
+    batch), and a text that is already being embedded for another caller is not requested twice;
+  * hit rate, batch sizes and provider latency are available from metrics().
+
+Use get_embedding_service() to get the shared service for a provider.
+"""
+
+from   collections              import deque
+from   concurrent.futures       import Future
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from   genesis_bots.connectors.embedding_utils \
+                                import EMBEDDING_DTYPE, decode_embedding, encode_embedding
+from   genesis_bots.core.logging_config \
+                                import logger
+import numpy as np
+
+
+def embedding_cache_key(model, text):
+    return hashlib.sha256(f"{model}\x00{text}".encode('utf-8')).hexdigest()
+
+
+class OpenAIEmbeddingProvider:
+    """Embeds texts with one OpenAI embeddings call per batch."""
+    kind = 'openai'
+    max_batch_size = 256
+
+    def __init__(self, client, model):
+        self.client = client
+        self.model = model
+
+    def embed_batch(self, texts):
+        response = self.client.embeddings.create(model=self.model, input=list(texts))
+        return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+
+
+class CortexEmbeddingProvider:
+    """Embeds texts with one SNOWFLAKE.CORTEX.EMBED_TEXT_768 statement per batch."""
+    kind = 'cortex'
+    max_batch_size = 100
+
+    def __init__(self, db_connector, model):
+        self.db_connector = db_connector
+        self.model = model
+
+    def embed_batch(self, texts):
+        values = ", ".join(["(%s, %s)"] * len(texts))
+        query = (f"SELECT v.idx, SNOWFLAKE.CORTEX.EMBED_TEXT_768(%s, v.txt) "
+                 f"FROM VALUES {values} AS v(idx, txt) ORDER BY v.idx")
+        params = [self.model]
+        for i, text in enumerate(texts):
+            params.extend((i, text))
+        cursor = self.db_connector.connection.cursor()
+        try:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+        return [row[1] for row in rows]
+
+
+class FakeEmbeddingProvider:
+    """Deterministic local provider (vectors derived from a hash of the text), for tests and benchmarks."""
+    kind = 'fake'
+
+    def __init__(self, model='fake', dimension=8, max_batch_size=64, latency_seconds=0.0):
+        self.model = model
+        self.dimension = dimension
+        self.max_batch_size = max_batch_size
+        self.latency_seconds = latency_seconds
+        self.calls = []                   # list of batches sent to the provider
+
+    def embed_batch(self, texts):
+        self.calls.append(list(texts))
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        vectors = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+            vectors.append(np.random.default_rng(seed).standard_normal(self.dimension).tolist())
+        return vectors
+
+
+class EmbeddingCache:
+    """
+    Content-addressed on-disk vector cache (SQLite, float32 blobs) with LRU eviction once it holds more than
+    `max_entries` vectors. Use path ':memory:' for a process-local cache.
+    """
+
+    def __init__(self, path, max_entries=100000):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, keys):
+        """Returns {key: float32 vector} for the cached keys and marks them as recently used."""
+        if not keys:
+            return {}
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+                found.update((k, decode_embedding(v)) for k, v in rows)
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+                self._conn.commit()
+        return found
+
+    def put_many(self, items):
+        """Stores (key, vector) pairs, evicting the least recently used vectors beyond max_entries."""
+        if not items:
+            return
+        now = time.time()
+        rows = [(k, encode_embedding(v), now) for k, v in items]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany("INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows)
+            self._count += self._conn.total_changes - before
+            excess = self._count - self.max_entries
+            if excess > 0:
+                # evict a little more than needed so eviction does not run on every insert
+                excess += self.max_entries // 20
+                self._conn.execute("DELETE FROM embeddings WHERE key IN "
+                                   "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,))
+                self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            self._conn.commit()
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class EmbeddingService:
+    """
+    Coalescing, batching and caching front end for one embedding provider (see module docstring).
+
+    :param provider: object with `model`, `kind`, `max_batch_size` and `embed_batch(texts) -> list of vectors`.
+    :param cache: EmbeddingCache, or None to disable caching.
+    :param max_batch_size: texts per provider call (defaults to the provider's limit).
+    :param max_wait_ms: how long the worker waits for more requests before sending a partial batch.
+    """
+
+    def __init__(self, provider, cache=None, max_batch_size=None, max_wait_ms=None):
+        self.provider = provider
+        self.model = provider.model
+        self.cache = cache
+        self.max_batch_size = max_batch_size or provider.max_batch_size
+        if max_wait_ms is None:
+            max_wait_ms = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._cond = threading.Condition()
+        self._queue = deque()          # (key, text) waiting for a provider call
+        self._inflight = {}            # key -> Future, queued or being embedded
+        self._worker = None
+        self._latencies = deque(maxlen=1000)
+        self._stats = {'requests': 0, 'texts': 0, 'cache_hits': 0, 'cache_misses': 0, 'coalesced': 0,
+                       'provider_calls': 0, 'provider_texts': 0, 'provider_errors': 0}
+
+
+    def embed(self, texts):
+        """Returns one embedding (list of floats) per text, in order. Raises if the provider call failed."""
+        texts = list(texts)
+        keys = [embedding_cache_key(self.model, t) for t in texts]
+        unique = list(dict.fromkeys(keys))
+        vectors = self.cache.get_many(unique) if self.cache is not None else {}
+        misses = [k for k in unique if k not in vectors]
+
+        futures = {}
+        if misses:
+            text_for = dict(zip(keys, texts))
+            with self._cond:
+                for k in misses:
+                    fut = self._inflight.get(k)
+                    if fut is None:
+                        fut = self._inflight[k] = Future()
+                        self._queue.append((k, text_for[k]))
+                    else:
+                        self._stats['coalesced'] += 1
+                    futures[k] = fut
+                self._ensure_worker()
+                self._cond.notify()
+        with self._cond:
+            self._stats['requests'] += 1
+            self._stats['texts'] += len(texts)
+            self._stats['cache_hits'] += len(unique) - len(misses)
+            self._stats['cache_misses'] += len(misses)
+        for k, fut in futures.items():
+            vectors[k] = fut.result()
+        return [vectors[k].tolist() for k in keys]
+
+
+    def embed_one(self, text):
+        return self.embed([text])[0]
+
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name=f"embedding_{self.provider.kind}", daemon=True)
+            self._worker.start()
+
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                # give concurrent callers a moment to join a partial batch
+                deadline = time.monotonic() + self.max_wait
+                while len(self._queue) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = [self._queue.popleft() for _ in range(min(self.max_batch_size, len(self._queue)))]
+            self._embed_batch(batch)
+
+
+    def _embed_batch(self, batch):
+        keys = [k for k, _ in batch]
+        start = time.monotonic()
+        try:
+            vectors = self.provider.embed_batch([t for _, t in batch])
+            if len(vectors) != len(batch):
+                raise ValueError(f"embedding provider returned {len(vectors)} vectors for {len(batch)} texts")
+            vectors = [decode_embedding(v).astype(EMBEDDING_DTYPE, copy=False) for v in vectors]
+            error = None
+        except Exception as e:
+            error = e
+            logger.info(f"Embedding batch of {len(batch)} texts with {self.provider.kind}/{self.model} failed: {e}")
+        elapsed = time.monotonic() - start
+        if error is None and self.cache is not None:
+            try:
+                self.cache.put_many(list(zip(keys, vectors)))
+            except Exception as e:
+                logger.info(f"Could not store embeddings in cache: {e}")
+        with self._cond:
+            self._stats['provider_calls'] += 1
+            self._stats['provider_texts'] += len(batch)
+            if error is not None:
+                self._stats['provider_errors'] += 1
+            self._latencies.append(elapsed)
+            futures = [self._inflight.pop(k) for k in keys]
+        for i, fut in enumerate(futures):
+            if error is None:
+                fut.set_result(vectors[i])
+            else:
+                fut.set_exception(error)
+
+
+    def metrics(self):
+        with self._cond:
+            stats = dict(self._stats)
+            latencies = sorted(self._latencies)
+            stats['queued'] = len(self._queue)
+        lookups = stats['cache_hits'] + stats['cache_misses']
+        stats['hit_rate'] = round(stats['cache_hits'] / lookups, 4) if lookups else 0.0
+        stats['avg_batch_size'] = round(stats['provider_texts'] / stats['provider_calls'], 2) if stats['provider_calls'] else 0.0
+        if latencies:
+            stats['provider_latency_ms'] = {
+                'avg': round(1000 * sum(latencies) / len(latencies), 2),
+                'p50': round(1000 * latencies[len(latencies) // 2], 2),
+                'p95': round(1000 * latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2),
+            }
+        stats['cache_entries'] = len(self.cache) if self.cache is not None else 0
+        return stats
+
+
+_services = {}
+_services_lock = threading.Lock()
+_shared_cache = None
+
+
+def _get_shared_cache():
+    global _shared_cache
+    if _shared_cache is None:
+        if os.getenv("EMBEDDING_CACHE_ENABLED", "True").lower() == 'false':
+            return None
+        path = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(".", "runtime", "embedding_cache.sqlite"))
+        max_entries = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000"))
+        try:
+            _shared_cache = EmbeddingCache(path, max_entries=max_entries)
+        except Exception as e:
+            logger.info(f"Embedding cache at {path} not available, continuing without it: {e}")
+            return None
+    return _shared_cache
+
+
+def get_embedding_service(provider):
+    """
+    Returns the process-wide EmbeddingService for (provider.kind, provider.model). The service sends its next batches
+    through `provider`, so callers whose client or connection was recreated keep working. All services share one
+    on-disk cache (env EMBEDDING_CACHE_PATH / EMBEDDING_CACHE_MAX_ENTRIES, disabled with EMBEDDING_CACHE_ENABLED=False).
+    """
+    key = (provider.kind, provider.model)
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            service = _services[key] = EmbeddingService(provider, cache=_get_shared_cache())
+        else:
+            service.provider = provider
+        return service
+
+
+def get_embedding_service_metrics():
+    with _services_lock:
+        services = list(_services.items())
+    return {f"{kind}/{model}": service.metrics() for (kind, model), service in services}
@@ -0,0 +1,89 @@
+"""
+Helpers for storing and reading harvested metadata embeddings.
+
+Embeddings are written as little-endian float32 blobs where the backing store supports it (SQLite) and read back with
+np.frombuffer, i.e. without parsing. Rows written by older versions (JSON text, comma separated text or Snowflake's
+ARRAY rendering '[\\n  0.1,\\n  0.2\\n]') are still decoded, with a single C-level parse per row instead of a float()
+call per element.
+"""
+
+import numpy as np
+import warnings
+
+EMBEDDING_DTYPE = np.dtype('<f4')
+
+# rows per keyset-paginated fetch
+DEFAULT_EMBEDDING_FETCH_BATCH_SIZE = 5000
+
+
+def encode_embedding(embedding):
+    """Returns the float32 blob for an embedding (list, ndarray or legacy text), or None if there is none."""
+    if embedding is None or (isinstance(embedding, str) and embedding.strip() == ''):
+        return None
+    return decode_embedding(embedding).astype(EMBEDDING_DTYPE, copy=False).tobytes()
+
+
+def decode_embedding(value):
+    """
+    Decodes a stored embedding to a 1-d float32 array.
+    Blobs are decoded zero-copy (the returned array is a read-only view on the blob).
+    Raises ValueError for values that cannot be decoded.
+    """
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return np.frombuffer(value, dtype=EMBEDDING_DTYPE)
+    if isinstance(value, np.ndarray):
+        return value.astype(EMBEDDING_DTYPE, copy=False).ravel()
+    if isinstance(value, (list, tuple)):
+        return np.asarray(value, dtype=EMBEDDING_DTYPE)
+    if isinstance(value, str):
+        text = value.strip()
+        if text.lower().startswith('array'):
+            text = text[5:].strip()
+        text = text.strip('[]() \n\t')
+        with warnings.catch_warnings():
+            # numpy only warns (and returns a truncated array) on malformed text
+            warnings.simplefilter('error', DeprecationWarning)
+            try:
+                vec = np.fromstring(text, dtype=EMBEDDING_DTYPE, sep=',')
+            except DeprecationWarning as e:
+                raise ValueError(str(e))
+        if vec.size == 0:
+            raise ValueError("empty embedding")
+        return vec
+    raise ValueError(f"Unsupported embedding value type: {type(value).__name__}")
+
+
+def embeddings_to_matrix(values, dimension=None):
+    """
+    Packs stored embedding values into one contiguous float32 matrix.
+
+    Returns (matrix, kept) where `kept` lists the positions in `values` that were decoded; values that fail to decode
+    or whose size differs from `dimension` (default: the size of the first decodable value) are skipped.
+    """
+    decoded = []
+    kept = []
+    for i, value in enumerate(values):
+        try:
+            vec = decode_embedding(value)
+        except (ValueError, TypeError):
+            continue
+        if dimension is None:
+            dimension = vec.size
+        if vec.size != dimension:
+            continue
+        decoded.append(vec)
+        kept.append(i)
+    if not decoded:
+        return np.zeros((0, dimension or 0), dtype=EMBEDDING_DTYPE), kept
+    matrix = np.empty((len(decoded), dimension), dtype=EMBEDDING_DTYPE)
+    for row, vec in enumerate(decoded):
+        matrix[row] = vec
+    return matrix, kept
+
+
+def normalize_rows(matrix, eps=1e-5):
+    """L2-normalizes the rows of a float matrix in place (one vectorized pass) and returns it."""
+    if len(matrix):
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= (norms + eps)
+    return matrix
@@ -0,0 +1,175 @@
+"""
+Single-pass, streaming result handling for query tools (run_query / query_database).
+
+Rows are pulled from the cursor in columnar batches and pass once through `stream_result`, which builds both
+  * the LLM-facing preview: a list of row dicts bounded by a byte budget (and the caller's max_rows), with string
+    cells escaped and optionally truncated, and
+  * optionally, the full result for exports, spooled to a temporary file instead of being held in memory.
+When nothing is spooled, reading stops as soon as the preview is full, so large results are never fully fetched, unless
+the caller asks for the total row count: then the remaining rows are only counted.
+"""
+
+from   collections.abc          import Sequence
+import json
+import os
+import tempfile
+
+DEFAULT_BATCH_ROWS = 1000
+# approximate size of the preview handed back to the LLM
+DEFAULT_PREVIEW_MAX_BYTES = int(os.getenv("QUERY_RESULT_MAX_BYTES", "100000"))
+
+
+class ColumnBatch:
+    """A batch of rows stored column-wise: `arrays[i]` holds the values of `columns[i]`."""
+    __slots__ = ('columns', 'arrays', 'num_rows')
+
+    def __init__(self, columns, arrays, num_rows):
+        self.columns = columns
+        self.arrays = arrays
+        self.num_rows = num_rows
+
+    def rows(self):
+        return zip(*self.arrays)
+
+
+def iter_column_batches(cursor, columns, batch_rows=DEFAULT_BATCH_ROWS):
+    """Yields ColumnBatch objects from a DB-API cursor (or SQLAlchemy result) until it is exhausted."""
+    while True:
+        rows = cursor.fetchmany(batch_rows)
+        if not rows:
+            return
+        yield ColumnBatch(columns, [list(col) for col in zip(*rows)], len(rows))
+
+
+class SpooledRows(Sequence):
+    """
+    Read-only sequence of row dicts backed by a temporary JSON-lines file. Only the line offsets are kept in memory;
+    rows are read back on access, so exports can slice through arbitrarily large results.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+        self._file = tempfile.TemporaryFile(mode='w+b', prefix='genesis_query_')
+        self._offsets = []
+
+    def append(self, row):
+        self._file.seek(0, os.SEEK_END)
+        self._offsets.append(self._file.tell())
+        self._file.write(json.dumps(list(row), default=str).encode('utf-8'))
+        self._file.write(b'\n')
+
+    def _read(self, i):
+        self._file.seek(self._offsets[i])
+        return dict(zip(self.columns, json.loads(self._file.readline())))
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._read(i) for i in range(*index.indices(len(self._offsets)))]
+        if index < 0:
+            index += len(self._offsets)
+        if not 0 <= index < len(self._offsets):
+            raise IndexError("SpooledRows index out of range")
+        return self._read(index)
+
+    def close(self):
+        self._file.close()
+
+
+class StreamedResult:
+    """Outcome of stream_result()."""
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.rows = []                 # preview: list of row dicts
+        self.preview_bytes = 0
+        self.truncated = False         # the preview does not hold every row of the result
+        self.fields_truncated = False  # some string cells were cut at max_field_size
+        self.rows_read = 0             # rows pulled from the cursor
+        self.total_rows = None         # rows in the result, when known (fully read, or count_rows)
+        self.spool = None              # SpooledRows with every row (up to spool_max_rows), if requested
+
+
+def _cell_size(value):
+    if value is None:
+        return 4
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    return len(str(value))
+
+
+def stream_result(batches, columns, max_rows=None, max_bytes=None, max_field_size=0, escape_backticks=True,
+                  spool=False, spool_max_rows=None, count_rows=False):
+    """
+    Consumes column batches once and returns a StreamedResult.
+
+    :param max_rows: maximum number of preview rows (None for no row limit).
+    :param max_bytes: approximate byte budget of the preview (defaults to QUERY_RESULT_MAX_BYTES).
+    :param max_field_size: string cells longer than this are truncated (0 disables truncation).
+    :param escape_backticks: escape ``` in preview string cells, so the preview cannot break markdown code blocks.
+    :param spool: also write rows to a temporary file (result.spool), e.g. for exports.
+    :param spool_max_rows: stop spooling after this many rows (None for no limit).
+    :param count_rows: once the preview is full, keep reading (without keeping the rows) to set result.total_rows.
+    """
+    if max_bytes is None:
+        max_bytes = DEFAULT_PREVIEW_MAX_BYTES
+    result = StreamedResult(columns)
+    if spool:
+        result.spool = SpooledRows(columns)
+    preview_full = False
+    counted = 0     # rows only counted, after the preview is full
+
+    def spooling():
+        return spool and (spool_max_rows is None or len(result.spool) < spool_max_rows)
+
+    for batch in batches:
+        if count_rows and preview_full and not spooling():
+            counted += batch.num_rows
+            result.truncated = True
+            continue
+        for row in batch.rows():
+            if preview_full and not spooling():
+                result.truncated = True
+                if count_rows:
+                    counted += 1
+                    continue
+                break
+            result.rows_read += 1
+            if max_field_size and max_field_size > 0:
+                row = _truncate_fields(row, max_field_size, result)
+            if spooling():
+                result.spool.append(row)
+            if preview_full:
+                result.truncated = True
+                continue
+            row_size = sum(_cell_size(v) for v in row)
+            if result.rows and result.preview_bytes + row_size > max_bytes:
+                preview_full = True
+                result.truncated = True
+                continue
+            if escape_backticks:
+                row = [v.replace("```", "\\`\\`\\`") if isinstance(v, str) else v for v in row]
+            result.rows.append(dict(zip(columns, row)))
+            result.preview_bytes += row_size
+            if max_rows is not None and len(result.rows) >= max_rows:
+                preview_full = True
+        else:
+            continue
+        # the inner loop stopped early: the preview is full and nothing more is spooled
+        break
+    if count_rows or not result.truncated:
+        result.total_rows = result.rows_read + counted
+    return result
+
+
+def _truncate_fields(row, max_field_size, result):
+    if not any(isinstance(v, str) and len(v) > max_field_size for v in row):
+        return row
+    result.fields_truncated = True
+    return tuple(
+        v[:max_field_size] + f"[!!FIELD OVER {max_field_size} (max_field_size) bytes--TRUNCATED!!]"
+        if isinstance(v, str) and len(v) > max_field_size else v
+        for v in row
+    )
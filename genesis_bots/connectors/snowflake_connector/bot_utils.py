@@ -502,6 +502,29 @@ def db_get_bot_details(self, project_id, dataset_name, bot_servicing_table, bot_
         )
         return None
 
+def db_get_all_bot_details(self, project_id, dataset_name, bot_servicing_table):
+    """
+    Bulk counterpart of db_get_bot_details: the details of every bot in the BOT_SERVICING table, in one query.
+
+    Returns:
+        list: A list of dictionaries (one per bot, same keys as db_get_bot_details), or None on error.
+    """
+    select_query = f"""
+        SELECT *
+        FROM {bot_servicing_table}
+    """
+
+    try:
+        cursor = self.connection.cursor()
+        cursor.execute(select_query)
+        rows = cursor.fetchall()
+        columns = [desc[0].lower() for desc in cursor.description]
+        cursor.close()
+        return [dict(zip(columns, row)) for row in rows]
+    except Exception as e:
+        logger.exception(f"Failed to retrieve the details of all bots with error: {e}")
+        return None
+
 def db_get_bot_database_creds(self, project_id, dataset_name, bot_servicing_table, bot_id):
     """
     Retrieves the database credentials for a bot based on the provided bot_id from the BOT_SERVICING table.
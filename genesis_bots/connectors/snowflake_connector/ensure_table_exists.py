@@ -116,20 +116,22 @@ def ensure_table_exists(self):
     # <<< END  helper functions
     # -------------------------------
 
-    # Get the current timestamp
-    current_timestamp = self.get_current_time_with_timezone()
-    # Format the timestamp as a string
-    timestamp_str = current_timestamp
-
-    # Create or replace the bots_active table with the current timestamp
-    create_bots_active_table_query = f"""CREATE OR REPLACE TABLE {self.schema}.bots_active ("{timestamp_str}" STRING); """
+    # BOT_HEARTBEATS: liveness of the bots and runners (see bot_heartbeats.py), replaces the BOTS_ACTIVE table
+    # ---------------------
+    bot_heartbeats_table_ddl = f"""
+    CREATE TABLE IF NOT EXISTS {self.bot_heartbeats_table_name} (
+        bot_id VARCHAR(255) NOT NULL,
+        runner_id VARCHAR(255) NOT NULL,
+        last_active TIMESTAMP_NTZ NOT NULL
+    );
+    """
+    _create_table_if_not_exist('BOT_HEARTBEATS', bot_heartbeats_table_ddl)
+    from genesis_bots.connectors.bot_heartbeats import RUNNER_BOT_ID, TIMESTAMP_FORMAT, utc_now
     try:
-        with self.client.cursor() as cursor:
-            cursor.execute(create_bots_active_table_query)
-            self.client.commit()
-        logger.info(f"Table {self.schema}.bots_active created or replaced successfully with timestamp: {timestamp_str}")
+        self._write_bot_heartbeats([(RUNNER_BOT_ID, os.getenv('RUNNER_ID', 'jl-local-runner'),
+                                     utc_now().strftime(TIMESTAMP_FORMAT))])
     except Exception as e:
-        logger.error(f"An error occurred while creating or replacing the bots_active table: {e}")
+        logger.error(f"An error occurred while writing the runner heartbeat: {e}")
 
     # CUST_DB_CONNECTIONS to trigger its ensure_table_exists
     from genesis_bots.connectors.data_connector import DatabaseConnector
@@ -44,6 +44,9 @@ from genesis_bots.llm.llm_openai.openai_utils import get_openai_client
 from .snowflake_connector_base import SnowflakeConnectorBase
 from ..connector_helpers import llm_keys_and_types_struct
 from ..sqlite_adapter import SQLiteAdapter
+from ..embedding_utils import DEFAULT_EMBEDDING_FETCH_BATCH_SIZE, embeddings_to_matrix, encode_embedding
+from ..query_results import DEFAULT_BATCH_ROWS, iter_column_batches, stream_result
+from ..chat_history_writer import get_chat_history_writer
 from .sematic_model_utils import *
 
 from genesis_bots.google_sheets.g_sheets import (
@@ -197,6 +200,7 @@ class SnowflakeConnector(SnowflakeConnectorBase):
         self.cust_db_connections_table_name = self.genbot_internal_project_and_schema + "." + "CUST_DB_CONNECTIONS"
         self.images_table_name = self.app_share_schema + "." + "IMAGES"
         self.index_manager_table_name = self.genbot_internal_project_and_schema + "." + "INDEX_MANAGER"
+        self.bot_heartbeats_table_name = self.genbot_internal_project_and_schema + "." + "BOT_HEARTBEATS"
 
     from .ensure_table_exists import (ensure_table_exists, one_time_db_fixes, get_process_info,
                                       get_processes_list)
@@ -215,7 +219,7 @@ class SnowflakeConnector(SnowflakeConnectorBase):
                             db_update_bot_instructions, db_update_bot_implementation, db_update_slack_allow_list,
                             db_get_bot_access, db_get_bot_details, db_get_bot_database_creds, db_update_existing_bot,
                             db_update_existing_bot_basics, db_update_bot_details, db_delete_bot, db_remove_bot_tools,
-                            db_list_all_bots)
+                            db_list_all_bots, db_get_all_bot_details)
 
     from .snowpark_utils import (_create_snowpark_connection, escallate_for_advice, add_hints, run_python_code,
                                  chat_completion_for_escallation, check_eai_assigned, get_endpoints, delete_endpoint_group,
@@ -909,7 +913,8 @@ class SnowflakeConnector(SnowflakeConnectorBase):
         bot_os_thread=None
     ):
         """
-        Inserts a single row into the chat history table using Snowflake's streaming insert.
+        Inserts a single row into the chat history table. The row is queued for the connector's write-behind
+        ChatHistoryWriter (see chat_history_writer.py), which inserts rows in batches off the response path.
 
         :param timestamp: TIMESTAMP field, format should be compatible with Snowflake.
         :param bot_id: STRING field representing the bot's ID.
@@ -927,7 +932,6 @@ class SnowflakeConnector(SnowflakeConnectorBase):
         :param task_id: STRING field representing the task, can be NULL.
         """
         from datetime import datetime
-        cursor = None
         if files is None:
             files = []
         files_str = str(files)
@@ -946,45 +950,110 @@ class SnowflakeConnector(SnowflakeConnectorBase):
             if bot_os_thread is not None and bot_os_thread.thread_id != thread_id:
                 thread_id = bot_os_thread.thread_id
 
-            insert_query = f"""
-            INSERT INTO {self.message_log_table_name}
-                (timestamp, bot_id, bot_name, thread_id, message_type, message_payload, message_metadata, tokens_in, tokens_out, files, channel_type, channel_name, primary_user, task_id)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
-            cursor = self.client.cursor()
-            cursor.execute(
-                insert_query,
-                (
-                    formatted_timestamp,
-                    bot_id,
-                    bot_name,
-                    thread_id,
-                    message_type,
-                    message_payload,
-                    message_metadata,
-                    tokens_in,
-                    tokens_out,
-                    files_str,
-                    channel_type,
-                    channel_name,
-                    primary_user,
-                    task_id,
-                ),
+            row = (
+                formatted_timestamp,
+                bot_id,
+                bot_name,
+                thread_id,
+                message_type,
+                message_payload,
+                message_metadata,
+                tokens_in,
+                tokens_out,
+                files_str,
+                channel_type,
+                channel_name,
+                primary_user,
+                task_id,
             )
-            self.client.commit()
         except Exception as e:
             logger.info(
                 f"Encountered errors while inserting into chat history table row: {e}"
             )
+            return
+        writer = get_chat_history_writer(self)
+        if writer is not None:
+            writer.enqueue(row)
+        else:
+            try:
+                self._write_chat_history_rows([row])
+            except Exception as e:
+                logger.info(
+                    f"Encountered errors while inserting into chat history table row: {e}"
+                )
+
+    def _write_chat_history_rows(self, rows):
+        """Inserts and commits a batch of chat history rows (tuples in insert_chat_history_row column order)."""
+        insert_query = f"""
+        INSERT INTO {self.message_log_table_name}
+            (timestamp, bot_id, bot_name, thread_id, message_type, message_payload, message_metadata, tokens_in, tokens_out, files, channel_type, channel_name, primary_user, task_id)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """
+        cursor = self.client.cursor()
+        try:
+            cursor.executemany(insert_query, rows)
+            self.client.commit()
+        except Exception:
+            self.client.rollback()
+            raise
         finally:
-            if cursor is not None:
-                cursor.close()
+            cursor.close()
 
     def get_current_time_with_timezone(self):
         from datetime import datetime
         current_time = datetime.now().astimezone()
         return current_time.strftime("%Y-%m-%d %H:%M:%S %Z")
 
+    def _write_bot_heartbeats(self, rows):
+        """Upserts and commits (bot_id, runner_id, last_active) rows of the BOT_HEARTBEATS table (see bot_heartbeats.py)."""
+        cursor = self.client.cursor()
+        try:
+            if self.source_name == 'Snowflake':
+                values = ", ".join(["(%s, %s, %s)"] * len(rows))
+                merge_query = f"""
+                MERGE INTO {self.bot_heartbeats_table_name} t
+                USING (SELECT column1 AS bot_id, column2 AS runner_id, TO_TIMESTAMP_NTZ(column3) AS last_active
+                       FROM VALUES {values}) s
+                ON t.bot_id = s.bot_id AND t.runner_id = s.runner_id
+                WHEN MATCHED THEN UPDATE SET t.last_active = s.last_active
+                WHEN NOT MATCHED THEN INSERT (bot_id, runner_id, last_active) VALUES (s.bot_id, s.runner_id, s.last_active)
+                """
+                cursor.execute(merge_query, [value for row in rows for value in row])
+            else:
+                for bot_id, runner_id, last_active in rows:
+                    cursor.execute(f"DELETE FROM {self.bot_heartbeats_table_name} WHERE bot_id = %s AND runner_id = %s",
+                                   (bot_id, runner_id))
+                    cursor.execute(f"INSERT INTO {self.bot_heartbeats_table_name} (bot_id, runner_id, last_active) "
+                                   f"VALUES (%s, %s, %s)", (bot_id, runner_id, last_active))
+            self.client.commit()
+        except Exception:
+            self.client.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def db_get_active_bots(self, minutes=5):
+        """
+        Returns the heartbeats of the last `minutes` minutes, newest first, as dicts with bot_id, runner_id and
+        last_active (naive UTC datetime). The row with bot_id '*' is the heartbeat of a runner itself.
+        """
+        from datetime import datetime, timedelta, timezone
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(minutes=minutes)
+        query = f"""SELECT bot_id, runner_id, last_active FROM {self.bot_heartbeats_table_name}
+                    WHERE last_active >= %s ORDER BY last_active DESC"""
+        cursor = self.client.cursor()
+        try:
+            cursor.execute(query, (cutoff.strftime("%Y-%m-%d %H:%M:%S"),))
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+        active = []
+        for bot_id, runner_id, last_active in rows:
+            if isinstance(last_active, str):
+                last_active = datetime.fromisoformat(last_active)
+            active.append({'bot_id': bot_id, 'runner_id': runner_id, 'last_active': last_active})
+        return active
+
     def db_insert_llm_results(self, uu, message):
         """
         Inserts a row into the LLM_RESULTS table.
@@ -1231,6 +1300,8 @@ class SnowflakeConnector(SnowflakeConnectorBase):
                 WHERE source_name = :source_name
                 AND qualified_table_name = :qualified_table_name
             """
+            # SQLite stores the embedding as a float32 blob that fetch_embeddings decodes without parsing
+            query_params["embedding"] = encode_embedding(embedding)
             cursor = None
             try:
                 cursor = self.client.cursor()
@@ -1725,9 +1796,6 @@ class SnowflakeConnector(SnowflakeConnectorBase):
         if max_rows > 100 and not max_rows_override:
             max_rows = 100
 
-        if export_to_google_sheet:
-            max_rows = 500
-
         #   logger.info('running query ... ', query)
         cursor = self.connection.cursor()
 
@@ -1795,37 +1863,22 @@ class SnowflakeConnector(SnowflakeConnectorBase):
 
         #    logger.info('getting results:')
         try:
-
-            results = cursor.fetchmany(max(1,max_rows))
+            # One pass over the cursor: the preview stops at max_rows (and, for queries from bots, at its byte
+            # budget), and for exports every row up to the export limit is spooled to a temporary file rather than
+            # kept in memory.
             columns = [col[0].upper() for col in cursor.description]
-
-            fieldTrunced = False
-            if userquery and max_field_size > 0:
-                updated_results = []
-                for row in results:
-                    updated_row = list(row)
-                    for i, value in enumerate(row):
-                        if isinstance(value, str) and len(value) > max_field_size:
-                            updated_row[i] = value[:max_field_size] + f"[!!FIELD OVER {max_field_size} (max_field_size) bytes--TRUNCATED!!]"
-                            fieldTrunced = True
-                    updated_results.append(tuple(updated_row))
-                results = updated_results
-
-            sample_data = [dict(zip(columns, row)) for row in results]
-            #   logger.info('query results: ',sample_data)
-
-            # Replace occurrences of triple backticks with triple single quotes in sample data
-            sample_data = [
-                {
-                    key: (
-                        value.replace("```", "\\`\\`\\`")
-                        if isinstance(value, str)
-                        else value
-                    )
-                    for key, value in row.items()
-                }
-                for row in sample_data
-            ]
+            export_max_rows = int(os.getenv("GOOGLE_SHEET_EXPORT_MAX_ROWS", "500"))
+            streamed = stream_result(
+                iter_column_batches(cursor, columns, batch_rows=min(max(1, max_rows), DEFAULT_BATCH_ROWS)),
+                columns,
+                max_rows=max(1, max_rows),
+                max_bytes=None if userquery else sys.maxsize,
+                max_field_size=max_field_size if userquery else 0,
+                spool=export_to_google_sheet,
+                spool_max_rows=export_max_rows,
+            )
+            fieldTrunced = streamed.fields_truncated
+            sample_data = streamed.rows
         except Exception as e:
             logger.info("run query: ", query, "\ncaused error: ", e)
             cursor.close()
@@ -1851,12 +1904,15 @@ class SnowflakeConnector(SnowflakeConnectorBase):
         if export_to_google_sheet:
             from datetime import datetime
 
-            shared_folder_id = get_root_folder_id()
-            timestamp = datetime.now().strftime("%m%d%Y_%H:%M:%S")
+            try:
+                shared_folder_id = get_root_folder_id()
+                timestamp = datetime.now().strftime("%m%d%Y_%H:%M:%S")
 
-            if export_title is None:
-                export_title = 'Genesis Export'
-            result = create_google_sheet_from_export(self, shared_folder_id['result'], title=f"{export_title}", data=sample_data )
+                if export_title is None:
+                    export_title = 'Genesis Export'
+                result = create_google_sheet_from_export(self, shared_folder_id['result'], title=f"{export_title}", data=streamed.spool)
+            finally:
+                streamed.spool.close()
 
             return {
                 "Success": True,
@@ -2662,6 +2718,54 @@ class SnowflakeConnector(SnowflakeConnectorBase):
         msg_log = self.run_query(query, max_rows=max_rows)
         return msg_log
 
+    def query_message_log_changes(self, since):
+        """
+        Threads with message log rows newer than `since` (the change feed high-water mark) that still have messages
+        not covered by the knowledge table: THREAD_ID, TIMESTAMP (latest message), MESSAGE_COUNT and LAST_TIMESTAMP
+        (latest message already processed into knowledge).
+        """
+        query = f"""
+                WITH N AS (SELECT thread_id, max(timestamp) as timestamp FROM {self.message_log_table_name}
+                    WHERE timestamp > TO_TIMESTAMP('{since}') AND PRIMARY_USER IS NOT NULL
+                    GROUP BY thread_id),
+                M AS (SELECT L.thread_id, COUNT(*) as message_count FROM {self.message_log_table_name} L
+                    WHERE L.thread_id IN (SELECT thread_id FROM N) AND L.PRIMARY_USER IS NOT NULL
+                    GROUP BY L.thread_id),
+                K AS (SELECT thread_id, max(last_timestamp) as last_timestamp FROM {self.knowledge_table_name}
+                    WHERE thread_id IN (SELECT thread_id FROM N)
+                    GROUP BY thread_id)
+                SELECT N.thread_id, N.timestamp as timestamp, M.message_count as message_count,
+                    COALESCE(K.last_timestamp, DATE('2000-01-01')) as last_timestamp FROM N
+                JOIN M on N.thread_id = M.thread_id
+                LEFT JOIN K on N.thread_id = K.thread_id
+                WHERE N.timestamp > COALESCE(K.last_timestamp, DATE('2000-01-01')) order by N.timestamp;"""
+        return self.run_query(query, max_rows=1000000, max_rows_override=True)
+
+    def query_message_log_for_threads(self, thread_timestamps, max_rows=50):
+        """
+        Message log rows of several threads in one query: for each thread_id in `thread_timestamps`, the first
+        `max_rows` rows after its timestamp. Returns {thread_id: [rows ordered by timestamp]}.
+        """
+        if not thread_timestamps:
+            return {}
+        conditions = " OR ".join(
+            f"(thread_id = '{thread_id}' AND timestamp > TO_TIMESTAMP('{last_timestamp}'))"
+            for thread_id, last_timestamp in thread_timestamps.items())
+        query = f"""SELECT * FROM (SELECT L.*, ROW_NUMBER() OVER (PARTITION BY thread_id ORDER BY timestamp) as feed_row_num
+                        FROM {self.message_log_table_name} L
+                        WHERE {conditions})
+                    WHERE feed_row_num <= {int(max_rows)}
+                    ORDER BY thread_id, timestamp;"""
+        rows = self.run_query(query, max_rows=max_rows * len(thread_timestamps), max_rows_override=True)
+        msg_logs = {thread_id: [] for thread_id in thread_timestamps}
+        if not isinstance(rows, list):
+            logger.error(f"Error querying message log for {len(thread_timestamps)} threads: {rows}")
+            return msg_logs
+        for row in rows:
+            row.pop("FEED_ROW_NUM", None)
+            msg_logs.setdefault(row["THREAD_ID"], []).append(row)
+        return msg_logs
+
     def run_insert(self, table, **kwargs):
         keys = ', '.join(kwargs.keys())
 
@@ -2685,20 +2789,11 @@ class SnowflakeConnector(SnowflakeConnectorBase):
             # If no results, you might want to return None or an empty list
             return None
 
-    def fetch_embeddings(self, table_id, bot_id="system"):
-        # Initialize Snowflake connector
-
-        # Initialize variables
-        batch_size = 100
-        offset = 0
-        total_fetched = 0
-
-        # Initialize lists to store results
-        embeddings = []
-        table_names = []
-        # update to use embedding_native column if cortex mode
-
-        # Get array of allowed bots
+    def get_embedding_visible_sources(self, bot_id="system"):
+        """
+        Returns the source_names of the harvested metadata a bot may see: Snowflake plus the connections it owns or
+        is allowed to use.
+        """
         allowed_connections_query = f"""
         select connection_id from {self.cust_db_connections_table_name}
         where owner_bot_id = '{bot_id}'
@@ -2711,13 +2806,21 @@ class SnowflakeConnector(SnowflakeConnectorBase):
         cursor = self.connection.cursor()
         cursor.execute(allowed_connections_query)
         allowed_connections = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+        return ['Snowflake'] + [x for x in allowed_connections if x != 'Snowflake']
 
-        # Format list of connections with proper quoting
-        connection_list = ','.join([f"'{x}'" for x in allowed_connections])
-        if connection_list == '':
-            connection_list = "('Snowflake')"
+    def _embedding_fetch_scope(self, table_id, bot_id="system"):
+        """
+        Returns (source_filter, embedding_column) used to fetch harvested embeddings visible to a bot:
+        an SQL condition on source_name (empty when bot_id is None, i.e. all sources) and the embedding column
+        that is more populated.
+        """
+        if bot_id is None:
+            source_filter = ""
         else:
-            connection_list = f"('Snowflake',{connection_list})"
+            # Format list of connections with proper quoting
+            connection_list = ','.join([f"'{x}'" for x in self.get_embedding_visible_sources(bot_id)])
+            source_filter = f"AND (source_name IN ({connection_list}))"
 
         # Build queries using the formatted connection list
         total_rows_query_openai = f"""
@@ -2757,75 +2860,96 @@ class SnowflakeConnector(SnowflakeConnectorBase):
             embedding_column = 'embedding_native'
             logger.info(f"Selected embedding column: {embedding_column} (Native embeddings are more)")
 
-        new_total_rows_query = f"""
-            SELECT COUNT(*) as total
+        return source_filter, embedding_column
+
+    def fetch_embedding_versions(self, table_id, bot_id="system"):
+        """
+        Returns {source_name.qualified_table_name: last_crawled_timestamp} for every row visible to the bot (every
+        row when bot_id is None) that has an embedding, without fetching the vectors. Used to incrementally sync the
+        metadata vector index.
+        """
+        source_filter, embedding_column = self._embedding_fetch_scope(table_id, bot_id)
+        query = f"""SELECT source_name || '.' || qualified_table_name, last_crawled_timestamp
             FROM {table_id}
             WHERE {embedding_column} IS NOT NULL
-            and source_name in {connection_list}
-            """
+            {source_filter}"""
         cursor = self.connection.cursor()
-        cursor.execute(new_total_rows_query)
-        total_rows_result = cursor.fetchone()
-        total_rows = total_rows_result[0]
+        cursor.execute(query)
+        versions = {row[0]: str(row[1]) for row in cursor.fetchall()}
+        cursor.close()
+        return versions
+
+    def fetch_embeddings(self, table_id, bot_id="system", keys=None):
+        """
+        Fetches the harvested embeddings visible to the bot (all of them when bot_id is None).
+
+        Returns (table_names, embeddings) where embeddings is a contiguous float32 matrix with one row per table name.
+        Rows are streamed with keyset pagination on (source_name, qualified_table_name), so every batch is an index
+        range scan rather than an OFFSET that re-reads all previous rows. `keys` (source_name.qualified_table_name)
+        restricts the fetch to the given rows (incremental index sync).
+        """
+        batch_size = int(os.getenv("EMBEDDING_FETCH_BATCH_SIZE", DEFAULT_EMBEDDING_FETCH_BATCH_SIZE))
+
+        table_names = []
+        values = []
 
-        with tqdm(total=total_rows, desc=f"Fetching embeddings for {bot_id}") as pbar:
+        source_filter, embedding_column = self._embedding_fetch_scope(table_id, bot_id)
+        cursor = self.connection.cursor()
 
-            while True:
-                # Modify the query to include LIMIT and OFFSET
+        if keys is not None:
+            for i in range(0, len(keys), 500):
+                chunk = list(keys[i:i+500])
                 query = f"""SELECT qualified_table_name, {embedding_column}, source_name
                     FROM {table_id}
                     WHERE {embedding_column} IS NOT NULL
-                    AND (source_name IN {connection_list})
-                    LIMIT {batch_size} OFFSET {offset}"""
-                #            logger.info('fetch query ',query)
-
-                cursor.execute(query)
-                rows = cursor.fetchall()
-
-                # Temporary lists to hold batch results
-                temp_embeddings = []
-                temp_table_names = []
-
-                for row in rows:
-                    try:
-                        if self.source_name == 'Snowflake':
-                            temp_embeddings.append(json.loads('['+row[1][5:-3]+']'))
-                        else:
-                            temp_embeddings.append(json.loads('['+row[1]+']'))
-                        temp_table_names.append(row[2]+"."+row[0])
-                        # logger.info('temp_embeddings len: ',len(temp_embeddings))
-                        # logger.info('temp table_names: ',temp_table_names)
-                    except:
-                        try:
-                            temp_embeddings.append(json.loads('['+row[1][5:-10]+']'))
-                            temp_table_names.append(row[0])
-                        except:
-                            logger.info('Cant load array from Snowflake')
-                    # Assuming qualified_table_name is the first column
-
-                # Check if the batch was empty and exit the loop if so
-                if not temp_embeddings:
-                    break
-
-                # Append batch results to the main lists
-                embeddings.extend(temp_embeddings)
-                table_names.extend(temp_table_names)
-
-                # Update counters and progress bar
-                fetched = len(temp_embeddings)
-                total_fetched += fetched
-                pbar.update(fetched)
-
-                if fetched < batch_size:
-                    # If less than batch_size rows were fetched, it's the last batch
-                    break
-
-                # Increase the offset for the next batch
-                offset += batch_size
+                    {source_filter}
+                    AND source_name || '.' || qualified_table_name IN ({','.join(['%s']*len(chunk))})"""
+                cursor.execute(query, tuple(chunk))
+                for row in cursor.fetchall():
+                    table_names.append(row[2]+"."+row[0])
+                    values.append(row[1])
+        else:
+            new_total_rows_query = f"""
+                SELECT COUNT(*) as total
+                FROM {table_id}
+                WHERE {embedding_column} IS NOT NULL
+                {source_filter}
+                """
+            cursor.execute(new_total_rows_query)
+            total_rows = cursor.fetchone()[0]
+
+            last_source, last_table = None, None
+            with tqdm(total=total_rows, desc=f"Fetching embeddings for {bot_id or 'all bots'}") as pbar:
+                while True:
+                    query = f"""SELECT qualified_table_name, {embedding_column}, source_name
+                        FROM {table_id}
+                        WHERE {embedding_column} IS NOT NULL
+                        {source_filter}"""
+                    params = None
+                    if last_source is not None:
+                        query += """
+                        AND (source_name > %s OR (source_name = %s AND qualified_table_name > %s))"""
+                        params = (last_source, last_source, last_table)
+                    query += f"""
+                        ORDER BY source_name, qualified_table_name
+                        LIMIT {batch_size}"""
+                    cursor.execute(query, params)
+                    rows = cursor.fetchall()
+                    if not rows:
+                        break
+                    for row in rows:
+                        table_names.append(row[2]+"."+row[0])
+                        values.append(row[1])
+                    pbar.update(len(rows))
+                    if len(rows) < batch_size:
+                        break
+                    last_table, last_source = rows[-1][0], rows[-1][2]
 
         cursor.close()
-        #   logger.info('table names ',table_names)
-        #   logger.info('embeddings len ',len(embeddings))
+        embeddings, kept = embeddings_to_matrix(values)
+        if len(kept) != len(table_names):
+            logger.info(f"Skipped {len(table_names) - len(kept)} embeddings that could not be decoded")
+            table_names = [table_names[i] for i in kept]
         return table_names, embeddings
 
 
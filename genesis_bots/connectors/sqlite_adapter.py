@@ -1,9 +1,12 @@
 import sqlite3
 import re
 import logging
+import threading
+from collections import OrderedDict
 from typing import Any
 from datetime import datetime
 from genesis_bots.core.logging_config import logger
+from genesis_bots.connectors.embedding_utils import decode_embedding, encode_embedding
 import os
 from pathlib import Path
 
@@ -397,8 +400,8 @@ class SQLiteAdapter:
                     row.get('last_crawled_timestamp'),
                     row.get('crawl_status'),
                     row.get('role_used_for_crawl'),
-                    str(row.get('embedding')),  # Convert ARRAY to TEXT
-                    str(row.get('embedding_native'))  # Convert ARRAY to TEXT
+                    encode_embedding(row.get('embedding')),  # float32 blob
+                    encode_embedding(row.get('embedding_native'))
                 ))
 
             self.connection.commit()
@@ -421,7 +424,12 @@ class SQLiteAdapter:
             # Convert to list of dicts
             data = []
             for row in rows:
-                data.append(dict(zip(column_names, row)))
+                record = dict(zip(column_names, row))
+                # keep the comma separated text format of the demo file for embedding blobs
+                for column in ('embedding', 'embedding_native'):
+                    if isinstance(record.get(column), bytes):
+                        record[column] = ','.join(str(float(e)) for e in decode_embedding(record[column]))
+                data.append(record)
 
             # Create demos/demo_data directory if it doesn't exist
             os.makedirs("./genesis_sample/demo_data", exist_ok=True)
@@ -584,9 +592,66 @@ class SQLiteAdapter:
         return self.connection.rollback()
 
 class SQLiteCursorWrapper:
+    # Translated SQL (a string or a list of statements) keyed by (raw query, named params, internal schema prefix).
+    # Shared by every cursor in the process: the connectors issue the same few hundred statement shapes over and over.
+    _translation_cache = OrderedDict()
+    _translation_cache_lock = threading.Lock()
+    _translation_cache_size = int(os.getenv('SQLITE_QUERY_CACHE_SIZE', '2048'))
+    # statements longer than this usually embed literal values and are never repeated, so they are not cached
+    _translation_cache_max_query_length = int(os.getenv('SQLITE_QUERY_CACHE_MAX_QUERY_LENGTH', '16384'))
+    _translation_cache_stats = {'hits': 0, 'misses': 0, 'uncached': 0}
+
     def __init__(self, real_cursor):
         self.real_cursor = real_cursor
 
+    @classmethod
+    def translation_cache_info(cls):
+        """Returns the hit / miss counters and the size of the query translation cache."""
+        with cls._translation_cache_lock:
+            return dict(cls._translation_cache_stats, size=len(cls._translation_cache), maxsize=cls._translation_cache_size)
+
+    @classmethod
+    def clear_translation_cache(cls):
+        with cls._translation_cache_lock:
+            cls._translation_cache.clear()
+            cls._translation_cache_stats.update(hits=0, misses=0, uncached=0)
+
+    def _translate(self, query: str, named_params: bool) -> str | tuple[str, ...]:
+        """Converts the parameter placeholders and transforms the query, using the translation cache."""
+        cls = SQLiteCursorWrapper
+        if cls._translation_cache_size <= 0 or len(query) > cls._translation_cache_max_query_length:
+            with cls._translation_cache_lock:
+                cls._translation_cache_stats['uncached'] += 1
+            return self._translate_uncached(query, named_params)
+
+        # the transformation strips the internal schema prefix, so it is part of the key
+        key = (query, named_params, os.environ.get('GENESIS_INTERNAL_DB_SCHEMA', ''))
+        with cls._translation_cache_lock:
+            translated = cls._translation_cache.get(key)
+            if translated is not None:
+                cls._translation_cache.move_to_end(key)
+                cls._translation_cache_stats['hits'] += 1
+                return translated
+            cls._translation_cache_stats['misses'] += 1
+
+        translated = self._translate_uncached(query, named_params)
+        if isinstance(translated, list):
+            translated = tuple(translated)
+        with cls._translation_cache_lock:
+            cls._translation_cache[key] = translated
+            cls._translation_cache.move_to_end(key)
+            while len(cls._translation_cache) > cls._translation_cache_size:
+                cls._translation_cache.popitem(last=False)
+        return translated
+
+    def _translate_uncached(self, query: str, named_params: bool) -> str | list[str]:
+        # Replace %s with ? for SQLite
+        if named_params:
+            converted_query = re.sub(r'%\(([a-zA-Z0-9_]+)\)s', r':\1', query)
+        else:
+            converted_query = re.sub(r'%\([a-zA-Z0-9_]*\)s|%s', '?', query)
+        return self._transform_query(converted_query)
+
     def __enter__(self):
         return self
 
@@ -604,12 +669,6 @@ class SQLiteCursorWrapper:
 
     def execute(self, query: str, params: Any = None) -> Any:
         try:
-            # Replace %s with ? for SQLite
-            if isinstance(params, dict):
-                converted_query = re.sub(r'%\(([a-zA-Z0-9_]+)\)s', r':\1', query)
-            else:
-                converted_query = re.sub(r'%\([a-zA-Z0-9_]*\)s|%s', '?', query)
-
             # Ensure params is in the correct format for SQLite
             if params is not None:
                 if not isinstance(params, (list, tuple, dict)):
@@ -634,7 +693,7 @@ class SQLiteCursorWrapper:
                     params = params[:3]
                     logger.debug(f"Using first 3 params for slack_app_config_tokens: {params}")
 
-            modified_query = self._transform_query(converted_query)
+            modified_query = self._translate(query, isinstance(params, dict))
             logger.debug(f"Transformed query: {modified_query}")
             logger.debug(f"Final params count: {len(params) if params else 0}")
 
@@ -643,7 +702,7 @@ class SQLiteCursorWrapper:
                 if params is None:
                     return self.real_cursor.execute(modified_query)
                 return self.real_cursor.execute(modified_query, params)
-            elif isinstance(modified_query, list):
+            elif isinstance(modified_query, (list, tuple)):
                 results = []
                 for single_query in modified_query:
                     if params is None:
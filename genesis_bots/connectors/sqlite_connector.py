@@ -6,6 +6,7 @@ from snowflake.connector import connect
 from tqdm import tqdm
 
 import os
+import sys
 import json
 from itertools import islice
 from datetime import datetime
@@ -21,6 +22,9 @@ import requests
 from genesis_bots.llm.llm_openai.openai_utils import get_openai_client
 from genesis_bots.connectors.data_connector import DatabaseConnector
 from genesis_bots.connectors.connector_helpers import llm_keys_and_types_struct
+from genesis_bots.connectors.embedding_utils import DEFAULT_EMBEDDING_FETCH_BATCH_SIZE, embeddings_to_matrix, encode_embedding
+from genesis_bots.connectors.query_results import DEFAULT_BATCH_ROWS, iter_column_batches, stream_result
+from genesis_bots.connectors.chat_history_writer import get_chat_history_writer
 from genesis_bots.core.bot_os_defaults import (
     BASE_EVE_BOT_INSTRUCTIONS,
     ELIZA_DATA_ANALYST_INSTRUCTIONS,
@@ -476,9 +480,11 @@ class SqliteConnector(DatabaseConnector):
         channel_name=None,
         primary_user=None,
         task_id=None,
+        bot_os_thread=None
     ):
         """
-        Inserts a single row into the chat history table using Snowflake's streaming insert.
+        Inserts a single row into the chat history table. The row is queued for the connector's write-behind
+        ChatHistoryWriter (see chat_history_writer.py), which inserts rows in batches off the response path.
 
         :param timestamp: TIMESTAMP field, format should be compatible with Snowflake.
         :param bot_id: STRING field representing the bot's ID.
@@ -495,7 +501,6 @@ class SqliteConnector(DatabaseConnector):
         :param primary_user: STRING field representing the who sent the original message, can be NULL.
         :param task_id: STRING field representing the task, can be NULL.
         """
-        cursor = None
         if files is None:
             files = []
         files_str = str(files)
@@ -507,39 +512,57 @@ class SqliteConnector(DatabaseConnector):
             if isinstance(message_metadata, dict):
                 message_metadata = json.dumps(message_metadata)
 
-            insert_query = f"""
-            INSERT INTO {self.message_log_table_name}
-                (timestamp, bot_id, bot_name, thread_id, message_type, message_payload, message_metadata, tokens_in, tokens_out, files, channel_type, channel_name, primary_user, task_id)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """
-            cursor = self.client.cursor()
-            cursor.execute(
-                insert_query,
-                (
-                    formatted_timestamp,
-                    bot_id,
-                    bot_name,
-                    thread_id,
-                    message_type,
-                    message_payload,
-                    message_metadata,
-                    tokens_in,
-                    tokens_out,
-                    files_str,
-                    channel_type,
-                    channel_name,
-                    primary_user,
-                    task_id,
-                ),
+            if bot_os_thread is not None and bot_os_thread.thread_id != thread_id:
+                thread_id = bot_os_thread.thread_id
+
+            row = (
+                formatted_timestamp,
+                bot_id,
+                bot_name,
+                thread_id,
+                message_type,
+                message_payload,
+                message_metadata,
+                tokens_in,
+                tokens_out,
+                files_str,
+                channel_type,
+                channel_name,
+                primary_user,
+                task_id,
             )
-            self.client.commit()
         except Exception as e:
             logger.info(
                 f"Encountered errors while inserting into chat history table row: {e}"
             )
+            return
+        writer = get_chat_history_writer(self)
+        if writer is not None:
+            writer.enqueue(row)
+        else:
+            try:
+                self._write_chat_history_rows([row])
+            except Exception as e:
+                logger.info(
+                    f"Encountered errors while inserting into chat history table row: {e}"
+                )
+
+    def _write_chat_history_rows(self, rows):
+        """Inserts and commits a batch of chat history rows (tuples in insert_chat_history_row column order)."""
+        insert_query = f"""
+        INSERT INTO {self.message_log_table_name}
+            (timestamp, bot_id, bot_name, thread_id, message_type, message_payload, message_metadata, tokens_in, tokens_out, files, channel_type, channel_name, primary_user, task_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """
+        cursor = self.client.cursor()
+        try:
+            cursor.executemany(insert_query, rows)
+            self.client.commit()
+        except Exception:
+            self.client.rollback()
+            raise
         finally:
-            if cursor is not None:
-                cursor.close()
+            cursor.close()
 
     # ========================================================================================================
 
@@ -2269,7 +2292,7 @@ class SqliteConnector(DatabaseConnector):
                 database_name=database_name, schema_name=schema_name, table_name=table_name,
                 complete_description=complete_description, ddl=ddl, ddl_short=ddl_short, ddl_hash=ddl_hash,
                 summary=summary, sample_data_text=sample_data_text, last_crawled_timestamp=last_crawled_timestamp,
-                crawl_status=crawl_status, role_used_for_crawl=role_used_for_crawl, **{embedding_target: json.dumps(embedding)})
+                crawl_status=crawl_status, role_used_for_crawl=role_used_for_crawl, **{embedding_target: encode_embedding(embedding)})
 
         except Exception as e:
             logger.info(f"An error occurred while executing the MERGE statement: {e}")
@@ -2718,15 +2741,11 @@ class SqliteConnector(DatabaseConnector):
 
         #    logger.info('getting results:')
         try:
-            results = cursor.fetchmany(max_rows)
+            # stream the result and stop reading once max_rows (or, for queries from bots, the byte budget) is reached
             columns = [col[0].upper() for col in cursor.description]
-            sample_data = [dict(zip(columns, row)) for row in results]
-
-            # Replace occurrences of triple backticks with triple single quotes in sample data
-            sample_data = [
-                {key: (value.replace("```", r"\`\`\`") if isinstance(value, str) else value) for key, value in row.items()}
-                for row in sample_data
-            ]
+            streamed = stream_result(iter_column_batches(cursor, columns, batch_rows=min(max(1, max_rows), DEFAULT_BATCH_ROWS)),
+                                     columns, max_rows=max_rows, max_bytes=None if userquery else sys.maxsize)
+            sample_data = streamed.rows
         except Exception as e:
             logger.info("run query: ", query, "\ncaused error: ", e)
             cursor.close()
@@ -3546,6 +3565,29 @@ class SqliteConnector(DatabaseConnector):
             )
             return None
 
+    def db_get_all_bot_details(self, project_id, dataset_name, bot_servicing_table):
+        """
+        Bulk counterpart of db_get_bot_details: the details of every bot in the BOT_SERVICING table, in one query.
+
+        Returns:
+            list: A list of dictionaries (one per bot, same keys as db_get_bot_details), or None on error.
+        """
+        select_query = f"""
+            SELECT *
+            FROM {bot_servicing_table}
+        """
+
+        try:
+            cursor = self.client.cursor()
+            cursor.execute(select_query)
+            rows = cursor.fetchall()
+            columns = [desc[0].lower() for desc in cursor.description]
+            cursor.close()
+            return [dict(zip(columns, row)) for row in rows]
+        except Exception as e:
+            logger.exception(f"Failed to retrieve the details of all bots with error: {e}")
+            return None
+
     def db_update_existing_bot(
         self,
         api_app_id,
@@ -5637,6 +5679,54 @@ class SqliteConnector(DatabaseConnector):
         msg_log = self.run_query(query, max_rows=max_rows)
         return msg_log
 
+    def query_message_log_changes(self, since):
+        """
+        Threads with message log rows newer than `since` (the change feed high-water mark) that still have messages
+        not covered by the knowledge table: THREAD_ID, TIMESTAMP (latest message), MESSAGE_COUNT and LAST_TIMESTAMP
+        (latest message already processed into knowledge).
+        """
+        query = f"""
+                WITH N AS (SELECT thread_id, max(timestamp) as timestamp FROM {self.message_log_table_name}
+                    WHERE timestamp > DATETIME('{since}') AND PRIMARY_USER IS NOT NULL
+                    GROUP BY thread_id),
+                M AS (SELECT L.thread_id, COUNT(*) as message_count FROM {self.message_log_table_name} L
+                    WHERE L.thread_id IN (SELECT thread_id FROM N) AND L.PRIMARY_USER IS NOT NULL
+                    GROUP BY L.thread_id),
+                K AS (SELECT thread_id, max(last_timestamp) as last_timestamp FROM {self.knowledge_table_name}
+                    WHERE thread_id IN (SELECT thread_id FROM N)
+                    GROUP BY thread_id)
+                SELECT N.thread_id, N.timestamp as timestamp, M.message_count as message_count,
+                    COALESCE(K.last_timestamp, DATE('2000-01-01')) as last_timestamp FROM N
+                JOIN M on N.thread_id = M.thread_id
+                LEFT JOIN K on N.thread_id = K.thread_id
+                WHERE N.timestamp > COALESCE(K.last_timestamp, DATE('2000-01-01')) order by N.timestamp;"""
+        return self.run_query(query, max_rows=1000000, max_rows_override=True)
+
+    def query_message_log_for_threads(self, thread_timestamps, max_rows=50):
+        """
+        Message log rows of several threads in one query: for each thread_id in `thread_timestamps`, the first
+        `max_rows` rows after its timestamp. Returns {thread_id: [rows ordered by timestamp]}.
+        """
+        if not thread_timestamps:
+            return {}
+        conditions = " OR ".join(
+            f"(thread_id = '{thread_id}' AND timestamp > DATETIME('{last_timestamp}'))"
+            for thread_id, last_timestamp in thread_timestamps.items())
+        query = f"""SELECT * FROM (SELECT L.*, ROW_NUMBER() OVER (PARTITION BY thread_id ORDER BY timestamp) as feed_row_num
+                        FROM {self.message_log_table_name} L
+                        WHERE {conditions})
+                    WHERE feed_row_num <= {int(max_rows)}
+                    ORDER BY thread_id, timestamp;"""
+        rows = self.run_query(query, max_rows=max_rows * len(thread_timestamps), max_rows_override=True)
+        msg_logs = {thread_id: [] for thread_id in thread_timestamps}
+        if not isinstance(rows, list):
+            logger.error(f"Error querying message log for {len(thread_timestamps)} threads: {rows}")
+            return msg_logs
+        for row in rows:
+            row.pop("FEED_ROW_NUM", None)
+            msg_logs.setdefault(row["THREAD_ID"], []).append(row)
+        return msg_logs
+
     def run_insert(self, table, **kwargs):
         keys = ','.join(kwargs.keys())
 
@@ -5648,75 +5738,73 @@ class SqliteConnector(DatabaseConnector):
         cursor.execute(insert_query, tuple(kwargs.values()))
         self.client.commit()
 
-    def fetch_embeddings(self, table_id, bot_id=None):
-        # Initialize Snowflake connector
+    def get_embedding_visible_sources(self, bot_id=None):
+        """
+        Harvested metadata is not scoped per bot here (fetch_embeddings ignores bot_id), so there is no source
+        restriction to apply: returns None.
+        """
+        return None
 
-        # Initialize variables
-        batch_size = 100
-        offset = 0
-        total_fetched = 0
+    def fetch_embedding_versions(self, table_id, bot_id=None):
+        """
+        Returns {qualified_table_name: last_crawled_timestamp} for every row that has an embedding, without fetching
+        the vectors. Used to incrementally sync the metadata vector index.
+        """
+        cursor = self.client.cursor()
+        cursor.execute(f"SELECT qualified_table_name, LAST_CRAWLED_TIMESTAMP FROM {table_id} WHERE embedding IS NOT NULL")
+        versions = {row[0]: str(row[1]) for row in cursor.fetchall()}
+        cursor.close()
+        return versions
 
-        # Initialize lists to store results
-        embeddings = []
-        table_names = []
+    def fetch_embeddings(self, table_id, bot_id=None, keys=None):
+        """
+        Returns (table_names, embeddings) where embeddings is a contiguous float32 matrix with one row per table name.
+        Rows are streamed with keyset pagination on qualified_table_name; `keys` restricts the fetch to the given rows
+        (incremental index sync).
+        """
+        batch_size = int(os.getenv("EMBEDDING_FETCH_BATCH_SIZE", DEFAULT_EMBEDDING_FETCH_BATCH_SIZE))
 
-        # First, get the total number of rows to set up the progress bar
-        total_rows_query = f"SELECT COUNT(*) as total FROM {table_id}"
+        table_names = []
+        values = []
         cursor = self.client.cursor()
-        # logger.info('total rows query: ',total_rows_query)
-        cursor.execute(total_rows_query)
-        total_rows_result = cursor.fetchone()
-        total_rows = total_rows_result[0]
-
-        with tqdm(total=total_rows, desc="Fetching embeddings") as pbar:
-            while True:
-                # Modify the query to include LIMIT and OFFSET
-                query = f"SELECT qualified_table_name, embedding FROM {table_id} LIMIT {batch_size} OFFSET {offset}"
-                #            logger.info('fetch query ',query)
-                cursor.execute(query)
-                rows = cursor.fetchall()
-
-                # Temporary lists to hold batch results
-                temp_embeddings = []
-                temp_table_names = []
-
-                for row in rows:
-                    try:
-                        temp_embeddings.append(json.loads('['+row[1][5:-3]+']'))
-                        temp_table_names.append(row[0])
-                    #                    logger.info('temp_embeddings len: ',len(temp_embeddings))
-                    #                    logger.info('temp table_names: ',temp_table_names)
-                    except:
-                        try:
-                            temp_embeddings.append(json.loads('['+row[1][5:-10]+']'))
-                            temp_table_names.append(row[0])
-                        except:
-                            logger.info('Cant load array from Snowflake')
-                    # Assuming qualified_table_name is the first column
-
-                # Check if the batch was empty and exit the loop if so
-                if not temp_embeddings:
-                    break
-
-                # Append batch results to the main lists
-                embeddings.extend(temp_embeddings)
-                table_names.extend(temp_table_names)
-
-                # Update counters and progress bar
-                fetched = len(temp_embeddings)
-                total_fetched += fetched
-                pbar.update(fetched)
-
-                if fetched < batch_size:
-                    # If less than batch_size rows were fetched, it's the last batch
-                    break
-
-                # Increase the offset for the next batch
-                offset += batch_size
+
+        if keys is not None:
+            for i in range(0, len(keys), 500):
+                chunk = list(keys[i:i+500])
+                query = f"SELECT qualified_table_name, embedding FROM {table_id} WHERE embedding IS NOT NULL AND qualified_table_name IN ({','.join(['?']*len(chunk))})"
+                cursor.execute(query, tuple(chunk))
+                for row in cursor.fetchall():
+                    table_names.append(row[0])
+                    values.append(row[1])
+        else:
+            cursor.execute(f"SELECT COUNT(*) as total FROM {table_id} WHERE embedding IS NOT NULL")
+            total_rows = cursor.fetchone()[0]
+
+            last_table = None
+            with tqdm(total=total_rows, desc="Fetching embeddings") as pbar:
+                while True:
+                    if last_table is None:
+                        cursor.execute(f"SELECT qualified_table_name, embedding FROM {table_id} WHERE embedding IS NOT NULL "
+                                       f"ORDER BY qualified_table_name LIMIT {batch_size}")
+                    else:
+                        cursor.execute(f"SELECT qualified_table_name, embedding FROM {table_id} WHERE embedding IS NOT NULL "
+                                       f"AND qualified_table_name > ? ORDER BY qualified_table_name LIMIT {batch_size}", (last_table,))
+                    rows = cursor.fetchall()
+                    if not rows:
+                        break
+                    for row in rows:
+                        table_names.append(row[0])
+                        values.append(row[1])
+                    pbar.update(len(rows))
+                    if len(rows) < batch_size:
+                        break
+                    last_table = rows[-1][0]
 
         cursor.close()
-        #   logger.info('table names ',table_names)
-        #   logger.info('embeddings len ',len(embeddings))
+        embeddings, kept = embeddings_to_matrix(values)
+        if len(kept) != len(table_names):
+            logger.info(f"Skipped {len(table_names) - len(kept)} embeddings that could not be decoded")
+            table_names = [table_names[i] for i in kept]
         return table_names, embeddings
 
     def generate_filename_from_last_modified(self, table_id, bot_id=None):
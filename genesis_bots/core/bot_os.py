@@ -16,12 +16,12 @@ import traceback
 from genesis_bots.core.bot_os_corpus import FileCorpus
 from genesis_bots.core.bot_os_assistant_base import get_tgt_pcnt
 from genesis_bots.core.bot_os_input import BotOsInputAdapter, BotOsInputMessage, BotOsOutputMessage
+from genesis_bots.core.bot_os_thread_messages import ThreadCatalog, ThreadFileStore, ThreadMessages
 from genesis_bots.llm.llm_openai.bot_os_openai import BotOsAssistantOpenAI, BotOsAssistantOpenAIChat
 from genesis_bots.llm.llm_cortex.bot_os_cortex import BotOsAssistantSnowflakeCortex
 
 # from bot_os_reka import BotOsAssistantReka
 from genesis_bots.core.bot_os_reminders import RemindersTest
-from genesis_bots.schema_explorer import embeddings_index_handler as embeddings_handler
 from genesis_bots.core.bot_os_defaults import _BOT_OS_BUILTIN_TOOLS
 from genesis_bots.core import global_flags
 import pickle
@@ -31,6 +31,7 @@ import json
 
 from genesis_bots.core.logging_config import logger
 from genesis_bots.core.file_diff_handler import GitFileManager
+from genesis_bots.connectors.bot_heartbeats import get_heartbeat_registry
 
 class BotOsThread:
     def __init__(self, assistant_implementaion, input_adapter, thread_id=None) -> None:
@@ -52,6 +53,14 @@ class BotOsThread:
         self.run_messg_count = 0
         self.stop_signal = False
 
+    @property
+    def messages(self):
+        return self._messages
+
+    @messages.setter
+    def messages(self, messages):
+        self._messages = messages if isinstance(messages, ThreadMessages) else ThreadMessages(messages)
+
     def is_thread_active(self):
         '''
         Return True is this thread is already active (processing other messages)
@@ -194,34 +203,34 @@ class BotOsThread:
         if tgt_pcnt == None:
             return False
 
-        messg_bytes = [len(json.dumps(messg)) for messg in self.messages]
-        total_bytes = sum(messg_bytes)
+        # message sizes are recorded as messages are added; only the instructions are rewritten in place
+        if self.messages:
+            self.messages.refresh_size(0)
+        messg_bytes = self.messages.sizes
+        total_bytes = self.messages.total_bytes
         tgt_bytes = math.ceil((total_bytes * tgt_pcnt) / 100)
         logger.info(f'bot={self.assistant_impl.bot_id}, thread={self.thread_id}, {len(self.messages)} messages, {total_bytes} bytes, {tgt_bytes=}')
 
-        messages = self.messages[:1]
         count = 0
         tools = set()
 
-        # don't delete instruction and current run messages
-        for messg, bytes in zip(self.messages[1:self.run_messg_count],
-                                messg_bytes[1:self.run_messg_count]):
-
-            # clean up tool messages associated with deleted tool_calls
+        # delete the oldest messages, but don't delete instruction and current run messages.
+        # tool messages follow their tool_calls message, so they go with it
+        end = 1
+        while end < self.run_messg_count:
+            messg = self.messages[end]
             if messg.get('role') == 'tool' and messg.get('tool_call_id') in tools:
-                total_bytes -= bytes
-                count += 1
-                continue
-
-            if total_bytes > tgt_bytes:
-                total_bytes -= bytes
-                count += 1
+                pass
+            elif total_bytes > tgt_bytes:
                 tools.update([tool['id'] for tool in messg.get('tool_calls', [])])
-                continue
-
-            messages.append(messg)
+            else:
+                break
+            total_bytes -= messg_bytes[end]
+            count += 1
+            end += 1
 
-        self.messages = messages + self.messages[self.run_messg_count:]
+        del self.messages[1:end]
+        self.run_messg_count -= count
         logger.info(f'bot={self.assistant_impl.bot_id}, thread={self.thread_id}, deleted {count} messages, {total_bytes} bytes in messages now')
         return True
 
@@ -239,6 +248,7 @@ class BotOsThread:
         """Reconstruct thread from dictionary"""
         thread = cls(assistant_impl, input_adapter, thread_id=data['thread_id'])
         thread.messages = data['messages']
+        thread.messages.mark_saved()
         thread.fast_mode = data['fast_mode']
         thread.run_messg_count = data['run_messg_count']
         return thread
@@ -441,13 +451,14 @@ class BotOsSession:
         self.next_messages = []
         self.bot_id = bot_id
         self.schema =  os.getenv("GENESIS_INTERNAL_DB_SCHEMA", "None").upper()
-        self.last_table_update = datetime.datetime.now() - datetime.timedelta(seconds=61)
         self.update_bots_active_table()
 
         # Use bot_git path for thread storage
         git_path = os.getenv('GIT_PATH', GitFileManager.get_default_git_repo_path())
         self.thread_storage_path = os.path.join(git_path, 'threads', bot_id)
         os.makedirs(self.thread_storage_path, exist_ok=True)
+        self.thread_stores = {}  # thread_id -> ThreadFileStore
+        self.thread_catalog = None  # last-touched index of the thread files, opened on first use
 
         # Load thread maps if they exist
         thread_maps_file = os.path.join(self.thread_storage_path, "thread_maps.json")
@@ -461,6 +472,8 @@ class BotOsSession:
                 logger.error(f"Failed to load thread maps for bot {self.bot_id}: {str(e)}")
 
         self.thread_retention_days = int(os.getenv("THREAD_RETENTION_DAYS", "30"))
+        # removing expired thread files (from the git repo) is opt-in
+        self.thread_retention_sweep = os.getenv("THREAD_RETENTION_SWEEP", "false").lower() == "true"
         self.last_cleanup = datetime.datetime.now()
 
     def _get_thread_storage_file(self, thread_id):
@@ -468,32 +481,34 @@ class BotOsSession:
         safe_thread_id = re.sub(r'[^a-zA-Z0-9-]', '_', thread_id)
         return os.path.join(self.thread_storage_path, f"{safe_thread_id}.json")
 
+    def _get_thread_catalog(self):
+        if self.thread_catalog is None:
+            self.thread_catalog = ThreadCatalog(self.thread_storage_path)
+        return self.thread_catalog
+
+    def _get_thread_store(self, thread_id):
+        store = self.thread_stores.get(thread_id)
+        if store is None:
+            store = self.thread_stores[thread_id] = ThreadFileStore(self._get_thread_storage_file(thread_id))
+        return store
+
     def _save_thread(self, thread):
-        """Save thread state directly to filesystem in bot_git/threads"""
+        """Save thread state directly to filesystem in bot_git/threads (appends new messages to the thread log)"""
         try:
-            thread_data = thread.to_dict()
-            file_path = self._get_thread_storage_file(thread.thread_id)
-            
-            # Write to temporary file first then rename for atomic operation
-            temp_path = file_path + '.tmp'
-            with open(temp_path, 'w') as f:
-                json.dump(thread_data, f, indent=2)
-            os.replace(temp_path, file_path)
-            
+            store = self._get_thread_store(thread.thread_id)
+            store.save(thread)
+            self._get_thread_catalog().touch(os.path.basename(store.file_path))
         except Exception as e:
             logger.error(f"Failed to save thread {thread.thread_id}: {str(e)}")
 
     def _load_thread(self, thread_id, input_adapter):
-        """Load thread state using git manager"""
-        relative_path = self._get_thread_storage_file(thread_id)
-        
-        result = self.git_manager.git_action(
-            "read_file", 
-            file_path=relative_path
-        )
-        
-        if result.get("success"):
-            thread_data = json.loads(result["content"])
+        """Load thread state (snapshot and log) from bot_git/threads"""
+        try:
+            thread_data = self._get_thread_store(thread_id).load()
+        except Exception as e:
+            logger.error(f"Failed to load thread {thread_id}: {str(e)}")
+            return None
+        if thread_data is not None:
             return BotOsThread.from_dict(thread_data, self.assistant_impl, input_adapter)
         return None
 
@@ -639,80 +654,64 @@ class BotOsSession:
         return current_time.strftime("%Y-%m-%d %H:%M:%S %Z")
 
     def update_bots_active_table(self):
-
-        # Check if last_table_update is more than 60 seconds ags
+        """Records a liveness heartbeat of this bot (see bot_heartbeats.py); only updates memory, the heartbeat
+        registry of the connector writes it to BOT_HEARTBEATS in the background."""
         if not global_flags.multibot_mode:
             return
-
-        current_time = datetime.datetime.now()
-        if not hasattr(self, 'last_table_update') or (current_time - self.last_table_update).total_seconds() > 60:
-            self.last_table_update = current_time
-        else:
-            return
-
-        current_timestamp = self.get_current_time_with_timezone()
-
-        # Format the timestamp as a string
-        timestamp_str = current_timestamp
-
-        # Create or replace the bots_active table with the current timestamp
-        create_bots_active_table_query = f"""
-        CREATE OR REPLACE TABLE {self.schema}.bots_active ("{timestamp_str}" STRING);
-        """
-
-        try:
-            cursor = self.log_db_connector.connection.cursor()
-            cursor.execute(create_bots_active_table_query)
-            self.log_db_connector.connection.commit()
-            logger.info(f"Table {self.schema}.bots_active created or replaced successfully with timestamp: {timestamp_str}")
-        except Exception as e:
-            logger.info(f"An error occurred while creating or replacing the bots_active table: {e}")
-        finally:
-            if cursor:
-                cursor.close()
+        registry = get_heartbeat_registry(self.log_db_connector)
+        if registry is not None:
+            registry.beat(self.bot_id)
 
     def _cleanup_old_threads(self):
-        """Remove thread storage files older than retention period"""
+        """Remove thread storage files older than retention period (expired ones found in the thread catalog)"""
         now = datetime.datetime.now()
         if (now - self.last_cleanup).days < 1:
             return
 
         self.last_cleanup = now
-        retention_delta = datetime.timedelta(days=self.thread_retention_days)
+        catalog = self._get_thread_catalog()
+        cutoff = time.time() - datetime.timedelta(days=self.thread_retention_days).total_seconds()
+        expired = catalog.expired(cutoff)
+        if not expired:
+            return
 
-        # List all thread files for this bot
-        result = self.git_manager.git_action(
-            "list_files",
-            path=f"threads/{self.bot_id}"
-        )
-        
+        # the thread files live under threads/<bot_id> of the bot_git repo
+        git_manager = GitFileManager()
+        rel_dir = os.path.relpath(self.thread_storage_path, git_manager.repo_path)
+        file_paths = []
+        for file_name in expired:
+            file_paths += [os.path.join(rel_dir, file_name), os.path.join(rel_dir, file_name + '.log')]
+        result = git_manager.remove_files(file_paths,
+                                          commit_message=f"Remove {len(expired)} old thread files of {self.bot_id}")
         if not result.get("success"):
+            logger.info(f"Failed to remove old thread storage of {self.bot_id}: {result.get('error')}")
             return
 
-        files = result.get("files", {}).get("files", [])
-        for file_path in files:
-            # Get file history to check last modification
-            history = self.git_manager.git_action(
-                "get_history",
-                file_path=file_path,
-                max_count=1
-            )
-            
-            if history.get("success") and history.get("history"):
-                last_commit = history["history"][0]
-                file_modified = last_commit["date"]
-                
-                if now - file_modified > retention_delta:
-                    self.git_manager.git_action(
-                        "remove_file",
-                        file_path=file_path,
-                        commit_message=f"Remove old thread file {file_path}"
-                    )
-                    logger.info(f"Removed old thread storage: {file_path}")
+        catalog.remove(expired)
+        expired_paths = {os.path.join(self.thread_storage_path, file_name) for file_name in expired}
+        for thread_id, store in list(self.thread_stores.items()):
+            if store.file_path in expired_paths:
+                del self.thread_stores[thread_id]
+        logger.info(f"Removed {len(expired)} old thread storage files of {self.bot_id}")
+
+    def has_pending_work(self) -> bool:
+        """
+        Returns True if this session needs another execute() cycle without a new input wakeup: queued validation
+        messages, in-flight LLM runs to check on, or input left on an adapter queue (e.g. put back because its thread was busy).
+        """
+        if self.next_messages:
+            return True
+        if self.assistant_impl.is_active() or self.assistant_impl.is_processing_runs():
+            return True
+        return any(a.has_pending_input() for a in self.input_adapters)
 
     def execute(self):
-        # Add cleanup check at start of execute
-       # self._cleanup_old_threads()
+        # Add cleanup check at start of execute (at most once a day, when THREAD_RETENTION_SWEEP is enabled)
+        if self.thread_retention_sweep:
+            try:
+                self._cleanup_old_threads()
+            except Exception as e:
+                logger.error(f"Failed to clean up old threads of {self.bot_id}: {str(e)}")
         
         # self._health_check()
 
@@ -895,8 +894,7 @@ Now, with that as background...\n''' + input_message.msg
         #     self.refresh_lock = False
 
     def _refresh_cached_annoy(self):
-        table = self.knowledge_impl.meta_database_connector.metadata_table_name
-        embeddings_handler.load_or_create_embeddings_index(table, refresh=True, bot_id=self.bot_id)
+        self.knowledge_impl.refresh_annoy()
 
     def _reminder_callback(self, message: str):
         logger.info(f"reminder_callback - {message}")
@@ -147,6 +147,18 @@ def create_func_wrapper(function, func_name):
     return run_task_with_exception_handling
 
 
+def lookup_function(available_functions, func_name: str):
+    """
+    Returns (func_name, function) for a tool name requested by the LLM, falling back to the name with an added
+    underscore (the name some tool functions are registered with). function is None if neither is available.
+    """
+    function = available_functions.get(func_name, None)
+    if function is None and available_functions.get('_'+func_name, None) is not None:
+        func_name = '_' + func_name
+        function = available_functions[func_name]
+    return func_name, function
+
+
 def execute_function(
     func_name: str,
     arguments,
@@ -160,12 +172,7 @@ def execute_function(
     run_id = None,
 ):
     logger.info(f"fn execute_function - {func_name}")
-    function = available_functions.get(func_name, None)
-    if function is None:
-        logger.info(f"fn execute_function - _{func_name} (trying with added underscore)")
-        function = available_functions.get('_'+func_name, None)
-        if function is not None:
-            func_name = '_' + func_name
+    func_name, function = lookup_function(available_functions, func_name)
     if function is not None:
         s_arguments = json.loads(arguments)
 
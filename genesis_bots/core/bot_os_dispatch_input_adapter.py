@@ -1,4 +1,4 @@
-import json, os
+import json, os, time
 
 from genesis_bots.bot_genesis.make_baby_bot import (
     MAKE_BABY_BOT_DESCRIPTIONS,
@@ -6,7 +6,7 @@ from genesis_bots.bot_genesis.make_baby_bot import (
     make_baby_bot_tools,
 )
 
-from genesis_bots.core.bot_os_input import BotOsInputAdapter, BotOsInputMessage, BotOsOutputMessage
+from genesis_bots.core.bot_os_input import BotOsInputAdapter, BotOsInputMessage, BotOsOutputMessage, RequestCompletion
 
 from genesis_bots.core.logging_config import logger
 
@@ -36,6 +36,9 @@ class BotOsDispatchInputAdapter(BotOsInputAdapter):
     def get_input(self, thread_map=None, active=None, processing=None, done_map=None):
         pass
 
+    def has_pending_input(self) -> bool:
+        return False
+
     # allows response to be sent back with optional reply
     def handle_response(
         self,
@@ -46,20 +49,28 @@ class BotOsDispatchInputAdapter(BotOsInputAdapter):
         task_meta=None,
     ):
         if message.status == "completed":
-            self.tasks[message.thread_id]["result"] = message.output
+            self.tasks[message.thread_id]["result"].update(message.output, done=True)
 
     def dispatch_task(self, task):
         # thread_id = self.session.add_task(task, self)
         thread_id = self.session.create_thread(self)
-        self.tasks[thread_id] = {"task": task, "result": None}
+        self.tasks[thread_id] = {"task": task, "result": RequestCompletion(thread_id)}
         self.session.add_message(BotOsInputMessage(thread_id=thread_id, msg=task))
 
-    def check_tasks(self):
+    def check_tasks(self, wait_seconds=0.0):
+        """
+        Runs the session once, then waits up to `wait_seconds` for the remaining tasks to complete (returning as soon
+        as the last one does). Returns the results of all tasks, or False if some are still running.
+        """
         self.session.execute()
-        if all(task["result"] is not None for task in self.tasks.values()):
-            return [task["result"] for task in self.tasks.values()]
-        else:
-            return False
+        deadline = time.monotonic() + wait_seconds
+        results = []
+        for task in self.tasks.values():
+            result = task["result"].result(timeout=max(0.0, deadline - time.monotonic()))
+            if result is None:
+                return False
+            results.append(result)
+        return results
 
 
 def make_session_for_dispatch(bot_config):
@@ -0,0 +1,193 @@
+from   concurrent.futures       import ThreadPoolExecutor
+import heapq
+import itertools
+import os
+import threading
+import time
+
+from   genesis_bots.core.logging_config \
+                                import logger
+
+
+class BotOsSessionDispatcher:
+    """
+    Event-driven executor for BotOsSession.execute().
+
+    Instead of calling execute() on every session from a fixed-interval scheduler job, sessions are only run when
+    there is something for them to do:
+
+        * an input adapter signals that new input arrived (see BotOsInputAdapter.set_wakeup_callback), or
+        * the session reported pending work after its last run (in-flight LLM runs, messages put back on an
+          adapter queue, pending validation messages). Such sessions are re-polled after `busy_poll_seconds`.
+
+    Ready sessions are handed to a bounded worker pool. A session is never executed concurrently with itself: a
+    wakeup that arrives while the session is running is recorded and the session is re-run as soon as the current
+    run finishes. Idle sessions are not touched at all.
+    """
+
+    def __init__(self, execute_fn, max_workers: int = None, busy_poll_seconds: float = None):
+        """
+        Args:
+            execute_fn (callable):
+                Called with a session to run one execution cycle (normally BotOsServer._run_session).
+            max_workers (int, optional):
+                Size of the worker pool. Defaults to env var BOT_OS_DISPATCHER_WORKERS or 16.
+            busy_poll_seconds (float, optional):
+                Delay before re-running a session that still has pending work. Defaults to env var
+                BOT_OS_DISPATCHER_BUSY_POLL_SECONDS or 1.0.
+        """
+        if max_workers is None:
+            max_workers = int(os.getenv("BOT_OS_DISPATCHER_WORKERS", "16"))
+        if busy_poll_seconds is None:
+            busy_poll_seconds = float(os.getenv("BOT_OS_DISPATCHER_BUSY_POLL_SECONDS", "1.0"))
+        self.execute_fn = execute_fn
+        self.max_workers = max_workers
+        self.busy_poll_seconds = busy_poll_seconds
+
+        self._cond = threading.Condition()
+        self._sessions = {}       # session_name -> session
+        self._ready = []          # FIFO of session names ready to run
+        self._ready_set = set()
+        self._running = set()     # session names currently executing
+        self._rerun = set()       # session names woken up while running
+        self._timers = []         # heap of (due_monotonic_ts, seq, session_name)
+        self._timer_seq = itertools.count()
+        self._stopped = True
+        self._thread = None
+        self._executor = None
+        self.stats = {"runs": 0, "wakeups": 0, "busy_polls": 0, "errors": 0}
+
+
+    def start(self):
+        with self._cond:
+            if not self._stopped:
+                return
+            self._stopped = False
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bot_os_session")
+            self._thread = threading.Thread(target=self._loop, name="bot_os_dispatcher", daemon=True)
+            self._thread.start()
+        logger.info(f"BotOsSessionDispatcher started with {self.max_workers} workers")
+
+
+    def stop(self, wait: bool = False):
+        with self._cond:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+
+
+    def register(self, session):
+        """Adds (or replaces, by session_name) a session and wires its input adapters to wake it up."""
+        name = session.session_name
+        with self._cond:
+            self._sessions[name] = session
+        for adapter in session.input_adapters:
+            adapter.set_wakeup_callback(lambda name=name: self.notify(name))
+        # run once so that anything queued before registration is picked up
+        self.notify(name)
+
+
+    def unregister(self, session):
+        name = session.session_name
+        with self._cond:
+            # only drop the entry if it was not already replaced by a newer session with the same name
+            if self._sessions.get(name) is session:
+                del self._sessions[name]
+
+
+    def notify(self, session_name: str):
+        """Marks a session as ready to run. Safe to call from any thread, including adapter event handlers."""
+        with self._cond:
+            if session_name not in self._sessions:
+                return
+            self.stats["wakeups"] += 1
+            if session_name in self._running:
+                self._rerun.add(session_name)
+                return
+            self._enqueue(session_name)
+            self._cond.notify()
+
+
+    def poll_pending(self):
+        """
+        Enqueues idle sessions that report pending work. This is a cheap safety net for work that becomes pending
+        without going through an adapter (e.g. tool results resubmitted to an LLM run from a worker thread).
+        """
+        with self._cond:
+            candidates = [(name, s) for name, s in self._sessions.items()
+                          if name not in self._running and name not in self._ready_set]
+        for name, session in candidates:
+            try:
+                if session.has_pending_work():
+                    self.notify(name)
+            except Exception as e:
+                logger.error(f"BotOsSessionDispatcher: has_pending_work failed for {name}: {e}")
+
+
+    def running_count(self) -> int:
+        with self._cond:
+            return len(self._running)
+
+
+    def _enqueue(self, session_name):
+        # caller must hold self._cond
+        if session_name not in self._ready_set:
+            self._ready_set.add(session_name)
+            self._ready.append(session_name)
+
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                now = time.monotonic()
+                while self._timers and self._timers[0][0] <= now:
+                    _, _, name = heapq.heappop(self._timers)
+                    if name in self._sessions and name not in self._running:
+                        self._enqueue(name)
+                if not self._ready:
+                    timeout = (self._timers[0][0] - now) if self._timers else None
+                    self._cond.wait(timeout=timeout)
+                    continue
+                batch = self._ready
+                self._ready = []
+                self._ready_set.clear()
+                to_run = []
+                for name in batch:
+                    session = self._sessions.get(name)
+                    if session is None:
+                        continue
+                    if name in self._running:
+                        self._rerun.add(name)
+                        continue
+                    self._running.add(name)
+                    to_run.append((name, session))
+            for name, session in to_run:
+                self._executor.submit(self._run, name, session)
+
+
+    def _run(self, name, session):
+        has_pending = False
+        try:
+            self.execute_fn(session)
+            has_pending = session.has_pending_work()
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"BotOsSessionDispatcher: error executing session {name}: {e}", exc_info=True)
+        finally:
+            with self._cond:
+                self.stats["runs"] += 1
+                self._running.discard(name)
+                if name in self._rerun:
+                    self._rerun.discard(name)
+                    self._enqueue(name)
+                elif has_pending:
+                    self.stats["busy_polls"] += 1
+                    heapq.heappush(self._timers, (time.monotonic() + self.busy_poll_seconds, next(self._timer_seq), name))
+                self._cond.notify()
@@ -3,6 +3,7 @@ from   abc                      import abstractmethod
 from   genesis_bots.core.bot_os_tools2       import ToolFuncDescriptor
 from   genesis_bots.core.bot_os_utils        import truncate_string
 from   genesis_bots.core.logging_config      import logger
+import threading
 import time
 from   typing                   import Optional
 import uuid
@@ -154,10 +155,74 @@ class BosOsClientAsyncToolInvocationHandle(BotOsOutputMessage):
                 f"result_obj={tr(self._result_obj)})")
 
 
+class RequestCompletion:
+    """
+    Completion of one request submitted to an input adapter, for in-process callers (delegated work, dispatched
+    tasks) that wait for the bot's answer instead of polling for it.
+
+    The adapter calls update() with the (cumulative) response every time the bot sends one. Callers block in
+    wait_update() to follow the intermediate responses, or in result() for the final one; both wake up as soon as
+    the response is updated.
+    """
+    IN_PROGRESS_SUFFIX = '💬'
+
+    def __init__(self, request_id: str) -> None:
+        self.request_id = request_id
+        self.output = None
+        self.done = False
+        self.version = 0
+        self._cond = threading.Condition()
+
+
+    def update(self, output: str, done: Optional[bool] = None) -> None:
+        """Stores the latest response; `done` defaults to the response not ending with the in-progress marker."""
+        if done is None:
+            done = not output.rstrip().endswith(self.IN_PROGRESS_SUFFIX)
+        with self._cond:
+            if self.done:
+                return # updates that arrive after the final response are ignored
+            self.output = output
+            self.done = done
+            self.version += 1
+            self._cond.notify_all()
+
+
+    def wait_update(self, version: int = 0, timeout: Optional[float] = None) -> tuple[int, Optional[str], bool]:
+        """
+        Waits up to `timeout` seconds for a response newer than `version` (or for the final one) and returns
+        (version, output, done); pass the returned version to the next call.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self.version > version or self.done, timeout)
+            return self.version, self.output, self.done
+
+
+    def result(self, timeout: Optional[float] = None) -> Optional[str]:
+        """The final response, or None if it is not available within `timeout` seconds."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.done, timeout)
+            return self.output if self.done else None
+
+
 class BotOsInputAdapter:
     def __init__(self, bot_id: Optional[str] = None) -> None:
         self.bot_id = bot_id
         self.thread_id = None
+        self._wakeup_callback = None
+
+    def set_wakeup_callback(self, callback) -> None:
+        """Registers a callable (normally installed by the BotOsSessionDispatcher) invoked when new input arrives."""
+        self._wakeup_callback = callback
+
+    def notify_input_ready(self) -> None:
+        """Signals the owning session that get_input() has something to return. Adapters call this after queuing an event."""
+        callback = getattr(self, "_wakeup_callback", None)
+        if callback is not None:
+            callback()
+
+    def has_pending_input(self) -> bool:
+        """Returns True if there is queued input that was not consumed yet (e.g. put back while its thread was busy)."""
+        return len(getattr(self, "events", ())) > 0
 
     # allows for polling from source
     @abstractmethod
@@ -189,7 +254,11 @@ class BotInputAdapterCLI(BotOsInputAdapter):
         files=[]
         return BotOsInputMessage(thread_id=self.thread_id, msg=prompt, files=files)
 
+    def has_pending_input(self) -> bool:
+        return self.next_message is not None and self.thread_id is not None
+
     def handle_response(self, session_id:str, message:BotOsOutputMessage):
         logger.info(f"{session_id} - {message.thread_id} - {message.status} - {message.output}")
         if self.prompt_on_response:
             self.next_message = input(f"[{self.thread_id}]> ") #FixMe do we need self.thread_id
+            self.notify_input_ready()
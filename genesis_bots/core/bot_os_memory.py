@@ -14,8 +14,9 @@ import sys
 #from genesis_bots.connectors.bigquery_connector import BigQueryConnector
 from genesis_bots.connectors.snowflake_connector.snowflake_connector import SnowflakeConnector
 from genesis_bots.connectors.sqlite_connector import SqliteConnector
+from genesis_bots.connectors.embedding_service import CortexEmbeddingProvider, OpenAIEmbeddingProvider, get_embedding_service
 from genesis_bots.llm.llm_openai.openai_utils import get_openai_client
-from  genesis_bots.schema_explorer.embeddings_index_handler import load_or_create_embeddings_index
+from  genesis_bots.schema_explorer.metadata_search_service import get_metadata_search_service
 
 from genesis_bots.core.logging_config import logger
 class BotOsKnowledgeBase:
@@ -80,29 +81,6 @@ class BotOsKnowledgeBase:
 #             os.makedirs(self.base_directory_path)  # Recreate the base directory after clearing
 
 
-class AnnoyIndexSingleton:
-    _instance = None
-    _index = None
-    _metadata_mapping = None
-
-    def __new__(cls, *args, **kwargs):
-        if cls._instance is None:
-            cls._instance = super(AnnoyIndexSingleton, cls).__new__(cls)
-        return cls._instance
-
-    def load_index_and_metadata(self, harvest_table_id, vector_size, refresh=True):
-        if self._index is None or self._metadata_mapping is None:
-            #self._index = AnnoyIndex(vector_size, 'angular')  # Using angular distance
-            self._index, self._metadata_mapping = load_or_create_embeddings_index(harvest_table_id, refresh=refresh)
-        return self._index, self._metadata_mapping
-
-    @classmethod
-    def get_index_and_metadata(cls, harvest_table_id, vector_size, refresh=True):
-        if cls._instance is None:
-            cls._instance = cls()
-        i, m = cls._instance.load_index_and_metadata(harvest_table_id, vector_size, refresh=refresh)
-        return i, m
-
 class BotOsKnowledgeAnnoy_Metadata(BotOsKnowledgeBase):
     def __init__(self, base_directory_path, vector_size=3072, n_trees=10, refresh=True, bot_id=None ):
         # Add debug logging
@@ -136,12 +114,14 @@ class BotOsKnowledgeAnnoy_Metadata(BotOsKnowledgeBase):
             logger.info("setting openai key in knowledge init")
             self.client = get_openai_client()
 
-        #self.index, self.metadata_mapping = AnnoyIndexSingleton.get_index_and_metadata(self.meta_database_connector.metadata_table_name, vector_size, refresh=refresh)
-        self.index, self.metadata_mapping = load_or_create_embeddings_index(self.meta_database_connector.metadata_table_name, refresh=refresh, bot_id=bot_id)
+        # one index shared by every bot of the process, filtered to this bot's connections at query time
+        self.search_service = get_metadata_search_service(self.meta_database_connector.metadata_table_name)
+        if refresh:
+            self.search_service.refresh()
 
 
     def refresh_annoy(self):
-        self.index, self.metadata_mapping = load_or_create_embeddings_index(self.meta_database_connector.metadata_table_name, refresh=True, bot_id=self.bot_id)
+        self.search_service.refresh()
 
 
     # Function to get embedding (reuse or modify your existing get_embedding function)
@@ -165,13 +145,11 @@ class BotOsKnowledgeAnnoy_Metadata(BotOsKnowledgeBase):
                 embedding_size = 3072
 
         if embedding_size == 768:
-            escaped_messages = str(text[:512]).replace("'", "\\'")
             try:
                 # review function used once new regions are unlocked in snowflake
                 model = os.getenv("CORTEX_EMBEDDING_MODEL", 'e5-base-v2')
-                embedding_result = self.meta_database_connector.run_query(f"SELECT SNOWFLAKE.CORTEX.EMBED_TEXT_768('{model}', '{escaped_messages}');")
-
-                result_value = next(iter(embedding_result[0].values()))
+                provider = CortexEmbeddingProvider(self.meta_database_connector, model)
+                result_value = get_embedding_service(provider).embed_one(str(text[:512]))
                 if result_value:
                     logger.info(f"Result value len embedding: {len(result_value)}")
             except:
@@ -181,11 +159,8 @@ class BotOsKnowledgeAnnoy_Metadata(BotOsKnowledgeBase):
         else:
             try:
                 model = os.getenv("OPENAI_HARVESTER_EMBEDDING_MODEL", 'text-embedding-3-large')
-                response = self.client.embeddings.create(
-                    model=model,
-                    input=text[:8000].replace("\n", " ")  # Replace newlines with spaces
-                )
-                embedding = response.data[0].embedding
+                provider = OpenAIEmbeddingProvider(self.client, model)
+                embedding = get_embedding_service(provider).embed_one(text[:8000].replace("\n", " "))  # Replace newlines with spaces
                 if embedding:
                     logger.info(f"Result value len embedding: {len(embedding)}")
             except:
@@ -353,11 +328,8 @@ class BotOsKnowledgeAnnoy_Metadata(BotOsKnowledgeBase):
                 return {"error": f"Invalid scope '{scope}'. Only 'database_metadata' scope is currently supported."}
 
             # Handle empty index
-            if len(self.metadata_mapping) <= 1:
-                self.index, self.metadata_mapping = load_or_create_embeddings_index(
-                    self.meta_database_connector.metadata_table_name,
-                    refresh=True
-                )
+            if self.search_service.is_empty():
+                self.search_service.refresh()
 
             # Check if connection_id is specified when filtering by database, schema, or table
             if (database or schema or table) and not connection_id:
@@ -499,7 +471,7 @@ class BotOsKnowledgeAnnoy_Metadata(BotOsKnowledgeBase):
                         ]
 
             try:
-                if self.metadata_mapping == ['empty_index']:
+                if self.search_service.is_empty():
                     return ["There is no data harvested, the search index is empty. Tell the user to use the Genesis Streamlit GUI to grant access to their data to Genesis, or to specify a specfic DATABASE and SCHEMA that has already been granted to see what is in it."]
             except:
                 pass
@@ -528,9 +500,9 @@ class BotOsKnowledgeAnnoy_Metadata(BotOsKnowledgeBase):
             # Convert embedding to list of floats if it's not already
             embedding_vector = embedding if isinstance(embedding, list) else [embedding]
 
-            # Get nearest neighbors using Annoy's get_nns_by_vector
+            # Get nearest neighbors visible to this bot from the shared index
             # Get 20x more results than requested to filter down to those in filtered_table_names
-            nn_indices, nn_distances = self.index.get_nns_by_vector(embedding_vector, 1000, include_distances=True)
+            nn_keys, nn_distances = self.search_service.search(embedding_vector, 1000, bot_id=self.bot_id)
 
             # # Debug the results
             # logger.info(f"Unique distances: {set(nn_distances)}")
@@ -543,8 +515,7 @@ class BotOsKnowledgeAnnoy_Metadata(BotOsKnowledgeBase):
 
             # Filter results to only include tables that match structural criteria
             results = []
-            for idx, dist in zip(nn_indices, nn_distances):
-                metadata = self.metadata_mapping[idx]
+            for idx, (metadata, dist) in enumerate(zip(nn_keys, nn_distances)):
                 if filtered_table_names is None:
                     results.append((idx, dist, metadata))
                 elif metadata in filtered_table_names:
@@ -7,6 +7,8 @@ from   genesis_bots.bot_genesis.make_baby_bot \
                                 import (get_slack_config_tokens,
                                         rotate_slack_token)
 from   genesis_bots.core.bot_os import BotOsSession
+from   genesis_bots.core.bot_os_dispatcher \
+                                import BotOsSessionDispatcher
 import os
 import sys
 import traceback
@@ -16,6 +18,8 @@ from   genesis_bots.demo.sessions_creator \
 
 from   genesis_bots.bot_genesis.make_baby_bot \
                                 import get_bot_details, make_baby_bot
+from   genesis_bots.bot_genesis.bot_config_cache \
+                                import get_bot_config_cache
 
 from   genesis_bots.core.logging_config \
                                 import logger
@@ -62,9 +66,16 @@ class BotOsServer:
         self.api_app_id_to_session_map = api_app_id_to_session_map
         self.bot_id_to_slack_adapter_map = bot_id_to_slack_adapter_map
 
+        # Sessions are executed by the dispatcher when their input adapters signal new input (or while they have
+        # in-flight work). The scheduler job below only does cheap, process-wide housekeeping.
+        self.dispatcher = BotOsSessionDispatcher(execute_fn=self._run_session)
         for session in self.sessions:
+            if session is None:
+                continue
             if hasattr(session, 'tool_belt'):
                 session.tool_belt.set_server(self)
+            self.dispatcher.register(session)
+        self.dispatcher.start()
 
         existing_job = self.scheduler.get_job("bots")
         if existing_job:
@@ -73,6 +84,7 @@ class BotOsServer:
             self._execute_session,
             "interval",
             coalesce=True,
+            max_instances=1,
             seconds=scheduler_seconds_interval,
             id="bots",
             name="test",
@@ -180,10 +192,13 @@ class BotOsServer:
                 session.tool_belt.set_server(self)
 
         self.sessions.append(session)
+        if session is not None:
+            self.dispatcher.register(session)
 
     def remove_session(self, session):
 
         self.sessions = [s for s in self.sessions if s != session]
+        self.dispatcher.unregister(session)
         logger.info(f"Session {session} has been removed.")
 
     def _rotate_slack_tokens(self):
@@ -200,9 +215,7 @@ class BotOsServer:
 
 
     def get_running_instances(self):
-        executor = self.scheduler._lookup_executor("default")
-        running_jobs = executor._instances["bots"]
-        return running_jobs
+        return self.dispatcher.running_count()
 
     def reset_session(self, bot_id, session):
         bot_config = get_bot_details(bot_id=bot_id)
@@ -241,64 +254,45 @@ class BotOsServer:
         self.add_session(new_session, replace_existing=True)
 
 
+    def _run_session(self, s: BotOsSession):
+        """Runs one execution cycle of a session. Called from a dispatcher worker thread."""
+        try:
+            if os.getenv(f'RESET_BOT_SESSION_{s.bot_id}', 'False') == 'True':
+                logger.info(f"Resetting bot session for bot_id: {s.bot_id}")
+                os.environ[f'RESET_BOT_SESSION_{s.bot_id}'] = 'False'
+                self.reset_session(s.bot_id,s)
+            else:
+                s.execute()
+        except Exception as e:
+            traceback.print_exc()
+
+
     def _execute_session(self):
+        # Periodic housekeeping only; sessions themselves are run by self.dispatcher.
         BotOsServer.run_count += 1
         if BotOsServer.run_count >= 60:
             BotOsServer.run_count = 0
             BotOsServer.cycle_count += 1
-            insts = self.get_running_instances()
-            if True or insts > 1:
-                # logger.info(f"--- {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} bot_os_server runners: {insts} / max 100 (cycle = {BotOsServer.cycle_count})")
-                emb_size = 'Unknown'
-                try:
-                    emb_size = os.environ['EMBEDDING_SIZE']
-                except:
-                    pass
-                if BotOsServer.cycle_count % 60 == 0:
-                    sys.stdout.write(
-                        f"--- {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} bot_os_server runners: {insts} / max 100, emb_size: {emb_size} (cycle = {BotOsServer.cycle_count})\n"
-                    )
-                    sys.stdout.flush()
-                i = 0
-            # self.clear_stuck_jobs(self.scheduler)
-            if insts >= 90:
-                logger.info("=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-")
-                logger.info(f"-!! Scheduler worker INSTANCES >= 90 at {insts} ... Clearing All Instances")
-                logger.info("=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-")
-                # Shut down the scheduler and terminate all jobs
-                # self.scheduler.shutdown(wait=False)
-                self.scheduler.remove_all_jobs()
-                self.job = self.scheduler.add_job(
-                    self._execute_session,
-                    "interval",
-                    coalesce=True,
-                    seconds=1,
-                    id="bots",
+            if BotOsServer.cycle_count % 60 == 0:
+                emb_size = os.environ.get('EMBEDDING_SIZE', 'Unknown')
+                d = self.dispatcher
+                c = get_bot_config_cache().stats
+                sys.stdout.write(
+                    f"--- {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} bot_os_server runners: {d.running_count()} / max {d.max_workers}, "
+                    f"runs: {d.stats['runs']}, wakeups: {d.stats['wakeups']}, bot config cache hits/misses: {c['hits']}/{c['misses']}, "
+                    f"emb_size: {emb_size} (cycle = {BotOsServer.cycle_count})\n"
                 )
-                logger.info( "Scheduler restarted the job. All existing instances have been terminated." )
-
-                # Restart the scheduler
-                # self.scheduler.start()
-                logger.info("Scheduler has been restarted.")
-                insts = self.get_running_instances()
-                logger.info(f"-=-=- Scheduler instances: {insts} / 100")
+                sys.stdout.flush()
         if BotOsSession.clear_access_cache == True:
             for s in self.sessions:
-                s.assistant_impl.user_allow_cache = {}
+                if s is not None:
+                    s.assistant_impl.user_allow_cache = {}
             BotOsSession.clear_access_cache = False
         for s in self.sessions:
-            try:
-                # import threading
-                # logger.info(f"Thread ID: {threading.get_ident()} - starting execute cycle...")
-                if os.getenv(f'RESET_BOT_SESSION_{s.bot_id}', 'False') == 'True':
-                    logger.info(f"Resetting bot session for bot_id: {s.bot_id}")
-                    os.environ[f'RESET_BOT_SESSION_{s.bot_id}'] = 'False'
-                    self.reset_session(s.bot_id,s)
-                else:
-                    s.execute()
-                # logger.info(f"Thread ID: {threading.get_ident()} - ending execute cycle...")
-            except Exception as e:
-                traceback.print_exc()
+            # a reset is requested out-of-band through the environment, so wake the session up to act on it
+            if s is not None and os.getenv(f'RESET_BOT_SESSION_{s.bot_id}', 'False') == 'True':
+                self.dispatcher.notify(s.session_name)
+        self.dispatcher.poll_pending()
 
         # Check if its time for Slack token totation, every 6 hours
         if (
@@ -319,4 +313,5 @@ class BotOsServer:
             self.app.run(*args, **kwargs)
 
     def shutdown(self):
+        self.dispatcher.stop()
         self.scheduler.shutdown(wait=False)
@@ -14,6 +14,7 @@ class TaskBotOsInputAdapter(BotOsInputAdapter):
 
     def add_event(self, event):
         self.events.append(event)
+        self.notify_input_ready()
 
     def get_input(self, thread_map=None,  active=None, processing=None, done_map=None):
         if len(self.events) == 0:
@@ -0,0 +1,178 @@
+from   datetime                 import datetime, timedelta
+import heapq
+import itertools
+
+from   genesis_bots.core.logging_config \
+                                import logger
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def parse_next_check_ts(value):
+    """Parses a TASKS.next_check_ts value (datetime, 'YYYY-MM-DD HH:MM:SS' or the same with a timezone suffix)."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    try:
+        return datetime.strptime(str(value)[:19], TIMESTAMP_FORMAT)
+    except ValueError:
+        return None
+
+
+class TaskSchedule:
+    """
+    In-memory schedule of the active scheduled processes (tasks) of the bots served by the task server.
+
+    Active tasks are kept in a min-heap keyed on next_check_ts, so finding the due tasks and the time until the next
+    one is due costs O(log n) per task rather than a scan of every task of every bot. Tasks that have been submitted
+    and are waiting for their response are tracked in `in_flight` (task_id -> task_meta) and are not handed out again
+    until mark_done() or expire_overdue() releases them.
+
+    Task definitions are loaded with `load_tasks(bot_ids)`, a single bulk query returning task dicts (as listed by
+    process_scheduler), and refreshed every `refresh_seconds`. A refresh only touches the heap for tasks whose schedule
+    changed (new, re-timed, deactivated or deleted); heap entries of changed tasks are invalidated lazily.
+    """
+
+    def __init__(self, load_tasks, refresh_seconds=60, max_run_seconds=1800):
+        self.load_tasks = load_tasks
+        self.refresh_seconds = refresh_seconds
+        self.max_run_seconds = max_run_seconds
+        self.in_flight = {}
+        self._tasks = {}            # task_id -> task dict of an active task
+        self._versions = {}         # task_id -> version of its only valid heap entry
+        self._fingerprints = {}     # task_id -> (bot_id, next_check) last loaded from the database
+        self._heap = []             # (next_check, version, task_id)
+        self._version_counter = itertools.count()
+        self._next_refresh = None
+
+
+    def __len__(self):
+        return len(self._tasks)
+
+
+    def get(self, task_id):
+        return self._tasks.get(task_id)
+
+
+    def needs_refresh(self, now=None):
+        return self._next_refresh is None or (now or datetime.now()) >= self._next_refresh
+
+
+    def seconds_until_refresh(self, now=None):
+        if self._next_refresh is None:
+            return 0.0
+        return max(0.0, (self._next_refresh - (now or datetime.now())).total_seconds())
+
+
+    def refresh(self, bot_ids, now=None):
+        """Reloads the task definitions of `bot_ids` and applies the differences. Returns the number of changed tasks."""
+        now = now or datetime.now()
+        self._next_refresh = now + timedelta(seconds=self.refresh_seconds)
+        try:
+            rows = self.load_tasks(bot_ids)
+        except Exception as e:
+            logger.error(f"Task schedule refresh failed: {e}")
+            return 0
+        if rows is None:
+            return 0
+
+        changed = 0
+        seen = set()
+        for task in rows:
+            task_id = task["task_id"]
+            next_check = parse_next_check_ts(task.get("next_check_ts"))
+            if not task.get("task_active", False) or next_check is None:
+                continue
+            seen.add(task_id)
+            self._tasks[task_id] = task
+            fingerprint = (task["bot_id"], next_check)
+            if self._fingerprints.get(task_id) != fingerprint:
+                self._fingerprints[task_id] = fingerprint
+                self._push(task_id, next_check)
+                changed += 1
+        for task_id in [t for t in self._tasks if t not in seen]:
+            self._drop(task_id)
+            changed += 1
+        return changed
+
+
+    def pop_due(self, now=None):
+        """Removes and returns the tasks whose next_check_ts has passed and that are not in flight, earliest first."""
+        now = now or datetime.now()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, version, task_id = heapq.heappop(self._heap)
+            if self._versions.get(task_id) != version:
+                continue                    # superseded by a later reschedule, or dropped
+            del self._versions[task_id]
+            if task_id in self.in_flight:
+                continue                    # rescheduled by mark_done() once the running instance finishes
+            due.append(self._tasks[task_id])
+        return due
+
+
+    def seconds_until_next(self, now=None):
+        """Seconds until the earliest scheduled task is due (0 if overdue), or None if no task is scheduled."""
+        now = now or datetime.now()
+        while self._heap and self._versions.get(self._heap[0][2]) != self._heap[0][1]:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return None
+        return max(0.0, (self._heap[0][0] - now).total_seconds())
+
+
+    def mark_submitted(self, task_id, task_meta):
+        self.in_flight[task_id] = task_meta
+
+
+    def mark_done(self, task_id, next_check_ts=None):
+        """
+        Releases a finished task. It is scheduled again at `next_check_ts`, or removed from the schedule if None
+        (the task was stopped or deactivated).
+        """
+        self.in_flight.pop(task_id, None)
+        next_check = parse_next_check_ts(next_check_ts)
+        task = self._tasks.get(task_id)
+        if next_check is None or task is None:
+            self._drop(task_id)
+            return
+        task["next_check_ts"] = next_check.strftime(TIMESTAMP_FORMAT)
+        self._fingerprints[task_id] = (task["bot_id"], next_check)
+        self._push(task_id, next_check)
+
+
+    def retry_later(self, task_id, seconds, now=None):
+        """Puts back a due task that could not be submitted, to be handed out again after `seconds`."""
+        if task_id in self._tasks:
+            self._push(task_id, (now or datetime.now()) + timedelta(seconds=seconds))
+
+
+    def expire_overdue(self, now=None):
+        """
+        Releases the in-flight tasks submitted more than `max_run_seconds` ago and makes them due again, as their
+        next_check_ts was not advanced. Returns their task_meta dicts.
+        """
+        now = now or datetime.now()
+        cutoff = now - timedelta(seconds=self.max_run_seconds)
+        expired = []
+        for task_id, task_meta in list(self.in_flight.items()):
+            submitted = parse_next_check_ts(task_meta.get("submited_time"))
+            if submitted is not None and submitted < cutoff:
+                del self.in_flight[task_id]
+                expired.append(task_meta)
+                if task_id in self._tasks:
+                    self._push(task_id, now)
+        return expired
+
+
+    def _push(self, task_id, next_check):
+        version = next(self._version_counter)
+        self._versions[task_id] = version
+        heapq.heappush(self._heap, (next_check, version, task_id))
+
+
+    def _drop(self, task_id):
+        self._tasks.pop(task_id, None)
+        self._versions.pop(task_id, None)
+        self._fingerprints.pop(task_id, None)
@@ -0,0 +1,353 @@
+'''
+  Message store and on-disk persistence for BotOsThread.
+
+  ThreadMessages - the LLM message list of a thread, with the serialized size of every message recorded
+                   when it is added, so context trimming never re-serializes the history
+  ThreadFileStore - snapshot + append-only log per thread, so saving a thread writes only the new messages
+  ThreadCatalog - last-touched time of every thread file of a bot, so retention sweeps only visit expired threads
+'''
+import heapq
+import json
+import os
+import threading
+import time
+import uuid
+
+from genesis_bots.core.logging_config import logger
+
+
+def message_size(message) -> int:
+    '''size of a message as sent to the LLM (length of its JSON serialization)'''
+    return len(json.dumps(message, default=str))
+
+
+class ThreadMessages(list):
+    '''
+    A list of LLM messages that keeps the byte size of each message and a running total (total_bytes).
+
+    Sizes are recorded when messages are added. Messages that are modified in place afterwards (e.g. the
+    instructions message) must be re-measured with refresh_size(). It also tracks which messages were already
+    persisted, so that ThreadFileStore only has to append new ones: any change to persisted messages (trimming,
+    deleting mismatched tool calls) marks the list as rewritten and the next save writes a full snapshot.
+    '''
+
+    def __init__(self, messages=()):
+        super().__init__(messages)
+        self._sizes = [message_size(m) for m in self]
+        self.total_bytes = sum(self._sizes)
+        self._saved = 0          # leading messages already persisted
+        self._rewritten = True   # persisted messages changed since the last save
+
+
+    @property
+    def sizes(self):
+        return self._sizes
+
+
+    def refresh_size(self, index):
+        new_size = message_size(self[index])
+        self.total_bytes += new_size - self._sizes[index]
+        self._sizes[index] = new_size
+
+
+    def append(self, message):
+        size = message_size(message)
+        super().append(message)
+        self._sizes.append(size)
+        self.total_bytes += size
+
+
+    def extend(self, messages):
+        for message in messages:
+            self.append(message)
+
+
+    def __iadd__(self, messages):
+        self.extend(messages)
+        return self
+
+
+    def _touches_saved(self, index):
+        return index < self._saved
+
+
+    def insert(self, index, message):
+        size = message_size(message)
+        pos = max(0, min(index + len(self) if index < 0 else index, len(self)))  # same clamping as list.insert
+        super().insert(index, message)
+        self._sizes.insert(pos, size)
+        self.total_bytes += size
+        if self._touches_saved(pos):
+            self._rewritten = True
+
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            positions = range(len(self))[index]
+            if not positions:
+                return
+            first = min(positions[0], positions[-1])
+        else:
+            first = range(len(self))[index]
+        super().__delitem__(index)
+        removed = self._sizes[index]
+        del self._sizes[index]
+        self.total_bytes -= sum(removed) if isinstance(index, slice) else removed
+        if self._touches_saved(first):
+            self._rewritten = True
+        self._saved = min(self._saved, len(self))
+
+
+    def pop(self, index=-1):
+        pos = range(len(self))[index]
+        message = super().pop(index)
+        self.total_bytes -= self._sizes.pop(pos)
+        if self._touches_saved(pos):
+            self._rewritten = True
+            self._saved = min(self._saved, len(self))
+        return message
+
+
+    def __setitem__(self, index, value):
+        super().__setitem__(index, value)
+        self._resync()
+
+
+    def _resync(self):
+        # rarely used mutations: re-measure everything and rewrite on the next save
+        self._sizes = [message_size(m) for m in self]
+        self.total_bytes = sum(self._sizes)
+        self._rewritten = True
+        self._saved = min(self._saved, len(self))
+
+
+    def remove(self, message):
+        super().remove(message)
+        self._resync()
+
+
+    def clear(self):
+        super().clear()
+        self._resync()
+
+
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self._resync()
+
+
+    def reverse(self):
+        super().reverse()
+        self._resync()
+
+
+    def unsaved(self):
+        '''return (rewrite, messages): the messages to append to the log, or all messages if a snapshot is needed'''
+        if self._rewritten:
+            return True, list(self)
+        return False, self[self._saved:]
+
+
+    def mark_saved(self):
+        self._saved = len(self)
+        self._rewritten = False
+
+
+class ThreadFileStore:
+    '''
+    Persists a thread as a JSON snapshot (<thread>.json, same layout as BotOsThread.to_dict()) plus an append-only
+    JSON-lines log (<thread>.json.log) of the messages and state changes since the snapshot.
+
+    A save appends only new messages; the snapshot is rewritten when persisted messages changed or the log grew past
+    `compact_after` records (env THREAD_LOG_COMPACT_RECORDS, default 500). The log starts with the generation of
+    the snapshot it belongs to, so a log left over from an interrupted compaction is ignored.
+    '''
+
+    def __init__(self, file_path, compact_after=None):
+        self.file_path = file_path
+        self.log_path = file_path + '.log'
+        if compact_after is None:
+            compact_after = int(os.getenv('THREAD_LOG_COMPACT_RECORDS', '500'))
+        self.compact_after = compact_after
+        self.generation = None
+        self.log_records = 0
+        self._last_state = None
+
+
+    @staticmethod
+    def _state(thread):
+        return {'fast_mode': thread.fast_mode, 'run_messg_count': thread.run_messg_count}
+
+
+    def save(self, thread):
+        messages = thread.messages
+        rewrite, new_messages = messages.unsaved()
+        state = self._state(thread)
+        if (rewrite or self.generation is None or self.log_records + len(new_messages) + 1 > self.compact_after
+                or not os.path.exists(self.log_path)):
+            self._write_snapshot(thread)
+        else:
+            records = [{'message': m} for m in new_messages]
+            if state != self._last_state:
+                records.append({'state': state})
+            if records:
+                with open(self.log_path, 'a') as f:
+                    f.write(''.join(json.dumps(r) + '\n' for r in records))
+                self.log_records += len(records)
+        self._last_state = state
+        messages.mark_saved()
+
+
+    def _write_snapshot(self, thread):
+        self.generation = uuid.uuid4().hex
+        data = thread.to_dict()
+        data['generation'] = self.generation
+        # write to temporary files first then rename for atomic operation
+        temp_path = self.file_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(temp_path, self.file_path)
+        temp_log = self.log_path + '.tmp'
+        with open(temp_log, 'w') as f:
+            f.write(json.dumps({'generation': self.generation}) + '\n')
+        os.replace(temp_log, self.log_path)
+        self.log_records = 0
+
+
+    def load(self):
+        '''return the thread dictionary (see BotOsThread.from_dict) with the log replayed, or None if not saved'''
+        if not os.path.exists(self.file_path):
+            return None
+        with open(self.file_path, 'r') as f:
+            data = json.load(f)
+        self.generation = data.pop('generation', None)
+        self.log_records = 0
+        if self.generation is not None and os.path.exists(self.log_path):
+            with open(self.log_path, 'r') as f:
+                lines = f.readlines()
+            header = json.loads(lines[0]) if lines else {}
+            if header.get('generation') == self.generation:
+                for line in lines[1:]:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning(f'Ignoring truncated record in thread log {self.log_path}')
+                        self.generation = None  # write a fresh snapshot on the next save
+                        break
+                    if 'message' in record:
+                        data['messages'].append(record['message'])
+                    elif 'state' in record:
+                        data.update(record['state'])
+                    self.log_records += 1
+        self._last_state = {'fast_mode': data.get('fast_mode', False), 'run_messg_count': data.get('run_messg_count', 0)}
+        return data
+
+
+class ThreadCatalog:
+    '''
+    Last-touched times of the thread files of a bot, so that a retention sweep does not have to look at (or git log)
+    every thread file to find the expired ones.
+
+    Entries are keyed by the snapshot file name (<thread>.json; its .log goes with it) and kept in memory with a
+    min-heap on the time, persisted as an append-only JSON-lines file of [file name, time] records ([file name, null]
+    for a removal) that is compacted when it grows past twice the number of entries. A touch within
+    `touch_resolution` seconds of the previous one of the same thread is not recorded. When the catalog file does not
+    exist yet, it is built once from the modification times of the thread files in the directory.
+    '''
+
+    CATALOG_FILE = 'thread_catalog.jsonl'
+
+    def __init__(self, dir_path, touch_resolution=60.0):
+        self.dir_path = dir_path
+        self.catalog_path = os.path.join(dir_path, self.CATALOG_FILE)
+        self.touch_resolution = touch_resolution
+        self.entries = {}       # file name -> last touched (epoch seconds)
+        self._heap = []         # (last touched, file name), including superseded pairs
+        self._records = 0
+        self._lock = threading.Lock()
+        if os.path.exists(self.catalog_path):
+            self._load()
+        else:
+            self._scan_directory()
+            self._compact()
+
+
+    def _load(self):
+        with open(self.catalog_path, 'r') as f:
+            for line in f:
+                try:
+                    file_name, touched = json.loads(line)
+                except ValueError:
+                    logger.warning(f'Ignoring truncated record in thread catalog {self.catalog_path}')
+                    continue
+                if touched is None:
+                    self.entries.pop(file_name, None)
+                else:
+                    self.entries[file_name] = touched
+                self._records += 1
+        self._heap = [(t, name) for name, t in self.entries.items()]
+        heapq.heapify(self._heap)
+
+
+    def _scan_directory(self):
+        for entry in os.scandir(self.dir_path):
+            if entry.name.endswith('.json') and entry.name != 'thread_maps.json' and entry.is_file():
+                touched = entry.stat().st_mtime
+                log_path = entry.path + '.log'
+                if os.path.exists(log_path):
+                    touched = max(touched, os.path.getmtime(log_path))
+                self.entries[entry.name] = touched
+        self._heap = [(t, name) for name, t in self.entries.items()]
+        heapq.heapify(self._heap)
+
+
+    def _compact(self):
+        temp_path = self.catalog_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            f.write(''.join(json.dumps([name, t]) + '\n' for name, t in self.entries.items()))
+        os.replace(temp_path, self.catalog_path)
+        self._records = len(self.entries)
+
+
+    def _append(self, records):
+        with open(self.catalog_path, 'a') as f:
+            f.write(''.join(json.dumps(r) + '\n' for r in records))
+        self._records += len(records)
+        if self._records > 2 * len(self.entries) + 1000:
+            self._compact()
+        if len(self._heap) > 2 * len(self.entries) + 1000:
+            self._heap = [(t, name) for name, t in self.entries.items()]
+            heapq.heapify(self._heap)
+
+
+    def touch(self, file_name, now=None):
+        '''records that the thread file `file_name` was written (at `now`, default the current time)'''
+        now = time.time() if now is None else now
+        with self._lock:
+            last = self.entries.get(file_name)
+            if last is not None and now - last < self.touch_resolution:
+                return
+            self.entries[file_name] = now
+            heapq.heappush(self._heap, (now, file_name))
+            self._append([[file_name, now]])
+
+
+    def expired(self, cutoff):
+        '''file names of the threads last touched before `cutoff` (epoch seconds), oldest first'''
+        with self._lock:
+            found = []
+            while self._heap and self._heap[0][0] < cutoff:
+                touched, file_name = heapq.heappop(self._heap)
+                if self.entries.get(file_name) == touched:     # else superseded by a later touch
+                    found.append((touched, file_name))
+            for item in found:
+                heapq.heappush(self._heap, item)
+            return [file_name for _, file_name in found]
+
+
+    def remove(self, file_names):
+        '''drops the entries of deleted thread files'''
+        with self._lock:
+            removed = [name for name in file_names if self.entries.pop(name, None) is not None]
+            if removed:
+                self._append([[name, None] for name in removed])
@@ -0,0 +1,159 @@
+from   concurrent.futures       import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from   genesis_bots.core.bot_os_tools2       import get_tool_func_descriptor, is_tool_func
+import os
+import threading
+import time
+
+from   genesis_bots.core.logging_config \
+                                import logger
+
+
+class ToolCall:
+    """
+    One tool call requested by the LLM in a turn.
+
+    `run` is a zero-argument callable that executes the call and returns its response. `func` is the tool function
+    itself (if known); its gc_tool descriptor supplies the per-tool concurrency cap.
+    """
+    __slots__ = ('tool_call_id', 'func_name', 'run', 'func', 'timeout')
+
+    def __init__(self, tool_call_id, func_name, run, func=None, timeout=None):
+        self.tool_call_id = tool_call_id
+        self.func_name = func_name
+        self.run = run
+        self.func = func
+        self.timeout = timeout
+
+
+class ToolCallResult:
+    """Outcome of a ToolCall: `response` if it completed, otherwise `error` (exception) / `timed_out` / `cancelled`."""
+    __slots__ = ('tool_call_id', 'func_name', 'response', 'error', 'timed_out', 'cancelled', 'elapsed')
+
+    def __init__(self, tool_call_id, func_name):
+        self.tool_call_id = tool_call_id
+        self.func_name = func_name
+        self.response = None
+        self.error = None
+        self.timed_out = False
+        self.cancelled = False
+        self.elapsed = None
+
+    @property
+    def ok(self):
+        return self.error is None and not self.timed_out and not self.cancelled
+
+
+class ToolCallScheduler:
+    """
+    Runs the tool calls of one LLM turn concurrently on a bounded pool of threads, and returns their results in the
+    order the calls were requested (i.e. in tool_call_id order, as they must be submitted back to the LLM).
+
+    Concurrency is limited
+        * per turn, to `max_parallel` calls (env TOOL_CALL_MAX_PARALLEL, default 8), and
+        * per tool function, process-wide, to the `max_concurrency` declared on its gc_tool descriptor
+          (e.g. @gc_tool(..., _max_concurrency_=4)). Tools without a declared cap are only limited per turn.
+
+    Each call can have its own timeout (default: env TOOL_CALL_TIMEOUT_SECONDS, 0 = no timeout). A call that times out
+    is reported as such and is no longer waited for; Python threads cannot be killed, so the tool keeps running in the
+    background and keeps holding its per-tool slot until it returns. Calls that have not started yet are cancelled when
+    `should_cancel()` becomes true (e.g. the user stopped the thread).
+
+    A turn with a single call and no timeout runs in the caller's thread, exactly as before.
+    """
+
+    _tool_slots = {}                    # tool name -> BoundedSemaphore, shared by all schedulers
+    _tool_slots_lock = threading.Lock()
+
+    def __init__(self, max_parallel: int = None, default_timeout: float = None, poll_seconds: float = 0.5):
+        if max_parallel is None:
+            max_parallel = int(os.getenv("TOOL_CALL_MAX_PARALLEL", "8"))
+        if default_timeout is None:
+            default_timeout = float(os.getenv("TOOL_CALL_TIMEOUT_SECONDS", "0"))
+        self.max_parallel = max(1, max_parallel)
+        self.default_timeout = default_timeout if default_timeout and default_timeout > 0 else None
+        self.poll_seconds = poll_seconds
+
+
+    @classmethod
+    def _slots_for(cls, call):
+        if call.func is None or not is_tool_func(call.func):
+            return None
+        descriptor = get_tool_func_descriptor(call.func)
+        if descriptor.max_concurrency is None:
+            return None
+        # keyed by the descriptor name: the LLM may request the tool with or without its leading underscore
+        with cls._tool_slots_lock:
+            slots = cls._tool_slots.get(descriptor.name)
+            if slots is None:
+                slots = cls._tool_slots[descriptor.name] = threading.BoundedSemaphore(descriptor.max_concurrency)
+            return slots
+
+
+    def _execute(self, call, result, deadline):
+        slots = self._slots_for(call)
+        if slots is not None:
+            wait_for = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not slots.acquire(timeout=wait_for):
+                result.timed_out = True
+                return result
+        start = time.monotonic()
+        try:
+            result.response = call.run()
+        except Exception as e:
+            result.error = e
+        finally:
+            result.elapsed = time.monotonic() - start
+            if slots is not None:
+                slots.release()
+        return result
+
+
+    def run(self, calls, should_cancel=None):
+        """
+        Executes `calls` (a list of ToolCall) and returns a list of ToolCallResult in the same order.
+
+        `should_cancel` is an optional zero-argument callable that is polled while waiting.
+        """
+        results = [ToolCallResult(call.tool_call_id, call.func_name) for call in calls]
+        if not calls:
+            return results
+        timeouts = [call.timeout if call.timeout is not None else self.default_timeout for call in calls]
+
+        if len(calls) == 1 and timeouts[0] is None:
+            if should_cancel is not None and should_cancel():
+                results[0].cancelled = True
+                return results
+            return [self._execute(calls[0], results[0], None)]
+
+        executor = ThreadPoolExecutor(max_workers=min(len(calls), self.max_parallel), thread_name_prefix="tool_call")
+        try:
+            now = time.monotonic()
+            deadlines = [None if t is None else now + t for t in timeouts]
+            futures = {}
+            for i, call in enumerate(calls):
+                futures[executor.submit(self._execute, call, results[i], deadlines[i])] = i
+            pending = set(futures)
+            while pending:
+                if should_cancel is not None and should_cancel():
+                    for fut in pending:
+                        fut.cancel()
+                        results[futures[fut]].cancelled = True
+                    break
+                now = time.monotonic()
+                for fut in [f for f in pending if deadlines[futures[f]] is not None and deadlines[futures[f]] <= now]:
+                    pending.discard(fut)
+                    fut.cancel()
+                    results[futures[fut]].timed_out = True
+                    logger.warning(f"Tool call {calls[futures[fut]].func_name} ({calls[futures[fut]].tool_call_id}) "
+                                   f"timed out after {timeouts[futures[fut]]}s")
+                if not pending:
+                    break
+                next_deadline = min((deadlines[futures[f]] for f in pending if deadlines[futures[f]] is not None), default=None)
+                wait_for = self.poll_seconds if should_cancel is not None else None
+                if next_deadline is not None:
+                    wait_for = max(0.0, next_deadline - now) if wait_for is None else min(wait_for, max(0.0, next_deadline - now))
+                done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+        finally:
+            # do not wait for calls that timed out or were cancelled while running
+            executor.shutdown(wait=False, cancel_futures=True)
+        return results
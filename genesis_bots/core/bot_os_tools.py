@@ -1351,7 +1351,7 @@ def get_tools(
     return func_descriptors, available_functions, tool_to_func_descriptors_map
 
 
-def dispatch_to_bots(task_template, args_array, dispatch_bot_id=None):
+def dispatch_to_bots(task_template, args_array, dispatch_bot_id=None, timeout_seconds=3600):
     """
     Dispatches a task to multiple bots, each instantiated by creating a new thread with a specific task.
     The task is created by filling in the task template with arguments from the args_array using Jinja templating.
@@ -1359,6 +1359,7 @@ def dispatch_to_bots(task_template, args_array, dispatch_bot_id=None):
     Args:
         task_template (str): A natural language task template using Jinja templating.
         args_array (list of dict): An array of dictionaries to plug into the task template for each bot.
+        timeout_seconds (int): How long to wait for all the bots to finish.
 
     Returns:
         list: An array of responses.
@@ -1376,9 +1377,11 @@ def dispatch_to_bots(task_template, args_array, dispatch_bot_id=None):
         task = template.render(**args)
         adapter.dispatch_task(task)
 
-    while True:
-        responses = adapter.check_tasks()
+    # the session is driven from here: run it, then wait (waking up as soon as the last task completes) until the next run
+    deadline = time.monotonic() + timeout_seconds
+    while time.monotonic() < deadline:
+        responses = adapter.check_tasks(wait_seconds=min(1.0, max(0.0, deadline - time.monotonic())))
         if responses:
             logger.info(f"dispatch_to_bots - {responses}")
             return responses
-        time.sleep(1)
+    return f"Error: timed out after {timeout_seconds} seconds waiting for the dispatched tasks."
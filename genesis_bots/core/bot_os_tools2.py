@@ -315,6 +315,8 @@ class ToolFuncDescriptor:
         parameters_desc (List[_ToolFuncParamDescriptor]): A list of parameter descriptors for the tool function.
         groups (List[ToolFuncGroup]): A list of groups to which the tool function belongs.
                 Defaults to ORPHAN_TOOL_FUNCS_GROUP (which is an ephemeral group and should not be used for server-side tools).
+        max_concurrency (int, optional): Maximum number of concurrent executions of the tool function across all
+                bots and threads (see ToolCallScheduler). None (default) means no per-tool limit.
 
     Methods:
         to_llm_description_dict() -> Dict[str, Any]:
@@ -327,7 +329,8 @@ class ToolFuncDescriptor:
                  name: str,
                  description: str,
                  parameters_desc: Iterable[ToolFuncParamDescriptor],
-                 groups: Iterable[ToolFuncGroup] = [ORPHAN_TOOL_FUNCS_GROUP]):
+                 groups: Iterable[ToolFuncGroup] = [ORPHAN_TOOL_FUNCS_GROUP],
+                 max_concurrency: int = None):
         self._name = str(name)
         self._description = str(description)
         # validate the parameters_desc list
@@ -345,6 +348,9 @@ class ToolFuncDescriptor:
         if len(lifetimes) > 1:
             raise ValueError(f"All groups for function {name} must have the same lifetime type. Found lifetimes: {lifetimes}")
         self._groups = groups
+        if max_concurrency is not None and (not isinstance(max_concurrency, int) or max_concurrency < 1):
+            raise ValueError(f"max_concurrency for function {name} must be a positive integer or None, got {max_concurrency!r}")
+        self._max_concurrency = max_concurrency
 
 
     @property
@@ -367,6 +373,11 @@ class ToolFuncDescriptor:
         return self._groups
 
 
+    @property
+    def max_concurrency(self) -> int:
+        return self._max_concurrency
+
+
     def to_llm_description_dict(self) -> Dict[str, Any]:
         """Generate the object used to describe this function to an LLM."""
         params_d = dict()
@@ -393,12 +404,15 @@ class ToolFuncDescriptor:
         Returns:
             dict: A dictionary representation of the instance.
         """
-        return {
+        data = {
             "name": self._name,
             "description": self._description,
             "parameters_desc": [param.to_json() for param in self._parameters_desc],
             "groups": [group.to_json() for group in self._groups]
         }
+        if self._max_concurrency is not None:
+            data["max_concurrency"] = self._max_concurrency
+        return data
 
 
     @classmethod
@@ -422,7 +436,8 @@ class ToolFuncDescriptor:
             name=data['name'],
             description=data['description'],
             parameters_desc=parameters_desc,
-            groups=groups
+            groups=groups,
+            max_concurrency=data.get('max_concurrency'),
         )
 
 
@@ -434,16 +449,19 @@ class ToolFuncDescriptor:
             name=self._name,
             description=self._description,
             parameters_desc=self._parameters_desc + (param_desc,),
-            groups=self._groups
+            groups=self._groups,
+            max_concurrency=self._max_concurrency,
         )
 
 
 
-def gc_tool(_group_tags_: List[ToolFuncGroup], **param_descriptions):
+def gc_tool(_group_tags_: List[ToolFuncGroup], _max_concurrency_: int = None, **param_descriptions):
     """
     A decorator for a 'tool' function that attaches a `gc_tool_descriptor` property to the wrapped function
     as a ToolFuncDescriptor object.
 
+    `_max_concurrency_` optionally caps how many calls of the function may run at the same time, process-wide.
+
     Example:
         @gctool2(_group_tags_=['group1', 'group2'], param1='this is param1', param2="note that param2 is optional")
         def foo(param1: int, param2: str = "genesis"):
@@ -517,7 +535,8 @@ def gc_tool(_group_tags_: List[ToolFuncGroup], **param_descriptions):
             name=func.__name__,
             description=_cleanup_docstring(func.__doc__),
             parameters_desc=params_desc_list,
-            groups=_group_tags_
+            groups=_group_tags_,
+            max_concurrency=_max_concurrency_,
         )
         setattr(func, ToolFuncDescriptor.GC_TOOL_DESCRIPTOR_ATTR_NAME, descriptor)
 
@@ -7,10 +7,12 @@ import base64
 from   collections              import deque
 from   genesis_bots.core.bot_os_input        import (BosOsClientAsyncToolInvocationHandle,
                                         BotOsInputAdapter, BotOsInputMessage,
-                                        BotOsOutputMessage)
+                                        BotOsOutputMessage, RequestCompletion)
 from   genesis_bots.core.bot_os_utils        import truncate_string
 import functools
 import json
+import threading
+import time
 import types
 
 from   genesis_bots.core.logging_config      import logger
@@ -45,6 +47,43 @@ class UDFInputEvent:
         self.event_type = event_type
 
 
+class ResponseStreamBuffer:
+    """
+    Append buffer holding the response text of one request, for clients that read it incrementally.
+
+    The LLM side re-sends the whole (cumulative) response on every update; update() stores it and, as long as the new
+    text extends the previous one, clients that already hold `offset` characters only need text[offset:]. When an
+    update rewrites earlier text, `epoch` is incremented, and clients with an older epoch are sent the full text again.
+    """
+    IN_PROGRESS_SUFFIX = ' 💬'
+
+    __slots__ = ('text', 'epoch', 'done')
+
+    def __init__(self):
+        self.text = ""
+        self.epoch = 0
+        self.done = False
+
+    def update(self, output):
+        if len(output) > 2 and output.endswith(self.IN_PROGRESS_SUFFIX):
+            output = output[:-len(self.IN_PROGRESS_SUFFIX)]
+            self.done = False
+        else:
+            self.done = True
+        if not output.startswith(self.text):
+            self.epoch += 1
+        self.text = output
+
+    def has_news(self, offset, epoch):
+        return epoch != self.epoch or offset < len(self.text) or self.done
+
+    def read(self, offset, epoch):
+        """returns (text, reset): the text after `offset`, or the full text (reset=True) if the client's epoch is stale"""
+        if epoch != self.epoch or offset > len(self.text):
+            return self.text, True
+        return self.text[offset:], False
+
+
 class UDFBotOsInputAdapter(BotOsInputAdapter):
     """
     UDFBotOsInputAdapter is an implementation of the BotOsInputAdapter class for handling input/output messages routed through the Flask end points.
@@ -69,6 +108,8 @@ class UDFBotOsInputAdapter(BotOsInputAdapter):
     #   - If the event's UUID is in pending_map, it is removed, indicating that the event has been processed.
     #   - The response can then be retrieved by the client (via endpoint) using the UUID using the lookup* methods
     #     or by reading from the LLM_RESULTS table (which is what the streamlit app does)
+    #   - In-process callers (e.g. delegate_work) wait on the RequestCompletion returned by completion(uuid) instead;
+    #     every response update wakes them up.
     #
     # Workflow for client tool invocations:
     # * BosOsServer invokes a tool function that is a proxy to the client tool function.
@@ -94,6 +135,12 @@ class UDFBotOsInputAdapter(BotOsInputAdapter):
     _shared_pending_map = {}
     _shared_user_actions = {}
     _shared_thread_map = {}  # Maps input thread IDs to bot_os thread IDs
+    _shared_stream_buffers = {}  # Maps input UUIDs to the ResponseStreamBuffer read by lookup_stream_fn
+    _shared_stream_conds = {}
+    _shared_completions = {}  # Maps input UUIDs to the RequestCompletion in-process callers wait on
+
+    MAX_STREAM_BUFFERS = int(os.getenv("UDF_STREAM_BUFFERS_MAX", "1000"))
+    MAX_STREAM_WAIT_SECONDS = 25.0
 
     ACTION_MSG_DELIM = "<!!-ACTION_MSG-!!>"
     '''prefix/suffix delimeter for special 'action' messages that distinguish them from normal chat messages'''
@@ -172,6 +219,14 @@ class UDFBotOsInputAdapter(BotOsInputAdapter):
         # Add reference to instance
         self.thread_map = self.__class__._shared_thread_map[self.adapter_name]
 
+        if self.adapter_name not in self.__class__._shared_stream_buffers:
+            self.__class__._shared_stream_buffers[self.adapter_name] = {}
+            self.__class__._shared_stream_conds[self.adapter_name] = threading.Condition()
+            self.__class__._shared_completions[self.adapter_name] = {}
+        self.stream_buffers = self.__class__._shared_stream_buffers[self.adapter_name]
+        self.completions = self.__class__._shared_completions[self.adapter_name]
+        self.stream_cond = self.__class__._shared_stream_conds[self.adapter_name]
+
 
     @functools.cached_property
     def db_connector(self):
@@ -183,6 +238,7 @@ class UDFBotOsInputAdapter(BotOsInputAdapter):
         self.events.append(event)
         if event and event.uuid:
             self.events_map[event.uuid] = event
+        self.notify_input_ready()
 
 
     def add_back_event(self, metadata: dict = None):
@@ -284,6 +340,8 @@ class UDFBotOsInputAdapter(BotOsInputAdapter):
         if in_uuid and message.thread_id:
             self.thread_map[in_uuid] = message.thread_id
 
+        self._update_stream(in_uuid)
+
         # Add thread mapping if we have both IDs
 
 
@@ -494,23 +552,21 @@ class UDFBotOsInputAdapter(BotOsInputAdapter):
         #     [row_index, column_1_value, column_2_value, ...}],
         #     ...
         #   ]}
-        request_uuid = input_rows[0][1]
-        #logger.info("lookup input: ", input_text )
-        resp = self._lookup_response(request_uuid) or "not found"
-
-        thread_id = self.thread_map.get(request_uuid)
-        if thread_id:
-            if not resp.endswith('💬'):
-                try:
-                    # Yuly, this isn't working that well, it still builds up a lot of stuff in this map, maybe there is somewhere else we can get this from to not maintain another map?
-                    del self.thread_map[request_uuid]
-                except:
-                    pass
-
-        if thread_id:
-            output_rows = [[row[0], resp, thread_id] for row in input_rows]
-        else:
-            output_rows = [[row[0], resp] for row in input_rows]
+        # each row is a separate request (clients may poll for many requests in one call)
+        output_rows = []
+        for row in input_rows:
+            request_uuid = row[1]
+            #logger.info("lookup input: ", input_text )
+            resp = self._lookup_response(request_uuid) or "not found"
+
+            thread_id = self.thread_map.get(request_uuid)
+            if thread_id:
+                if not resp.endswith('💬'):
+                    # the response is complete: the client will not ask for it again
+                    self.thread_map.pop(request_uuid, None)
+                output_rows.append([row[0], resp, thread_id])
+            else:
+                output_rows.append([row[0], resp])
 
         response = make_response({"data": output_rows})
         response.headers['Content-type'] = 'application/json'
@@ -520,3 +576,117 @@ class UDFBotOsInputAdapter(BotOsInputAdapter):
 
     def lookup_udf(self, in_uuid:str):
         return self._lookup_response(in_uuid)
+
+
+    def _update_stream(self, in_uuid):
+        # called for every response update (and for new client tool invocations): wake up waiting stream readers
+        # and in-process callers waiting on the request's completion
+        with self.stream_cond:
+            if in_uuid in self.response_map:
+                buffer = self.stream_buffers.get(in_uuid)
+                if buffer is None:
+                    while len(self.stream_buffers) >= self.MAX_STREAM_BUFFERS:
+                        del self.stream_buffers[next(iter(self.stream_buffers))]  # oldest request first
+                    buffer = self.stream_buffers[in_uuid] = ResponseStreamBuffer()
+                buffer.update(self.response_map[in_uuid])
+                completion = self.completions.get(in_uuid)
+                if completion is not None:
+                    completion.update(self.response_map[in_uuid])
+                    if completion.done:
+                        del self.completions[in_uuid]
+            self.stream_cond.notify_all()
+
+
+    def completion(self, in_uuid:str) -> RequestCompletion:
+        """
+        The RequestCompletion of a request submitted with submit(), for in-process callers that wait for its response.
+        It is resolved by handle_response(); callers that stop waiting before the final response must call
+        discard_completion().
+        """
+        with self.stream_cond:
+            completion = self.completions.get(in_uuid)
+            if completion is None:
+                completion = RequestCompletion(in_uuid)
+                if in_uuid in self.response_map:
+                    completion.update(self.response_map[in_uuid])  # response produced before the caller asked
+                if not completion.done:
+                    self.completions[in_uuid] = completion
+        return completion
+
+
+    def discard_completion(self, in_uuid:str):
+        with self.stream_cond:
+            self.completions.pop(in_uuid, None)
+
+
+    def _take_pending_actions(self):
+        actions = []
+        while self.user_actions_tacker.unprocessed_q:
+            ihandle: BosOsClientAsyncToolInvocationHandle = self.user_actions_tacker.unprocessed_q.popleft() # type: ignore
+            actions.append(self.format_action_msg("action_required",
+                                                  invocation_id=ihandle.invocation_id,
+                                                  tool_func_name=ihandle.tool_func_descriptor.name,
+                                                  invocation_kwargs=ihandle.invocation_kwargs))
+            self.user_actions_tacker.pending_result_q.append(ihandle)
+        return actions
+
+
+    def lookup_stream(self, in_uuid:str, offset:int=0, epoch:int=0, wait_seconds:float=0.0) -> dict:
+        """
+        Incremental counterpart of lookup_udf: returns only the response text added since the client's `offset`
+        (number of characters it already holds) and `epoch`, plus any pending client tool invocations ('actions').
+
+        Waits up to `wait_seconds` (long poll) for something new. The result is a dict with the keys
+            text     - new text (or the full text if reset is True)
+            reset    - the response was rewritten: the client must replace what it holds with `text`
+            offset   - the offset to send with the next request
+            epoch    - the epoch to send with the next request
+            done     - the response is complete
+            found    - a response (possibly empty) exists for in_uuid
+            actions  - list of 'action_required' messages (see format_action_msg)
+            thread_id
+        """
+        if in_uuid not in self.stream_buffers and in_uuid in self.response_map:
+            self._update_stream(in_uuid)   # response produced before this request was first streamed
+        deadline = time.monotonic() + min(max(0.0, wait_seconds), self.MAX_STREAM_WAIT_SECONDS)
+        with self.stream_cond:
+            while True:
+                buffer = self.stream_buffers.get(in_uuid)
+                if self.user_actions_tacker.unprocessed_q or (buffer is not None and buffer.has_news(offset, epoch)):
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.stream_cond.wait(remaining)
+            actions = self._take_pending_actions()
+            result = dict(text="", reset=False, offset=offset, epoch=epoch, done=False, found=buffer is not None,
+                          actions=actions, thread_id=self.thread_map.get(in_uuid))
+            if buffer is not None:
+                text, reset = buffer.read(offset, epoch)
+                result.update(text=text, reset=reset, offset=len(buffer.text), epoch=buffer.epoch, done=buffer.done)
+                if buffer.done:
+                    del self.stream_buffers[in_uuid]
+                    self.thread_map.pop(in_uuid, None)
+        return result
+
+
+    def lookup_stream_fn(self):
+        '''
+        Flask handler for incremental (delta) response reads; see lookup_stream().
+
+        input format:
+          {"data": [[row_index, request_uuid, bot_id, offset, epoch, wait_seconds]]}
+        output format:
+          {"data": [[row_index, <lookup_stream result dict>]]}
+        '''
+        message = request.json
+        if message is None or not message['data']:
+            return {}
+        row = message['data'][0]
+        offset = int(row[3]) if len(row) > 3 and row[3] is not None else 0
+        epoch = int(row[4]) if len(row) > 4 and row[4] is not None else 0
+        wait_seconds = float(row[5]) if len(row) > 5 and row[5] is not None else 0.0
+        result = self.lookup_stream(row[1], offset=offset, epoch=epoch, wait_seconds=wait_seconds)
+        response = make_response({"data": [[row[0], result]]})
+        response.headers['Content-type'] = 'application/json'
+        return response
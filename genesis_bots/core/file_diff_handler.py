@@ -373,6 +373,29 @@ class GitFileManager:
         except Exception as e:
             return {"success": False, "error": str(e)}
 
+    def remove_files(self, file_paths: List[str], commit_message: str = None) -> Dict:
+        """Remove several files (tracked or not) with one index update and at most one commit"""
+        try:
+            removed, tracked = [], []
+            entries = self.repo.index.entries
+            for file_path in file_paths:
+                full_path = os.path.join(self.repo_path, file_path)
+                if os.path.exists(full_path):
+                    os.remove(full_path)
+                    removed.append(file_path)
+                if (file_path, 0) in entries:
+                    tracked.append(file_path)
+
+            if tracked:
+                self.repo.index.remove(tracked)
+                if commit_message:
+                    self.commit_changes(commit_message)
+
+            return {"success": True, "removed": removed,
+                    "message": f"{len(removed)} files removed, {len(tracked)} of them from git"}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
     def git_action(self, action: str, **kwargs) -> Dict:
         """
         Unified interface for all git operations.
@@ -390,6 +413,7 @@ class GitFileManager:
             - get_branch: Get current branch name
             - get_status: Get file status (optional: file_path)
             - remove_file: Remove a file from the repository (requires: file_path; optional: commit_message)
+            - remove_files: Remove several files in one commit (requires: file_paths; optional: commit_message)
         
         Returns:
             Dict containing operation result and any relevant data
@@ -621,6 +645,14 @@ class GitFileManager:
                     kwargs.get("commit_message")
                 )
 
+            elif action == "remove_files":
+                if "file_paths" not in kwargs:
+                    return {"success": False, "error": "file_paths is required"}
+                return self.remove_files(
+                    kwargs["file_paths"],
+                    kwargs.get("commit_message")
+                )
+
             else:
                 return {"success": False, "error": f"Unknown action: {action}"}
 
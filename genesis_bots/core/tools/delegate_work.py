@@ -520,18 +520,20 @@ def _delegate_work(
             bot_id={},
             file={}
         )
+        completion = udf_adapter.completion(uu)
 
-        # Wait for response with timeout
+        # Wait for response with timeout. The adapter wakes us up on every update of the response, so the final one
+        # is returned as soon as the target bot sends it.
         start_time = time.time()
         attempts = 0
+        version = 0
         last_response = ""
         previous_summary = ""
         _last_summary_time = time.time()
         while attempts < max_retries and (time.time() - start_time) < timeout_seconds:
-            # Check if response available
-            response = udf_adapter.lookup_udf(uu)
-            # Check if response ends with chat emoji
-            if response:
+            remaining = timeout_seconds - (time.time() - start_time)
+            version, response, done = completion.wait_update(version, timeout=min(remaining, UPDATE_INTERVAL_SECONDS))
+            if response and not done:
                 if response != last_response:
                     # Track last summary time
                     current_time = time.time()
@@ -557,10 +559,8 @@ def _delegate_work(
                         except Exception as e:
                             logger.error(f"Error getting response summary: {str(e)}")
                             _last_summary_time = current_time
-            if response and response.strip().endswith("💬"):
-                time.sleep(2)
                 continue
-            if response:
+            if done:
                 try:
                     # Extract the last JSON object from the response string
                     # Try to find JSON in code blocks first
@@ -599,9 +599,11 @@ def _delegate_work(
                             bot_id={},
                             file={}
                         )
+                        completion = udf_adapter.completion(uu)
+                        version = 0
                         _update_streaming_status(target_bot, 'Bot provided incorrect JSON response format, retrying...', run_id, session_id, thread_id, status_update_callback, input_metadata)
 
-            time.sleep(1)
+        udf_adapter.discard_completion(uu)
 
         # If we've timed out, send stop command
         if (time.time() - start_time) >= timeout_seconds:
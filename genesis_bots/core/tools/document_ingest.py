@@ -0,0 +1,222 @@
+"""
+Incremental, batched ingestion of files into the DocumentManager Chroma collection.
+
+Files are parsed and split into chunks on a pool of threads and streamed to the writer as they complete. Every chunk
+gets a content-addressed id (index, file, sha256 of the chunk text), so for a file that was ingested before only the
+chunks whose text changed are embedded and upserted, and its chunks that no longer exist are deleted. New chunks are
+embedded and upserted in batches.
+
+An IngestManifest records the size and mtime of every file whose chunks are fully written. Files that are unchanged
+since are skipped without being parsed, so re-syncing a folder costs only as much as the files that changed, and an
+interrupted ingest resumes where it stopped when the same folder is added again.
+"""
+
+from   concurrent.futures       import ThreadPoolExecutor, as_completed
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from   genesis_bots.core.logging_config \
+                                import logger
+
+_METADATA_TYPES = (str, int, float, bool)
+
+
+def chunk_id(index_name, file_path, text):
+    content_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    file_hash = hashlib.sha256(f"{index_name}\x00{file_path}".encode('utf-8')).hexdigest()[:16]
+    return f"{file_hash}-{content_hash[:32]}", content_hash
+
+
+class IngestManifest:
+    """Per-index record of the ingested files (path -> size, mtime), in a local SQLite file."""
+
+    def __init__(self, path):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS ingested_files (
+                                index_name TEXT NOT NULL, file_path TEXT NOT NULL, size INTEGER NOT NULL,
+                                mtime_ns INTEGER NOT NULL, chunks INTEGER NOT NULL, ingested_at REAL NOT NULL,
+                                PRIMARY KEY (index_name, file_path))""")
+        self._conn.commit()
+
+    def get(self, index_name):
+        with self._lock:
+            rows = self._conn.execute("SELECT file_path, size, mtime_ns FROM ingested_files WHERE index_name = ?",
+                                      (index_name,)).fetchall()
+        return {path: (size, mtime_ns) for path, size, mtime_ns in rows}
+
+    def record(self, index_name, entries):
+        """Records (file_path, size, mtime_ns, chunks) entries of fully written files."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO ingested_files VALUES (?, ?, ?, ?, ?, ?)",
+                                   [(index_name, path, size, mtime_ns, chunks, now) for path, size, mtime_ns, chunks in entries])
+            self._conn.commit()
+
+    def forget(self, index_name, file_paths=None):
+        """Forgets the given files of an index (all of them if file_paths is None), so they are ingested again."""
+        with self._lock:
+            if file_paths is None:
+                self._conn.execute("DELETE FROM ingested_files WHERE index_name = ?", (index_name,))
+            else:
+                self._conn.executemany("DELETE FROM ingested_files WHERE index_name = ? AND file_path = ?",
+                                       [(index_name, p) for p in file_paths])
+            self._conn.commit()
+
+    def rename(self, index_name, new_index_name):
+        with self._lock:
+            self._conn.execute("UPDATE ingested_files SET index_name = ? WHERE index_name = ?", (new_index_name, index_name))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class DocumentIngestPipeline:
+    """
+    Ingests files into a Chroma collection (see module docstring).
+
+    :param collection: the Chroma collection.
+    :param load_file: path -> list of documents.
+    :param split_documents: documents -> list of (chunk text, metadata dict).
+    :param embed_texts: list of texts -> list of vectors (one provider call per `embed_batch_size` texts).
+    :param manifest: IngestManifest, or None to always parse every file.
+
+    A pipeline runs one ingest at a time.
+    """
+
+    def __init__(self, collection, load_file, split_documents, embed_texts, manifest=None,
+                 max_workers=8, embed_batch_size=100, upsert_batch_size=256, progress_every=100):
+        self.collection = collection
+        self.load_file = load_file
+        self.split_documents = split_documents
+        self.embed_texts = embed_texts
+        self.manifest = manifest
+        self.max_workers = max(1, max_workers)
+        self.embed_batch_size = max(1, embed_batch_size)
+        self.upsert_batch_size = max(1, upsert_batch_size)
+        self.progress_every = progress_every
+
+
+    def run(self, index_name, file_paths, base_metadata=None, progress_callback=None):
+        """
+        Ingests `file_paths` into `index_name`. `base_metadata` is added to every chunk. `progress_callback(stats)` is
+        called every `progress_every` files and at the end. Returns the stats dict.
+        """
+        start = time.monotonic()
+        base_metadata = dict(base_metadata or {}, index_name=index_name)
+        stats = {'files': len(file_paths), 'files_done': 0, 'files_unchanged': 0, 'files_failed': 0,
+                 'chunks': 0, 'chunks_unchanged': 0, 'chunks_embedded': 0, 'chunks_deleted': 0, 'errors': []}
+        known = self.manifest.get(index_name) if self.manifest is not None else {}
+
+        to_parse = []
+        for path in file_paths:
+            try:
+                st = os.stat(path)
+            except OSError as e:
+                self._fail(stats, path, e)
+                continue
+            if known.get(path) == (st.st_size, st.st_mtime_ns):
+                stats['files_unchanged'] += 1
+                stats['files_done'] += 1
+                continue
+            to_parse.append((path, st.st_size, st.st_mtime_ns))
+
+        self._pending = []          # (id, text, metadata) to embed and upsert
+        self._pending_files = []    # (manifest entry, stale chunk ids) completed by the next flush
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="doc_ingest") as pool:
+            futures = {pool.submit(self._parse, path): (path, size, mtime_ns) for path, size, mtime_ns in to_parse}
+            for future in as_completed(futures):
+                path, size, mtime_ns = futures[future]
+                try:
+                    self._add_file(index_name, path, size, mtime_ns, future.result(), base_metadata, stats)
+                except Exception as e:
+                    self._fail(stats, path, e)
+                    continue
+                stats['files_done'] += 1
+                if len(self._pending) >= self.upsert_batch_size:
+                    self._flush(index_name, stats)
+                if self.progress_every and stats['files_done'] % self.progress_every == 0:
+                    self._report(index_name, stats, progress_callback)
+        self._flush(index_name, stats)
+
+        stats['seconds'] = round(time.monotonic() - start, 2)
+        self._report(index_name, stats, progress_callback)
+        return stats
+
+
+    def _parse(self, path):
+        return self.split_documents(self.load_file(path))
+
+
+    def _add_file(self, index_name, path, size, mtime_ns, chunks, base_metadata, stats):
+        existing = set(self.collection.get(where={"$and": [{"index_name": index_name}, {"file_path": path}]},
+                                           include=[])['ids'])
+        current = {}
+        for text, metadata in chunks:
+            if not text or not text.strip():
+                continue
+            cid, content_hash = chunk_id(index_name, path, text)
+            if cid in current:
+                continue                    # identical chunk twice in one file
+            chunk_metadata = {k: v for k, v in (metadata or {}).items() if isinstance(v, _METADATA_TYPES)}
+            chunk_metadata.update(base_metadata)
+            chunk_metadata['file_path'] = path
+            chunk_metadata['chunk_hash'] = content_hash
+            current[cid] = (text, chunk_metadata)
+        stats['chunks'] += len(current)
+        for cid, (text, chunk_metadata) in current.items():
+            if cid in existing:
+                stats['chunks_unchanged'] += 1
+            else:
+                self._pending.append((cid, text, chunk_metadata))
+        self._pending_files.append(((path, size, mtime_ns, len(current)), list(existing - current.keys())))
+
+
+    def _flush(self, index_name, stats):
+        pending, self._pending = self._pending, []
+        files, self._pending_files = self._pending_files, []
+        try:
+            for start in range(0, len(pending), self.upsert_batch_size):
+                batch = pending[start:start + self.upsert_batch_size]
+                texts = [text for _, text, _ in batch]
+                vectors = []
+                for i in range(0, len(texts), self.embed_batch_size):
+                    vectors.extend(self.embed_texts(texts[i:i + self.embed_batch_size]))
+                self.collection.upsert(ids=[cid for cid, _, _ in batch], embeddings=vectors, documents=texts,
+                                       metadatas=[metadata for _, _, metadata in batch])
+                stats['chunks_embedded'] += len(batch)
+            # the new chunks of these files are written: drop their stale chunks and mark them done
+            stale = [cid for _, stale_ids in files for cid in stale_ids]
+            if stale:
+                self.collection.delete(ids=stale)
+                stats['chunks_deleted'] += len(stale)
+        except Exception as e:
+            # not recorded in the manifest, so these files are ingested again next time
+            for (path, _, _, _), _ in files:
+                stats['files_done'] -= 1
+                self._fail(stats, path, e)
+            return
+        if files and self.manifest is not None:
+            self.manifest.record(index_name, [entry for entry, _ in files])
+
+
+    def _fail(self, stats, path, error):
+        stats['files_failed'] += 1
+        stats['errors'].append(f"{path}: {error}")
+        logger.info(f"Document ingest: failed to ingest {path}: {error}")
+
+
+    def _report(self, index_name, stats, progress_callback):
+        logger.info(f"Document ingest into {index_name}: {stats['files_done']}/{stats['files']} files "
+                    f"({stats['files_unchanged']} unchanged, {stats['files_failed']} failed), "
+                    f"{stats['chunks_embedded']} chunks embedded, {stats['chunks_unchanged']} unchanged, "
+                    f"{stats['chunks_deleted']} deleted")
+        if progress_callback is not None:
+            progress_callback(dict(stats))
@@ -3,6 +3,8 @@ from textwrap import dedent
 import os
 from genesis_bots.connectors import get_global_db_connector
 import chromadb
+from genesis_bots.connectors.embedding_service import get_embedding_service
+from genesis_bots.core.tools.document_ingest import DocumentIngestPipeline, IngestManifest
 
 from genesis_bots.core.bot_os_tools2 import (
     BOT_ID_IMPLICIT_FROM_CONTEXT,
@@ -17,20 +19,44 @@ def get_llama_components():
     from llama_index.vector_stores.chroma import ChromaVectorStore
     from llama_index.core import Settings
     from llama_index.embeddings.openai import OpenAIEmbedding
+    from llama_index.llms.openai import OpenAI
     from llama_index.core.indices.vector_store import VectorStoreIndex
     from llama_index.core.storage.storage_context import StorageContext
     from llama_index.core.readers import SimpleDirectoryReader
-    from llama_index.core import ComposableGraph
+    from llama_index.core import get_response_synthesizer
+    from llama_index.core.schema import NodeWithScore, TextNode
     return {
         'ChromaVectorStore': ChromaVectorStore,
         'Settings': Settings,
         'OpenAIEmbedding': OpenAIEmbedding,
+        'OpenAI': OpenAI,
         'VectorStoreIndex': VectorStoreIndex,
         'StorageContext': StorageContext,
         'SimpleDirectoryReader': SimpleDirectoryReader,
-        'ComposableGraph': ComposableGraph
+        'get_response_synthesizer': get_response_synthesizer,
+        'NodeWithScore': NodeWithScore,
+        'TextNode': TextNode,
     }
 
+# bookkeeping keys llama_index adds to the Chroma metadata of each node
+_LLAMA_METADATA_KEYS = ('_node_content', '_node_type', 'document_id', 'doc_id', 'ref_doc_id')
+
+
+class _LlamaEmbeddingProvider:
+    """
+    Embeds texts with the llama_index embed model of the document store (one embeddings call per batch). Search
+    queries go through the shared EmbeddingService with it, so they are cached like every other embedding request.
+    """
+    kind = 'llama_index'
+    max_batch_size = 100
+
+    def __init__(self, embed_model):
+        self.embed_model = embed_model
+        self.model = getattr(embed_model, 'model_name', None) or 'text-embedding-3-large'
+
+    def embed_batch(self, texts):
+        return self.embed_model.get_text_embedding_batch(list(texts))
+
 class DocumentManager(object):
     _instance = None
     _initialized = False
@@ -56,6 +82,8 @@ class DocumentManager(object):
             metadata={"hnsw:space": "cosine"}
         )
 
+        self.ingest_manifest = IngestManifest(os.path.join(self.storage_path, 'ingest_manifest.sqlite'))
+
         self._index_cache = {}
         self._initialized = True
 
@@ -69,6 +97,7 @@ class DocumentManager(object):
             # Set up embedding model
             self.embed_model = self._llama_components['OpenAIEmbedding'](model="text-embedding-3-large")
             self._llama_components['Settings'].embed_model = self.embed_model
+            self._embedding_provider = _LlamaEmbeddingProvider(self.embed_model)
 
     def get_index_id(self, index_name: str):
         query = f"SELECT INDEX_ID FROM {self.db_adapter.index_manager_table_name} WHERE index_name = '{index_name}'"
@@ -225,6 +254,7 @@ class DocumentManager(object):
             raise Exception("Index does not exist")
         query = f"UPDATE {self.db_adapter.index_manager_table_name} SET index_name = '{new_index_name}' WHERE index_name = '{index_name}'"
         self.db_adapter.run_query(query)
+        self.ingest_manifest.rename(index_name, new_index_name)
         return True
     
     def create_index(self, index_name: str, bot_id: str):        
@@ -267,6 +297,7 @@ class DocumentManager(object):
         )
 
         self.delete_index_from_table(index_name)
+        self.ingest_manifest.forget(index_name)
 
         return True
 
@@ -289,27 +320,29 @@ class DocumentManager(object):
             )
         return self._index_cache[index_id]
 
-    def add_document(self, index_name, datapath):
+    def add_document(self, index_name, datapath, progress_callback=None):
         """
-        Add a document to an index
-        
+        Add a document, or the documents of a directory, to an index
+
+        Only new and changed files are parsed, and only their new or changed chunks are embedded (see
+        document_ingest), so adding a folder again re-syncs it, and resumes an ingest that was interrupted.
+
         Args:
             index_name (str): Name of the index to add document to
-            datapath (str): Path to the document to add
-            
+            datapath (str): Path to the document or directory to add
+            progress_callback (callable, optional): called with the ingest stats while the ingest runs
+
         Returns:
             dict: Result containing success status and additional info
         """
         if not index_name:
             raise Exception("Index name is required")
 
-        try:
-            index = self.load_index(index_name)
-        except Exception as e:
+        if not self.get_index_id(index_name):
             indices = self.list_of_indices()
             return {
                 'success': False,
-                'error': f'Invalid index: {str(e)}',
+                'error': 'Invalid index: Index does not exist',
                 'available_indices': indices
             }
 
@@ -334,115 +367,118 @@ class DocumentManager(object):
 
         try:
             self._ensure_llama_initialized()
+            reader_class = self._llama_components['SimpleDirectoryReader']
             if os.path.isfile(datapath):
-                new_documents = self._llama_components['SimpleDirectoryReader'](input_files=[datapath]).load_data()
+                files = [datapath]
             elif os.path.isdir(datapath):
-                new_documents = self._llama_components['SimpleDirectoryReader'](input_dir=datapath).load_data()
+                files = [str(path) for path in reader_class(input_dir=datapath).input_files]
             else:
                 return {
                     'success': False,
                     'error': 'Invalid path'
                 }
 
-            for doc in new_documents:
-                # Add index_name and original path to the document metadata
-                if not hasattr(doc, 'metadata'):
-                    doc.metadata = {}
-                doc.metadata['index_name'] = index_name
-                doc.metadata['original_path'] = original_path
-                index.insert(doc)
+            node_parser = self._llama_components['Settings'].node_parser
+            pipeline = DocumentIngestPipeline(
+                self.collection,
+                load_file=lambda path: reader_class(input_files=[path]).load_data(),
+                split_documents=lambda docs: [(node.get_content(), node.metadata) for node in node_parser.get_nodes_from_documents(docs)],
+                embed_texts=self._embedding_provider.embed_batch,
+                manifest=self.ingest_manifest,
+                max_workers=int(os.getenv('DOCUMENT_INGEST_WORKERS', '8')),
+                embed_batch_size=self._embedding_provider.max_batch_size,
+            )
+            stats = pipeline.run(index_name, files, {'original_path': original_path}, progress_callback=progress_callback)
 
-            return {
+            if stats['files_failed'] and stats['files_failed'] == stats['files']:
+                return {
+                    'success': False,
+                    'error': f"Error adding document: {'; '.join(stats['errors'][:5])}"
+                }
+            result = {
                 'success': True,
-                'message': f'Successfully added document to index {index_name}'
+                'message': (f"Successfully added document to index {index_name}: {stats['files']} file(s), "
+                            f"{stats['files_unchanged']} unchanged, {stats['chunks_embedded']} chunk(s) embedded, "
+                            f"{stats['chunks_unchanged']} unchanged, {stats['chunks_deleted']} removed"),
+                'stats': {k: v for k, v in stats.items() if k != 'errors'},
             }
+            if stats['errors']:
+                result['errors'] = stats['errors'][:20]
+            return result
         except Exception as e:
             return {
                 'success': False,
                 'error': f'Error adding document: {str(e)}'
             }
 
+    def _query_collection(self, query, index_names, top_n):
+        """
+        One k-NN query over the shared Chroma collection, restricted to `index_names` by their index_name metadata.
+        The query is embedded once, through the shared embedding service (cached). Returns score/text/metadata dicts,
+        best first; score is the cosine similarity.
+        """
+        if not index_names or not query:
+            return []
+        self._ensure_llama_initialized()
+        embedding = get_embedding_service(self._embedding_provider).embed_one(query)
+        if len(index_names) == 1:
+            where = {"index_name": index_names[0]}
+        else:
+            where = {"index_name": {"$in": list(index_names)}}
+        results = self.collection.query(
+            query_embeddings=[embedding],
+            n_results=top_n,
+            where=where,
+            include=['documents', 'metadatas', 'distances']
+        )
+        hits = []
+        for text, metadata, distance in zip(results['documents'][0], results['metadatas'][0], results['distances'][0]):
+            metadata = {k: v for k, v in (metadata or {}).items() if k not in _LLAMA_METADATA_KEYS}
+            hits.append({
+                'score': 1.0 - distance,
+                'text': text,
+                'metadata': metadata
+            })
+        return hits
+
     def retrieve(self, query, index_name=None, top_n=3):
         if index_name:
-            index = self.load_index(index_name)
-            retriever = index.as_retriever(similarity_top_k=top_n)
-            all_results = retriever.retrieve(query)
-            simplified_results = []
-            for result in all_results:
-                simplified_results.append({
-                    'score': result.score,
-                    'text': result.text,
-                    'metadata': result.metadata
-                })
-            return simplified_results
-        else:
-            # Search across all indices and combine results
-            all_results = []
-            for idx_name in self.list_of_indices():
-                try:
-                    index = self.load_index(idx_name)
-                    retriever = index.as_retriever(similarity_top_k=top_n)
-                    results = retriever.retrieve(query)
-                    all_results.extend(results)
-                except Exception as e:
-                    print(f"Error retrieving from index {idx_name}: {e}")
-                    continue
-            # Sort all results by score and take top_n
-            sorted_results = sorted(all_results, key=lambda x: x.score, reverse=True)
-            all_results = sorted_results[:top_n]
-            # Convert to simple array of score/text/metadata
-            simplified_results = []
-            for result in all_results:
-                simplified_results.append({
-                    'score': result.score,
-                    'text': result.text,
-                    'metadata': result.metadata
-                })
-            return simplified_results
+            if not self.get_index_id(index_name):
+                raise Exception("Index does not exist")
+            return self._query_collection(query, [index_name], top_n)
+        # all indices live in the same collection, so one query covers them all
+        return self._query_collection(query, self.list_of_indices(), top_n)
 
     def retrieve_all_indices(self, query, top_n=3):
         """
-        Search across all indices using a composable graph to combine results.
-        
+        Answers a question from the top_n passages across all indices.
+
         Args:
-            query (str): The search query
-            top_n (int): Number of top results to return per index
-            
+            query (str): The question
+            top_n (int): Number of passages to synthesize the answer from
+
         Returns:
-            Response from querying across all indices
+            dict with the synthesized answer and the referenced file names
         """
         try:
-            # Get list of all indices
-            indices = []
-            summaries = []
-            for index_name in self.list_of_indices():
-                try:
-                    index = self.load_index(index_name)
-                    indices.append(index)
-                    summaries.append(f"Index: {index_name}")
-                except Exception as e:
-                    print(f"Error loading index {index_name}: {e}")
-                    continue
-
-            if not indices:
+            hits = self.retrieve(query, top_n=top_n)
+            if not hits:
                 return []
 
-            # Create composable graph from all indices
-            self._ensure_llama_initialized()
-            graph = self._llama_components['ComposableGraph'].from_indices(
-                self._llama_components['VectorStoreIndex'],
-                indices,
-                index_summaries=summaries
-            )
-
-            # Create query engine and execute query
-            query_engine = graph.as_query_engine(
-                response_mode="compact",
-                llm_kwargs={"model": "o3-mini"}  # or any other OpenAI model
+            nodes = [
+                self._llama_components['NodeWithScore'](
+                    node=self._llama_components['TextNode'](text=hit['text'], metadata=hit['metadata']),
+                    score=hit['score']
+                )
+                for hit in hits
+            ]
+            synthesizer = self._llama_components['get_response_synthesizer'](
+                llm=self._llama_components['OpenAI'](model="o3-mini"),  # or any other OpenAI model
+                response_mode="compact"
             )
-            response = query_engine.query(query)
+            response = synthesizer.synthesize(query, nodes=nodes)
 
-            references = ', '.join(list(set(item['file_name'] for item in response.metadata.values() if 'file_name' in item)))
+            references = ', '.join(sorted(set(hit['metadata']['file_name'] for hit in hits if 'file_name' in hit['metadata'])))
             return {'answer': response.response, 'references': references}
 
         except Exception as e:
@@ -466,12 +502,14 @@ class DocumentManager(object):
 
         # Find the IDs of documents that match either path
         ids_to_delete = []
+        files_deleted = set()
         if results and isinstance(results, dict):
             for i, metadata in enumerate(results.get('metadatas', [])):
                 if metadata:
                     doc_path = metadata.get('original_path') or metadata.get('file_path')
                     if doc_path == document_path:
                         ids_to_delete.append(results['ids'][i])
+                        files_deleted.add(metadata.get('file_path') or doc_path)
                         logger.info(f"Found matching document with ID: {results['ids'][i]}")
 
         # Delete by IDs if any found
@@ -480,6 +518,7 @@ class DocumentManager(object):
             self.collection.delete(
                 ids=ids_to_delete
             )
+            self.ingest_manifest.forget(index_name, files_deleted)
         else:
             logger.info("No matching documents found to delete")
 
@@ -201,28 +201,7 @@ def process_scheduler(
                 f"SELECT * FROM {db_adapter.schema}.TASKS WHERE upper(bot_id) = upper(%s)"
             )
             cursor.execute(list_query, (bot_id,))
-            tasks = cursor.fetchall()
-            task_list = []
-            for task in tasks:
-                next_check = None
-                if task[5] is not None:
-                    next_check = datetime_to_string(task[5])
-                task_dict = {
-                    "task_id": task[0],
-                    "bot_id": task[1],
-                    "task_name": task[2],
-                    "primary_report_to_type": task[3],
-                    "primary_report_to_id": task[4],
-                    "next_check_ts": next_check,
-                    "action_trigger_type": task[6],
-                    "action_trigger_details": task[7],
-                    "process_name_to_run": task[8],
-                    "reporting_instructions": task[9],
-                    "last_task_status": task[10],
-                    "task_learnings": task[11],
-                    "task_active": task[12],
-                }
-                task_list.append(task_dict)
+            task_list = [_task_row_to_dict(task) for task in cursor.fetchall()]
             return {"Success": True, "Scheduled Processes": task_list, "Note": "Don't take any immediate actions on this information unless instructed to by the user. Also note the task_id is the id of the schedule, not the id of the process to run."}
         except Exception as e:
             return {
@@ -357,6 +336,45 @@ def process_scheduler(
         cursor.close()
 
 
+def _task_row_to_dict(task):
+    next_check = None
+    if task[5] is not None:
+        next_check = datetime_to_string(task[5])
+    return {
+        "task_id": task[0],
+        "bot_id": task[1],
+        "task_name": task[2],
+        "primary_report_to_type": task[3],
+        "primary_report_to_id": task[4],
+        "next_check_ts": next_check,
+        "action_trigger_type": task[6],
+        "action_trigger_details": task[7],
+        "process_name_to_run": task[8],
+        "reporting_instructions": task[9],
+        "last_task_status": task[10],
+        "task_learnings": task[11],
+        "task_active": task[12],
+    }
+
+
+def list_scheduled_tasks(bot_ids):
+    """
+    Returns the scheduled processes of all of `bot_ids` (as listed by process_scheduler LIST) with one query.
+    Used by the task server to load its schedule; not exposed as a tool.
+    """
+    bot_ids = list(bot_ids)
+    if not bot_ids:
+        return []
+    placeholders = ", ".join(["upper(%s)"] * len(bot_ids))
+    list_query = f"SELECT * FROM {db_adapter.schema}.TASKS WHERE upper(bot_id) IN ({placeholders})"
+    cursor = db_adapter.client.cursor()
+    try:
+        cursor.execute(list_query, tuple(bot_ids))
+        return [_task_row_to_dict(task) for task in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
 def _get_current_time_with_timezone():
     current_time = datetime.now().astimezone()
     return current_time.strftime("%Y-%m-%d %H:%M:%S %Z")
@@ -370,6 +370,11 @@ class GenesisApp:
             for slack_adapter in self.bot_id_to_slack_adapter_map.values():
                 slack_adapter.shutdown()
 
+        # write out chat history rows still queued by the connector's write-behind writer
+        chat_history_writer = getattr(self.db_adapter, '_chat_history_writer', None)
+        if chat_history_writer is not None:
+            chat_history_writer.flush(timeout=30)
+
         self.server = None
         self.scheduler = None
 
@@ -432,16 +437,10 @@ class GenesisApp:
 
                 if not wake_up:
                     try:
-                        cursor = self.db_adapter.client.cursor()
-                        check_bot_active = f"DESCRIBE TABLE {self.db_adapter.schema}.BOTS_ACTIVE"
-                        cursor.execute(check_bot_active)
-                        result = cursor.fetchone()
-
-                        bot_active_time_dt = datetime.strptime(result[0], '%Y-%m-%d %H:%M:%S %Z')
+                        active_bots = self.db_adapter.db_get_active_bots(minutes=5)
                         current_time = datetime.now()
-                        time_difference = current_time - bot_active_time_dt
 
-                        if time_difference >= timedelta(minutes=5) and os.getenv("HARVEST_TEST", "false").lower() != "true":
+                        if not active_bots and os.getenv("HARVEST_TEST", "false").lower() != "true":
                             # Implement backoff logging
                             should_log = False
                             if self.last_inactive_log is None:
@@ -463,7 +462,7 @@ class GenesisApp:
                             self.consecutive_inactive_runs = 0
                             self.last_inactive_log = None
                     except:
-                        logger.info('Waiting for BOTS_ACTIVE table to be created...')
+                        logger.info('Waiting for BOT_HEARTBEATS table to be created...')
                         return
 
                 self.harvester_running = True
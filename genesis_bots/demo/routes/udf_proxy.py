@@ -88,6 +88,20 @@ def lookup_udf():
         return None
 
 
+@udf_routes.route("/udf_proxy/lookup_stream", methods=["POST"])
+def lookup_stream():
+    logger.debug('Flask invocation: /udf_proxy/lookup_stream')
+    message = request.json
+    input_rows = message["data"]
+    bot_id = input_rows[0][2]
+
+    bots_udf_adapter = genesis_app.bot_id_to_udf_adapter_map.get(bot_id, None)
+    if bots_udf_adapter is not None:
+        return bots_udf_adapter.lookup_stream_fn()
+    else:
+        return None
+
+
 @udf_routes.route("/udf_proxy/list_available_bots", methods=["POST"])
 def list_available_bots_fn():
   #  logger.info('Flask invocation: /udf_proxy/list_available_bots')
@@ -12,6 +12,7 @@ import pandas as pd
 import re
 import traceback
 from genesis_bots.core.logging_config import logger
+from genesis_bots.knowledge.message_log_feed import MessageLogChangeFeed, format_timestamp
 
 print("     ┌───────┐     ")
 print("    ╔═════════╗    ")
@@ -50,6 +51,14 @@ class KnowledgeServer:
         self.thread_set_lock = threading.Lock()
         self.llm_type = llm_type.lower()
         self.sleepytime = True
+        # new message log rows are read incrementally; the consumer reads the logs of up to consumer_batch_size
+        # queued threads in one query, max_thread_rows rows per thread
+        self.feed = MessageLogChangeFeed(db_connector)
+        self.consumer_batch_size = int(os.getenv("KNOWLEDGE_CONSUMER_BATCH_SIZE", "10"))
+        self.max_thread_rows = 50
+        # a thread that keeps failing is retried on the next polls up to max_retries times, then dropped
+        self.max_retries = int(os.getenv("KNOWLEDGE_MAX_RETRIES", "3"))
+        self.failed_attempts = {}   # thread_id -> consecutive failures
         if llm_type == 'openai':
             self.openai_api_key = os.getenv("OPENAI_API_KEY")
             self.client = get_openai_client()
@@ -63,43 +72,25 @@ class KnowledgeServer:
 
     def producer(self):
         while True:
+            time.sleep(refresh_seconds)
+            poll = self.feed.poll()
+            print('KNOWLEDGE_SERVER:', 'query_message_log_changes')
 
-            wake_up = False
-            i = 0
-            while not wake_up:
-                time.sleep(refresh_seconds)
-                self.sleepytime = True
-                cursor = self.db_connector.client.cursor()
-                check_bot_active = f"DESCRIBE TABLE {self.db_connector.schema}.BOTS_ACTIVE"
-                cursor.execute(check_bot_active)
-                print('KNOWLEDGE_SERVER:', 'RUN DESCRIBE TABLE BOTS_ACTIVE')
-                result = cursor.fetchone()
-
-                bot_active_time_dt = datetime.strptime(result[0], '%Y-%m-%d %H:%M:%S %Z')
-                current_time = datetime.now()
-                time_difference = current_time - bot_active_time_dt
-
-                i += 1
-                if i >= 30:
-                    logger.info(f"BOTS ACTIVE TIME: {result[0]} | CURRENT TIME: {current_time} | TIME DIFFERENCE: {time_difference} | producer")
-                    i = 0
-
-                if time_difference < timedelta(minutes=5):
-                    logger.info(f"Knowledge Server is Active | TIME DIFFERENCE: {time_difference}")
-                    wake_up = True
-                    self.sleepytime = False
-
-            # join inside snowflake
-            cutoff = (datetime.now() - timedelta(minutes=10)).strftime("%Y-%m-%d %H:%M:%S")
-            threads = self.db_connector.query_threads_message_log(cutoff)
-            print('KNOWLEDGE_SERVER:', 'query_threads_message_log')
-            logger.info(f"Producer found {len(threads)} threads")
-            for thread in threads:
+            active = poll.latest_activity is not None and datetime.now() - poll.latest_activity < timedelta(minutes=5)
+            if active and self.sleepytime:
+                logger.info(f"Knowledge Server is Active | LATEST MESSAGE: {poll.latest_activity}")
+            self.sleepytime = not active
+
+            if poll.threads:
+                logger.info(f"Producer found {len(poll.threads)} threads")
+            for thread in poll.threads:
                 thread_id = thread["THREAD_ID"]
                 with self.thread_set_lock:
                     if thread_id not in self.thread_set:
                         self.thread_set.add(thread_id)
                     else:
+                        # still being processed: keep its new rows above the watermark for the next poll
+                        poll.defer(thread)
                         continue
 
                 with self.condition:
@@ -109,161 +100,202 @@ class KnowledgeServer:
                     self.thread_queue.put(thread)
                     logger.info(f"Produced {thread_id}")
                     self.condition.notify()
-    #                logger.info("Bot is active")
+            self.feed.commit(poll)
+
+    def _take_threads(self):
+        # block for one thread, then take whatever else is queued, up to consumer_batch_size
+        with self.condition:
+            if self.thread_queue.empty():
+                #logger.info("Queue is empty, consumer is waiting...")
+                self.condition.wait()
+            threads = [self.thread_queue.get()]
+            while len(threads) < self.consumer_batch_size and not self.thread_queue.empty():
+                threads.append(self.thread_queue.get())
+            self.condition.notify()
+        return threads
 
     def consumer(self):
         while True:
-            with self.condition:
-                if self.thread_queue.empty():
-                    #logger.info("Queue is empty, consumer is waiting...")
-                    self.condition.wait()
-                thread = self.thread_queue.get()
-                self.condition.notify()
-
-            thread_id = thread["THREAD_ID"]
-            timestamp = thread["TIMESTAMP"]
-            if type(thread["LAST_TIMESTAMP"]) != str:
-                last_timestamp = thread["LAST_TIMESTAMP"].strftime("%Y-%m-%d %H:%M:%S")
-            else:
-                last_timestamp = thread["LAST_TIMESTAMP"]
-
-            msg_log = self.db_connector.query_timestamp_message_log(thread_id, last_timestamp, max_rows=50)
-            print('KNOWLEDGE_SERVER:', 'query_timestamp_message_log')
-
-            non_bot_users_query = f"""
-                WITH BOTS AS (SELECT BOT_SLACK_USER_ID,
-                    CONCAT('{{"user_id": "', BOT_SLACK_USER_ID, '", "user_name": "', BOT_NAME, '", "user_email": "unknown_email"}}') as PRIMARY_USER
-                    FROM  {self.db_connector.bot_servicing_table_name}),
-                    BOTS2 AS (SELECT BOT_SLACK_USER_ID,
-                    CONCAT('{{"user_id": "', BOT_SLACK_USER_ID, '", "user_name": "', BOT_NAME, '"}}') as PRIMARY_USER
-                    FROM  {self.db_connector.bot_servicing_table_name})
-                SELECT count(DISTINCT M.PRIMARY_USER) as CNT FROM {self.db_connector.message_log_table_name} M
-                LEFT JOIN BOTS ON M.PRIMARY_USER = BOTS.PRIMARY_USER
-                LEFT JOIN BOTS2 ON M.PRIMARY_USER = BOTS2.PRIMARY_USER
-                WHERE THREAD_ID = '{thread_id}'
-                AND  BOTS.BOT_SLACK_USER_ID IS NULL AND  BOTS2.BOT_SLACK_USER_ID IS NULL
-                and m.primary_user <> '{{"user_id": "unknown_id", "user_name": "unknown_name"}}';
-                """
-                # this is needed to exclude channels with more than one user
-            count_non_bot_users = self.db_connector.run_query(non_bot_users_query)
-            print('KNOWLEDGE_SERVER:', 'count_non_bot_users')
-
-            skipped_thread = False
-            if count_non_bot_users and count_non_bot_users[0]["CNT"] != 1:
-                logger.info(f"Skipped {thread_id}, {count_non_bot_users[0]['CNT']} non-bot-users is not 1")
-                response = {'thread_summary': 'Skipped due to empty or multiple non-bot-users',
-                            'user_learning' : 'Skipped due to empty or multiple non-bot-users',
-                            'tool_learning' : 'Skipped due to empty or multiple non-bot-users',
-                            'data_learning' : 'Skipped due to empty or multiple non-bot-users'}
-                skipped_thread = True
-
+            threads = self._take_threads()
+            thread_timestamps = {thread["THREAD_ID"]: format_timestamp(thread["LAST_TIMESTAMP"]) for thread in threads}
+            try:
+                msg_logs = self.db_connector.query_message_log_for_threads(thread_timestamps, max_rows=self.max_thread_rows)
+                print('KNOWLEDGE_SERVER:', 'query_message_log_for_threads')
+            except Exception as e:
+                logger.info(f"Encountered errors reading the message log of {len(threads)} threads: {e}")
+                msg_logs = None
+            for thread in threads:
+                try:
+                    if msg_logs is None:
+                        self._retry_thread(thread)
+                    else:
+                        self.consume_thread(thread, msg_logs.get(thread["THREAD_ID"], []))
+                except Exception as e:
+                    logger.info(f"Encountered errors processing knowledge for thread {thread['THREAD_ID']}: {e}")
+                    logger.info(traceback.format_exc())
+                    self._retry_thread(thread)
+                finally:
+                    with self.thread_set_lock:
+                        self.thread_set.discard(thread["THREAD_ID"])
+                        logger.info(f"Consumed {thread['THREAD_ID']}")
+
+    def _retry_thread(self, thread):
+        # the watermark is already past this thread's rows: hand it back to the next poll unprocessed
+        thread_id = thread["THREAD_ID"]
+        with self.thread_set_lock:
+            failures = self.failed_attempts.get(thread_id, 0) + 1
+            if failures > self.max_retries:
+                self.failed_attempts.pop(thread_id, None)
             else:
-                messages = [f"{msg['MESSAGE_TYPE']}: {msg['MESSAGE_PAYLOAD']}" for msg in msg_log if "'EMBEDDING': " not in msg['MESSAGE_PAYLOAD']]
-                messages = "\n".join(messages)[:200_000] # limit to 200k char for now
-
-                query = f"""SELECT DISTINCT(knowledge_thread_id) FROM {self.db_connector.knowledge_table_name}
-                            WHERE thread_id = '{thread_id}';"""
-                knowledge_thread_id = self.db_connector.run_query(query)
-                print('KNOWLEDGE_SERVER:', 'knowledge_thread_id')
-                if knowledge_thread_id and self.llm_type == 'openai':
-                    knowledge_thread_id = knowledge_thread_id[0]["KNOWLEDGE_THREAD_ID"]
-                    content = f"""Find a new batch of conversations between the user and agent and update 4 requested information in the original prompt and return it in JSON format:
-                                Conversation:
-                                {messages}
-                            """
-                    try:
-                        logger.info('openai create ', knowledge_thread_id)
-                        self.client.beta.threads.messages.create(
-                            thread_id=knowledge_thread_id, content=content, role="user"
-                        )
-                    except Exception as e:
-                        logger.info('openai create exception ', e)
-                        knowledge_thread_id = None
-                else:
-                    content = f"""Given the following conversations between the user and agent, analyze them and extract the 4 requested information:
-                                Conversation:
-                                {messages}
-
-                                Requested information:
-                                - thread_summary: Extract summary of the conversation
-                                - user_learning: Extract what you learned about this user, their preferences, and interests
-                                - tool_learning: For any tools you called in this thread, what did you learn about how to best use them or call them
-                                - data_learning: For any data you analyzed, what did you learn about the data that was not obvious from the metadata that you were provided by search_metadata.
-
-                                Expected output in JSON:
-                                {{'thread_summary': STRING,
-                                'user_learning': STRING,
-                                'tool_learning': STRING,
-                                'data_learning': STRING}}
-                            """
-                    if self.llm_type == 'openai':
-                        knowledge_thread_id = self.client.beta.threads.create().id
-                        self.client.beta.threads.messages.create(
-                            thread_id=knowledge_thread_id, content=content, role="user"
-                        )
-                    else: # cortex
-                        knowledge_thread_id = ''
-                response = None
-                if self.llm_type == 'openai' and knowledge_thread_id is not None:
-                    run = self.client.beta.threads.runs.create(
-                        thread_id=knowledge_thread_id, assistant_id=self.assistant.id
+                self.failed_attempts[thread_id] = failures
+        if failures > self.max_retries:
+            logger.error(f"Knowledge for thread {thread_id} failed {failures} times, dropping its messages after "
+                         f"{thread['LAST_TIMESTAMP']}")
+            return
+        self.feed.carry_over(thread_id, thread["TIMESTAMP"], thread["LAST_TIMESTAMP"])
+
+    def consume_thread(self, thread, msg_log):
+        thread_id = thread["THREAD_ID"]
+        timestamp = thread["TIMESTAMP"]
+        if not msg_log:
+            logger.info(f"No new message log rows for thread {thread_id}, skipped")
+            return
+        non_bot_users_query = f"""
+            WITH BOTS AS (SELECT BOT_SLACK_USER_ID,
+                CONCAT('{{"user_id": "', BOT_SLACK_USER_ID, '", "user_name": "', BOT_NAME, '", "user_email": "unknown_email"}}') as PRIMARY_USER
+                FROM  {self.db_connector.bot_servicing_table_name}),
+                BOTS2 AS (SELECT BOT_SLACK_USER_ID,
+                CONCAT('{{"user_id": "', BOT_SLACK_USER_ID, '", "user_name": "', BOT_NAME, '"}}') as PRIMARY_USER
+                FROM  {self.db_connector.bot_servicing_table_name})
+            SELECT count(DISTINCT M.PRIMARY_USER) as CNT FROM {self.db_connector.message_log_table_name} M
+            LEFT JOIN BOTS ON M.PRIMARY_USER = BOTS.PRIMARY_USER
+            LEFT JOIN BOTS2 ON M.PRIMARY_USER = BOTS2.PRIMARY_USER
+            WHERE THREAD_ID = '{thread_id}'
+            AND  BOTS.BOT_SLACK_USER_ID IS NULL AND  BOTS2.BOT_SLACK_USER_ID IS NULL
+            and m.primary_user <> '{{"user_id": "unknown_id", "user_name": "unknown_name"}}';
+            """
+            # this is needed to exclude channels with more than one user
+        count_non_bot_users = self.db_connector.run_query(non_bot_users_query)
+        print('KNOWLEDGE_SERVER:', 'count_non_bot_users')
+
+        skipped_thread = False
+        if count_non_bot_users and count_non_bot_users[0]["CNT"] != 1:
+            logger.info(f"Skipped {thread_id}, {count_non_bot_users[0]['CNT']} non-bot-users is not 1")
+            response = {'thread_summary': 'Skipped due to empty or multiple non-bot-users',
+                        'user_learning' : 'Skipped due to empty or multiple non-bot-users',
+                        'tool_learning' : 'Skipped due to empty or multiple non-bot-users',
+                        'data_learning' : 'Skipped due to empty or multiple non-bot-users'}
+            skipped_thread = True
+
+        else:
+            messages = [f"{msg['MESSAGE_TYPE']}: {msg['MESSAGE_PAYLOAD']}" for msg in msg_log if "'EMBEDDING': " not in msg['MESSAGE_PAYLOAD']]
+            messages = "\n".join(messages)[:200_000] # limit to 200k char for now
+
+            query = f"""SELECT DISTINCT(knowledge_thread_id) FROM {self.db_connector.knowledge_table_name}
+                        WHERE thread_id = '{thread_id}';"""
+            knowledge_thread_id = self.db_connector.run_query(query)
+            print('KNOWLEDGE_SERVER:', 'knowledge_thread_id')
+            if knowledge_thread_id and self.llm_type == 'openai':
+                knowledge_thread_id = knowledge_thread_id[0]["KNOWLEDGE_THREAD_ID"]
+                content = f"""Find a new batch of conversations between the user and agent and update 4 requested information in the original prompt and return it in JSON format:
+                            Conversation:
+                            {messages}
+                        """
+                try:
+                    logger.info('openai create ', knowledge_thread_id)
+                    self.client.beta.threads.messages.create(
+                        thread_id=knowledge_thread_id, content=content, role="user"
                     )
-                    while not self.client.beta.threads.runs.retrieve(
-                        thread_id=knowledge_thread_id, run_id=run.id
-                    ).completed_at:
-                        time.sleep(1)
-
-                    raw_knowledge = (
-                        self.client.beta.threads.messages.list(knowledge_thread_id)
-                        .data[0]
-                        .content[0]
-                        .text.value
+                except Exception as e:
+                    logger.info('openai create exception ', e)
+                    knowledge_thread_id = None
+            else:
+                content = f"""Given the following conversations between the user and agent, analyze them and extract the 4 requested information:
+                            Conversation:
+                            {messages}
+
+                            Requested information:
+                            - thread_summary: Extract summary of the conversation
+                            - user_learning: Extract what you learned about this user, their preferences, and interests
+                            - tool_learning: For any tools you called in this thread, what did you learn about how to best use them or call them
+                            - data_learning: For any data you analyzed, what did you learn about the data that was not obvious from the metadata that you were provided by search_metadata.
+
+                            Expected output in JSON:
+                            {{'thread_summary': STRING,
+                            'user_learning': STRING,
+                            'tool_learning': STRING,
+                            'data_learning': STRING}}
+                        """
+                if self.llm_type == 'openai':
+                    knowledge_thread_id = self.client.beta.threads.create().id
+                    self.client.beta.threads.messages.create(
+                        thread_id=knowledge_thread_id, content=content, role="user"
                     )
-                    try:
-                        response = json.loads(raw_knowledge)
-                    except:
-                        logger.info('Skipped thread ',knowledge_thread_id,' knowledge unparseable')
-                        response = {'thread_summary': 'Skipped due to invalid summary generated by LLM',
-                            'user_learning' : 'Skipped due to invalid summary generated by LLM',
-                            'tool_learning' : 'Skipped due to invalid summary generated by LLM',
-                            'data_learning' : 'Skipped due to invalid summary generated by LLM'}
-                        skipped_thread = True
-                else:
-                    system = "You are a Knowledge Explorer to extract, synthesize, and inject knowledge that bots learn from doing their jobs"
-                    res, status_code  = self.db_connector.cortex_chat_completion(content, system=system)
-                    print('KNOWLEDGE_SERVER:', 'cortex_chat_completion')
-                    response = ast.literal_eval(res.split("```")[1])
-
+                else: # cortex
+                    knowledge_thread_id = ''
+            response = None
+            if self.llm_type == 'openai' and knowledge_thread_id is not None:
+                run = self.client.beta.threads.runs.create(
+                    thread_id=knowledge_thread_id, assistant_id=self.assistant.id
+                )
+                while not self.client.beta.threads.runs.retrieve(
+                    thread_id=knowledge_thread_id, run_id=run.id
+                ).completed_at:
+                    time.sleep(1)
+
+                raw_knowledge = (
+                    self.client.beta.threads.messages.list(knowledge_thread_id)
+                    .data[0]
+                    .content[0]
+                    .text.value
+                )
+                try:
+                    response = json.loads(raw_knowledge)
+                except:
+                    logger.info('Skipped thread ',knowledge_thread_id,' knowledge unparseable')
+                    response = {'thread_summary': 'Skipped due to invalid summary generated by LLM',
+                        'user_learning' : 'Skipped due to invalid summary generated by LLM',
+                        'tool_learning' : 'Skipped due to invalid summary generated by LLM',
+                        'data_learning' : 'Skipped due to invalid summary generated by LLM'}
+                    skipped_thread = True
+            else:
+                system = "You are a Knowledge Explorer to extract, synthesize, and inject knowledge that bots learn from doing their jobs"
+                res, status_code  = self.db_connector.cortex_chat_completion(content, system=system)
+                print('KNOWLEDGE_SERVER:', 'cortex_chat_completion')
+                response = ast.literal_eval(res.split("```")[1])
 
 
-            try:
-                if response is not None:
-                    # Ensure the timestamp is in the correct format for Snowflake
-                    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    if type(msg_log[-1]["TIMESTAMP"]) != str:
-                        last_timestamp = msg_log[-1]["TIMESTAMP"].strftime("%Y-%m-%d %H:%M:%S")
-                    else:
-                        last_timestamp = msg_log[-1]["TIMESTAMP"]
-                    bot_id = msg_log[-1]["BOT_ID"]
-                    primary_user = msg_log[-1]["PRIMARY_USER"]
-                    thread_summary = response.get("thread_summary", '')
-                    user_learning = response.get("user_learning",'')
-                    tool_learning = response.get("tool_learning",'')
-                    data_learning = response.get("data_learning",'')
-
-                    self.db_connector.run_insert(self.db_connector.knowledge_table_name, timestamp=timestamp,thread_id=thread_id,knowledge_thread_id=knowledge_thread_id,
-                                                primary_user=primary_user,bot_id=bot_id,last_timestamp=last_timestamp,thread_summary=thread_summary,
-                                                user_learning=user_learning,tool_learning=tool_learning,data_learning=data_learning)
-                    print('KNOWLEDGE_SERVER:', 'run_insert - line 256')
-                    if not skipped_thread:
-                        self.user_queue.put((primary_user, bot_id, response))
-            except Exception as e:
-                logger.info(f"Encountered errors processing knowledge for thread {thread_id}, {self.db_connector.knowledge_table_name} row: {e}")
-                logger.info(traceback.format_exc())
 
-            with self.thread_set_lock:
-                self.thread_set.remove(thread_id)
-                logger.info(f"Consumed {thread_id}")
+        try:
+            if response is not None:
+                # Ensure the timestamp is in the correct format for Snowflake
+                timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                if type(msg_log[-1]["TIMESTAMP"]) != str:
+                    last_timestamp = msg_log[-1]["TIMESTAMP"].strftime("%Y-%m-%d %H:%M:%S")
+                else:
+                    last_timestamp = msg_log[-1]["TIMESTAMP"]
+                bot_id = msg_log[-1]["BOT_ID"]
+                primary_user = msg_log[-1]["PRIMARY_USER"]
+                thread_summary = response.get("thread_summary", '')
+                user_learning = response.get("user_learning",'')
+                tool_learning = response.get("tool_learning",'')
+                data_learning = response.get("data_learning",'')
+
+                self.db_connector.run_insert(self.db_connector.knowledge_table_name, timestamp=timestamp,thread_id=thread_id,knowledge_thread_id=knowledge_thread_id,
+                                            primary_user=primary_user,bot_id=bot_id,last_timestamp=last_timestamp,thread_summary=thread_summary,
+                                            user_learning=user_learning,tool_learning=tool_learning,data_learning=data_learning)
+                print('KNOWLEDGE_SERVER:', 'run_insert - line 256')
+                with self.thread_set_lock:
+                    self.failed_attempts.pop(thread_id, None)
+                if not skipped_thread:
+                    self.user_queue.put((primary_user, bot_id, response))
+                if len(msg_log) >= self.max_thread_rows:
+                    # more unprocessed messages than fit in one pass: pick up the rest on the next poll
+                    self.feed.carry_over(thread_id, thread["TIMESTAMP"], last_timestamp)
+        except Exception as e:
+            logger.info(f"Encountered errors processing knowledge for thread {thread_id}, {self.db_connector.knowledge_table_name} row: {e}")
+            logger.info(traceback.format_exc())
+            self._retry_thread(thread)
 
     def refiner(self):
         while True:
@@ -0,0 +1,117 @@
+"""
+Watermark-based change feed over the message log, used by the KnowledgeServer producer.
+
+Each poll asks the database only for threads with message log rows newer than the committed high-water mark, instead
+of rescanning a fixed time window. Threads are handed out once they have been idle for `idle_minutes` (their latest
+message is older than the cutoff) and have more than `min_messages` messages, the same rules the producer applied to
+the full scan before. After the caller has queued a poll's threads it commits the poll, which moves the high-water mark
+to the poll's cutoff: threads that were still active keep rows newer than the cutoff, so they are found again by a
+later poll once they go idle.
+
+Threads whose unprocessed backlog did not fit in one consumer pass are handed back with carry_over() and are returned
+by the next poll, so they do not have to wait for new messages.
+"""
+
+from   collections              import deque
+from   datetime                 import datetime, timedelta
+import os
+import threading
+
+from   genesis_bots.core.logging_config \
+                                import logger
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+# before the first commit the feed looks at everything not yet covered by the knowledge table
+INITIAL_WATERMARK = "2000-01-01 00:00:00"
+
+
+def format_timestamp(value):
+    if isinstance(value, datetime):
+        return value.strftime(TIMESTAMP_FORMAT)
+    return str(value)[:19]
+
+
+def _parse_timestamp(value):
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    try:
+        return datetime.strptime(str(value)[:19], TIMESTAMP_FORMAT)
+    except ValueError:
+        return None
+
+
+class FeedPoll:
+    """Result of MessageLogChangeFeed.poll()."""
+
+    def __init__(self, threads, watermark, latest_activity):
+        self.threads = threads                  # thread rows (THREAD_ID, TIMESTAMP, LAST_TIMESTAMP) ready to process
+        self.watermark = watermark              # high-water mark to commit once the threads are queued
+        self.latest_activity = latest_activity  # newest message timestamp seen above the watermark, or None
+
+    def defer(self, thread):
+        """Keeps the rows of a thread that could not be queued now (e.g. still being processed) above the watermark."""
+        last_timestamp = format_timestamp(thread["LAST_TIMESTAMP"])
+        if last_timestamp < self.watermark:
+            self.watermark = last_timestamp
+
+
+class MessageLogChangeFeed:
+    """
+    Change feed over the message log of `db_connector` (see module docstring).
+
+    :param idle_minutes: a thread is processed once its latest message is older than this (env KNOWLEDGE_IDLE_MINUTES).
+    :param min_messages: threads with at most this many messages are skipped until they grow.
+    """
+
+    def __init__(self, db_connector, idle_minutes=None, min_messages=3, watermark=INITIAL_WATERMARK):
+        if idle_minutes is None:
+            idle_minutes = int(os.getenv("KNOWLEDGE_IDLE_MINUTES", "10"))
+        self.db_connector = db_connector
+        self.idle = timedelta(minutes=idle_minutes)
+        self.min_messages = min_messages
+        self.watermark = watermark
+        self._carried_over = deque()
+        self._lock = threading.Lock()
+
+
+    def poll(self, now=None):
+        now = now or datetime.now()
+        cutoff = now - self.idle
+        watermark = cutoff.strftime(TIMESTAMP_FORMAT)
+        rows = self.db_connector.query_message_log_changes(self.watermark)
+        if not isinstance(rows, list):
+            logger.error(f"Knowledge change feed query failed: {rows}")
+            rows = []
+            watermark = self.watermark
+        with self._lock:
+            carried_over = list(self._carried_over)
+            self._carried_over.clear()
+
+        threads = carried_over
+        seen = {t["THREAD_ID"] for t in threads}
+        latest_activity = None
+        for row in rows:
+            timestamp = _parse_timestamp(row["TIMESTAMP"])
+            if timestamp is None:
+                continue
+            if latest_activity is None or timestamp > latest_activity:
+                latest_activity = timestamp
+            # threads that are still active have rows newer than the cutoff, so a later poll finds them again
+            if timestamp >= cutoff or row["THREAD_ID"] in seen or (row.get("MESSAGE_COUNT") or 0) <= self.min_messages:
+                continue
+            seen.add(row["THREAD_ID"])
+            threads.append(row)
+        return FeedPoll(threads, watermark, latest_activity)
+
+
+    def commit(self, poll):
+        """Moves the high-water mark past a poll whose threads have all been queued."""
+        if poll.watermark > self.watermark:
+            self.watermark = poll.watermark
+
+
+    def carry_over(self, thread_id, timestamp, last_timestamp):
+        """Returns a thread with remaining unprocessed messages (after `last_timestamp`) to the next poll."""
+        with self._lock:
+            self._carried_over.append({"THREAD_ID": thread_id, "TIMESTAMP": timestamp,
+                                       "LAST_TIMESTAMP": format_timestamp(last_timestamp)})
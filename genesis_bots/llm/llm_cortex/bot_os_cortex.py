@@ -18,11 +18,13 @@ from decimal import Decimal
 from openai import OpenAI
 
 from genesis_bots.connectors.snowflake_connector.snowflake_connector import SnowflakeConnector
-from genesis_bots.core.bot_os_assistant_base import BotOsAssistantInterface, execute_function, get_tgt_pcnt
+from genesis_bots.core.bot_os_assistant_base import BotOsAssistantInterface, execute_function, get_tgt_pcnt, lookup_function
 
 from genesis_bots.core.logging_config import logger
 
 from genesis_bots.core.bot_os_input import BotOsInputMessage, BotOsOutputMessage
+from genesis_bots.core.bot_os_tool_scheduler import ToolCall, ToolCallScheduler
+from genesis_bots.llm.llm_cortex.cortex_thread_store import CortexThreadStore, ThreadBusyRegistry
 from genesis_bots.llm.llm_openai.openai_utils import get_openai_client
 
 
@@ -80,12 +82,13 @@ class BotOsAssistantSnowflakeCortex(BotOsAssistantInterface):
 
         # Initialize shared thread history for this bot name if needed
         if name not in self.__class__._shared_thread_history:
-            self.__class__._shared_thread_history[name] = {}
+            self.__class__._shared_thread_history[name] = CortexThreadStore()
         self.thread_history = self.__class__._shared_thread_history[name]
 
-        self.thread_busy_list = deque()
+        self.thread_busy_list = ThreadBusyRegistry()
 
         self.thread_full_response = {}
+        self.tool_scheduler = ToolCallScheduler()
 
 
 
@@ -184,40 +187,15 @@ class BotOsAssistantSnowflakeCortex(BotOsAssistantInterface):
 
             messages.append(messg)
 
-        self.thread_history[thread_id] = messages + orig_messages[-1:]
+        orig_messages.replace(messages + orig_messages[-1:])
         logger.info(f'bot={self.bot_id}, thread={thread_id}, deleted {count} messages, {total_bytes} bytes in messages now')
         return True
 
     def make_messages(self, thread_id):
-        '''convert thread_history list to messages suitable for Cortex API'''
+        '''convert thread_history list to messages suitable for Cortex API (consecutive user messages consolidated);
+        only the messages added since the last call are rendered, the rest comes from the thread's cached prompt'''
 
-        newarray = [{"role": message["message_type"], "content": message["content"]} for message in self.thread_history[thread_id]]
-        consolidated_array = []
-        current_user_content = []
-
-        for message in newarray:
-            if message["role"] == "user":
-                # Accumulate content from consecutive 'user' messages
-                current_user_content.append(message["content"])
-            else:
-                # If there are accumulated 'user' messages, consolidate them
-                if current_user_content:
-                    consolidated_array.append({
-                        "role": "user",
-                        "content": "\n".join(current_user_content)
-                    })
-                    current_user_content = []  # Reset after consolidation
-                # Append the non-'user' message as is
-                consolidated_array.append(message)
-
-        # After the loop, check if there are any remaining 'user' messages to consolidate
-        if current_user_content:
-            consolidated_array.append({
-                "role": "user",
-                "content": "\n".join(current_user_content)
-            })
-
-        return consolidated_array
+        return self.thread_history[thread_id].render()
 
     def cortex_rest_api(self,thread_id,message_metadata=None, event_callback=None, temperature=None, fast_mode=False):
 
@@ -327,7 +305,7 @@ class BotOsAssistantSnowflakeCortex(BotOsAssistantInterface):
                         return None
 
                     openai_model = os.getenv("OPENAI_O1_OVERRIDE_MODEL",os.getenv("OPENAI_MODEL_NAME","gpt-4o-2024-11-20"))
-                    newarray[0]['role'] = 'user'
+                    newarray[0] = dict(newarray[0], role='user')
                     logger.info(f'**** OpenaAI o1 override for bot {self.bot_id} using model: {openai_model}')
                     try:
                         client = get_openai_client(use_external=True)
@@ -435,7 +413,7 @@ class BotOsAssistantSnowflakeCortex(BotOsAssistantInterface):
                     response_string = str(vars(response))
                     msg += f"\nFull response dump:\n{response_string}"
                     logger.info(f"Cortex Error: {msg}")
-                    self.thread_history[thread_id] = [message for message in self.thread_history[thread_id] if not (message.get("role","") == "user" and message == last_user_message)]
+                    self.thread_history[thread_id].replace([message for message in self.thread_history[thread_id] if not (message.get("role","") == "user" and message == last_user_message)])
                     if True or BotOsAssistantSnowflakeCortex.stream_mode == True:
                         if self.event_callback:
                             chunk_size = 3000
@@ -679,9 +657,7 @@ class BotOsAssistantSnowflakeCortex(BotOsAssistantInterface):
                 "timestamp": timestamp.isoformat()
             }
 
-            if thread_id not in self.thread_history:
-                self.thread_history[thread_id] = []
-            self.thread_history[thread_id].append(message_object)
+            self.thread_history.get_or_create(thread_id).append(message_object)
 
             logger.info(f"Successfully inserted system prompt for thread_id: {thread_id}")
         except Exception as e:
@@ -772,20 +748,20 @@ class BotOsAssistantSnowflakeCortex(BotOsAssistantInterface):
             "metadata": message_metadata
         }
 
-        if thread_id not in self.thread_history:
-            self.thread_history[thread_id] = []
-            system_message_object = {
-                    "message_type": "system",
-                   "content": self.instructions,
-                   "timestamp": timestamp.isoformat()
-               }
-            self.thread_history[thread_id].append(system_message_object)
-        else:
-            # Update the first (system) message with current instructions
-            if self.thread_history[thread_id][0]["message_type"] == "system":
-                self.thread_history[thread_id][0]["content"] = self.instructions
-            
-        self.thread_history[thread_id].append(message_object)
+        thread = self.thread_history.get_or_create(thread_id)
+        with thread.lock:
+            if not thread:
+                system_message_object = {
+                        "message_type": "system",
+                       "content": self.instructions,
+                       "timestamp": timestamp.isoformat()
+                   }
+                thread.append(system_message_object)
+            else:
+                # Update the first (system) message with current instructions
+                thread.set_system_prompt(self.instructions)
+
+            thread.append(message_object)
 
         try:
 
@@ -814,22 +790,17 @@ class BotOsAssistantSnowflakeCortex(BotOsAssistantInterface):
             return
         thread_id = thread_to_check["thread_id"]
         timestamp = thread_to_check["timestamp"]
-        if thread_id in self.thread_busy_list:
-            logger.info(f"BotOsAssistantSnowflakeCortex:check_runs - skipping thread {thread_to_check['thread_id']} as its busy in another run")
-            return
         output = None
         if True:
-            if thread_id not in self.thread_busy_list:
-                self.thread_busy_list.append(thread_id)
-            else:
+            if not self.thread_busy_list.try_acquire(thread_id):
                 logger.info(f"BotOsAssistantSnowflakeCortex:check_runs - skipping thread {thread_to_check['thread_id']} as its busy in another run")
                 return
             logger.info(f"BotOsAssistantSnowflakeCortex:check_runs - running now, thread {thread_id} ts {timestamp} ")
 
-            thread = self.thread_history.get(thread_id, [])
-            user_message = next((msg for msg in thread if (msg.get("message_type") == "user" or msg.get("message_type") == "ipython") and msg.get("timestamp") == timestamp.isoformat()), None)
-            # This line searches for the last message in the thread that is of type "assistant" and has a timestamp matching the given timestamp.
-            assistant_message = next((msg for msg in reversed(thread) if msg.get("message_type") == "assistant" and msg.get("timestamp") == timestamp.isoformat()), None)
+            thread = self.thread_history.get_or_create(thread_id)
+            user_message = thread.find(timestamp.isoformat(), ("user", "ipython"))
+            # the last assistant message of the thread with the given timestamp
+            assistant_message = thread.find(timestamp.isoformat(), ("assistant",), last=True)
             if assistant_message:
                 message_payload = assistant_message.get("content")
               #  logger.info(f"Assistant message found: {message_payload}")
@@ -918,8 +889,7 @@ class BotOsAssistantSnowflakeCortex(BotOsAssistantInterface):
                                                                     channel_type=message_metadata_json.get("channel_type", None), channel_name=message_metadata_json.get("channel", None),
                                                                     primary_user=primary_user)
 
-        if thread_id in self.thread_busy_list:
-            self.thread_busy_list.remove(thread_id)
+        self.thread_busy_list.release(thread_id)
 
     def process_tool_call(self, thread_id, timestamp, message_payload, message_metadata):
         import json
@@ -987,6 +957,11 @@ class BotOsAssistantSnowflakeCortex(BotOsAssistantInterface):
             tool_type = 'markup'
 
         tool_call_str = message_payload[start_index:end_index].strip()
+        if tool_type == 'markup':
+            multiple_calls = self._parse_markup_tool_calls(message_payload)
+            if len(multiple_calls) > 1:
+                self._process_multiple_tool_calls(thread_id, timestamp, multiple_calls, message_metadata)
+                return
         try:
             if tool_type == 'markup':
                 function_call_str = message_payload[start_index:end_index].strip()
@@ -1045,7 +1020,8 @@ class BotOsAssistantSnowflakeCortex(BotOsAssistantInterface):
 #              execute_function(func_name, func_args, self.all_functions, callback_closure,
 #                                       thread_id = thread_id, bot_id=self.bot_id, status_update_callback=event_callback if event_callback else None, session_id=self.assistant.id if self.assistant.id is not None else None, input_metadata=run.metadata if run.metadata is not None else None )#, dispatch_task_callback=dispatch_task_callback)
 
-            execute_function(function_to_call, json.dumps(arguments), self.available_functions, cb_closure, thread_id, self.bot_id)
+            func_response = self._run_tool_calls(thread_id, timestamp, [func_call_details])[0]
+            cb_closure(func_response)
         except json.JSONDecodeError as e:
             logger.info(f"Failed to decode tool call JSON: {e}")
             cb_closure = self._generate_callback_closure(thread_id, timestamp, message_metadata)
@@ -1055,6 +1031,41 @@ class BotOsAssistantSnowflakeCortex(BotOsAssistantInterface):
             cb_closure(f"Error processing tool call: {e}")
 
 
+    @staticmethod
+    def _parse_markup_tool_calls(message_payload):
+        """Returns func_call_details for every well-formed <function=name>{...}</function> call in the payload."""
+        func_calls = []
+        for match in re.finditer(r'<function=([^>]+)>(.*?)</function>', message_payload, re.DOTALL):
+            arguments_str = match.group(2).strip().replace('\\\\"', '\\"')
+            if arguments_str.endswith('>'):
+                arguments_str = arguments_str[:-1]
+            try:
+                arguments = json.loads(arguments_str) if arguments_str else {}
+            except json.JSONDecodeError:
+                return []  # let the single-call path report the malformed call
+            func_calls.append({"function_name": match.group(1), "arguments": arguments})
+        return func_calls
+
+
+    def _process_multiple_tool_calls(self, thread_id, timestamp, func_calls, message_metadata):
+        """Runs several tool calls of one response concurrently and submits their results together, in call order."""
+        meta = json.loads(message_metadata)
+        primary_user = json.dumps({'user_id': meta.get('user_id', 'unknown_id'),
+                                   'user_name': meta.get('user_name', 'unknown_name'),
+                                   'user_email': meta.get('user_email', 'unknown_email')})
+        for details in func_calls:
+            logger.info(f"Function to call: {details['function_name']}")
+            self.log_db_connector.insert_chat_history_row(datetime.datetime.now(), bot_id=self.bot_id, bot_name=self.bot_name, thread_id=thread_id,
+                                                          message_type='Tool Call', message_payload=details['function_name']+"("+json.dumps(details['arguments'])+")",
+                                                          message_metadata={'func_name': details['function_name'], 'func_args': details['arguments']},
+                                                          channel_type=meta.get("channel_type", None), channel_name=meta.get("channel", None),
+                                                          primary_user=primary_user)
+        responses = self._run_tool_calls(thread_id, timestamp, func_calls)
+        results = [{"function": details['function_name'], "result": response} for details, response in zip(func_calls, responses)]
+        cb_closure = self._generate_callback_closure(thread_id, timestamp, message_metadata, func_call_details=func_calls)
+        cb_closure(results)
+
+
     def _submit_tool_outputs(self, thread_id, timestamp, results, message_metadata, func_call_details=None):
         """
         Inserts tool call results back into the genesis_test.public.genesis_threads table.
@@ -1135,29 +1146,17 @@ class BotOsAssistantSnowflakeCortex(BotOsAssistantInterface):
             results_json = results  # Fallback to original results if JSON decoding fails
         if isinstance(results, dict) and 'success' in results and results['success']:
             logger.info(f"Tool call was successful for Thread ID {thread_id}")
-        if func_call_details is not None:
+        if isinstance(func_call_details, list):
+            # several tool calls of one turn, submitted together; results_json is a list in call order
+            function_name = ', '.join(d.get('function_name') or '' for d in func_call_details)
+            arguments = [d.get('arguments') for d in func_call_details]
+            for details, call_result in zip(func_call_details, results_json):
+                self._apply_tool_call_side_effects(thread_id, details, call_result.get('result'), message_object)
+        elif func_call_details is not None:
             function_name = func_call_details.get('function_name')
-            if function_name == '_run_process':
-                message_object['process_flag'] = 'TRUE'
-            if function_name == '_run_process':
-                if isinstance(results_json, dict) and ('success' in results_json and results_json['success']) or ('Success' in results_json and results_json['Success']):
-                    if thread_id in self.thread_tool_call_counter:
-                        del self.thread_tool_call_counter[thread_id]
-            if function_name in ['remove_tools_from_bot','add_new_tools_to_bot', 'add_bot_files', 'update_bot_instructions', 'remove_bot_files']:
-                try:
-                    results_json = json.loads(results)
-                    if ('success' in results_json and results_json['success']) or ('Success' in results_json and results_json['Success']):
-                        if func_call_details and 'arguments' in func_call_details:
-                            arguments = func_call_details['arguments']
-                            if 'bot_id' in arguments:
-                                bot_id = arguments['bot_id']
-                                os.environ[f'RESET_BOT_SESSION_{bot_id}'] = 'True'
-                except:
-                    pass
-
-        if thread_id not in self.thread_history:
-            self.thread_history[thread_id] = []
-        self.thread_history[thread_id].append(message_object)
+            arguments = self._apply_tool_call_side_effects(thread_id, func_call_details, results_json, message_object)
+
+        self.thread_history.get_or_create(thread_id).append(message_object)
 
         if isinstance(results_json, str) and results_json.strip() == "Error, your query was cut off.  Query must be complete and end with a semicolon.  Include the full query text, with an ; on the end and RUN THIS TOOL AGAIN NOW! Also replace all ' (single quotes) in the query with <!Q!>":
             hightemp = 0.6
@@ -1182,6 +1181,67 @@ class BotOsAssistantSnowflakeCortex(BotOsAssistantInterface):
         return
 
 
+    def _apply_tool_call_side_effects(self, thread_id, func_call_details, results_json, message_object):
+        """Bookkeeping after a tool call (process runs, bot tool/instruction changes). Returns the logged arguments."""
+        arguments = ''
+        function_name = func_call_details.get('function_name')
+        if isinstance(results_json, str):
+            try:
+                results_json = json.loads(results_json)
+            except json.JSONDecodeError:
+                pass
+        if function_name == '_run_process':
+            message_object['process_flag'] = 'TRUE'
+        if function_name == '_run_process':
+            if isinstance(results_json, dict) and ('success' in results_json and results_json['success']) or ('Success' in results_json and results_json['Success']):
+                if thread_id in self.thread_tool_call_counter:
+                    del self.thread_tool_call_counter[thread_id]
+        if function_name in ['remove_tools_from_bot','add_new_tools_to_bot', 'add_bot_files', 'update_bot_instructions', 'remove_bot_files']:
+            try:
+                if ('success' in results_json and results_json['success']) or ('Success' in results_json and results_json['Success']):
+                    if func_call_details and 'arguments' in func_call_details:
+                        arguments = func_call_details['arguments']
+                        if 'bot_id' in arguments:
+                            bot_id = arguments['bot_id']
+                            os.environ[f'RESET_BOT_SESSION_{bot_id}'] = 'True'
+            except:
+                pass
+        return arguments
+
+
+    def _run_tool_calls(self, thread_id, timestamp, func_calls):
+        """
+        Runs the tool calls of one turn (a list of func_call_details dicts) through the ToolCallScheduler, concurrently
+        when there are several, and returns their responses in call order.
+        """
+        def make_tool_runner(function_name, arguments):
+            def run_tool():
+                response = None
+                def capture(resp):
+                    nonlocal response
+                    response = resp
+                execute_function(function_name, json.dumps(arguments), self.available_functions, capture, thread_id, self.bot_id)
+                return response
+            return run_tool
+
+        calls = [ToolCall(f"{thread_id}_{timestamp}_{i}", d['function_name'], make_tool_runner(d['function_name'], d['arguments']),
+                          func=lookup_function(self.available_functions, d['function_name'])[1])
+                 for i, d in enumerate(func_calls)]
+        stopped = lambda: thread_id in self.last_stop_time_map and timestamp < self.last_stop_time_map[thread_id]
+        responses = []
+        for outcome in self.tool_scheduler.run(calls, should_cancel=stopped):
+            if outcome.cancelled:
+                responses.append(f"Tool call {outcome.func_name} was cancelled because the user stopped the thread.")
+            elif outcome.timed_out:
+                responses.append(f"Tool call {outcome.func_name} timed out and was abandoned; it may still complete in the background.")
+            elif outcome.error is not None:
+                logger.error(f"Error processing tool call {outcome.func_name}: {outcome.error}")
+                responses.append(f"Error processing tool call: {outcome.error}")
+            else:
+                responses.append(outcome.response)
+        return responses
+
+
     def _generate_callback_closure(self, thread_id, timestamp, message_metadata, func_call_details = None):
       def callback_closure(func_response):  # FixMe: need to break out as a generate closure so tool_call_id isn't copied
         #  try:
@@ -1202,15 +1262,13 @@ class BotOsAssistantSnowflakeCortex(BotOsAssistantInterface):
         Executes the SQL query to update threads based on the provided SQL, incorporating self.cortex... tables.
         """
 
-        if thread_id not in self.thread_busy_list:
-            self.thread_busy_list.append(thread_id)
+        self.thread_busy_list.mark_busy(thread_id)
 
   #      resp = self.cortex_rest_api(thread_id)
 
         resp = self.cortex_complete(thread_id=thread_id, message_metadata=message_metadata, event_callback=event_callback, temperature=temperature, fast_mode = fast_mode)
         if resp is None:
-            if thread_id in self.thread_busy_list:
-                self.thread_busy_list.remove(thread_id)
+            self.thread_busy_list.release(thread_id)
             return
 
         try:
@@ -1227,12 +1285,9 @@ class BotOsAssistantSnowflakeCortex(BotOsAssistantInterface):
             "timestamp": timestamp.isoformat(),
         }
 
-        if thread_id not in self.thread_history:
-            self.thread_history[thread_id] = []
-        self.thread_history[thread_id].append(message_object)
+        self.thread_history.get_or_create(thread_id).append(message_object)
 
-        if thread_id in self.thread_busy_list:
-            self.thread_busy_list.remove(thread_id)
+        self.thread_busy_list.release(thread_id)
         self.active_runs.append({"thread_id": thread_id, "timestamp": timestamp})
 
         return
@@ -0,0 +1,192 @@
+"""
+In-memory thread store of BotOsAssistantSnowflakeCortex.
+
+A CortexThread holds the messages of one thread (dicts with message_type, content, timestamp, ...) and keeps
+  * an index from timestamp to messages, so check_runs finds the user message and the assistant reply of a run
+    without scanning the thread, and
+  * the Cortex prompt rendered so far (consecutive user messages consolidated), so each turn only renders the
+    messages appended since the previous one.
+Appends are the common case and keep both up to date; pop(), replace() and set_system_prompt() adjust them. Message
+dicts must not be modified after they are appended, except through those methods.
+
+ThreadBusyRegistry replaces the busy deque: a set of the threads with a run in progress, with an atomic try_acquire().
+"""
+
+import threading
+
+
+class CortexThread:
+
+    def __init__(self, messages=None):
+        self.lock = threading.RLock()
+        self._messages = []
+        self._by_timestamp = {}
+        self._reset_render()
+        for message in messages or ():
+            self.append(message)
+
+
+    def __len__(self):
+        return len(self._messages)
+
+
+    def __bool__(self):
+        return bool(self._messages)
+
+
+    def __iter__(self):
+        return iter(list(self._messages))
+
+
+    def __reversed__(self):
+        return reversed(list(self._messages))
+
+
+    def __getitem__(self, index):
+        return self._messages[index]
+
+
+    def append(self, message):
+        with self.lock:
+            self._messages.append(message)
+            self._by_timestamp.setdefault(message.get("timestamp"), []).append(message)
+
+
+    def pop(self):
+        """Removes and returns the last message."""
+        with self.lock:
+            message = self._messages.pop()
+            self._unindex(message)
+            if self._rendered_upto > len(self._messages):
+                # the message was rendered; a trailing user message is only in the open run, anything else re-renders
+                if message["message_type"] == "user" and self._pending_user:
+                    self._pending_user.pop()
+                    self._rendered_upto -= 1
+                else:
+                    self._reset_render()
+            return message
+
+
+    def replace(self, messages):
+        """Replaces all messages (e.g. after trimming the thread to fit the context window)."""
+        with self.lock:
+            self._messages = []
+            self._by_timestamp = {}
+            self._reset_render()
+            for message in messages:
+                self.append(message)
+
+
+    def set_system_prompt(self, content):
+        """Updates the content of the leading system message, if there is one."""
+        with self.lock:
+            if not self._messages or self._messages[0].get("message_type") != "system":
+                return
+            if self._messages[0]["content"] == content:
+                return
+            self._messages[0]["content"] = content
+            if self._rendered:
+                self._rendered[0] = {"role": "system", "content": content}
+
+
+    def find(self, timestamp, message_types, last=False):
+        """The first (or last) message of one of `message_types` with the given ISO `timestamp`, or None."""
+        with self.lock:
+            candidates = self._by_timestamp.get(timestamp, ())
+            if last:
+                candidates = reversed(candidates)
+            return next((m for m in candidates if m.get("message_type") in message_types), None)
+
+
+    def render(self):
+        """
+        The thread as Cortex API messages ({"role", "content"}), with consecutive user messages consolidated into one.
+        Returns a new list; the message dicts in it are shared with the cache and must not be modified.
+        """
+        with self.lock:
+            for message in self._messages[self._rendered_upto:]:
+                if message["message_type"] == "user":
+                    self._pending_user.append(message["content"])
+                    continue
+                self._close_user_run()
+                self._rendered.append({"role": message["message_type"], "content": message["content"]})
+            self._rendered_upto = len(self._messages)
+            rendered = list(self._rendered)
+            if self._pending_user:
+                rendered.append({"role": "user", "content": "\n".join(self._pending_user)})
+            return rendered
+
+
+    def _close_user_run(self):
+        if self._pending_user:
+            self._rendered.append({"role": "user", "content": "\n".join(self._pending_user)})
+            self._pending_user = []
+
+
+    def _reset_render(self):
+        self._rendered = []         # rendered messages of self._messages[:_rendered_upto], minus a trailing user run
+        self._pending_user = []     # contents of that trailing run of user messages
+        self._rendered_upto = 0
+
+
+    def _unindex(self, message):
+        same_ts = self._by_timestamp.get(message.get("timestamp"), [])
+        for i in range(len(same_ts) - 1, -1, -1):
+            if same_ts[i] is message:
+                del same_ts[i]
+                break
+        if not same_ts:
+            self._by_timestamp.pop(message.get("timestamp"), None)
+
+
+class CortexThreadStore(dict):
+    """Maps thread_id to CortexThread. Shared by the assistants of a bot name."""
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+
+
+    def get_or_create(self, thread_id):
+        thread = self.get(thread_id)
+        if thread is None:
+            with self._lock:
+                thread = self.get(thread_id)
+                if thread is None:
+                    thread = self[thread_id] = CortexThread()
+        return thread
+
+
+class ThreadBusyRegistry:
+    """Threads with a Cortex run in progress."""
+
+    def __init__(self):
+        self._busy = set()
+        self._lock = threading.Lock()
+
+
+    def __contains__(self, thread_id):
+        return thread_id in self._busy
+
+
+    def __len__(self):
+        return len(self._busy)
+
+
+    def try_acquire(self, thread_id):
+        """Marks the thread busy; returns False if it already was."""
+        with self._lock:
+            if thread_id in self._busy:
+                return False
+            self._busy.add(thread_id)
+            return True
+
+
+    def mark_busy(self, thread_id):
+        with self._lock:
+            self._busy.add(thread_id)
+
+
+    def release(self, thread_id):
+        with self._lock:
+            self._busy.discard(thread_id)
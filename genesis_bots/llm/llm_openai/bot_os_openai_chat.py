@@ -13,11 +13,14 @@ from typing_extensions import override
 import traceback
 
 from genesis_bots.core import global_flags
-from genesis_bots.core.bot_os_assistant_base import BotOsAssistantInterface, execute_function
+from genesis_bots.core.bot_os_assistant_base import BotOsAssistantInterface, execute_function, lookup_function
 from genesis_bots.core.bot_os_input import BotOsInputMessage, BotOsOutputMessage
+from genesis_bots.core.bot_os_thread_messages import ThreadFileStore
+from genesis_bots.core.bot_os_tool_scheduler import ToolCall, ToolCallScheduler
 from genesis_bots.core.bot_os_defaults import BASE_BOT_INSTRUCTIONS_ADDENDUM, BASE_BOT_DB_CONDUCT_INSTRUCTIONS,BASE_BOT_PROCESS_TOOLS_INSTRUCTIONS,BASE_BOT_SLACK_TOOLS_INSTRUCTIONS
 from genesis_bots.llm.llm_openai.openai_utils import get_openai_client
 from genesis_bots.core.logging_config import logger
+from genesis_bots.connectors.bot_heartbeats import get_heartbeat_registry
 
 thread_local = ThreadLocal()
 
@@ -26,9 +29,7 @@ class BotOsAssistantOpenAIChat(BotOsAssistantInterface):
 
     _shared_done_map = {}  # Maps bot names to their completed runs
     _shared_tool_failure_map = {}  # Maps run hashes to failure counts and timestamps
-
-    # Class-level timestamp for all instances to share
-    _last_bots_active_update = datetime.datetime.now() - datetime.timedelta(minutes=1)
+    _tool_failure_lock = Lock()
 
     def __init__(self, name:str, instructions:str,
                  tools:list[dict] = None, available_functions=None, files=None,
@@ -86,6 +87,7 @@ class BotOsAssistantOpenAIChat(BotOsAssistantInterface):
         if name not in self.__class__._shared_tool_failure_map:
             self.__class__._shared_tool_failure_map[name] = {}
         self.tool_failure_map = self.__class__._shared_tool_failure_map[name]
+        self.tool_scheduler = ToolCallScheduler()
 
     @override
     def is_active(self) -> deque:
@@ -174,12 +176,11 @@ class BotOsAssistantOpenAIChat(BotOsAssistantInterface):
             try:
                 git_path = os.getenv('GIT_PATH', os.path.join(os.getcwd(), 'bot_git'))
                 storage_file = os.path.join(git_path, 'threads', self.bot_id, f"{new_thread_id}.json")
-                if os.path.exists(storage_file):
-                    with open(storage_file, 'r') as f:
-                        thread_data = json.load(f)
-                        bot_os_thread.messages = thread_data.get('messages', [])
-                        bot_os_thread.fast_mode = thread_data.get('fast_mode', False)
-                        bot_os_thread.run_messg_count = thread_data.get('run_messg_count', 0)
+                thread_data = ThreadFileStore(storage_file).load()
+                if thread_data is not None:
+                    bot_os_thread.messages = thread_data.get('messages', [])
+                    bot_os_thread.fast_mode = thread_data.get('fast_mode', False)
+                    bot_os_thread.run_messg_count = thread_data.get('run_messg_count', 0)
                     input_message.msg = f"SYSTEM MESSAGE: Switched to existing thread {new_thread_id}. " + input_message.msg
                     logger.info(f"{self.bot_name} loaded existing thread {new_thread_id}")
                 else:
@@ -285,7 +286,8 @@ class BotOsAssistantOpenAIChat(BotOsAssistantInterface):
                 }
             ]
             bot_os_thread.messages = openai_messages
-            
+            openai_messages = bot_os_thread.messages
+
         openai_messages[0]["content"] = self.instructions
         return openai_messages
 
@@ -539,7 +541,9 @@ class BotOsAssistantOpenAIChat(BotOsAssistantInterface):
                          session_id=self.assistant.id if self.assistant.id is not None else None,
                          input_metadata=run.metadata if run.metadata is not None else None, run_id = run.id)
 
-        func_response = self.decode_tool_response(run, thread_id, func_name, func_args, func_response)
+        # tool calls of one turn complete concurrently; the failure map is shared by all threads of this bot
+        with self._tool_failure_lock:
+            func_response = self.decode_tool_response(run, thread_id, func_name, func_args, func_response)
         self.postprocess_tool_response(func_name, func_args, func_response)
         return func_response
 
@@ -683,26 +687,20 @@ class BotOsAssistantOpenAIChat(BotOsAssistantInterface):
             if output_stream:
                 output_event(status=run.status, output=output_stream + " 💬", messages=None)
 
-            results = []
-            for tool_call in tool_calls:
-                func_name = tool_call['function']['name']
-                func_args = tool_call['function']['arguments']
-                tool_call_id = tool_call['id']
-
-                if bot_os_thread.stop_signal:
-                    logger.info(f'bot={self.bot_id} {thread_id=} received stop signal')
-                    run.status = 'completed'
-                    run.completed_at = datetime.datetime.now()
-                    self.send_response_to_user(run, thread_id, output_stream + f'..stopped!', model_name,
-                                               chat_history, output_event, bot_os_thread=bot_os_thread)
-                    break
-
-                output_stream = self.record_tool_call(run, thread_id, func_name, func_args, tool_call_id,
-                                                      output_stream, chat_history, output_event, bot_os_thread=bot_os_thread)
+            if bot_os_thread.stop_signal:
+                logger.info(f'bot={self.bot_id} {thread_id=} received stop signal')
+                run.status = 'completed'
+                run.completed_at = datetime.datetime.now()
+                self.send_response_to_user(run, thread_id, output_stream + f'..stopped!', model_name,
+                                           chat_history, output_event, bot_os_thread=bot_os_thread)
+                break
 
-                # tool function may use below callback to update user on its progress
-                def status_callback(session_id, update_message):
-                    nonlocal output_stream, run
+            # tool functions may use below callback to update user on their progress; calls of one turn run
+            # concurrently, so updates are serialized
+            status_lock = Lock()
+            def status_callback(session_id, update_message):
+                nonlocal output_stream, run
+                with status_lock:
                     if output_stream.endswith('\n'):
                         output_stream += "\n"
                     else:
@@ -715,22 +713,56 @@ class BotOsAssistantOpenAIChat(BotOsAssistantInterface):
                     output_event(status=run.status, output=output_stream + msg + " 💬", messages=None)
                     output_stream += msg + '\n'
 
-                # pass bot_os_thread to tool function in thread_local_storage
-                thread_local.bot_os_thread = bot_os_thread
+            def make_tool_runner(func_name, func_args, tool_call_id):
+                def run_tool():
+                    # pass bot_os_thread to tool function in thread_local_storage (of the thread running the tool)
+                    thread_local.bot_os_thread = bot_os_thread
+                    return self.run_tool_function(run, thread_id, func_name, func_args, tool_call_id, status_callback)
+                return run_tool
 
-                try:
-                    func_response = self.run_tool_function(run, thread_id, func_name, func_args, tool_call_id, status_callback)
-                except Exception as e:
-                    logger.error(f'bot={self.bot_id} {thread_id=}: error making tool call:\n{traceback.format_exc()}')
+            calls = []
+            for tool_call in tool_calls:
+                func_name = tool_call['function']['name']
+                func_args = tool_call['function']['arguments']
+                tool_call_id = tool_call['id']
+
+                output_stream = self.record_tool_call(run, thread_id, func_name, func_args, tool_call_id,
+                                                      output_stream, chat_history, output_event, bot_os_thread=bot_os_thread)
+                calls.append(ToolCall(tool_call_id, func_name, make_tool_runner(func_name, func_args, tool_call_id),
+                                      func=lookup_function(self.all_functions, func_name)[1]))
+
+            # independent tool calls of this turn run concurrently; outcomes come back in tool_call_id order
+            outcomes = self.tool_scheduler.run(calls, should_cancel=lambda: bot_os_thread.stop_signal)
+
+            results = []
+            for outcome in outcomes:
+                if outcome.cancelled:
+                    logger.info(f'bot={self.bot_id} {thread_id=} received stop signal')
+                    run.status = 'completed'
+                    run.completed_at = datetime.datetime.now()
+                    self.send_response_to_user(run, thread_id, output_stream + f'..stopped!', model_name,
+                                               chat_history, output_event, bot_os_thread=bot_os_thread)
+                    break
+
+                if outcome.error is not None:
+                    e = outcome.error
+                    logger.error(f'bot={self.bot_id} {thread_id=}: error making tool call:\n'
+                                 f'{"".join(traceback.format_exception(type(e), e, e.__traceback__))}')
                     run.status = 'completed'
                     run.completed_at = datetime.datetime.now()
                     self.send_response_to_user(run, thread_id, output_stream + f'\nError making tool call: {str(e)}', model_name,
                                                chat_history, output_event, bot_os_thread=bot_os_thread)
-                    break       
+                    break
+
+                if outcome.timed_out:
+                    func_response = {"success": False,
+                                     "error": f"Tool call {outcome.func_name} timed out and was abandoned; it may still complete in the background."}
+                else:
+                    func_response = outcome.response
 
-                bot_os_thread.messages.append({"role": "tool", "tool_call_id": tool_call_id, "content": str(func_response)})
+                bot_os_thread.messages.append({"role": "tool", "tool_call_id": outcome.tool_call_id, "content": str(func_response)})
 
-                results.append((tool_call_id, str(func_response)))
+                results.append((outcome.tool_call_id, str(func_response)))
                 continue # to next tool call
 
             if run.status == 'completed':
@@ -844,31 +876,10 @@ class BotOsAssistantOpenAIChat(BotOsAssistantInterface):
             return False
 
     def update_bots_active_table(self):
-        """Update bots active table at most once per minute"""
+        """Records a liveness heartbeat of this bot, written to BOT_HEARTBEATS in the background"""
         if not global_flags.multibot_mode:
             return
-
-        current_time = datetime.datetime.now()
-        
-        # Simple timestamp check without locking
-        if (current_time - self.__class__._last_bots_active_update).total_seconds() < 60:
-            return
-            
-        self.__class__._last_bots_active_update = current_time
-
-        try:
-            timestamp_str = self.get_current_time_with_timezone()
-            create_bots_active_table_query = f"""
-            CREATE OR REPLACE TABLE {self.schema}.bots_active ("{timestamp_str}" STRING);
-            """
-            
-            cursor = self.log_db_connector.connection.cursor()
-            cursor.execute(create_bots_active_table_query)
-            self.log_db_connector.connection.commit()
-            logger.debug(f"Table {self.schema}.bots_active updated with timestamp: {timestamp_str}")
-        except Exception as e:
-            logger.debug(f"Failed to update bots_active table: {e}")
-        finally:
-            if cursor:
-                cursor.close()
+        registry = get_heartbeat_registry(self.log_db_connector)
+        if registry is not None:
+            registry.beat(self.bot_id)
 
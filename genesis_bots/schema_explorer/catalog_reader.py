@@ -0,0 +1,190 @@
+"""
+Bulk catalog reads for the harvester.
+
+Step 1 of a harvest needs the DDL, DDL hash and column list of every new or changed object. Fetching them per
+object costs two or three catalog round trips each, which dominates harvesting schemas with thousands of tables.
+CatalogReader reads the columns of all objects in the harvested schemas of a database with a single
+information_schema (or equivalent) query, builds the DDL and its hash in memory, and keeps the result for the rest of
+the harvest run, so every further schema of the same database is served from memory.
+
+Dialects without a bulk query, and views whose DDL is their definition rather than a column list, fall back to the
+per-object queries of SchemaExplorer.
+"""
+
+import hashlib
+import threading
+
+from   genesis_bots.core.logging_config \
+                                import logger
+
+# Every query returns one row per column, ordered by object and ordinal position, with the columns table_schema,
+# table_name, column_name, data_type, character_maximum_length, numeric_precision, numeric_scale, is_nullable
+# ('YES'/'NO'), column_default and comment, plus an optional native ddl of the object (and, for Snowflake,
+# datetime_precision). Placeholders: !database_name! and !schema_names! (a list of quoted string literals).
+BULK_CATALOG_QUERIES = {
+    'snowflake': """
+        SELECT table_schema, table_name, column_name, data_type, character_maximum_length, numeric_precision,
+               numeric_scale, is_nullable, column_default, comment, datetime_precision
+        FROM "!database_name!".INFORMATION_SCHEMA.COLUMNS
+        WHERE table_schema IN (!schema_names!)
+        ORDER BY table_schema, table_name, ordinal_position""",
+    'postgresql': """
+        SELECT table_schema, table_name, column_name, data_type, character_maximum_length, numeric_precision,
+               numeric_scale, is_nullable, column_default, NULL AS comment
+        FROM information_schema.columns
+        WHERE table_catalog = '!database_name!' AND table_schema IN (!schema_names!)
+        ORDER BY table_schema, table_name, ordinal_position""",
+    'redshift': """
+        SELECT table_schema, table_name, column_name, data_type, character_maximum_length, numeric_precision,
+               numeric_scale, is_nullable, column_default, remarks AS comment
+        FROM svv_columns
+        WHERE table_catalog = '!database_name!' AND table_schema IN (!schema_names!)
+        ORDER BY table_schema, table_name, ordinal_position""",
+    'mysql': """
+        SELECT table_schema AS table_schema, table_name AS table_name, column_name AS column_name,
+               column_type AS data_type, NULL AS character_maximum_length, NULL AS numeric_precision,
+               NULL AS numeric_scale, is_nullable AS is_nullable, column_default AS column_default,
+               column_comment AS comment
+        FROM information_schema.columns
+        WHERE table_schema IN (!schema_names!)
+        ORDER BY table_schema, table_name, ordinal_position""",
+    # sqlite keeps the DDL of tables and views itself; it is the same text the per-object get_ddl query returns
+    'sqlite': """
+        SELECT 'main' AS table_schema, m.name AS table_name, p.name AS column_name, p.type AS data_type,
+               NULL AS character_maximum_length, NULL AS numeric_precision, NULL AS numeric_scale,
+               CASE WHEN p."notnull" THEN 'NO' ELSE 'YES' END AS is_nullable, p.dflt_value AS column_default,
+               NULL AS comment, m.sql AS ddl
+        FROM sqlite_master m JOIN pragma_table_info(m.name) p
+        WHERE m.type IN ('table', 'view') AND m.name NOT LIKE 'sqlite_%'
+        ORDER BY m.name, p.cid""",
+}
+
+_PRECISION_TYPES = ('NUMBER', 'NUMERIC', 'DECIMAL')
+
+# INFORMATION_SCHEMA data types of Snowflake as DESCRIBE TABLE spells them (length/precision are added to these)
+_SNOWFLAKE_DESCRIBE_TYPES = {'TEXT': 'VARCHAR', 'REAL': 'FLOAT', 'DOUBLE': 'FLOAT', 'DOUBLE PRECISION': 'FLOAT'}
+_SNOWFLAKE_DATETIME_TYPES = ('TIME', 'TIMESTAMP_NTZ', 'TIMESTAMP_LTZ', 'TIMESTAMP_TZ')
+
+
+def ddl_hash(ddl):
+    return hashlib.sha256(ddl.encode()).hexdigest()
+
+
+def _quote_literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _column_type(row):
+    data_type = row['data_type'] or ''
+    if row.get('character_maximum_length'):
+        return f"{data_type}({int(row['character_maximum_length'])})"
+    if (data_type.upper() in _PRECISION_TYPES and row.get('numeric_precision') is not None
+            and row.get('numeric_scale') is not None):
+        return f"{data_type}({int(row['numeric_precision'])},{int(row['numeric_scale'])})"
+    return data_type
+
+
+def _snowflake_column_type(row):
+    """The TYPE column of DESCRIBE TABLE, e.g. VARCHAR(16777216), NUMBER(38,0), TIMESTAMP_NTZ(9)."""
+    data_type = (row['data_type'] or '').upper()
+    data_type = _SNOWFLAKE_DESCRIBE_TYPES.get(data_type, data_type)
+    if data_type in ('VARCHAR', 'BINARY') and row.get('character_maximum_length'):
+        return f"{data_type}({int(row['character_maximum_length'])})"
+    if data_type == 'NUMBER' and row.get('numeric_precision') is not None:
+        return f"NUMBER({int(row['numeric_precision'])},{int(row.get('numeric_scale') or 0)})"
+    if data_type in _SNOWFLAKE_DATETIME_TYPES:
+        precision = row.get('datetime_precision')
+        return f"{data_type}({9 if precision is None else int(precision)})"
+    return data_type
+
+
+def build_ddl(qualified_table_name, column_rows, dialect=None):
+    """
+    A CREATE TABLE statement from catalog column rows, in the format of the connectors' alt_get_ddl, so objects
+    harvested before keep their DDL hash. For Snowflake that is the DESCRIBE TABLE based alt_get_ddl of the Snowflake
+    connector: DESCRIBE type names, and no NOT NULL (its NULL? column is a 'Y'/'N' string, which alt_get_ddl reads as
+    always nullable) nor key clauses (it looks them up under keys DESCRIBE does not return).
+    """
+    snowflake = dialect == 'snowflake'
+    ddl_statement = "CREATE TABLE " + qualified_table_name + " (\n"
+    for row in column_rows:
+        nullable = " NOT NULL" if not snowflake and str(row.get('is_nullable') or 'YES').upper() == 'NO' else ""
+        default = f" DEFAULT {row['column_default']}" if row.get('column_default') is not None else ""
+        comment = f" COMMENT '{row['comment']}'" if row.get('comment') else ""
+        column_type = _snowflake_column_type(row) if snowflake else _column_type(row)
+        ddl_statement += f"    {row['column_name']} {column_type}{nullable}{default}{comment},\n"
+    return ddl_statement.rstrip(',\n') + "\n);"
+
+
+class CatalogReader:
+    """
+    Per-harvest-run cache of bulk catalog reads, keyed by (source_name, database_name). Thread-safe; concurrent calls
+    for the same database share one read.
+
+    :param run_query: (dataset, sql) -> list of row dicts; raises on failure.
+    """
+
+    def __init__(self, run_query):
+        self.run_query = run_query
+        self.query_count = 0
+        self._databases = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+
+    def get_schema(self, dataset, dialect, schema_names=None):
+        """
+        The objects of `dataset`'s schema as {table_name: {'columns', 'ddl', 'ddl_hash', 'native_ddl'}}, or None when
+        the dialect has no bulk query or the catalog could not be read (callers then use the per-object queries).
+
+        The first call for a database reads all of `schema_names` (default: just this schema) in one query.
+        """
+        key = (dataset['source_name'], dataset['database_name'])
+        with self._lock:
+            database_lock = self._locks.setdefault(key, threading.Lock())
+        with database_lock:
+            if key not in self._databases:
+                schema_names = list(schema_names or [dataset['schema_name']])
+                if dataset['schema_name'] not in schema_names:
+                    schema_names.append(dataset['schema_name'])
+                self._databases[key] = self._read_database(dataset, (dialect or '').lower(), schema_names)
+            schemas = self._databases[key]
+        if schemas is None:
+            return None
+        return schemas.get(dataset['schema_name'], {})
+
+
+    def _read_database(self, dataset, dialect, schema_names):
+        sql = BULK_CATALOG_QUERIES.get(dialect)
+        if sql is None:
+            return None
+        sql = sql.replace('!database_name!', dataset['database_name'])
+        sql = sql.replace('!schema_names!', ', '.join(_quote_literal(s) for s in schema_names))
+        try:
+            with self._lock:
+                self.query_count += 1
+            rows = self.run_query(dataset, sql)
+        except Exception as e:
+            logger.info(f"Bulk catalog read of {dataset['source_name']}.{dataset['database_name']} failed, "
+                        f"using per-object catalog queries: {e}")
+            return None
+
+        column_rows = {}
+        for row in rows:
+            row = {k.lower(): v for k, v in row.items()}
+            column_rows.setdefault((row['table_schema'], row['table_name']), []).append(row)
+
+        schemas = {schema_name: {} for schema_name in schema_names}
+        for (schema_name, table_name), table_rows in column_rows.items():
+            native_ddl = table_rows[0].get('ddl')
+            qualified_name = f'"{dataset["database_name"]}"."{schema_name}"."{table_name}"'
+            ddl = native_ddl or build_ddl(qualified_name, table_rows, dialect)
+            schemas.setdefault(schema_name, {})[table_name] = {
+                'columns': [str(row['column_name']) for row in table_rows if row['column_name'] is not None],
+                'ddl': ddl,
+                'ddl_hash': ddl_hash(ddl),
+                'native_ddl': native_ddl is not None,
+            }
+        logger.info(f"Bulk catalog read of {dataset['source_name']}.{dataset['database_name']}: "
+                    f"{len(column_rows)} objects in {len(schema_names)} schemas")
+        return schemas
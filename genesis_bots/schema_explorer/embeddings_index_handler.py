@@ -14,106 +14,58 @@ from datetime import datetime
 from genesis_bots.core.logging_config import logger
 
 from genesis_bots.llm.llm_openai.openai_utils import get_openai_client
+from genesis_bots.schema_explorer.metadata_vector_index import IncrementalAnnoyIndex
+from genesis_bots.connectors.embedding_service import OpenAIEmbeddingProvider, get_embedding_service
+from genesis_bots.connectors.embedding_utils import DEFAULT_EMBEDDING_FETCH_BATCH_SIZE, embeddings_to_matrix, normalize_rows
+import numpy as np
 
 index_file_path = './tmp/'
 
 def fetch_embeddings_from_snow(table_id):
-    # Initialize Snowflake connector
-
-    # Initialize variables
-    batch_size = 100
-    offset = 0
-    total_fetched = 0
+    """
+    Returns (table_names, embeddings) for every harvested table, embeddings being a contiguous float32 matrix.
+    Rows are streamed with keyset pagination on qualified_table_name.
+    """
+    batch_size = int(os.getenv("EMBEDDING_FETCH_BATCH_SIZE", DEFAULT_EMBEDDING_FETCH_BATCH_SIZE))
+    if os.environ.get("CORTEX_MODE", 'False') == 'True':
+        embedding_column = 'embedding_native'
+    else:
+        embedding_column = 'embedding'
 
-    # Initialize lists to store results
-    embeddings = []
     table_names = []
+    values = []
 
-    # First, get the total number of rows to set up the progress bar
-    total_rows_query = f"SELECT COUNT(*) as total FROM {table_id}"
     emb_db_adapter = get_global_db_connector()
     cursor = emb_db_adapter.connection.cursor()
-   # logger.info('total rows query: ',total_rows_query)
-    cursor.execute(total_rows_query)
-    total_rows_result = cursor.fetchone()
-    total_rows = total_rows_result[0]
+    cursor.execute(f"SELECT COUNT(*) as total FROM {table_id} WHERE {embedding_column} IS NOT NULL")
+    total_rows = cursor.fetchone()[0]
 
+    last_table = None
     with tqdm(total=total_rows, desc="Fetching embeddings") as pbar:
         while True:
-            #TODO update to use embedding_native column if cortex mode
-            if os.environ.get("CORTEX_MODE", 'False') == 'True':
-                embedding_column = 'embedding_native'
-            else:
-                embedding_column = 'embedding'
-            # Modify the query to include LIMIT and OFFSET
-            query = f"SELECT qualified_table_name, {embedding_column} FROM {table_id} LIMIT {batch_size} OFFSET {offset}"
-#            logger.info('fetch query ',query)
-            cursor.execute(query)
+            query = f"SELECT qualified_table_name, {embedding_column} FROM {table_id} WHERE {embedding_column} IS NOT NULL"
+            params = None
+            if last_table is not None:
+                query += " AND qualified_table_name > %s"
+                params = (last_table,)
+            query += f" ORDER BY qualified_table_name LIMIT {batch_size}"
+            cursor.execute(query, params)
             rows = cursor.fetchall()
-
-            # Temporary lists to hold batch results
-            temp_embeddings = []
-            temp_table_names = []
-
-            for row in rows:
-                try:
-                    # Debug the raw string before parsing
-                    if len(embeddings) == 0:
-                        logger.info(f"Raw embedding string sample: {row[1][:100]}...")
-
-                    # Current problematic parsing
-                    # embedding = json.loads('['+row[1][5:-3]+']')
-
-                    # New safer parsing approach
-                    embedding_str = row[1]
-                    # Remove any 'array' prefix if present
-                    if embedding_str.lower().startswith('array['):
-                        embedding_str = embedding_str[6:-1]  # Remove 'array[' and final ']'
-                    elif embedding_str.startswith('['):
-                        embedding_str = embedding_str[1:-1]  # Remove outer brackets
-
-                    # Split and convert to float, handling scientific notation
-                    embedding = [float(x.strip()) for x in embedding_str.split(',')]
-
-                    # Verify the parsed values
-                    if len(embeddings) == 0:
-                        logger.info(f"First few parsed values: {embedding[:5]}")
-                        import numpy as np
-                        norm = np.linalg.norm(embedding)
-                        logger.info(f"Parsed embedding norm: {norm}")
-
-                    temp_embeddings.append(embedding)
-                    temp_table_names.append(row[0])
-
-                except Exception as e:
-                    logger.error(f"Error parsing embedding: {str(e)}")
-                    logger.error(f"Problematic row: {row[1][:100]}...")
-                    continue
-                  # Assuming qualified_table_name is the first column
-
-            # Check if the batch was empty and exit the loop if so
-            if not temp_embeddings:
+            if not rows:
                 break
-
-            # Append batch results to the main lists
-            embeddings.extend(temp_embeddings)
-            table_names.extend(temp_table_names)
-
-            # Update counters and progress bar
-            fetched = len(temp_embeddings)
-            total_fetched += fetched
-            pbar.update(fetched)
-
-            if fetched < batch_size:
-                # If less than batch_size rows were fetched, it's the last batch
+            for row in rows:
+                table_names.append(row[0])
+                values.append(row[1])
+            pbar.update(len(rows))
+            if len(rows) < batch_size:
                 break
-
-            # Increase the offset for the next batch
-            offset += batch_size
+            last_table = rows[-1][0]
 
     cursor.close()
- #   logger.info('table names ',table_names)
- #   logger.info('embeddings len ',len(embeddings))
+    embeddings, kept = embeddings_to_matrix(values)
+    if len(kept) != len(table_names):
+        logger.error(f"Skipped {len(table_names) - len(kept)} embeddings that could not be parsed")
+        table_names = [table_names[i] for i in kept]
     return table_names, embeddings
 
 
@@ -133,36 +85,32 @@ def load_embeddings_from_csv(csv_file_path):
 
 
 def create_annoy_index(embeddings, n_trees=10):
-    dimension = max(len(embedding) for embedding in embeddings)
+    embeddings = np.array(embeddings, dtype=np.float32)
+    dimension = embeddings.shape[1]
     logger.info(f"Creating Annoy index with dimension {dimension}")
 
     # Verify embeddings are normalized
-    import numpy as np
-    norms = [np.linalg.norm(emb) for emb in embeddings]
-    logger.info(f"Embedding norms min/max/mean: {min(norms):.3f}/{max(norms):.3f}/{np.mean(norms):.3f}")
+    norms = np.linalg.norm(embeddings, axis=1)
+    logger.info(f"Embedding norms min/max/mean: {norms.min():.3f}/{norms.max():.3f}/{norms.mean():.3f}")
 
-    if any(abs(n - 1.0) > 0.01 for n in norms):
+    if np.any(np.abs(norms - 1.0) > 0.01):
         logger.info("Some embeddings are not normalized!")
-        # Normalize embeddings
-        embeddings = [np.array(emb)/(1e-5+np.linalg.norm(emb)) for emb in embeddings]
+        normalize_rows(embeddings)
 
     index = AnnoyIndex(dimension, 'angular')
-    import random
     try:
         logger.info('starting i..')
         with tqdm(total=len(embeddings), desc="Indexing embeddings") as pbar:
             for i, embedding in enumerate(embeddings):
-              #  logger.info(i)
                 try:
                     index.add_item(i, embedding)
                 except Exception as e:
-                    logger.info('embedding ',i,' failed, exception: ',e,' skipping...')
+                    logger.info(f'embedding {i} failed, exception: {e} skipping...')
                 pbar.update(1)
             logger.info('index build real')
             index.build(n_trees)
     except Exception as e:
-        logger.info('indexing exception: ',e)
-    #logger.info('index 2 ',index)
+        logger.info(f'indexing exception: {e}')
     return index
 
 
@@ -175,14 +123,13 @@ def make_and_save_index(table_id, bot_id=None):
     logger.info(f"indexing {len(embeddings)} embeddings for bot {bot_id}...")
 
     if len(embeddings) == 0:
-        embeddings = []
         if os.environ.get("CORTEX_MODE", 'False') == 'True':
             embedding_size = 768
         else:
             embedding_size = 3072
-        embeddings.append( [0.0] * embedding_size)
+        embeddings = np.zeros((1, embedding_size), dtype=np.float32)
         table_names = ['empty_index']
-        logger.info("0 Embeddings found in database, saving a dummy index with size ",embedding_size," vectors")
+        logger.info(f"0 Embeddings found in database, saving a dummy index with size {embedding_size} vectors")
 
     try:
         annoy_index = create_annoy_index(embeddings)
@@ -240,12 +187,8 @@ def make_and_save_index(table_id, bot_id=None):
 def get_embedding(text):
     client = get_openai_client()
     #TODO if cortex mode use cortex
-    response = client.embeddings.create(
-        model="text-embedding-3-large",
-        input=text.replace("\n", " ")  # Replace newlines with spaces
-    )
-    embedding = response.data[0].embedding
-    return embedding
+    provider = OpenAIEmbeddingProvider(client, "text-embedding-3-large")
+    return get_embedding_service(provider).embed_one(text.replace("\n", " "))  # Replace newlines with spaces
 
 # Function to search and display results
 def search_and_display_results(search_term, annoy_index, metadata_mapping):
@@ -261,76 +204,72 @@ def search_and_display_results(search_term, annoy_index, metadata_mapping):
         logger.info(f"Match: {table_name}, Score: {idx[1]}")
 
 
-def load_or_create_embeddings_index(table_id, refresh=True, bot_id=None):
-
+def _get_embedding_size():
     # if cortex_mode then 768 else
     if os.environ.get("CORTEX_MODE", 'False') == 'True':
         embedding_size = 768
     else:
         embedding_size = 3072
 
-    if bot_id is None:
-        bot_id = 'default'
-
-    index_file_path = './tmp/'
-    # embedding_size = 3072
-
-    emb_db_adapter = get_global_db_connector()
-    index_file_name, meta_file_name = emb_db_adapter.generate_filename_from_last_modified(table_id, bot_id=bot_id)
-
     index_size_file = os.path.join(index_file_path, 'index_size.txt')
     if os.path.exists(index_size_file):
         with open(index_size_file, 'r') as f:
             embedding_size = int(f.read().strip())
-#        logger.info(f"Embedding size ({embedding_size}) read from {index_size_file}")
     # Set the EMBEDDING_SIZE environment variable
     os.environ['EMBEDDING_SIZE'] = str(embedding_size)
-   # logger.info(f"EMBEDDING_SIZE environment variable set to: {os.environ['EMBEDDING_SIZE']}")
-
-    annoy_index = AnnoyIndex(embedding_size, 'angular')
-
-  #  logger.info(f'loadtry  {os.path.join(index_file_path,index_file_name)}')
-    if os.path.exists(os.path.join(index_file_path,index_file_name)):
-        try:
-      #      logger.info(f'load  {index_file_path+index_file_name}')
-            try:
-                annoy_index.load(os.path.join(index_file_path,index_file_name))
-            except Exception as e:
-                logger.debug('Error on annoy_index.load: ',e)
-           # logger.info(f'index  now {annoy_index}')
-
-            # Load the metadata mapping
-       #     logger.info(f'load meta  {index_file_path+meta_file_name}')
-            with open(os.path.join(index_file_path,meta_file_name), 'r') as f:
-                metadata_mapping = json.load(f)
-          #      logger.info(f'metadata_mapping meta  {metadata_mapping}')
-          #      logger.info('metadata_mapping meta  ',metadata_mapping)
-
-            if refresh:
-                if not os.path.exists(index_file_path):
-                    os.makedirs(index_file_path)
-                # copy_index_file_name, copy_meta_file_name = f'latest_cached_index_{bot_id}.ann', f'latest_cached_metadata_{bot_id}.json'
-                # try:
-                #     annoy_index.save(os.path.join(index_file_path,copy_index_file_name))
-                # except Exception as e:
-                #     logger.debug('I cannot save save annoy index')
-                #     logger.debug(e)
-
-                # with open(os.path.join(index_file_path,copy_meta_file_name), 'w') as f:
-                #     json.dump(metadata_mapping, f)
-
-                #logger.info(f"Annoy Cache Manager: Existing certified fresh Annoy index copied to {index_file_path+copy_index_file_name}, {index_file_path+copy_meta_file_name}")
-            else:
-                pass
-                #logger.info(f'Annoy Cache Manager: Existing locally cached index {index_file_path+index_file_name} loaded (may be slightly stale).')
-
-        except OSError:
-         #   logger.error("Annoy Cache Manager: Refreshing locally cached Annoy index as Harvest Results table has changed due to harvester activity")
-            logger.info("Annoy Cache Manager: Refreshing locally cached Annoy index as Harvest Results table has changed due to harvester activity")
-            annoy_index, metadata_mapping = make_and_save_index(table_id, bot_id=bot_id)
+    return embedding_size
+
+
+def _save_embedding_size(embedding_size):
+    if not os.path.exists(index_file_path):
+        os.makedirs(index_file_path)
+    with open(os.path.join(index_file_path, 'index_size.txt'), 'w') as f:
+        f.write(str(embedding_size))
+    os.environ['EMBEDDING_SIZE'] = str(embedding_size)
+
+
+def sync_embeddings_index(index, table_id, bot_id, db_adapter=None):
+    """
+    Brings an IncrementalAnnoyIndex up to date with the harvest results table rows visible to `bot_id` (all rows
+    when `bot_id` is None, as for the shared index of MetadataSearchService).
+
+    Only rows whose LAST_CRAWLED_TIMESTAMP changed since the last sync are fetched and upserted, and rows that
+    disappeared are deleted. The index is compacted into a new base generation when the append segment gets large.
+    Returns the (possibly new) index object.
+    """
+    emb_db_adapter = db_adapter or get_global_db_connector()
+    source_token, _ = emb_db_adapter.generate_filename_from_last_modified(table_id, bot_id=bot_id)
+    if source_token == index.source_token and index.metadata_mapping:
+        return index
+
+    current_versions = emb_db_adapter.fetch_embedding_versions(table_id, bot_id)
+    removed = [k for k in index.versions if k not in current_versions]
+    if index.versions:
+        changed = [k for k, v in current_versions.items() if index.versions.get(k) != v]
+        table_names, embeddings = emb_db_adapter.fetch_embeddings(table_id, bot_id, keys=changed) if changed else ([], [])
     else:
-       # logger.error("Annoy Cache Manager: Refreshing locally cached Annoy index as Harvest Results table has changed due to harvester activity")
-        logger.info(f"Annoy Cache Manager: Refreshing locally cached Annoy index for bot {bot_id} as Harvest Results table has changed due to harvester activity")
-        annoy_index, metadata_mapping = make_and_save_index(table_id, bot_id=bot_id)
+        # nothing indexed yet, a full scan is cheaper than fetching by key
+        table_names, embeddings = emb_db_adapter.fetch_embeddings(table_id, bot_id)
+
+    # fetch_embeddings returns a (rows x dimension) float32 matrix
+    if len(embeddings) and embeddings.shape[1] != index.dimension:
+        embedding_size = embeddings.shape[1]
+        logger.info(f"Metadata index: embedding size changed from {index.dimension} to {embedding_size}, rebuilding for bot {bot_id}")
+        _save_embedding_size(embedding_size)
+        if index.versions:
+            # the incremental fetch only returned changed rows, re-read everything for the new index
+            table_names, embeddings = emb_db_adapter.fetch_embeddings(table_id, bot_id)
+        index = IncrementalAnnoyIndex(index.index_dir, embedding_size)
+        removed = []
+
+    index.upsert(table_names, embeddings, versions=[current_versions.get(k, '') for k in table_names])
+    index.delete(removed)
+    index.source_token = source_token
+    logger.info(f"Metadata index for bot {bot_id}: {len(table_names)} upserted, {len(removed)} deleted, {index.get_n_items()} live items")
+
+    if index._base is None or index.needs_compaction():
+        index = index.compact()
+        index.source_token = source_token
+    index.save()
+    return index
 
-    return annoy_index, metadata_mapping
@@ -0,0 +1,256 @@
+"""
+Staged work pipeline of the harvester.
+
+A harvest is a chain of stages (catalog scan, DDL diff, sample data, summarize, embed, store). Every stage has its
+own bounded input queue and pool of worker threads; a handler takes one work item and returns the items it passes to
+the next stage (a scan turns one schema into one item per table). Bounded queues give backpressure, so a fast stage
+cannot run ahead of a slow one by more than a queue's worth of items, and since the stages run concurrently the I/O
+of different tables overlaps: while one table waits for the LLM another one's sample data is fetched.
+
+The calls to an external resource (a source connection, an LLM provider, an embedding provider) go through
+ResourceLimits, which caps the concurrent calls and the calls per minute per resource. The concurrency cap adapts:
+it is halved when a call is throttled (and the call retried after a backoff), and grows back by one after a run of
+successful calls.
+"""
+
+from   collections              import defaultdict
+import queue
+import threading
+import time
+
+from   genesis_bots.core.logging_config \
+                                import logger
+
+_THROTTLING_MARKERS = ('rate limit', 'ratelimit', 'too many requests', '429', 'throttl', 'concurrency limit')
+
+
+def is_throttling_error(error):
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in _THROTTLING_MARKERS)
+
+
+class RateLimiter:
+    """Token bucket: at most `per_minute` acquisitions per minute, in bursts of up to `burst`."""
+
+    def __init__(self, per_minute, burst=None):
+        self.rate = per_minute / 60.0
+        self.capacity = float(burst or max(1, int(self.rate)))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveLimit:
+    """Concurrency cap of one resource, between 1 and `max_concurrency`, with an optional RateLimiter."""
+
+    def __init__(self, max_concurrency, per_minute=0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = self.max_concurrency
+        self.active = 0
+        self._successes = 0
+        self._cond = threading.Condition()
+        self._rate = RateLimiter(per_minute) if per_minute else None
+
+
+    def acquire(self):
+        with self._cond:
+            while self.active >= self.limit:
+                self._cond.wait()
+            self.active += 1
+        if self._rate is not None:
+            self._rate.acquire()
+
+
+    def release(self, throttled=False):
+        with self._cond:
+            self.active -= 1
+            if throttled:
+                self.limit = max(1, self.limit // 2)
+                self._successes = 0
+            else:
+                self._successes += 1
+                if self.limit < self.max_concurrency and self._successes >= self.limit:
+                    self.limit += 1
+                    self._successes = 0
+            self._cond.notify_all()
+
+
+class ResourceLimits:
+    """
+    AdaptiveLimits per (kind, key), e.g. ('source', connection id) or ('llm', provider), created on first use.
+
+    :param settings: kind -> (max_concurrency, calls_per_minute or 0).
+    """
+
+    def __init__(self, settings, retries=4, backoff_seconds=2.0):
+        self.settings = settings
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self._limits = {}
+        self._lock = threading.Lock()
+
+
+    def get(self, kind, key):
+        with self._lock:
+            limit = self._limits.get((kind, key))
+            if limit is None:
+                max_concurrency, per_minute = self.settings.get(kind, (4, 0))
+                limit = self._limits[(kind, key)] = AdaptiveLimit(max_concurrency, per_minute)
+            return limit
+
+
+    def call(self, kind, key, fn, *args, **kwargs):
+        """Calls fn within the limits of the resource, retrying with exponential backoff when it is throttled."""
+        limit = self.get(kind, key)
+        for attempt in range(self.retries + 1):
+            limit.acquire()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                throttled = is_throttling_error(e)
+                limit.release(throttled=throttled)
+                if not throttled or attempt == self.retries:
+                    raise
+                delay = self.backoff_seconds * (2 ** attempt)
+                logger.info(f"Harvester: {kind} {key} throttled, concurrency now {limit.limit}, retrying in {delay:.0f}s")
+                time.sleep(delay)
+                continue
+            limit.release()
+            return result
+
+
+class Stage:
+    """
+    :param handler: item -> iterable of items for the next stage (None: nothing).
+    :param workers: number of worker threads.
+    :param queue_size: capacity of the stage's input queue.
+    :param max_emitted: at most this many items are passed to the next stage per run (None: no limit); items beyond
+        it are dropped, and once it is reached the stage's remaining input items are skipped.
+    """
+
+    def __init__(self, name, handler, workers=1, queue_size=100, max_emitted=None):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.max_emitted = max_emitted
+
+
+_DONE = object()
+
+
+class Pipeline:
+    """
+    Runs items through a chain of Stages. An item whose handler raises is passed to `on_error(stage_name, item,
+    error)` and goes no further.
+    """
+
+    def __init__(self, stages, on_error=None, name="pipeline"):
+        self.stages = stages
+        self.on_error = on_error
+        self.name = name
+
+
+    def run(self, items):
+        """Feeds `items` to the first stage and returns when every stage has finished. Returns per-stage stats."""
+        start = time.monotonic()
+        queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        stats = {stage.name: defaultdict(int) for stage in self.stages}
+        remaining = [stage.workers for stage in self.stages]
+        admitted = [0] * len(self.stages)
+        lock = threading.Lock()
+
+        def capped(i):
+            cap = self.stages[i].max_emitted
+            return cap is not None and admitted[i] >= cap
+
+        def admit(i):
+            """Counts an item emitted by stage i against its max_emitted; False once that is reached."""
+            if self.stages[i].max_emitted is None:
+                return True
+            with lock:
+                if capped(i):
+                    return False
+                admitted[i] += 1
+                return True
+
+        def worker(i):
+            stage = self.stages[i]
+            stage_stats = stats[stage.name]
+            out = queues[i + 1] if i + 1 < len(queues) else None
+            while True:
+                item = queues[i].get()
+                if item is _DONE:
+                    break
+                with lock:
+                    if capped(i):
+                        stage_stats['skipped'] += 1
+                        continue
+                try:
+                    results = stage.handler(item)
+                except Exception as e:
+                    with lock:
+                        stage_stats['errors'] += 1
+                    self._handle_error(stage.name, item, e)
+                    continue
+                emitted = dropped = 0
+                for result in results or ():
+                    if not admit(i):
+                        dropped += 1
+                        continue
+                    emitted += 1
+                    if out is not None:
+                        out.put(result)
+                with lock:
+                    stage_stats['processed'] += 1
+                    stage_stats['emitted'] += emitted
+                    if dropped:
+                        stage_stats['dropped'] += dropped
+            with lock:
+                remaining[i] -= 1
+                last = remaining[i] == 0
+                if last:
+                    stage_stats['seconds'] = round(time.monotonic() - start, 2)
+            if last:
+                # every item of this stage has been handed on; let the next stage's workers finish
+                if out is not None:
+                    for _ in range(self.stages[i + 1].workers):
+                        out.put(_DONE)
+                logger.info(f"{self.name}: stage {stage.name} done, {dict(stage_stats)}")
+
+        threads = []
+        for i, stage in enumerate(self.stages):
+            for n in range(stage.workers):
+                t = threading.Thread(target=worker, args=(i,), name=f"{self.name}_{stage.name}_{n}", daemon=True)
+                t.start()
+                threads.append(t)
+        for item in items:
+            queues[0].put(item)
+        for _ in range(self.stages[0].workers):
+            queues[0].put(_DONE)
+        for t in threads:
+            t.join()
+        return {name: dict(s) for name, s in stats.items()}
+
+
+    def _handle_error(self, stage_name, item, error):
+        if self.on_error is None:
+            logger.info(f"{self.name}: stage {stage_name} failed: {error}")
+            return
+        try:
+            self.on_error(stage_name, item, error)
+        except Exception as e:
+            logger.info(f"{self.name}: error handler of stage {stage_name} failed: {e}")
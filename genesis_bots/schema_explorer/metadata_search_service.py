@@ -0,0 +1,214 @@
+"""
+Process-wide search over harvested metadata embeddings, shared by every bot.
+
+Every bot used to open its own IncrementalAnnoyIndex holding just the rows it may see, so a process with many bots
+kept as many copies of the (mostly identical) index and metadata mapping, and a refresh synced each copy separately.
+MetadataSearchService keeps a single index over all harvested rows of a harvest results table and applies each bot's
+visibility at query time: a key (source_name.qualified_table_name) is visible when its source is one of the bot's
+connections (see get_embedding_visible_sources of the connectors). The visible sources of a bot are cached for
+METADATA_VISIBILITY_TTL_SECONDS.
+
+A refresh syncs the shared index once, however many bots ask for it at the same time. When a sync returns a new index
+object (compaction, dimension change) it is swapped in; searches that are running on the previous one keep it, and
+its memory-mapped base segment is unloaded once the last of them is done.
+"""
+
+from   contextlib               import contextmanager
+import os
+import re
+import threading
+import time
+
+from   genesis_bots.connectors  import get_global_db_connector
+from   genesis_bots.core.logging_config \
+                                import logger
+from   genesis_bots.schema_explorer.embeddings_index_handler \
+                                import _get_embedding_size, index_file_path, sync_embeddings_index
+from   genesis_bots.schema_explorer.metadata_vector_index \
+                                import EMPTY_INDEX_KEY, IncrementalAnnoyIndex
+
+DEFAULT_VISIBILITY_TTL_SECONDS = 60
+
+
+class _IndexGeneration:
+    """An index object and the number of searches currently using it."""
+
+    def __init__(self, index):
+        self.index = index
+        self.readers = 0
+        self.retired = False
+
+
+    def release(self):
+        base = self.index._base
+        if base is not None:
+            base.unload()
+
+
+class MetadataSearchService:
+    """
+    The shared metadata index of one harvest results table.
+
+    :param table_id: fully qualified harvest results table.
+    :param db_adapter: connector used for syncing and for visibility lookups (default: the global db connector).
+    :param index_dir: where the index is persisted (default: ./tmp/metadata_index/shared_<table>).
+    """
+
+    def __init__(self, table_id, db_adapter=None, index_dir=None, visibility_ttl_seconds=None):
+        self.table_id = table_id
+        self._db_adapter = db_adapter
+        self.index_dir = index_dir or os.path.join(index_file_path, 'metadata_index',
+                                                   'shared_' + re.sub(r'[^a-zA-Z0-9_-]', '_', table_id))
+        if visibility_ttl_seconds is None:
+            visibility_ttl_seconds = float(os.getenv('METADATA_VISIBILITY_TTL_SECONDS', DEFAULT_VISIBILITY_TTL_SECONDS))
+        self.visibility_ttl_seconds = visibility_ttl_seconds
+        self.sync_count = 0
+        self._current = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._syncs_started = 0
+        self._visibility = {}       # bot_id -> (expires_at, frozenset of source names or None)
+
+
+    @property
+    def db_adapter(self):
+        if self._db_adapter is None:
+            self._db_adapter = get_global_db_connector()
+        return self._db_adapter
+
+
+    # ----------------------------------------------------------------------------------------------------------
+    # index lifecycle
+    # ----------------------------------------------------------------------------------------------------------
+    def refresh(self):
+        """
+        Syncs the shared index with the harvest results table (a no-op when the harvest results did not change, see
+        sync_embeddings_index). Callers that arrive while a sync is running wait for it and share its result instead
+        of running another one.
+        """
+        with self._lock:
+            ticket = self._syncs_started
+        with self._refresh_lock:
+            if self._syncs_started > ticket and self._current is not None:
+                # a sync started after this call was made has completed in the meantime
+                return
+            self._syncs_started += 1
+            index = self._current.index if self._current is not None else \
+                IncrementalAnnoyIndex.open(self.index_dir, _get_embedding_size())
+            try:
+                synced = sync_embeddings_index(index, self.table_id, None, db_adapter=self.db_adapter)
+                self.sync_count += 1
+            except Exception as e:
+                logger.info(f"Metadata search service: error syncing the shared index of {self.table_id}: {e}")
+                synced = index if index.metadata_mapping else index.compact()
+            if self._current is None or synced is not self._current.index:
+                self._swap(synced)
+
+
+    def _swap(self, index):
+        with self._lock:
+            previous, self._current = self._current, _IndexGeneration(index)
+            if previous is None:
+                return
+            previous.retired = True
+            release = previous.readers == 0
+        if release:
+            previous.release()
+
+
+    @contextmanager
+    def lease(self):
+        """The current index, kept loaded until the block exits even if a refresh swaps in a new one."""
+        if self._current is None:
+            self.refresh()
+        with self._lock:
+            generation = self._current
+            generation.readers += 1
+        try:
+            yield generation.index
+        finally:
+            with self._lock:
+                generation.readers -= 1
+                release = generation.retired and generation.readers == 0
+            if release:
+                generation.release()
+
+
+    def is_empty(self):
+        with self.lease() as index:
+            return index.get_n_items() == 0 or index.metadata_mapping == [EMPTY_INDEX_KEY]
+
+
+    # ----------------------------------------------------------------------------------------------------------
+    # visibility
+    # ----------------------------------------------------------------------------------------------------------
+    def visible_sources(self, bot_id):
+        """The source names `bot_id` may search, or None when the connector does not restrict them."""
+        if bot_id is None:
+            bot_id = 'default'
+        now = time.monotonic()
+        with self._lock:
+            cached = self._visibility.get(bot_id)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        sources = self.db_adapter.get_embedding_visible_sources(bot_id)
+        sources = frozenset(sources) if sources is not None else None
+        with self._lock:
+            self._visibility[bot_id] = (now + self.visibility_ttl_seconds, sources)
+        return sources
+
+
+    def invalidate_visibility(self, bot_id=None):
+        """Forgets the cached visible sources of `bot_id` (of every bot when None), e.g. after a connection grant."""
+        with self._lock:
+            if bot_id is None:
+                self._visibility.clear()
+            else:
+                self._visibility.pop(bot_id, None)
+
+
+    # ----------------------------------------------------------------------------------------------------------
+    # query
+    # ----------------------------------------------------------------------------------------------------------
+    def search(self, vector, n, bot_id=None, search_k=-1):
+        """
+        Returns (keys, distances) of the `n` nearest rows visible to `bot_id`, nearest first. Rows of other sources
+        are skipped by over-fetching from the shared index until `n` visible ones are found or it is exhausted.
+        """
+        sources = self.visible_sources(bot_id)
+        with self.lease() as index:
+            mapping = index.metadata_mapping
+            fetch = n if sources is None else n * 2
+            while True:
+                ids, distances = index.get_nns_by_vector(vector, fetch, search_k=search_k, include_distances=True)
+                keys, kept = [], []
+                for i, d in zip(ids, distances):
+                    key = mapping[i]
+                    if key == EMPTY_INDEX_KEY or (sources is not None and key.partition('.')[0] not in sources):
+                        continue
+                    keys.append(key)
+                    kept.append(d)
+                if len(keys) >= n or len(ids) < fetch:
+                    return keys[:n], kept[:n]
+                fetch *= 4
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_metadata_search_service(table_id):
+    """The process-wide MetadataSearchService of `table_id`."""
+    with _services_lock:
+        service = _services.get(table_id)
+        if service is None:
+            service = _services[table_id] = MetadataSearchService(table_id)
+        return service
+
+
+def invalidate_metadata_visibility(bot_id=None):
+    """Forgets cached visible sources in every service; called when database connections or their grants change."""
+    with _services_lock:
+        services = list(_services.values())
+    for service in services:
+        service.invalidate_visibility(bot_id)
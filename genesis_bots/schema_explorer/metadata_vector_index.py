@@ -0,0 +1,281 @@
+"""
+Persistent, incrementally updatable vector index for harvested metadata embeddings.
+
+The index is made of two segments:
+
+  * a *base* segment: an Annoy index file that is memory-mapped from disk (so every loader in the process, and every
+    process on the host, shares the same pages) together with the list of keys for its items.
+  * an *append* segment: a small dense float32 matrix of vectors upserted since the base was built, searched by brute
+    force, plus a set of tombstoned base ids for rows that were deleted or replaced.
+
+Upserts and deletes only touch the append segment and the tombstones, so a newly crawled table costs one vector
+instead of a full rebuild. When the append segment grows past a fraction of the base, compact() folds both segments
+into a new base generation. Compaction never mutates an index that is in use: it returns a new
+IncrementalAnnoyIndex object and the old one remains valid for as long as callers hold it.
+
+The query interface mirrors the subset of AnnoyIndex used by BotOsKnowledgeAnnoy_Metadata: get_nns_by_vector()
+returns ids into `metadata_mapping` and Annoy 'angular' distances.
+"""
+
+from   annoy                    import AnnoyIndex
+import json
+import numpy as np
+import os
+import threading
+
+from   genesis_bots.core.logging_config \
+                                import logger
+
+EMPTY_INDEX_KEY = 'empty_index'
+MANIFEST_FILE = 'manifest.json'
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / (norms + 1e-5)
+
+
+def _angular_from_cosine(cos):
+    # Annoy's angular distance is the euclidean distance of normalized vectors: sqrt(2 * (1 - cos))
+    return np.sqrt(np.maximum(2.0 * (1.0 - cos), 0.0))
+
+
+class IncrementalAnnoyIndex:
+    """
+    A base Annoy segment plus an in-memory append segment, persisted under `index_dir`.
+
+    Files in `index_dir`:
+        manifest.json         - generation, dimension, per-key versions, tombstones and append segment keys
+        base_<gen>.ann        - Annoy index of the base segment
+        base_<gen>.json       - keys of the base segment (position == Annoy item id)
+        delta_<gen>.npy       - vectors of the append segment
+    """
+
+    def __init__(self, index_dir, dimension, n_trees=10):
+        self.index_dir = index_dir
+        self.dimension = dimension
+        self.n_trees = n_trees
+        self.generation = 0
+        self.versions = {}            # key -> version string (e.g. LAST_CRAWLED_TIMESTAMP) of the live vector
+        self.source_token = None      # opaque marker of the source state at the last sync
+        self._base = None             # AnnoyIndex or None
+        self._base_count = 0
+        self._tombstones = set()      # ids (base or delta) that must never be returned
+        self._key_to_id = {}          # live key -> id
+        self._delta = np.zeros((0, dimension), dtype=np.float32)
+        self._lock = threading.RLock()
+        # ids index into metadata_mapping; the list is only ever appended to, so callers may hold on to it
+        self.metadata_mapping = []
+
+
+    # ----------------------------------------------------------------------------------------------------------
+    # persistence
+    # ----------------------------------------------------------------------------------------------------------
+    @classmethod
+    def open(cls, index_dir, dimension, n_trees=10):
+        """Opens the index persisted in `index_dir`, or returns a new empty one if there is none (or it is unusable)."""
+        manifest_path = os.path.join(index_dir, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return cls(index_dir, dimension, n_trees=n_trees)
+        try:
+            with open(manifest_path, 'r') as f:
+                manifest = json.load(f)
+            if manifest['dimension'] != dimension:
+                logger.info(f"IncrementalAnnoyIndex: dimension changed ({manifest['dimension']} -> {dimension}), starting a new index in {index_dir}")
+                return cls(index_dir, dimension, n_trees=n_trees)
+            index = cls(index_dir, dimension, n_trees=n_trees)
+            index.generation = manifest['generation']
+            index.versions = manifest['versions']
+            index.source_token = manifest.get('source_token')
+            gen = index.generation
+            with open(os.path.join(index_dir, f'base_{gen}.json'), 'r') as f:
+                base_keys = json.load(f)
+            if base_keys:
+                base = AnnoyIndex(dimension, 'angular')
+                base.load(os.path.join(index_dir, f'base_{gen}.ann'), prefault=False)  # memory-mapped
+                index._base = base
+            index._base_count = len(base_keys)
+            index.metadata_mapping.extend(base_keys)
+            delta_keys = manifest['delta_keys']
+            if delta_keys:
+                index._delta = np.load(os.path.join(index_dir, f'delta_{gen}.npy'))
+                index.metadata_mapping.extend(delta_keys)
+            index._tombstones = set(manifest['tombstones'])
+            index._key_to_id = {k: i for i, k in enumerate(index.metadata_mapping) if i not in index._tombstones}
+            return index
+        except Exception as e:
+            logger.info(f"IncrementalAnnoyIndex: unable to open index in {index_dir} ({e}), starting a new one")
+            return cls(index_dir, dimension, n_trees=n_trees)
+
+
+    def save(self):
+        """Persists the append segment and the manifest. The base segment files are immutable once written."""
+        with self._lock:
+            os.makedirs(self.index_dir, exist_ok=True)
+            gen = self.generation
+            delta_keys = self.metadata_mapping[self._base_count:]
+            if not os.path.exists(os.path.join(self.index_dir, f'base_{gen}.json')):
+                self._write_base_files(gen, None, [])
+            if delta_keys:
+                tmp_path = os.path.join(self.index_dir, f'delta_{gen}.tmp.npy')
+                np.save(tmp_path, self._delta)
+                os.replace(tmp_path, os.path.join(self.index_dir, f'delta_{gen}.npy'))
+            manifest = {
+                'generation': gen,
+                'dimension': self.dimension,
+                'versions': self.versions,
+                'source_token': self.source_token,
+                'delta_keys': delta_keys,
+                'tombstones': sorted(self._tombstones),
+            }
+            tmp_path = os.path.join(self.index_dir, MANIFEST_FILE + '.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump(manifest, f)
+            os.replace(tmp_path, os.path.join(self.index_dir, MANIFEST_FILE))
+
+
+    def _write_base_files(self, gen, annoy_index, keys):
+        if annoy_index is not None:
+            annoy_index.save(os.path.join(self.index_dir, f'base_{gen}.ann'))
+        with open(os.path.join(self.index_dir, f'base_{gen}.json'), 'w') as f:
+            json.dump(keys, f)
+
+
+    def _remove_generation_files(self, gen):
+        for name in (f'base_{gen}.ann', f'base_{gen}.json', f'delta_{gen}.npy'):
+            try:
+                os.remove(os.path.join(self.index_dir, name))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                # e.g. the file is still mapped by another process on platforms that do not allow unlinking it
+                logger.debug(f"IncrementalAnnoyIndex: could not remove {name}: {e}")
+
+
+    # ----------------------------------------------------------------------------------------------------------
+    # mutation
+    # ----------------------------------------------------------------------------------------------------------
+    def upsert(self, keys, vectors, versions=None):
+        """Adds or replaces the vectors for `keys`. `versions` (optional) records the source version of each row."""
+        if len(keys) == 0:
+            return
+        vectors = _normalize(vectors)
+        assert vectors.shape == (len(keys), self.dimension), f"Expected vectors of shape {(len(keys), self.dimension)}, got {vectors.shape}"
+        with self._lock:
+            self._drop_placeholder()
+            first_id = len(self.metadata_mapping)
+            for i, key in enumerate(keys):
+                old_id = self._key_to_id.get(key)
+                if old_id is not None:
+                    self._tombstones.add(old_id)
+                self._key_to_id[key] = first_id + i
+                if versions is not None:
+                    self.versions[key] = versions[i]
+            # append a copy; readers only ever see a fully built matrix
+            self._delta = np.concatenate([self._delta, vectors]) if len(self._delta) else vectors.copy()
+            self.metadata_mapping.extend(keys)
+
+
+    def delete(self, keys):
+        with self._lock:
+            for key in keys:
+                old_id = self._key_to_id.pop(key, None)
+                if old_id is not None:
+                    self._tombstones.add(old_id)
+                self.versions.pop(key, None)
+
+
+    def _drop_placeholder(self):
+        placeholder_id = self._key_to_id.pop(EMPTY_INDEX_KEY, None)
+        if placeholder_id is not None:
+            self._tombstones.add(placeholder_id)
+
+
+    def needs_compaction(self, ratio=0.2, min_delta=1000):
+        with self._lock:
+            pending = (len(self.metadata_mapping) - self._base_count) + len(self._tombstones)
+            return pending > max(min_delta, ratio * self._base_count)
+
+
+    def compact(self):
+        """
+        Builds a new base generation from all live vectors and returns it as a new IncrementalAnnoyIndex.
+        `self` is left untouched so that concurrent readers holding it keep working.
+        """
+        with self._lock:
+            live = sorted(self._key_to_id.items(), key=lambda kv: kv[1])
+            keys = [k for k, _ in live]
+            base_count = self._base_count
+            base = self._base
+            delta = self._delta
+            versions = dict(self.versions)
+        new_gen = self.generation + 1
+        annoy_index = AnnoyIndex(self.dimension, 'angular')
+        for i, (key, item_id) in enumerate(live):
+            if item_id < base_count:
+                annoy_index.add_item(i, base.get_item_vector(item_id))
+            else:
+                annoy_index.add_item(i, delta[item_id - base_count])
+        if not keys:
+            # keep a searchable placeholder, as callers treat ['empty_index'] as "nothing harvested yet"
+            annoy_index.add_item(0, [0.0] * self.dimension)
+            keys = [EMPTY_INDEX_KEY]
+        annoy_index.build(self.n_trees)
+        os.makedirs(self.index_dir, exist_ok=True)
+        self._write_base_files(new_gen, annoy_index, keys)
+        annoy_index.unload()
+
+        compacted = IncrementalAnnoyIndex(self.index_dir, self.dimension, n_trees=self.n_trees)
+        compacted.generation = new_gen
+        compacted.versions = versions
+        compacted.source_token = self.source_token
+        compacted._base = AnnoyIndex(self.dimension, 'angular')
+        compacted._base.load(os.path.join(self.index_dir, f'base_{new_gen}.ann'), prefault=False)
+        compacted._base_count = len(keys)
+        compacted.metadata_mapping.extend(keys)
+        compacted._key_to_id = {k: i for i, k in enumerate(keys)}
+        compacted.save()
+        self._remove_generation_files(self.generation)
+        logger.info(f"IncrementalAnnoyIndex: compacted {self.index_dir} to generation {new_gen} with {len(keys)} items")
+        return compacted
+
+
+    # ----------------------------------------------------------------------------------------------------------
+    # query (AnnoyIndex-compatible subset)
+    # ----------------------------------------------------------------------------------------------------------
+    @property
+    def f(self):
+        return self.dimension
+
+
+    def get_n_items(self):
+        with self._lock:
+            return len(self._key_to_id)
+
+
+    def get_nns_by_vector(self, vector, n, search_k=-1, include_distances=False):
+        with self._lock:
+            base, base_count = self._base, self._base_count
+            delta = self._delta
+            tombstones = frozenset(self._tombstones)
+        candidates = []
+        if base is not None and base_count > 0:
+            # over-fetch to make up for tombstoned base items
+            base_tombstones = sum(1 for t in tombstones if t < base_count)
+            ids, dists = base.get_nns_by_vector(vector, n + base_tombstones, search_k=search_k, include_distances=True)
+            candidates.extend((d, i) for i, d in zip(ids, dists) if i not in tombstones)
+        if len(delta):
+            q = _normalize(vector)[0]
+            dists = _angular_from_cosine(delta @ q)
+            k = min(n + len(tombstones), len(delta))
+            top = np.argpartition(dists, k - 1)[:k] if k < len(delta) else np.arange(len(delta))
+            candidates.extend((float(dists[j]), base_count + int(j)) for j in top if (base_count + int(j)) not in tombstones)
+        candidates.sort()
+        candidates = candidates[:n]
+        ids = [i for _, i in candidates]
+        if include_distances:
+            return ids, [d for d, _ in candidates]
+        return ids
@@ -3,11 +3,18 @@ import os, csv, io
 import simplejson as json
 from openai import OpenAI
 import random
+import uuid
 #from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
 from genesis_bots.llm.llm_openai.openai_utils import get_openai_client
 from genesis_bots.core.logging_config import logger
+from genesis_bots.connectors.embedding_service import CortexEmbeddingProvider, OpenAIEmbeddingProvider, get_embedding_service
+from genesis_bots.schema_explorer.catalog_reader import CatalogReader
+from genesis_bots.schema_explorer.harvest_pipeline import Pipeline, ResourceLimits, Stage
+
+# row limit of the harvester's catalog and metadata queries (one row per object, or per column for bulk reads)
+_CATALOG_MAX_ROWS = 10_000_000
 # Assuming OpenAI SDK initialization
 
 class SchemaExplorer:
@@ -313,14 +320,7 @@ class SchemaExplorer:
             if ddl is None:
                 ddl = self.alt_get_ddl(table_name='"'+database+'"."'+schema+'"."'+table+'"')
 
-            if os.environ.get("CORTEX_MODE", 'False') == 'True':
-                memory_content = f"<OBJECT>{database}.{schema}.{table}</OBJECT><DDL_SHORT>{ddl_short}</DDL_SHORT>"
-                complete_description = memory_content
-            else:
-                memory_content = f"<OBJECT>{database}.{schema}.{table}</OBJECT><DDL>\n{ddl}\n</DDL>\n<SUMMARY>\n{summary}\n</SUMMARY><DDL_SHORT>{ddl_short}</DDL_SHORT>"
-                if sample_data != "":
-                    memory_content += f"\n\n<SAMPLE CSV DATA>\n{sample_data}\n</SAMPLE CSV DATA>"
-                complete_description = memory_content
+            complete_description = self._table_memory_content(database, schema, table, ddl, ddl_short, summary, sample_data)
             embedding = self.get_embedding(complete_description)
             # logger.info("we got the embedding!")
             #sample_data_text = json.dumps(sample_data)  # Assuming sample_data needs to be a JSON text.
@@ -346,6 +346,15 @@ class SchemaExplorer:
             logger.info(f"Harvester Error for an object: {e}")
             self.store_table_summary(database, schema, table, summary="Harvester Error: {e}", ddl="Harvester Error", ddl_short="Harvester Error", sample_data="Harvester Error")
 
+    def _table_memory_content(self, database, schema, table, ddl, ddl_short, summary, sample_data):
+        """The text that is embedded for a table (the complete_description of its harvest result)."""
+        if os.environ.get("CORTEX_MODE", 'False') == 'True':
+            return f"<OBJECT>{database}.{schema}.{table}</OBJECT><DDL_SHORT>{ddl_short}</DDL_SHORT>"
+        memory_content = f"<OBJECT>{database}.{schema}.{table}</OBJECT><DDL>\n{ddl}\n</DDL>\n<SUMMARY>\n{summary}\n</SUMMARY><DDL_SHORT>{ddl_short}</DDL_SHORT>"
+        if sample_data != "":
+            memory_content += f"\n\n<SAMPLE CSV DATA>\n{sample_data}\n</SAMPLE CSV DATA>"
+        return memory_content
+
     def generate_summary(self, prompt):
         p = [
             {"role": "system", "content": "You are an assistant that is great at explaining database tables and columns in natural language."},
@@ -400,12 +409,10 @@ class SchemaExplorer:
     def get_embedding(self, text):
         # logic to handle switch between openai and cortex
         if os.getenv("CORTEX_MODE", 'False') == 'True':
-            escaped_messages = str(text[:512]).replace("'", "\\'")
             try:
                 # review function used once new regions are unlocked in snowflake
-                embedding_result = self.db_connector.run_query(f"SELECT SNOWFLAKE.CORTEX.EMBED_TEXT_768('{self.embedding_model}', '{escaped_messages}');")
-
-                result_value = next(iter(embedding_result[0].values()))
+                provider = CortexEmbeddingProvider(self.db_connector, self.embedding_model)
+                result_value = get_embedding_service(provider).embed_one(str(text[:512]))
                 if result_value:
                     logger.info(f"Result value len embedding: {len(result_value)}")
             except:
@@ -414,11 +421,8 @@ class SchemaExplorer:
             return result_value
         else:
             try:
-                response = self.client.embeddings.create(
-                    model=self.embedding_model,
-                    input=text[:8000].replace("\n", " ")  # Replace newlines with spaces
-                )
-                embedding = response.data[0].embedding
+                provider = OpenAIEmbeddingProvider(self.client, self.embedding_model)
+                embedding = get_embedding_service(provider).embed_one(text[:8000].replace("\n", " "))  # Replace newlines with spaces
                 if embedding:
                     logger.info(f"Result value len embedding: {len(embedding)}")
             except:
@@ -758,8 +762,59 @@ class SchemaExplorer:
                 logger.info(f'Error getting columns for table {table_name}: {e}')
                 return []
 
+    def _run_catalog_query(self, dataset, sql):
+        """Runs a bulk catalog query against the source of the dataset; returns a list of row dicts."""
+        if dataset['source_name'] == 'Snowflake':
+            result = self.db_connector.run_query(sql, max_rows=_CATALOG_MAX_ROWS, max_rows_override=True)
+            if isinstance(result, dict):
+                raise RuntimeError(result.get('Error') or result.get('error') or 'catalog query failed')
+            return result
+        from genesis_bots.connectors.data_connector import DatabaseConnector
+        result = DatabaseConnector().query_database(
+            connection_id=dataset['source_name'],
+            bot_id='system',
+            query=sql,
+            max_rows=_CATALOG_MAX_ROWS,
+            max_rows_override=True,
+            bot_id_override=True,
+            database_name=dataset['database_name']
+        )
+        if not (isinstance(result, dict) and result.get('success')):
+            raise RuntimeError(result.get('error') if isinstance(result, dict) else 'catalog query failed')
+        return [dict(zip(result['columns'], row)) for row in result['rows']]
+
+    def _describe_object(self, dataset, obj, qualified_name, matching_connection, catalog):
+        """
+        Returns (ddl, ddl_hash, columns) of an object, from the bulk catalog read when it covers the object and with
+        per-object queries otherwise. columns is None when it has to be fetched with get_table_columns.
+        """
+        entry = catalog.get(obj['table_name']) if catalog else None
+        columns = entry['columns'] if entry else None
+        # outside Snowflake the DDL of a view is its definition, which the column catalog does not have
+        if entry and (entry['native_ddl'] or obj['object_type'] != 'VIEW' or dataset['source_name'] == 'Snowflake'):
+            return entry['ddl'], entry['ddl_hash'], columns
+        ddl = self.alt_get_ddl(
+            table_name=qualified_name,
+            dataset=dataset,
+            matching_connection=matching_connection,
+            object_type=obj['object_type']
+        )
+        return ddl, self.db_connector.sha256_hash_hex_string(ddl), columns
+
 
     def explore_and_summarize_tables_parallel(self, max_to_process=1000, dataset_filter=None):
+        """
+        Harvests the schemas of the active databases that are due for a crawl (all those matching dataset_filter, if
+        given) through a staged pipeline (see harvest_pipeline.py): a catalog scan per schema that diffs its objects
+        against the harvest results, then per object the DDL, sample data, summary, embedding and the store. Calls
+        to source connections, the LLM and the embedding provider are limited per resource (HARVEST_* env vars).
+
+        Progress is checkpointed in the harvest results table: a new object is stored with a placeholder summary as
+        soon as it is found and again as soon as it is summarized, so an interrupted harvest resumes with the objects
+        that were not yet summarized or embedded. At most `max_to_process` objects are queued per run; the rest are
+        found again by the next run.
+        """
+        schemas = []
         try:
             self.run_number += 1
             databases = self.get_active_databases()
@@ -798,383 +853,353 @@ class SchemaExplorer:
                         'schema_name': schema
                     } for schema in self.get_active_schemas(database)])
 
-            summaries = {}
-            total_processed = 0
         except Exception as e:
             logger.info(f'Error explore and summarize tables parallel Error: {e}')
 
-        #logger.info('checking schemas: ',schemas)
-
-        # todo, first build list of objects to harvest, then harvest them
-
-        def process_dataset_step1(dataset, max_to_process = 1000):
-            potential_objects = []
-            matching_connection = None
-            if dataset['source_name'] == 'Snowflake':
-                try:
-                    # For Snowflake, just get tables as before - it already handles views
-                    potential_objects = self.db_connector.get_tables(dataset['database_name'], dataset['schema_name'])
-                    for obj in potential_objects:
-                        obj['object_type'] = 'TABLE'  # Default, but Snowflake handles views internally
-                except Exception as e:
-                    logger.info(f'Error running get potential objects Error: {e}')
-            else:
-                try:
-                    from genesis_bots.connectors.data_connector import DatabaseConnector
-                    connector = DatabaseConnector()
-                    connections = connector.list_database_connections(bot_id='system', bot_id_override=True)
-                    if connections['success']:
-                        connections = connections['connections']
-                    else:
-                        logger.info(f'Error listing connections: {connections.get("error")}')
-                        return None
-
-                    matching_connection = None
-                    for conn in connections:
-                        if conn['connection_id'] == dataset['source_name']:
-                            matching_connection = conn
-                            break
-
-                    if matching_connection is None:
-                        logger.info(f"No matching connection found for source {dataset['source_name']}")
-                        return None
-
-                    db_type = matching_connection['db_type']
-                    if '+' in db_type:
-                        db_type = db_type.split('+')[0]
-
-                    database_name = dataset['database_name']
-                    schema_name = dataset['schema_name']
-
-                    if matching_connection.get('connection_string'):
-                        if '.redshift.' in matching_connection['connection_string'].lower() or '.redshift-serverless.' in matching_connection['connection_string'].lower():
-                            db_type = 'redshift'                
-
-                    # Get tables
-                    sql_tables = self.load_custom_query(db_type, 'get_tables')
-                    if sql_tables:
-                        sql_tables = sql_tables.replace('!database_name!', database_name)
-                        sql_tables = sql_tables.replace('!schema_name!', schema_name)
-                        result_tables = connector.query_database(
-                            connection_id=dataset['source_name'],
-                            bot_id='system',
-                            query=sql_tables,
-                            max_rows=1000,
-                            max_rows_override=True,
-                            bot_id_override=True,
-                            database_name=database_name
-                        )
-
-                        col_num = 0
-                        if 'columns' in result_tables and result_tables['columns']:
-                            for i, col in enumerate(result_tables['columns']):
-                                if col.lower() == 'name' or col.lower() == 'tablename':
-                                    col_num = i
-                                    break
-                        if isinstance(result_tables, dict) and result_tables.get('success'):
-                            for row in result_tables['rows']:
-                                potential_objects.append({
-                                    'name': row[col_num],
-                                    'object_type': 'TABLE'
-                                })
-
-                    # Get views
-                    sql_views = self.load_custom_query(db_type, 'get_views')
-                    if sql_views:
-                        sql_views = sql_views.replace('!database_name!', database_name)
-                        sql_views = sql_views.replace('!schema_name!', schema_name)
-                        result_views = connector.query_database(
-                            connection_id=dataset['source_name'],
-                            bot_id='system',
-                            query=sql_views,
-                            max_rows=1000,
-                            max_rows_override=True,
-                            bot_id_override=True,
-                            database_name=database_name
-                        )
-                        col_num = 0
-                        if 'columns' in result_views and result_views['columns']:
-                            for i, col in enumerate(result_views['columns']):
-                                if col.lower() == 'name' or col.lower() == 'tablename' or col.lower() == 'viewname':
-                                    col_num = i
-                                    break
-                        if isinstance(result_views, dict) and result_views.get('success'):
-                            for row in result_views['rows']:
-                                potential_objects.append({
-                                    'name': row[col_num],
-                                    'object_type': 'VIEW'
-                                })
-                except Exception as e:
-                    logger.error(f"Error getting objects from database: {e}")
-                    potential_objects = []
-
-            non_indexed_tables = []
-
-            # Check all potential_tables at once using a single query with an IN clause
-            db, sch = dataset['database_name'], dataset['schema_name']
+        self.initialize_model()
+        catalog_reader = CatalogReader(self._run_catalog_query)
+        schemas_by_database = {}
+        for schema in schemas:
+            schemas_by_database.setdefault((schema['source_name'], schema['database_name']), []).append(schema['schema_name'])
+        random.shuffle(schemas)
+        try:
+            logger.info(f"Harvester checking {len(schemas)} schemas for new objects.")
+        except Exception as e:
+            logger.info(f'Error printing schema count log line. {e}')
 
-            self.initialize_model()
-            if os.environ.get("CORTEX_MODE", 'False') == 'True':
-                embedding_column = 'embedding_native'
-            else:
-                embedding_column = 'embedding'
-
-            if self.db_connector.source_name == 'Snowflake':
-                check_query = f"""
-                SELECT qualified_table_name, table_name, ddl_hash, last_crawled_timestamp, ddl, ddl_short, summary, sample_data_text, memory_uuid, (SUMMARY = '{{!placeholder}}') as needs_full, NULLIF(COALESCE(ARRAY_TO_STRING({embedding_column}, ','), ''), '') IS NULL as needs_embedding
-                FROM {self.db_connector.metadata_table_name}
-                WHERE  source_name = '{dataset['source_name']}'
-                AND database_name= '{db}' and schema_name = '{sch}';"""
-            else:
-                check_query = f"""
-                SELECT qualified_table_name, table_name, ddl_hash, last_crawled_timestamp, ddl, ddl_short, summary, sample_data_text, memory_uuid, (SUMMARY = '{{!placeholder}}') as needs_full, {embedding_column} IS NULL as needs_embedding
-                FROM {self.db_connector.metadata_table_name}
-                WHERE source_name = '{dataset['source_name']}'
-                AND database_name= '{db}' and schema_name = '{sch}';"""
-
-            # Query to find tables with unloaded catalog supplements
-            catalog_supplement_query = f"""
-            SELECT qualified_table_name, catalog_supplement, summary, ddl_short
-            FROM {self.db_connector.metadata_table_name}
-            WHERE source_name = '{dataset['source_name']}'
-            AND database_name = '{db}' 
-            AND schema_name = '{sch}'
-            AND catalog_supplement IS NOT NULL 
-            AND catalog_supplement != ''
-            AND (catalog_supplement_loaded IS NULL OR catalog_supplement_loaded = 'FALSE');
-            """
+        env = lambda name, default: int(os.getenv(name, default))
+        limits = ResourceLimits({
+            'source': (env('HARVEST_SOURCE_CONCURRENCY', 4), env('HARVEST_SOURCE_CALLS_PER_MINUTE', 0)),
+            'llm': (env('HARVEST_LLM_CONCURRENCY', 4), env('HARVEST_LLM_CALLS_PER_MINUTE', 0)),
+            'embedding': (env('HARVEST_EMBED_CONCURRENCY', 4), env('HARVEST_EMBED_CALLS_PER_MINUTE', 0)),
+        })
+        provider = 'cortex' if os.environ.get("CORTEX_MODE", 'False') == 'True' else 'openai'
+        queue_size = env('HARVEST_QUEUE_SIZE', 200)
+        table_workers = env('HARVEST_TABLE_WORKERS', 8)
+        stages = [
+            Stage('scan', lambda dataset: self._harvest_scan(dataset, catalog_reader, schemas_by_database, limits),
+                  workers=env('HARVEST_SCAN_WORKERS', 4), queue_size=queue_size, max_emitted=max_to_process),
+            Stage('ddl', lambda item: self._harvest_ddl(item, limits), workers=table_workers, queue_size=queue_size),
+            Stage('sample', lambda item: self._harvest_sample(item, limits), workers=table_workers, queue_size=queue_size),
+            Stage('summarize', lambda item: self._harvest_summarize(item, limits, provider),
+                  workers=env('HARVEST_SUMMARY_WORKERS', 8), queue_size=queue_size),
+            Stage('embed', lambda item: self._harvest_embed(item, limits, provider),
+                  workers=env('HARVEST_EMBED_WORKERS', 4), queue_size=queue_size),
+            Stage('store', self._harvest_store, workers=env('HARVEST_STORE_WORKERS', 1), queue_size=queue_size),
+        ]
+        stats = Pipeline(stages, on_error=self._harvest_error, name='harvester').run(schemas)
+        logger.info(f"Harvester processed {stats['store']['processed']} objects from {len(schemas)} schemas "
+                    f"({catalog_reader.query_count} bulk catalog reads)")
+        if stats['scan'].get('dropped') or stats['scan'].get('skipped'):
+            logger.info(f"Harvester reached its limit of {max_to_process} objects per run, the remaining objects "
+                        f"({stats['scan'].get('skipped', 0)} schemas not scanned) are left for the next run")
+        return 'Processed'
 
+    def _list_harvest_objects(self, dataset):
+        """Lists the tables and views of a dataset; returns (objects, matching_connection, db_type) or None."""
+        potential_objects = []
+        matching_connection = None
+        db_type = None
+        if dataset['source_name'] == 'Snowflake':
+            db_type = self.db_connector.source_name.lower()
             try:
-                existing_tables_info = self.db_connector.run_query(check_query, max_rows=1000, max_rows_override=True)
-                existing_tables_info = [{k.upper(): v for k, v in table.items()} for table in existing_tables_info]
-                catalog_supplement_needed = self.db_connector.run_query(catalog_supplement_query, max_rows=1000, max_rows_override=True)
-                table_names_field = 'QUALIFIED_TABLE_NAME'
-                existing_tables_set = {info[table_names_field] for info in existing_tables_info}
-                
-                # Process new or updated objects
+                # For Snowflake, just get tables as before - it already handles views
+                potential_objects = self.db_connector.get_tables(dataset['database_name'], dataset['schema_name'])
                 for obj in potential_objects:
-                    try:
-                        if 'name' in obj and 'table_name' not in obj:
-                            obj['table_name'] = obj['name']
-                        qualified_name = f'"{db}"."{sch}"."{obj["table_name"]}"'
-                        if qualified_name not in existing_tables_set:
-                            # Table is new, so get its DDL and hash
-                            current_ddl = self.alt_get_ddl(
-                                table_name=qualified_name, 
-                                dataset=dataset, 
-                                matching_connection=matching_connection,
-                                object_type=obj['object_type']
-                            )
-                            current_ddl_hash = self.db_connector.sha256_hash_hex_string(current_ddl)
-                            new_table = {
-                                "qualified_table_name": qualified_name, 
-                                "ddl_hash": current_ddl_hash, 
-                                "ddl": current_ddl, 
-                                "dataset": dataset, 
-                                "matching_connection": matching_connection,
-                                "object_type": obj['object_type']
-                            }
-                            logger.info('Newly found object added to harvest array (no cache hit)')
-                            non_indexed_tables.append(new_table)
-
-                            if qualified_name not in existing_tables_set:
-                                self.store_table_summary(
-                                    database=db, 
-                                    schema=sch, 
-                                    table=obj["table_name"], 
-                                    ddl=current_ddl, 
-                                    ddl_short=current_ddl, 
-                                    summary="{!placeholder}", 
-                                    sample_data="", 
-                                    matching_connection=matching_connection
-                                )
-
-                    except Exception as e:
-                        logger.info(f'Error processing table in step1: {e}')
+                    obj['object_type'] = 'TABLE'  # Default, but Snowflake handles views internally
+            except Exception as e:
+                logger.info(f'Error running get potential objects Error: {e}')
+        else:
+            try:
+                from genesis_bots.connectors.data_connector import DatabaseConnector
+                connector = DatabaseConnector()
+                connections = connector.list_database_connections(bot_id='system', bot_id_override=True)
+                if connections['success']:
+                    connections = connections['connections']
+                else:
+                    logger.info(f'Error listing connections: {connections.get("error")}')
+                    return None
 
-                # Process objects needing embedding updates
-                needs_updating = [table['QUALIFIED_TABLE_NAME'] for table in existing_tables_info if table["NEEDS_FULL"]]
-                needs_embedding = [(table['QUALIFIED_TABLE_NAME'], table['TABLE_NAME']) for table in existing_tables_info if table["NEEDS_EMBEDDING"]]
-                
-                list_of_catalog_supplement_needed = []
-                if catalog_supplement_needed:
-                    list_of_catalog_supplement_needed = [row['QUALIFIED_TABLE_NAME'] for row in catalog_supplement_needed]
-                for obj in potential_objects:
-                    qualified_name = f'"{db}"."{sch}"."{obj["table_name"]}"'
-                    if qualified_name in needs_updating or qualified_name in list_of_catalog_supplement_needed:
-                        current_ddl = self.alt_get_ddl(
-                            table_name=qualified_name, 
-                            dataset=dataset, 
-                            matching_connection=matching_connection,
-                            object_type=obj['object_type']
-                        )
-                        current_ddl_hash = self.db_connector.sha256_hash_hex_string(current_ddl)
-                        # Get catalog supplement info if this table needs it
-                        catalog_supplement = None
-                        summary = None
-                        ddl_short = None
-                        if qualified_name in list_of_catalog_supplement_needed:
-                            for row in catalog_supplement_needed:
-                                if row['QUALIFIED_TABLE_NAME'] == qualified_name:
-                                    catalog_supplement = row['CATALOG_SUPPLEMENT']
-                                    summary = row['SUMMARY']
-                                    ddl_short = row['DDL_SHORT']
-                                    break
-                        new_table = {
-                            "qualified_table_name": qualified_name, 
-                            "ddl_hash": current_ddl_hash, 
-                            "ddl": current_ddl, 
-                            "dataset": dataset, 
-                            "matching_connection": matching_connection,
-                            "object_type": obj['object_type'],
-                            "catalog_supplement": catalog_supplement,
-                            "summary": summary,
-                            "ddl_short": ddl_short
-                        }
+                matching_connection = None
+                for conn in connections:
+                    if conn['connection_id'] == dataset['source_name']:
+                        matching_connection = conn
+                        break
 
-                        non_indexed_tables.append(new_table)
+                if matching_connection is None:
+                    logger.info(f"No matching connection found for source {dataset['source_name']}")
+                    return None
 
-                for table_info in needs_embedding:
-                    try:
-                        qualified_name = table_info[0]
-                        table_name = table_info[1]
-                        
-                        for current_info in existing_tables_info:
-                            if current_info["QUALIFIED_TABLE_NAME"] == qualified_name:
-                                current_ddl = current_info['DDL']
-                                ddl_short = current_info['DDL_SHORT']
-                                summary = current_info['SUMMARY']
-                                sample_data_text = current_info['SAMPLE_DATA_TEXT']
-                                memory_uuid = current_info['MEMORY_UUID']
-                                ddl_hash = current_info['DDL_HASH']
-                                self.store_table_summary(
-                                    database=db, 
-                                    schema=sch, 
-                                    table=table_name, 
-                                    ddl=current_ddl, 
-                                    ddl_short=ddl_short, 
-                                    summary=summary, 
-                                    sample_data=sample_data_text, 
-                                    memory_uuid=memory_uuid, 
-                                    ddl_hash=ddl_hash
-                                )
+                db_type = matching_connection['db_type']
+                if '+' in db_type:
+                    db_type = db_type.split('+')[0]
 
-                    except Exception as e:
-                        logger.info(f'Error processing table in step1 embedding refresh: {e}')
+                database_name = dataset['database_name']
+                schema_name = dataset['schema_name']
 
-                return non_indexed_tables
+                if matching_connection.get('connection_string'):
+                    if '.redshift.' in matching_connection['connection_string'].lower() or '.redshift-serverless.' in matching_connection['connection_string'].lower():
+                        db_type = 'redshift'                
 
-            except Exception as e:
-                logger.info(f'Error running check query Error: {e}')
-                return None
+                # Get tables
+                sql_tables = self.load_custom_query(db_type, 'get_tables')
+                if sql_tables:
+                    sql_tables = sql_tables.replace('!database_name!', database_name)
+                    sql_tables = sql_tables.replace('!schema_name!', schema_name)
+                    result_tables = connector.query_database(
+                        connection_id=dataset['source_name'],
+                        bot_id='system',
+                        query=sql_tables,
+                        max_rows=1000,
+                        max_rows_override=True,
+                        bot_id_override=True,
+                        database_name=database_name
+                    )
 
-        def process_dataset_step2(self, non_indexed_tables, max_to_process = 1000):
-            try:
-                local_summaries = {}
-                if len(non_indexed_tables) > 0:
-                    logger.info(f'starting indexing of {len(non_indexed_tables)} objects...')
-                
-                for row in non_indexed_tables:
-                    database = None
-                    schema = None
-                    table = None
-                    summary = None
-                    qualified_table_name = None
-                    
-                    try:
-                        dataset = row.get('dataset', None)
-                        matching_connection = row.get('matching_connection', None)
-                        object_type = row.get('object_type', 'TABLE')  # Default to TABLE if not specified
-                        qualified_table_name = row.get('qualified_table_name',row)
-                        logger.info("     -> An object")
-                        database, schema, table = (part.strip('"') for part in qualified_table_name.split('.', 2))
-
-                        # Proceed with generating the summary
-                        columns = self.get_table_columns(dataset, table)
-
-                        summary = row.get('summary', None)
-                        ddl_short = row.get('ddl_short', None)
-                        if not summary:
-                            prompt = self.generate_table_summary_prompt(database, schema, table, columns)
-                            summary = self.generate_summary(prompt)
-                        ddl = row.get('ddl',None)
-                        if not ddl_short:
-                            ddl_short = self.get_ddl_short(ddl)
-
-                        catalog_supplement = row.get('catalog_supplement', None)
-                        if catalog_supplement:
-                            ddl_short += f"\nSupplemental information from the Data Catalog: {catalog_supplement}"
-                            summary += f"\nSupplemental information from the Data Catalog: {catalog_supplement}"
-                        logger.info('Storing summary for new object')
-                        self.store_table_memory(
-                            database, 
-                            schema, 
-                            table, 
-                            summary, 
-                            ddl=ddl, 
-                            ddl_short=ddl_short, 
-                            dataset=dataset, 
-                            matching_connection=matching_connection,
-                            object_type=object_type ,
-                            catalog_supplement=catalog_supplement
-                        )
-                        
-                        if qualified_table_name:
-                            local_summaries[qualified_table_name] = summary
-                            
-                    except Exception as e:
-                        logger.info(f"Harvester Error on Object: {e}")
-                        if all([database, schema, table]):
-                            self.store_table_memory(
-                                database, 
-                                schema, 
-                                table, 
-                                summary=f"Harvester Error: {e}", 
-                                ddl="Harvester Error", 
-                                ddl_short="Harvester Error", 
-                                dataset=dataset
-                            )
-                
-                return local_summaries
-                
+                    col_num = 0
+                    if 'columns' in result_tables and result_tables['columns']:
+                        for i, col in enumerate(result_tables['columns']):
+                            if col.lower() == 'name' or col.lower() == 'tablename':
+                                col_num = i
+                                break
+                    if isinstance(result_tables, dict) and result_tables.get('success'):
+                        for row in result_tables['rows']:
+                            potential_objects.append({
+                                'name': row[col_num],
+                                'object_type': 'TABLE'
+                            })
+
+                # Get views
+                sql_views = self.load_custom_query(db_type, 'get_views')
+                if sql_views:
+                    sql_views = sql_views.replace('!database_name!', database_name)
+                    sql_views = sql_views.replace('!schema_name!', schema_name)
+                    result_views = connector.query_database(
+                        connection_id=dataset['source_name'],
+                        bot_id='system',
+                        query=sql_views,
+                        max_rows=1000,
+                        max_rows_override=True,
+                        bot_id_override=True,
+                        database_name=database_name
+                    )
+                    col_num = 0
+                    if 'columns' in result_views and result_views['columns']:
+                        for i, col in enumerate(result_views['columns']):
+                            if col.lower() == 'name' or col.lower() == 'tablename' or col.lower() == 'viewname':
+                                col_num = i
+                                break
+                    if isinstance(result_views, dict) and result_views.get('success'):
+                        for row in result_views['rows']:
+                            potential_objects.append({
+                                'name': row[col_num],
+                                'object_type': 'VIEW'
+                            })
             except Exception as e:
-                logger.error(f"Error in process_dataset_step2: {e}")
-                return {}
-
-        # Using ThreadPoolExecutor to parallelize dataset processing
-
-        # MAIN LOOP
-
-        tables_for_full_processing = []
-        random.shuffle(schemas)
-        try:
-            logger.info(f"Harvester checking {len(schemas)} schemas for new objects.")
-        except Exception as e:
-            logger.info(f'Error printing schema count log line. {e}')
-
-
-        for schema in schemas:
-            tables_for_full_processing.extend(process_dataset_step1(schema))
-        random.shuffle(tables_for_full_processing)
-        process_dataset_step2(self, tables_for_full_processing)
+                logger.error(f"Error getting objects from database: {e}")
+                potential_objects = []
+        return potential_objects, matching_connection, db_type
+
+    def _harvest_item(self, dataset, matching_connection, table_name, object_type='TABLE', **fields):
+        item = {
+            'dataset': dataset,
+            'matching_connection': matching_connection,
+            'database': dataset['database_name'],
+            'schema': dataset['schema_name'],
+            'table': table_name,
+            'qualified_table_name': f'"{dataset["database_name"]}"."{dataset["schema_name"]}"."{table_name}"',
+            'object_type': object_type,
+            'new': False,
+            'summarize': True,      # False: only the embedding is missing
+            'catalog': None,
+            'ddl': None,
+            'ddl_hash': None,
+            'ddl_short': None,
+            'columns': None,
+            'summary': None,
+            'sample_data': None,
+            'catalog_supplement': None,
+            'memory_uuid': str(uuid.uuid4()),
+        }
+        item.update(fields)
+        return item
+
+    def _harvest_scan(self, dataset, catalog_reader, schemas_by_database, limits):
+        """Pipeline stage: diffs the objects of a dataset against the harvest results; one item per object to process."""
+        listing = limits.call('source', dataset['source_name'], self._list_harvest_objects, dataset)
+        if listing is None:
+            return []
+        potential_objects, matching_connection, db_type = listing
+        db, sch = dataset['database_name'], dataset['schema_name']
 
-        return 'Processed'
+        if os.environ.get("CORTEX_MODE", 'False') == 'True':
+            embedding_column = 'embedding_native'
+        else:
+            embedding_column = 'embedding'
 
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            future_to_dataset = {executor.submit(process_dataset, schema, max_to_process): schema for schema in schemas if total_processed < max_to_process}
+        if self.db_connector.source_name == 'Snowflake':
+            check_query = f"""
+            SELECT qualified_table_name, table_name, ddl_hash, last_crawled_timestamp, ddl, ddl_short, summary, sample_data_text, memory_uuid, (SUMMARY = '{{!placeholder}}') as needs_full, NULLIF(COALESCE(ARRAY_TO_STRING({embedding_column}, ','), ''), '') IS NULL as needs_embedding
+            FROM {self.db_connector.metadata_table_name}
+            WHERE  source_name = '{dataset['source_name']}'
+            AND database_name= '{db}' and schema_name = '{sch}';"""
+        else:
+            check_query = f"""
+            SELECT qualified_table_name, table_name, ddl_hash, last_crawled_timestamp, ddl, ddl_short, summary, sample_data_text, memory_uuid, (SUMMARY = '{{!placeholder}}') as needs_full, {embedding_column} IS NULL as needs_embedding
+            FROM {self.db_connector.metadata_table_name}
+            WHERE source_name = '{dataset['source_name']}'
+            AND database_name= '{db}' and schema_name = '{sch}';"""
+
+        # Query to find tables with unloaded catalog supplements
+        catalog_supplement_query = f"""
+        SELECT qualified_table_name, catalog_supplement, summary, ddl_short
+        FROM {self.db_connector.metadata_table_name}
+        WHERE source_name = '{dataset['source_name']}'
+        AND database_name = '{db}' 
+        AND schema_name = '{sch}'
+        AND catalog_supplement IS NOT NULL 
+        AND catalog_supplement != ''
+        AND (catalog_supplement_loaded IS NULL OR catalog_supplement_loaded = 'FALSE');
+        """
 
-            for future in as_completed(future_to_dataset):
-                dataset = future_to_dataset[future]
-                try:
-                    _, dataset_summaries = future.result()
-                    if dataset_summaries:
-                        summaries.update(dataset_summaries)
-                        total_processed += len(dataset_summaries)
-                        if total_processed >= max_to_process:
-                            break
-                except Exception as exc:
-                    logger.info(f'Dataset {dataset} generated an exception: {exc}')
+        # DDL and columns of all objects of the database in one catalog query, built in memory
+        catalog = None
+        if potential_objects:
+            catalog = limits.call('source', dataset['source_name'], catalog_reader.get_schema,
+                                  dataset, db_type, schemas_by_database.get((dataset['source_name'], db)))
+
+        existing_tables_info = self.db_connector.run_query(check_query, max_rows=_CATALOG_MAX_ROWS, max_rows_override=True)
+        existing_tables_info = [{k.upper(): v for k, v in table.items()} for table in existing_tables_info]
+        catalog_supplement_needed = self.db_connector.run_query(catalog_supplement_query, max_rows=_CATALOG_MAX_ROWS, max_rows_override=True)
+        existing_tables_by_name = {info['QUALIFIED_TABLE_NAME']: info for info in existing_tables_info}
+        catalog_supplement_by_name = {}
+        if catalog_supplement_needed:
+            catalog_supplement_by_name = {row['QUALIFIED_TABLE_NAME']: row for row in catalog_supplement_needed}
+
+        items = []
+        for obj in potential_objects:
+            if 'name' in obj and 'table_name' not in obj:
+                obj['table_name'] = obj['name']
+            item = self._harvest_item(dataset, matching_connection, obj['table_name'], obj['object_type'], catalog=catalog)
+            info = existing_tables_by_name.get(item['qualified_table_name'])
+            supplement = catalog_supplement_by_name.get(item['qualified_table_name'])
+            if info is None:
+                item['new'] = True
+                logger.info('Newly found object added to harvest array (no cache hit)')
+            elif not info['NEEDS_FULL'] and supplement is None:
+                continue
+            if supplement is not None:
+                item.update(catalog_supplement=supplement['CATALOG_SUPPLEMENT'], summary=supplement['SUMMARY'],
+                            ddl_short=supplement['DDL_SHORT'])
+            items.append(item)
+
+        # summarized objects without an embedding, e.g. from a harvest interrupted after the summary was stored
+        for info in existing_tables_info:
+            if not info['NEEDS_EMBEDDING'] or info['NEEDS_FULL'] or info['QUALIFIED_TABLE_NAME'] in catalog_supplement_by_name:
+                continue
+            items.append(self._harvest_item(
+                dataset, matching_connection, info['TABLE_NAME'], summarize=False, ddl=info['DDL'],
+                ddl_hash=info['DDL_HASH'], ddl_short=info['DDL_SHORT'], summary=info['SUMMARY'],
+                sample_data=info['SAMPLE_DATA_TEXT'] or "", memory_uuid=info['MEMORY_UUID']))
+        return items
+
+    def _harvest_ddl(self, item, limits):
+        """Pipeline stage: DDL of the object; a new object is recorded with a placeholder summary right away."""
+        catalog = item.pop('catalog', None)
+        if item['ddl'] is None:
+            obj = {'table_name': item['table'], 'object_type': item['object_type']}
+            item['ddl'], item['ddl_hash'], columns = limits.call(
+                'source', item['dataset']['source_name'], self._describe_object,
+                item['dataset'], obj, item['qualified_table_name'], item['matching_connection'], catalog)
+            if item['columns'] is None:
+                item['columns'] = columns
+        if item['new']:
+            self.db_connector.insert_table_summary(
+                database_name=item['database'],
+                schema_name=item['schema'],
+                table_name=item['table'],
+                ddl=item['ddl'],
+                ddl_short=item['ddl'],
+                summary="{!placeholder}",
+                sample_data_text="",
+                memory_uuid=item['memory_uuid'],
+                ddl_hash=item['ddl_hash'],
+                matching_connection=item['matching_connection']
+            )
+        return [item]
 
+    def _harvest_sample(self, item, limits):
+        """Pipeline stage: sample data, and the column list when the catalog did not provide it."""
+        source_name = item['dataset']['source_name']
+        if item['sample_data'] is None:
+            sample_data = limits.call('source', source_name, self.get_sample_data, item['dataset'], item['table'])
+            try:
+                item['sample_data'] = self.format_sample_data(sample_data) if sample_data else ""
+            except Exception:
+                item['sample_data'] = "format error"
+        if item['summarize'] and item['columns'] is None:
+            item['columns'] = limits.call('source', source_name, self.get_table_columns, item['dataset'], item['table'])
+        return [item]
+
+    def _harvest_summarize(self, item, limits, provider):
+        """Pipeline stage: LLM summary and short DDL; the result is checkpointed without an embedding."""
+        if not item['summarize']:
+            return [item]
+        if not item['summary']:
+            prompt = self.generate_table_summary_prompt(item['database'], item['schema'], item['table'], item['columns'] or [])
+            item['summary'] = limits.call('llm', provider, self.generate_summary, prompt)
+        if not item['ddl_short']:
+            item['ddl_short'] = limits.call('llm', provider, self.get_ddl_short, item['ddl'])
+        if item['catalog_supplement']:
+            item['ddl_short'] += f"\nSupplemental information from the Data Catalog: {item['catalog_supplement']}"
+            item['summary'] += f"\nSupplemental information from the Data Catalog: {item['catalog_supplement']}"
+        self._insert_harvest_result(item, embedding=None, crawl_status="Summarized")
+        return [item]
+
+    def _harvest_embed(self, item, limits, provider):
+        item['complete_description'] = self._table_memory_content(
+            item['database'], item['schema'], item['table'], item['ddl'], item['ddl_short'], item['summary'], item['sample_data'])
+        item['embedding'] = limits.call('embedding', provider, self.get_embedding, item['complete_description'])
+        return [item]
+
+    def _harvest_store(self, item):
+        self._insert_harvest_result(item, embedding=item['embedding'])
+        logger.info('Stored summary for an object in Harvest Results.')
+        return None
+
+    def _insert_harvest_result(self, item, embedding, crawl_status="Completed"):
+        self.db_connector.insert_table_summary(
+            database_name=item['database'],
+            schema_name=item['schema'],
+            table_name=item['table'],
+            ddl=item['ddl'],
+            ddl_short=item['ddl_short'],
+            summary=item['summary'],
+            sample_data_text=item['sample_data'],
+            complete_description=item.get('complete_description', ""),
+            crawl_status=crawl_status,
+            embedding=embedding,
+            memory_uuid=item['memory_uuid'],
+            ddl_hash=item['ddl_hash'],
+            matching_connection=item['matching_connection'],
+            catalog_supplement=item['catalog_supplement']
+        )
+
+    def _harvest_error(self, stage_name, item, error):
+        if stage_name == 'scan':
+            logger.info(f"Harvester error scanning {item['source_name']}.{item['database_name']}.{item['schema_name']}: {error}")
+            return
+        logger.info(f"Harvester Error on Object in stage {stage_name}: {error}")
+        self.store_table_summary(
+            item['database'],
+            item['schema'],
+            item['table'],
+            summary=f"Harvester Error: {error}",
+            ddl="Harvester Error",
+            ddl_short="Harvester Error",
+            sample_data="Harvester Error",
+            matching_connection=item['matching_connection']
+        )
 
     def get_sample_data(self, dataset, table_name):
         """
@@ -51,23 +51,16 @@ def get_llm_api_key(db_adapter=None):
         while not wake_up:
 
             try:
-                cursor = db_adapter.client.cursor()
-                check_bot_active = f"DESCRIBE TABLE {db_adapter.schema}.BOTS_ACTIVE"
-                cursor.execute(check_bot_active)
-                result = cursor.fetchone()
+                active_bots = db_adapter.db_get_active_bots(minutes=5)
 
-                bot_active_time_dt = datetime.strptime(result[0], '%Y-%m-%d %H:%M:%S %Z')
-                current_time = datetime.now()
-                time_difference = current_time - bot_active_time_dt
+                logger.info(f"BOTS ACTIVE IN THE LAST 5 MINUTES: {len(active_bots)} | knowledge server")
 
-                logger.info(f"BOTS ACTIVE TIME: {result[0]} | CURRENT TIME: {current_time} | TIME DIFFERENCE: {time_difference} | knowledge server")
-
-                if time_difference < timedelta(minutes=5):
+                if active_bots:
                     wake_up = True
                 else:
                     time.sleep(refresh_seconds)
             except:
-                logger.info('Waiting for BOTS_ACTIVE table to be created...')
+                logger.info('Waiting for BOT_HEARTBEATS table to be created...')
                 time.sleep(refresh_seconds)
 
         i = i + 1
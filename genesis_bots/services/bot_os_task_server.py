@@ -11,8 +11,10 @@ from   apscheduler.schedulers.background \
 from   flask                    import Flask, jsonify, make_response, request
 from   genesis_bots.core.bot_os_server \
                                 import BotOsServer
+from   genesis_bots.core.bot_os_task_schedule \
+                                import TaskSchedule
 from   genesis_bots.core.tools.process_scheduler \
-                                import process_scheduler
+                                import list_scheduled_tasks, process_scheduler
 # from connectors import get_global_db_connector
 from   genesis_bots.bot_genesis.make_baby_bot \
                                 import (get_all_bots_full_details,
@@ -245,26 +247,19 @@ def get_llm_api_key(db_adapter=None):
 
             ii = 0
             try:
-                cursor = db_adapter.client.cursor()
-                check_bot_active = f"DESCRIBE TABLE {db_adapter.schema}.BOTS_ACTIVE"
-                cursor.execute(check_bot_active)
-                result = cursor.fetchone()
-
-                bot_active_time_dt = datetime.strptime(result[0], '%Y-%m-%d %H:%M:%S %Z')
-                current_time = datetime.now()
-                time_difference = current_time - bot_active_time_dt
+                active_bots = db_adapter.db_get_active_bots(minutes=5)
 
                 ii += 1
                 if ii >= 30:
-                    logger.info(f"BOTS ACTIVE TIME: {result[0]} | CURRENT TIME: {current_time} | TIME DIFFERENCE: {time_difference} | task server")
+                    logger.info(f"BOTS ACTIVE IN THE LAST 5 MINUTES: {len(active_bots)} | task server")
                     ii = 0
 
-                if time_difference < timedelta(minutes=5):
+                if active_bots:
                     wake_up = True
                 else:
                     time.sleep(refresh_seconds)
             except:
-                logger.info('Waiting for BOTS_ACTIVE table to be created...')
+                logger.info('Waiting for BOT_HEARTBEATS table to be created...')
                 time.sleep(refresh_seconds)
 
         i = i + 1
@@ -416,6 +411,20 @@ def lookup_udf():
         return None
 
 
+@app.route("/udf_proxy/lookup_stream", methods=["POST"])
+def lookup_stream():
+
+    message = request.json
+    input_rows = message["data"]
+    bot_id = input_rows[0][2]
+
+    bots_udf_adapter = bot_id_to_udf_adapter_map.get(bot_id, None)
+    if bots_udf_adapter is not None:
+        return bots_udf_adapter.lookup_stream_fn()
+    else:
+        return None
+
+
 @app.route("/udf_proxy/list_available_bots", methods=["POST"])
 def list_available_bots_fn():
 
@@ -1112,17 +1121,14 @@ def task_log_and_update(bot_id, task_id, task_result):
 
 def tasks_loop():
 
-    from collections import deque
-    from sortedcontainers import SortedList
-
-    # Initialize a deque for pending tasks
-    pending_tasks = deque()
+    test_task_mode = os.getenv("TEST_TASK_MODE", "false").lower() == "true"
+    # Active tasks of all bots in a min-heap on next_check_ts, and the submitted (in-flight) runs by task_id
+    schedule = TaskSchedule(list_scheduled_tasks,
+                            refresh_seconds=int(os.getenv("TASK_SCHEDULE_REFRESH_SECONDS", "60")),
+                            max_run_seconds=30 * 60)
     task_retry_attempts_map = {}
 
-    def task_sort_key(task):
-        return task["next_check_ts"]
-
-    if os.getenv("TEST_TASK_MODE", "false").lower() != "true":
+    if not test_task_mode:
         backup_bot_servicing()
 
     i = 10
@@ -1139,90 +1145,37 @@ def tasks_loop():
             sys.stdout.flush()
             i = 0
 
-        # Get all bot details
-        all_bots_details = get_all_bots_full_details(runner_id=runner_id)
-
-        # Extract bot IDs from the details
-        all_bot_ids = [bot['bot_id'] for bot in all_bots_details]
-
-        # global sessions
+        # Reload the bots and their task definitions (one query for all bots) every refresh_seconds; in between, the
+        # schedule is kept current from the results of the task runs
+        if schedule.needs_refresh(iteration_start_time):
+            all_bots_details = get_all_bots_full_details(runner_id=runner_id)
+            all_bot_ids = [bot['bot_id'] for bot in all_bots_details]
+            if not test_task_mode:
+                add_sessions(all_bot_ids, all_bots_details, sessions)
+            changed = schedule.refresh([session.bot_id for session in sessions], iteration_start_time)
+            if changed:
+                logger.info(f"Task schedule refreshed: {changed} task(s) changed, {len(schedule)} active task(s)")
 
-        if os.getenv("TEST_TASK_MODE", "false").lower() != "true":
-            add_sessions(all_bot_ids, all_bots_details, sessions)
-
-        # Retrieve the list of bots and their tasks
+        active_sessions = sessions
+        sessions_by_bot_id = {session.bot_id.upper(): session for session in active_sessions}
 
-        # Check for tasks submitted more than 10 minutes ago
-        ten_minutes_ago = datetime.now() - timedelta(minutes=30)
-        overdue_tasks = [
-            task
-            for task in pending_tasks
-            if datetime.strptime(task["submited_time"], "%Y-%m-%d %H:%M:%S")
-            < ten_minutes_ago
-        ]
-        for task in overdue_tasks:
+        for task_meta in schedule.expire_overdue(iteration_start_time):
             logger.info(
-                f"Task {task['task_id']} from bot {task['bot_id']} is overdue, running for more than 30 minutes, removing from queue. Can we cancel the run?."
+                f"Task {task_meta['task_id']} from bot {task_meta['bot_id']} is overdue, running for more than 30 minutes, removing from queue. Can we cancel the run?."
             )
-            pending_tasks.remove(task)
-            # set to failed status
-
-        skipped_tasks = SortedList(key=task_sort_key)
-        active_sessions = sessions
 
-        # Assuming sessions is a list of session objects and sessions_to_recreate is a list of bot_ids
-        # sessions = [session for session in sessions if session.bot_id not in sessions_to_recreate]
-
-        # if len(sessions_to_recreate) > 0:
-        #     all_bots_details = get_all_bots_full_details(runner_id=runner_id)
-        #     add_sessions(all_bot_ids, all_bots_details, sessions)
-
-        for session in active_sessions:
-            bot_id = session.bot_id
-            if os.getenv("TEST_TASK_MODE", "false").lower() == "true":
-                logger.info('test task mode - looking for tasks for bot ',bot_id)
-            tasks = process_scheduler(action="LIST", bot_id=bot_id, task_id=None)
-           # if os.getenv("TEST_TASK_MODE", "false").lower() == "true":
-           #     logger.info('test task mode - tasks are: ',tasks)
-            if tasks.get("Success"):
-                for task in [
-                    t for t in tasks.get("Scheduled Processes", []) if t.get("task_active", False)
-                ]:
-              #      if os.getenv("TEST_TASK_MODE", "false").lower() == "true":
-              #          if task['task_id'] != 'janiCortex-123456_monitor_unused_data_tables_6WIDsb_HDBgeH':
-               #             continue
-                 #       logger.info('test task mode - task is: ',task)
-                    # If an instance of the task is not alreday running, Process the task using the bot
-                    if not any(
-                        pending_task["task_id"] == task["task_id"]
-                        for pending_task in pending_tasks
-                    ):
-                        task_result = submit_task(
-                            session=session, bot_id=bot_id, task=task
-                        )
-                        if task_result.get('task_skipped', False) and task_result['reason'] == "Next check timestamp is in the future.":
-                            skipped_tasks.add(task)
-                        if "bot_id" in task_result:
-                            pending_tasks.append(task_result)
-                            logger.info(f"Task {task['task_id']} has been started.")
-                    else:
-                        submitted_time = next(
-                            (
-                                pt["submited_time"]
-                                for pt in pending_tasks
-                                if pt["task_id"] == task["task_id"]
-                            ),
-                            None,
-                        )
-                        if submitted_time:
-                            logger.info(
-                                f"Task {task['task_id']} from bot {bot_id} is already running. It has been running for {(datetime.now() - datetime.strptime(submitted_time, '%Y-%m-%d %H:%M:%S')).total_seconds() / 60:.2f} minutes."
-                            )
-        #  i = input('Check for done? >')
-
-        # for testing, make
+        # Submit the due tasks; tasks with an instance still running are not handed out by the schedule
+        for task in schedule.pop_due(datetime.max if test_task_mode else datetime.now()):
+            session = sessions_by_bot_id.get(task["bot_id"].upper())
+            task_result = {}
+            if session is not None:
+                task_result = submit_task(session=session, bot_id=session.bot_id, task=task)
+            if "bot_id" in task_result:
+                schedule.mark_submitted(task["task_id"], task_result)
+                logger.info(f"Task {task['task_id']} has been started.")
+            else:
+                schedule.retry_later(task["task_id"], 120)
 
-        next_runs = []
         for session in active_sessions:
             # Find the input adapter that is an instance of BotOsInputAdapter
             input_adapter = next(
@@ -1234,9 +1187,10 @@ def tasks_loop():
                 None,
             )
             response_map = input_adapter.response_map
+            if not response_map:
+                continue
             bot_id = session.bot_id
-            tasks = process_scheduler(action="LIST", bot_id=bot_id, task_id=None)
-            processed_tasks = []
+            processed_tasks = {}    # task_id -> next run time, None if the task is no longer active
             for task_id, response in response_map.items():
 
                 logger.info(
@@ -1334,9 +1288,7 @@ def tasks_loop():
                     task_response_data["stop_task_flag"] = True
                     try:
                         try:
-                            task = next(
-                                (t for t in tasks["Scheduled Processes"] if t["task_id"] == task_id), None
-                            )
+                            task = schedule.get(task_id)
                             task_creator_id = task.get("primary_report_to_id", None)
                             task_name = task.get("task_name", None)
                             slack_adapter = next(
@@ -1389,9 +1341,6 @@ def tasks_loop():
                             logger.info(
                                 f"Changed next_run_time for task {task_id} from bot {bot_id} to ensure it's at least 5 minutes from now."
                             )
-                        next_run_time = datetime.strptime(     task_response_data["next_run_time"], "%Y-%m-%d %H:%M:%S"   )
-                        next_runs.append(next_run_time)
-
 
 
                 if not response_valid:
@@ -1410,7 +1359,7 @@ def tasks_loop():
                             f"Task {task_id} has exceeded the maximum number of retries. Marking as inactive."
                         )
 
-                        processed_tasks.append(task_id)
+                        processed_tasks[task_id] = None
 
                         process_scheduler(
                             action="UPDATE_CONFIRMED",
@@ -1464,7 +1413,7 @@ def tasks_loop():
                         )
                         task_meta = {
                             "bot_id": bot_id,
-                            "task_id": task["task_id"],
+                            "task_id": task_id,
                             "submited_time": current_timestamp_str,
                         }
                         event = {
@@ -1484,12 +1433,13 @@ def tasks_loop():
                 # ...
 
                 if response_valid:
-                    processed_tasks.append(task_id)
+                    if task_response_data.get("stop_task_flag", False):
+                        processed_tasks[task_id] = None
+                    else:
+                        processed_tasks[task_id] = task_response_data["next_run_time"]
 
-            for task_id in processed_tasks:
-                pending_tasks = deque(
-                    [task for task in pending_tasks if task["task_id"] != task_id]
-                )
+            for task_id, next_run_time in processed_tasks.items():
+                schedule.mark_done(task_id, next_run_time)
                 response_map.pop(task_id, None)
 
         #   i = input('Next round? >')
@@ -1500,68 +1450,39 @@ def tasks_loop():
         # else:
         #     logger.info('Waiting 60 seconds before checking tasks again...')
 
-        # for testing, set skipped_tasks[0]["next_check_ts"] to datetime.now() + timedelta(seconds=30)
-        # skipped_tasks[0]["next_check_ts"] = datetime.now() + timedelta(seconds=30)
-
+        # Sleep until the next task is due, the schedule needs a refresh, or (while runs are in flight) the next
+        # check for responses; in between, wake up early if a bot was recently active
         wake_up = False
         i = 0
         while not wake_up:
-             # Check for a task within the next two minutes
-
-            seconds_until_next_check = None
-
-            if len(skipped_tasks) > 0:
-                try:
-                    seconds_until_next_check = (datetime.strptime(skipped_tasks[0]["next_check_ts"], '%Y-%m-%d %H:%M:%S') - datetime.now()).total_seconds()
-                except:
-                    seconds_until_next_check = (datetime.strptime(skipped_tasks[0]["next_check_ts"], '%Y-%m-%d %H:%M:%S %Z') - datetime.now()).total_seconds()
-                if seconds_until_next_check and seconds_until_next_check < 120:
-                    wake_up = True
-                    logger.info(f"Seconds until next check: {seconds_until_next_check:.2f}")
-                    logger.info(f"Task {task['task_id']} is due to run soon.")
-            if len(pending_tasks) > 0:
-                wake_up = True
-            for next_run in next_runs:
-                if next_run < datetime.now() + timedelta(minutes=2):
-                    wake_up = True
-                    logger.info(f"A task is due to run soon.")
-                    next_runs.remove(next_run)
-                    seconds_until_next_run = (next_run - datetime.now()).total_seconds()
-                    if seconds_until_next_check is None or seconds_until_next_run < seconds_until_next_check:
-                        seconds_until_next_check = seconds_until_next_run
-                    logger.info(f"Task due to run in {seconds_until_next_check:.2f} seconds.")
-                    #break
-
-            if seconds_until_next_check is not None:
-                wait_time = max(0, min(120, seconds_until_next_check))
-            else:
-                wait_time = 120
-            if len(pending_tasks) > 0:
-                    wait_time = 15
-
-            if os.getenv("TEST_TASK_MODE", "false").lower() == "true":
+            now = datetime.now()
+            wait_time = 120
+            seconds_until_next_check = schedule.seconds_until_next(now)
+            if seconds_until_next_check is not None and seconds_until_next_check <= wait_time:
+                wait_time, wake_up = seconds_until_next_check, True
+                logger.info(f"Task due to run in {seconds_until_next_check:.2f} seconds.")
+            if schedule.seconds_until_refresh(now) <= wait_time:
+                wait_time, wake_up = schedule.seconds_until_refresh(now), True
+            if schedule.in_flight and wait_time > 15:
+                wait_time, wake_up = 15, True
+
+            if test_task_mode:
                 logger.info("TEST_TASK_MODE -> overriding sleep to 5 seconds...")
                 wait_time = 5
                 wake_up = True
             time.sleep(wait_time)
 
             if os.getenv("TEST_TASK_MODE", "false").lower() == "false":
-                cursor = db_adapter.client.cursor()
-                check_bot_active = f"DESCRIBE TABLE {db_adapter.schema}.BOTS_ACTIVE"
-                cursor.execute(check_bot_active)
-                result = cursor.fetchone()
-
-                bot_active_time_dt = datetime.strptime(result[0], '%Y-%m-%d %H:%M:%S %Z')
-                current_time = datetime.now()
-                time_difference = current_time - bot_active_time_dt
+                active_bots = db_adapter.db_get_active_bots(minutes=5)
 
                 i = i + 1
                 if i == 1:
-                    logger.info(f"BOTS ACTIVE TIME: {result[0]} | CURRENT TIME: {current_time} | TIME DIFFERENCE: {time_difference}")
+                    last_active = active_bots[0]['last_active'] if active_bots else None
+                    logger.info(f"BOTS ACTIVE IN THE LAST 5 MINUTES: {len(active_bots)} | LAST ACTIVE (UTC): {last_active}")
                 if i > 30:
                     i = 0
 
-                if time_difference < timedelta(minutes=5):
+                if active_bots:
                     wake_up = True
         #         logger.info("Bot is active")
 
@@ -2,7 +2,6 @@ import os
 import json
 import sys
 import time
-from datetime import datetime, timedelta
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
@@ -63,22 +62,14 @@ def get_llm_api_key(db_adapter):
             ii = 0
 
             try:
-                cursor = db_adapter.client.cursor()
-                check_bot_active = f"DESCRIBE TABLE {db_adapter.schema}.BOTS_ACTIVE"
-                cursor.execute(check_bot_active)
-                result = cursor.fetchone()
-
-                bot_active_time_dt = datetime.strptime(result[0], '%Y-%m-%d %H:%M:%S %Z')
-                current_time = datetime.now()
-                time_difference = current_time - bot_active_time_dt
-
+                active_bots = db_adapter.db_get_active_bots(minutes=5)
 
                 ii += 1
                 if ii >= 30:
-                    logger.info(f"BOTS ACTIVE TIME: {result[0]} | CURRENT TIME: {current_time} | TIME DIFFERENCE: {time_difference} | producer")
+                    logger.info(f"BOTS ACTIVE IN THE LAST 5 MINUTES: {len(active_bots)} | producer")
                     ii = 0
 
-                if time_difference < timedelta(minutes=5) or os.getenv("HARVEST_TEST", "false").lower() == "true":
+                if active_bots or os.getenv("HARVEST_TEST", "false").lower() == "true":
                     wake_up = True
                 else:
                     if first_pass:
@@ -86,7 +77,7 @@ def get_llm_api_key(db_adapter):
                         first_pass = False
                     time.sleep(refresh_seconds)
             except:
-                logger.info('Waiting for BOTS_ACTIVE table to be created...')
+                logger.info('Waiting for BOT_HEARTBEATS table to be created...')
                 time.sleep(refresh_seconds)
 
         i = i + 1
@@ -213,21 +204,14 @@ while True:
             wake_up = True
             
         if not wake_up:  # Only check bot activity if we haven't woken up yet
-            cursor = harvester_db_connector.client.cursor()
-            check_bot_active = f"DESCRIBE TABLE {harvester_db_connector.schema}.BOTS_ACTIVE"
-            cursor.execute(check_bot_active)
-            result = cursor.fetchone()
-
-            bot_active_time_dt = datetime.strptime(result[0], '%Y-%m-%d %H:%M:%S %Z')
-            current_time = datetime.now()
-            time_difference = current_time - bot_active_time_dt
+            active_bots = harvester_db_connector.db_get_active_bots(minutes=5)
             i = i + 1
             if i >= 30:
-                logger.info(f"BOTS ACTIVE TIME: {result[0]} | CURRENT TIME: {current_time} | TIME DIFFERENCE: {time_difference}")
+                logger.info(f"BOTS ACTIVE IN THE LAST 5 MINUTES: {len(active_bots)}")
             if i > 30:
                 i = 0
 
-            if time_difference < timedelta(minutes=5):
+            if active_bots:
                 wake_up = True
         if first_pass:
             logger.info("Waiting for bots to be active as running in non-local (Snowflake SCPS) mode. Set SPCS_MODE=FALSE to prevent this sleeping.")
@@ -15,6 +15,8 @@ from genesis_bots.core.bot_os_artifacts import ARTIFACT_ID_REGEX, get_artifacts_
 from genesis_bots.connectors import get_global_db_connector
 
 from genesis_bots.core.logging_config import logger, logging, LogSupressor
+from genesis_bots.slack.slack_update_coalescer import (DEFAULT_SPLIT_AT, SlackResponseStream, SlackUpdateCoalescer,
+                                                        close_code_block, convert_to_slack_format, split_boundary)
 import threading
 import random
 import re
@@ -65,6 +67,10 @@ class SlackBotAdapter(BotOsInputAdapter):
 
             logger.debug("Initializing Slack App")
             self.slack_app = App(token=token, signing_secret=signing_secret)
+            self.update_coalescer = SlackUpdateCoalescer(
+                self.slack_app.client,
+                updates_per_second=float(os.getenv("SLACK_UPDATES_PER_SECOND", 1)),
+            )
 
             logger.debug("Setting basic attributes")
             self.channel_id = channel_id
@@ -79,12 +85,9 @@ class SlackBotAdapter(BotOsInputAdapter):
             self.thinking_map = {}
             self.events_map = {}
             self.handled_events = {}
-            self.chunk_start_map = {}
-            self.chunk_last_100 = {}
-            self.thinking_msg_overide_map = {}
-            self.in_markdown_map = {}
+            self.response_streams = {}  # thinking_ts -> SlackResponseStream of the answer being streamed
             self.finalized_threads = {}
-            self.split_at = 3700  # use 3700 normally
+            self.split_at = DEFAULT_SPLIT_AT
             self.legacy_sessions = legacy_sessions
 
             logger.debug("Setting thread-related attributes to None")
@@ -161,6 +164,7 @@ class SlackBotAdapter(BotOsInputAdapter):
                                     "event": event,
                                     "datetime": datetime.datetime.now().isoformat(),
                                 }
+                                self.notify_input_ready()
                                 if random.randint(1, 100) == 1:
                                     current_time = datetime.datetime.now()
                                     thirty_minutes_ago = current_time - datetime.timedelta(
@@ -198,6 +202,7 @@ class SlackBotAdapter(BotOsInputAdapter):
                         event["channel"] = body["channel"]["id"]
                         with self.events_lock:
                             self.events.append(event)
+                        self.notify_input_ready()
 
                     def run_slack_app():
                         # runs the event loop and blocks on an event. This emulates the .start() method
@@ -228,6 +233,7 @@ class SlackBotAdapter(BotOsInputAdapter):
         """
         if self.slack_socket_mode_handler:
             self.slack_socket_mode_handler.close()
+        self.update_coalescer.close()
         self.slack_thread_shutdown_event.set() # thread should exit now.
         if self.slack_thread and self.slack_thread.is_alive():
             timeout = 1 # 1sec
@@ -243,6 +249,7 @@ class SlackBotAdapter(BotOsInputAdapter):
 
     def add_event(self, event):
         self.events.append(event)
+        self.notify_input_ready()
 
     def add_back_event(self, metadata=None):
         event_ts = metadata["event_ts"],
@@ -264,6 +271,7 @@ class SlackBotAdapter(BotOsInputAdapter):
         ):
             with self.events_lock:
                 self.events.append(event)
+            self.notify_input_ready()
             if (self.bot_user_id, thread_ts) not in thread_ts_dict:
                 with meta_lock:
                     thread_ts_dict[self.bot_user_id, thread_ts] = {
@@ -794,6 +802,25 @@ class SlackBotAdapter(BotOsInputAdapter):
 
 
     # abstract method from BotOsInputAdapter
+    def _response_stream(self, orig_thinking, message, thinking_ts):
+        """The SlackResponseStream of the answer that started in thinking message `orig_thinking`."""
+        stream = self.response_streams.get(orig_thinking)
+        if stream is None:
+            stream = SlackResponseStream(
+                self.update_coalescer,
+                channel=message.input_metadata.get("channel", self.channel_id),
+                thread_ts=message.input_metadata.get("thread_ts", None),
+                ts=thinking_ts,
+                split_at=self.split_at,
+                fix_fn_calls=self.fix_fn_calls,
+            )
+            self.response_streams[orig_thinking] = stream
+        return stream
+
+    def _delete_slack_message(self, channel, ts):
+        self.update_coalescer.discard(channel, ts)
+        self.update_coalescer.call("chat_delete", channel=channel, ts=ts)
+
     def handle_response(
         self,
         session_id: str,
@@ -802,183 +829,46 @@ class SlackBotAdapter(BotOsInputAdapter):
         in_uuid=None,
         task_meta=None,
     ):
-   #     if "!NO_RESPONSE_REQUIRED" in message.output:
-   #         pass
         logger.debug(f"SlackBotAdapter:handle_response - {session_id} {message}")
         thinking_ts = None
         try:
             thinking_ts = message.input_metadata.get("thinking_ts", None)
             orig_thinking = thinking_ts
-            if orig_thinking in self.thinking_msg_overide_map:
-                thinking_ts = self.thinking_msg_overide_map[orig_thinking]
-            if thinking_ts:
-             #   logger.info('0-0-0-0-0-0-0-0 SLACK RESPONSE HANDLER -0-0-0-0-0-0-0-0-0')
-                current_chunk_start =  self.chunk_start_map.get(orig_thinking,None)
-         #       if current_chunk_start:
-         #           logger.info('     Current chunk start: ', current_chunk_start)
-                msg = message.output.replace("\n 💬", " 💬")
-                full_msg = msg
-         #       if current_chunk_start:
-         #           logger.info(f"    Length of message: {len(msg)}")
-                inmarkdown = False
-                if current_chunk_start is not None:
-                    trimmed = False
-                    if orig_thinking in self.chunk_last_100:
-                        last100 = self.chunk_last_100[orig_thinking]
-                        l100 = last100.replace(" \n\n", "\n")
-          #              logger.info(f"    Length of last 100: {len(last100)}")
-                        if last100 in msg:
-           #                 logger.info(f"    Last 100 is in msg")
-                            last_index = msg.rfind(last100, 0, current_chunk_start)
-            #                logger.info(f"    Last index: {last_index}")
-                            if last_index != -1:
-                                msg = msg[last_index + len(last100):]
-                                trimmed=True
-                        if l100 in msg:
-           #                 logger.info(f"    Last 100 is in msg")
-                            last_index = msg.rfind(l100, 0, current_chunk_start)
-            #                logger.info(f"    Last index: {last_index}")
-                            if last_index != -1:
-                                msg = msg[last_index + len(l100):]
-                                trimmed=True
-                        if not trimmed and l100[:100] in msg:
-                            last_index = msg.rfind(l100[:100], 0, current_chunk_start)
-            #                logger.info(f"    Last index: {last_index}")
-                            if last_index != -1:
-                                msg = msg[last_index + len(l100):]
-                                trimmed=True
-             #                   logger.info(f"    Length of new trimmed msg: {len(msg)}")
-                    if not trimmed:
-                 #       logger.info("     Not trimmed based on last100, going to trim on current chunk start: ",current_chunk_start)
-                        msg = msg[current_chunk_start:]
-                  #      logger.info(f"    Length of new trimmed msg: {len(msg)}")
-                    if orig_thinking in self.in_markdown_map:
-                        if self.in_markdown_map[orig_thinking] == True:
-                            msg = '```' + msg
-                 #           logger.info('     Added markedown start to start of msg')
-                            inmarkdown = True
-
-                if (
-                    message.status == "in_progress"
-                    or message.status == "requires_action"
-                    or msg.endswith("💬")
-                ):
-         #           logger.info('processing in_progress message: ', message.status,
-         #               " updating ",
-         #               thinking_ts,
-         #               " len ",
-          #              len(message.output),
-          #          )
-                    # show knowledge incorporated
-                    knowledge_parts = [f"({k}): {v}" for k, v in message.input_metadata.items() if k.endswith("_knowledge")]
-                    if knowledge_parts:
-                        logger.info(f"Length of msg before knowledge add: {len(msg)}")
-                        msg = "\n\n".join(knowledge_parts) + "\n\n" + msg
-                        logger.info(f"Length of msg after knowledge add: {len(msg)}")
-
-                    split_at = self.split_at
-                    if len(msg) > split_at:
-                        logger.info('     Splitting message')
-                        duplicato = False
-                        split_index = msg[max(0, split_at-300):split_at].rfind("\n")
-                        if split_index != -1:
-                            split_index += (split_at-300)
-                        if split_index == -1:
-                            # Find the last space character within the range of 3400 to 3700 to split the message cleanly
-                            split_index = msg[max(0, split_at-300):split_at].rfind(" ")
-                            if split_index != -1:
-                                split_index += split_at
-                        if split_index != -1:
-                            msg_part1 = msg[:split_index]
-                            msg_part2 = msg[split_index:]
-                            chunk_start = split_index
-                        else:
-                            msg_part1 = msg[:split_at]
-                            msg_part2 = msg[split_at:]
-                            chunk_start = split_at
-                        last300 = self.fix_fn_calls(msg_part1[-300:])
-                        self.chunk_last_100[orig_thinking] = last300
-                        if msg_part1.count("```") % 2 != 0:
-                            msg_part1 += "```"
-                            msg_part2 = "```" + msg_part2
-                            self.in_markdown_map[orig_thinking] = True
-                        else:
-                            self.in_markdown_map[orig_thinking] = False
-                        if orig_thinking in self.chunk_start_map:
-                           if self.chunk_start_map[orig_thinking] + chunk_start < len(full_msg):
-                                self.chunk_start_map[orig_thinking] += chunk_start
-                           else:
-                                logger.info('*** avoiding double add to the chunk_start ')
-                                duplicato = True
-                        else:
-                            self.chunk_start_map[orig_thinking] = chunk_start
-                        if inmarkdown:
-                            self.chunk_start_map[orig_thinking] -= 3
-                       # logger.info('chunkstart: ', self.chunk_start_map[orig_thinking])
-                        chunk_start = self.chunk_start_map[orig_thinking]
-                        #logger.info('Breakpoint context: ', message.output.replace("\n 💬", " 💬")[max(0, chunk_start-20):chunk_start] + '<>' + message.output.replace("\n 💬", " 💬")[chunk_start:chunk_start+20])
-                        # Store the first 100 characters of the first part of the message in the chunk_last_100 dictionary
-                        # Store the substring of msg_part1 starting from the 100th character in the chunk_last_100 dictionary
-                        # Store the last 100 characters of msg_part1 in the chunk_last_100 dictionary
-                        if not duplicato:
-                            try:
-                                self.slack_app.client.chat_update(
-                                    channel=message.input_metadata.get("channel", self.channel_id),
-                                    ts=thinking_ts,
-                                    text=self._convert_to_slack_format(self.fix_fn_calls(msg_part1)),
-                                )
-                                thread_ts = message.input_metadata.get("thread_ts", None)
-                            except Exception as e:
-                                pass
-                            if msg_part2.count("```") % 2 != 0:
-                                msg_part2 += "```"
-                            posted_message = self.slack_app.client.chat_postMessage(
-                                channel=message.input_metadata.get("channel", self.channel_id),
-                                thread_ts=thread_ts,
-                                text=self._convert_to_slack_format(msg_part2),
-                            )
-                            thinking_ts = posted_message["ts"]
-                            if orig_thinking is not None:
-                                self.thinking_msg_overide_map[orig_thinking] = thinking_ts
-                        return
+            msg = message.output.replace("\n 💬", " 💬")
+            if thinking_ts and (
+                message.status == "in_progress"
+                or message.status == "requires_action"
+                or msg.endswith("💬")
+            ):
+                channel = message.input_metadata.get("channel", self.channel_id)
+                if message.input_metadata.get("response_authorized", "TRUE") == "FALSE":
+                    message.output = "!NO_RESPONSE_REQUIRED"
+
+                if "!NO_RESPONSE_REQUIRED" in message.output:
+                    if not message.output.startswith("!NO_RESPONSE_REQUIRED"):
+                        message.output = message.output.replace(
+                            "!NO_RESPONSE_REQUIRED", ""
+                        ).strip()
                     else:
-                        if msg.count("```") % 2 != 0:
-                            msg += "```"
-
-                        if message.input_metadata.get("response_authorized", "TRUE") == "FALSE":
-                                message.output = "!NO_RESPONSE_REQUIRED"
-
-                        if "!NO_RESPONSE_REQUIRED" in message.output:
-                            if not message.output.startswith("!NO_RESPONSE_REQUIRED"):
-                                message.output = message.output.replace(
-                                    "!NO_RESPONSE_REQUIRED", ""
-                                ).strip()
-                            else:
-                                logger.info(
-                                    "Bot has indicated that no response will be posted to this thread."
-                                )
-                                if thinking_ts is not None:
-                                    self.slack_app.client.chat_delete(
-                                        channel=message.input_metadata.get("channel", self.channel_id),
-                                        ts=thinking_ts,
-                                    )
-                            return
-
-                        self.slack_app.client.chat_update(
-                            channel=message.input_metadata.get("channel", self.channel_id),
-                            ts=thinking_ts,
-                            text=self._convert_to_slack_format(msg),
+                        logger.info(
+                            "Bot has indicated that no response will be posted to this thread."
                         )
-                        return
-                else:
-                    pass
-                    # self.slack_app.client.chat_delete(channel= message.input_metadata.get("channel",self.channel_id),ts = thinking_ts)
+                        stream = self.response_streams.get(orig_thinking)
+                        self._delete_slack_message(channel, stream.ts if stream else thinking_ts)
+                    return
+
+                # show knowledge incorporated
+                knowledge_parts = [f"({k}): {v}" for k, v in message.input_metadata.items() if k.endswith("_knowledge")]
+                prefix = "\n\n".join(knowledge_parts) + "\n\n" if knowledge_parts else ""
+
+                # the update is coalesced with later ones and sent within the channel's rate limit
+                self._response_stream(orig_thinking, message, thinking_ts).update(msg, prefix=prefix)
+                return
         except Exception as e:
             logger.debug(
                 "thinking already deleted"
             )  # FixMe: need to keep track when thinking is deleted
         message.output = message.output.strip()
-      #  logger.info('...in the completion handler now...')
         if message.output.startswith("<Assistant>"):
             message.output = message.output[len("<Assistant>") :].strip()
 
@@ -994,12 +884,12 @@ class SlackBotAdapter(BotOsInputAdapter):
                 logger.info(
                     "Bot has indicated that no response will be posted to this thread."
                 )
+                stream = self.response_streams.pop(thinking_ts, None)
+                if stream is not None:
+                    thinking_ts = stream.ts
                 if thinking_ts is not None:
                     try:
-                        self.slack_app.client.chat_delete(
-                            channel=message.input_metadata.get("channel", self.channel_id),
-                            ts=thinking_ts,
-                        )
+                        self._delete_slack_message(message.input_metadata.get("channel", self.channel_id), thinking_ts)
                     except:
                         pass
 
@@ -1015,48 +905,16 @@ class SlackBotAdapter(BotOsInputAdapter):
                 else:
                     self.finalized_threads[orig_thinking] = True
 
-                if orig_thinking in self.thinking_msg_overide_map:
-                    thinking_ts = self.thinking_msg_overide_map[orig_thinking]
-
-
-                current_chunk_start =  self.chunk_start_map.get(orig_thinking,None)
+                channel = message.input_metadata.get("channel", self.channel_id)
+                thread_ts = message.input_metadata.get("thread_ts", None)
                 msg = message.output.replace("\n 💬", " 💬")
 
-                if current_chunk_start is not None:
-
-                 #   print (' -0-0-0-0-0- IN the completion handler ready to trim if needed -0-0-0-0-0')
-
-                    trimmed = False
-                    if orig_thinking in self.chunk_last_100:
-                        last100 = self.chunk_last_100[orig_thinking]
-                        logger.info(f"    Length of last 100: {len(last100)}")
-                        if last100 in msg:
-                            logger.info(f"    Last 100 is in msg")
-                            last_index = msg.rfind(last100, 0, current_chunk_start)
-                            logger.info(f"    Last index: {last_index}")
-                            if last_index != -1:
-                                msg = msg[last_index + len(last100):]
-                                trimmed=True
-                                logger.info(f"    Length of new trimmed msg: {len(msg)}")
-                        else:
-                            last50 = last100[-50:]
-                            if last50 in msg:
-                                logger.info(f"    Last 50 is in msg")
-                                last_index = msg.rfind(last50, 0, current_chunk_start)
-                                logger.info(f"    Last index: {last_index}")
-                                if last_index != -1:
-                                    msg = msg[last_index + len(last50):]
-                                    trimmed=True
-                                    logger.info(f"    Length of new trimmed msg based on last50: {len(msg)}")
-                    if not trimmed:
-                        logger.info("     Not trimmed based on last100, going to trim on current chunk start: ",current_chunk_start)
-                        msg = msg[current_chunk_start:]
-                        logger.info(f"    Length of new trimmed msg: {len(msg)}")
-                    if orig_thinking in self.in_markdown_map:
-                        if self.in_markdown_map[orig_thinking] == True:
-                            msg = '```' + msg
-                            logger.info('     Added markdown start to start of msg')
-                            inmarkdown = True
+                # messages already split off while streaming get their final text; msg is what goes in the last one
+                if thinking_ts is not None:
+                    stream = self._response_stream(orig_thinking, message, thinking_ts)
+                    self.response_streams.pop(orig_thinking, None)
+                    msg = stream.finish(msg)
+                    thinking_ts = stream.ts
 
                 msg_trimmed = msg
 
@@ -1073,11 +931,10 @@ class SlackBotAdapter(BotOsInputAdapter):
                 files_in = list(set(message.files + local_paths)) # combine with message.files and remove duplicates
 
                 #          logger.info("Uploading files:", files_in)
-                thread_ts = message.input_metadata.get("thread_ts", None)
                 msg_files = self._upload_files(
                     files_in,
                     thread_ts=thread_ts,
-                    channel=message.input_metadata.get("channel", self.channel_id),
+                    channel=channel,
                 )
 
                 # Replace the markdown of the uploaded files with the Slack-compatible markdown for links to the
@@ -1118,111 +975,67 @@ class SlackBotAdapter(BotOsInputAdapter):
 
                 #      logger.info("sending message to slack post url fixes:", msg)
                 blocks = self._extract_slack_blocks(msg)
-#                if blocks is not None or len(msg) > 2000:
-#                    logger.info('blocks / long: ',len(msg))
-
-                split_at = self.split_at
-                if len(msg) > split_at:
-                    split_index = msg[max(0, split_at-300):split_at].rfind("\n")
-                    if split_index != -1:
-                        split_index += split_at
-                    if split_index == -1:
-                        # Find the last space character within the range of 3400 to 3700 to split the message cleanly
-                        split_index = msg[max(0, split_at-300):split_at].rfind(" ")
-                        if split_index != -1:
-                            split_index += split_at
-                    if split_index != -1:
-                        msg_part1 = msg[:split_index]
-                        msg_part2 = msg[split_index:]
-                        chunk_start = split_index
-                    else:
-                        msg_part1 = msg[:split_at]
-                        msg_part2 = msg[split_at:]
-                        chunk_start = split_at
-                    self.chunk_last_100[orig_thinking] = self.fix_fn_calls(msg_part1[-300:])
+
+                # links and file references can make the last message longer than split_at again
+                split_index = split_boundary(msg, 0, self.split_at)
+                if split_index is not None:
+                    msg_part1 = msg[:split_index]
+                    msg_part2 = msg[split_index:]
                     if msg_part1.count("```") % 2 != 0:
                         msg_part1 += "```"
                         msg_part2 = "```" + msg_part2
-                        self.in_markdown_map[orig_thinking] = True
-                    else:
-                        self.in_markdown_map[orig_thinking] = False
-                    if orig_thinking in self.chunk_start_map:
-                        self.chunk_start_map[orig_thinking] += chunk_start
-                    else:
-                        self.chunk_start_map[orig_thinking] = chunk_start
-                    if inmarkdown:
-                        self.chunk_start_map[orig_thinking] -= 3
-                    # logger.info('chunkstart: ', self.chunk_start_map[orig_thinking])
-                    chunk_start = self.chunk_start_map[orig_thinking]
-
 
                     try:
-                        self.slack_app.client.chat_update(
-                            channel=message.input_metadata.get("channel", self.channel_id),
+                        self.update_coalescer.call(
+                            "chat_update",
+                            channel=channel,
                             ts=thinking_ts,
                             text=self._convert_to_slack_format(self.fix_fn_calls(msg_part1)),
                         )
-                        thread_ts = message.input_metadata.get("thread_ts", None)
                     except Exception as e:
                         pass
 
+                    msg_part2 = close_code_block(msg_part2)
                     if msg_part2 == None or len(msg_part2) == 0:
-                        channel = message.input_metadata.get("channel", self.channel_id)
                         logger.error(f'bot={self.bot_name}: adjusting msg_part2 from "{msg_part2}" to " " {channel=} {thread_ts=}')
                         msg_part2 = " "
 
-                    posted_message = self.slack_app.client.chat_postMessage(
-                        channel=message.input_metadata.get("channel", self.channel_id),
+                    self.update_coalescer.call(
+                        "chat_postMessage",
+                        channel=channel,
                         thread_ts=thread_ts,
                         text=self._convert_to_slack_format(msg_part2),
                     )
-                    thinking_ts = posted_message["ts"]
-                    if orig_thinking is not None:
-                        self.thinking_msg_overide_map[orig_thinking] = thinking_ts
 
                 else:
 
                     if msg_trimmed == msg and thinking_ts is not None:
-                        if msg.count("```") % 2 != 0:
-                            msg += "```"
-                        self.slack_app.client.chat_update(
-                            channel=message.input_metadata.get("channel", self.channel_id),
+                        self.update_coalescer.call(
+                            "chat_update",
+                            channel=channel,
                             ts=thinking_ts,
-                            text=self._convert_to_slack_format(msg),
+                            text=self._convert_to_slack_format(close_code_block(msg)),
                             blocks=blocks,
                         )
                     else:
 
-                        thinking_ts = message.input_metadata.get("thinking_ts", None)
-                        orig_thinking = thinking_ts
-                        if orig_thinking in self.thinking_msg_overide_map:
-                            thinking_ts = self.thinking_msg_overide_map[orig_thinking]
                         if thinking_ts is not None:
-                            self.slack_app.client.chat_delete(
-                                channel=message.input_metadata.get(
-                                    "channel", self.channel_id
-                                ),
-                                ts=thinking_ts,
-                            )
-                        if msg.count("```") % 2 != 0:
-                            msg += "```"
+                            self._delete_slack_message(channel, thinking_ts)
+                        msg = close_code_block(msg)
 
                         if msg == None or len(msg) == 0:
-                            channel = message.input_metadata.get("channel", self.channel_id)
                             logger.error(f'bot={self.bot_name}: adjusting msg from "{msg}" to " " {channel=} {thread_ts=}')
                             msg = " "
 
-                        result = self.slack_app.client.chat_postMessage(
-                            channel=message.input_metadata.get("channel", self.channel_id),
+                        result = self.update_coalescer.call(
+                            "chat_postMessage",
+                            channel=channel,
                             thread_ts=thread_ts,
                             text=self._convert_to_slack_format(msg),
                         )
                         if message.input_metadata.get("thinking_ts", None) is None:
                             message.input_metadata.thinking_ts = result.ts
 
-                #    logger.info("Result of sending message to Slack:", result)
-                # Replace patterns in msg with the appropriate format
-
                 # Utility function handles file uploads and logs errors internally
                 if thread_ts is not None:
                     with meta_lock:
@@ -1543,63 +1356,4 @@ class SlackBotAdapter(BotOsInputAdapter):
             return "Error: unknown slack user.  Maybe use the list_all_bots function to see if its a bot?"
 
     def _convert_to_slack_format(self, msg: str) -> str:
-        import re
-        # Convert Markdown headers (e.g. "# Header") into bold text
-        msg = re.sub(r'^(#{1,6})\s*(.*)', lambda m: f"*{m.group(2).strip()}*", msg, flags=re.MULTILINE)
-        # Convert Markdown bold (e.g. **text**) to Slack bold (*text*)
-        msg = re.sub(r'\*\*(.*?)\*\*', r'*\1*', msg)
-        # Remove language specifiers from triple backticks (e.g. ```python becomes ``` )
-        msg = re.sub(r'```[\w+-]*\n', '```\n', msg)
-        
-        # Special handling for bold headers: format any standalone bold text so that it appears as a clearly delineated header with a trailing colon.
-        msg = re.sub(r'(?:^|\n)(\*[^\*\n]+\*)(?!:)', lambda m: f"\n{m.group(1)}:\n", msg, flags=re.MULTILINE)
-        
-        # Detect and reformat Markdown tables to be monospaced and aligned.
-        table_pattern = re.compile(r'((?:^\|.*\n){3,})', flags=re.MULTILINE)
-        def block_table(match):
-            table_text = match.group(1)
-            lines = [line for line in table_text.splitlines() if line.strip()]
-            rows = []
-            for line in lines:
-                if line.lstrip().startswith("|"):
-                    # Split the row into cells by the '|' delimiter.
-                    cells = [cell.strip() for cell in line.strip().strip('|').split('|')]
-                    rows.append(cells)
-            if not rows:
-                return table_text
-            # Determine the maximum number of columns.
-            num_cols = max(len(row) for row in rows)
-            # Pad rows with missing cells.
-            for row in rows:
-                if len(row) < num_cols:
-                    row.extend([""] * (num_cols - len(row)))
-            # Compute maximum width for each column.
-            col_widths = [0] * num_cols
-            for row in rows:
-                for i, cell in enumerate(row):
-                    col_widths[i] = max(col_widths[i], len(cell))
-            # Helper to check if a row is a separator row (dividing header from data)
-            def is_separator_row(row):
-                return all(re.fullmatch(r'[-:\s]+', cell) for cell in row)
-            formatted_lines = []
-            for row in rows:
-                if is_separator_row(row):
-                    formatted_cells = []
-                    for i, cell in enumerate(row):
-                        cell = cell.strip()
-                        if cell.endswith(':'):
-                            formatted_cells.append('-' * (col_widths[i] - 1) + ':')
-                        else:
-                            formatted_cells.append('-' * col_widths[i])
-                    formatted_line = "| " + " | ".join(formatted_cells) + " |"
-                else:
-                    formatted_cells = [cell.ljust(col_widths[i]) for i, cell in enumerate(row)]
-                    formatted_line = "| " + " | ".join(formatted_cells) + " |"
-                formatted_lines.append(formatted_line)
-            new_table = "\n".join(formatted_lines)
-            return f"```\n{new_table}\n```"
-        msg = table_pattern.sub(block_table, msg)
-        
-        # Convert Markdown unordered lists (e.g. "- item" or "* item") to Slack bullet lists.
-        msg = re.sub(r'^\s*[-*]\s+', '• ', msg, flags=re.MULTILINE)
-        return msg
+        return convert_to_slack_format(msg)
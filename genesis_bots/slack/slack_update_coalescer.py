@@ -0,0 +1,455 @@
+"""
+Streaming answers into Slack messages.
+
+While an answer streams in, SlackBotAdapter.handle_response is called with the whole text so far, many times a
+second. Sending each of these as a chat.update hits Slack's rate limits on busy channels, and re-converting the whole
+text every time burns CPU on text that did not change. The pieces here keep that work proportional to what changed:
+
+  * SlackUpdateCoalescer sends chat.update calls from a worker thread, at most `updates_per_second` per channel.
+    Only the latest text of a message is sent, and a channel that was rate limited is left alone for the Retry-After
+    Slack asked for.
+  * IncrementalSlackFormatter converts a growing text to Slack markdown, re-converting only the part after the last
+    line boundary that is known to convert the same way on its own.
+  * SlackResponseStream maps one answer onto Slack messages of at most `split_at` characters. A split point is
+    chosen once, from the first `split_at` characters of the message, which streaming no longer changes.
+"""
+
+import re
+import threading
+import time
+
+from genesis_bots.core.logging_config import logger
+
+DEFAULT_SPLIT_AT = 3700         # Slack truncates the display of longer messages
+
+
+def convert_to_slack_format(msg: str) -> str:
+    # Convert Markdown headers (e.g. "# Header") into bold text
+    msg = re.sub(r'^(#{1,6})\s*(.*)', lambda m: f"*{m.group(2).strip()}*", msg, flags=re.MULTILINE)
+    # Convert Markdown bold (e.g. **text**) to Slack bold (*text*)
+    msg = re.sub(r'\*\*(.*?)\*\*', r'*\1*', msg)
+    # Remove language specifiers from triple backticks (e.g. ```python becomes ``` )
+    msg = re.sub(r'```[\w+-]*\n', '```\n', msg)
+
+    # Special handling for bold headers: format any standalone bold text so that it appears as a clearly delineated header with a trailing colon.
+    msg = re.sub(r'(?:^|\n)(\*[^\*\n]+\*)(?!:)', lambda m: f"\n{m.group(1)}:\n", msg, flags=re.MULTILINE)
+
+    # Detect and reformat Markdown tables to be monospaced and aligned.
+    table_pattern = re.compile(r'((?:^\|.*\n){3,})', flags=re.MULTILINE)
+    def block_table(match):
+        table_text = match.group(1)
+        lines = [line for line in table_text.splitlines() if line.strip()]
+        rows = []
+        for line in lines:
+            if line.lstrip().startswith("|"):
+                # Split the row into cells by the '|' delimiter.
+                cells = [cell.strip() for cell in line.strip().strip('|').split('|')]
+                rows.append(cells)
+        if not rows:
+            return table_text
+        # Determine the maximum number of columns.
+        num_cols = max(len(row) for row in rows)
+        # Pad rows with missing cells.
+        for row in rows:
+            if len(row) < num_cols:
+                row.extend([""] * (num_cols - len(row)))
+        # Compute maximum width for each column.
+        col_widths = [0] * num_cols
+        for row in rows:
+            for i, cell in enumerate(row):
+                col_widths[i] = max(col_widths[i], len(cell))
+        # Helper to check if a row is a separator row (dividing header from data)
+        def is_separator_row(row):
+            return all(re.fullmatch(r'[-:\s]+', cell) for cell in row)
+        formatted_lines = []
+        for row in rows:
+            if is_separator_row(row):
+                formatted_cells = []
+                for i, cell in enumerate(row):
+                    cell = cell.strip()
+                    if cell.endswith(':'):
+                        formatted_cells.append('-' * (col_widths[i] - 1) + ':')
+                    else:
+                        formatted_cells.append('-' * col_widths[i])
+                formatted_line = "| " + " | ".join(formatted_cells) + " |"
+            else:
+                formatted_cells = [cell.ljust(col_widths[i]) for i, cell in enumerate(row)]
+                formatted_line = "| " + " | ".join(formatted_cells) + " |"
+            formatted_lines.append(formatted_line)
+        new_table = "\n".join(formatted_lines)
+        return f"```\n{new_table}\n```"
+    msg = table_pattern.sub(block_table, msg)
+
+    # Convert Markdown unordered lists (e.g. "- item" or "* item") to Slack bullet lists.
+    msg = re.sub(r'^\s*[-*]\s+', '• ', msg, flags=re.MULTILINE)
+    return msg
+
+
+# ----------------------------------------------------------------------------------------------------------------
+# incremental conversion
+# ----------------------------------------------------------------------------------------------------------------
+# A line starting with one of these may join a rule of convert_to_slack_format with the lines before it (lists,
+# headers, bold headers, tables, code fences).
+_JOINING_LINE_STARTS = frozenset(' \t\r\n\f\v-*#|`')
+
+
+def _is_safe_cut(text, i):
+    """
+    True when text[:i] and text[i:] convert to the same as text: i is just after a newline, no rule can match across
+    it and none looks past it. Only depends on text[:i + 1], so a safe cut stays safe as the text grows.
+    """
+    if i <= 0 or i >= len(text) or text[i - 1] != '\n' or text[i] in _JOINING_LINE_STARTS:
+        return False
+    # a header line ("# ...") followed by blank lines would take the next text line as its title
+    end = i - 1
+    while True:
+        line_start = text.rfind('\n', 0, end) + 1
+        line = text[line_start:end]
+        if line.strip() or line_start == 0:
+            return not line.lstrip().startswith('#')
+        end = line_start - 1
+
+
+class IncrementalSlackFormatter:
+    """
+    convert_to_slack_format for a text that grows by appending. The converted text up to the last safe cut is kept;
+    a call only converts what was appended since, plus the part after the cut. Falls back to a full conversion when
+    the text no longer starts with the kept part.
+    """
+
+    def __init__(self, convert=convert_to_slack_format, scan_back=2000):
+        self.convert = convert
+        self.scan_back = scan_back
+        self.converted_chars = 0
+        self._raw = ''
+        self._converted = ''
+
+
+    def format(self, text):
+        if not text.startswith(self._raw):
+            self._raw, self._converted = '', ''
+        start = len(self._raw)
+        cut = self._last_safe_cut(text, start)
+        if cut > start:
+            self._converted += self._convert(text[start:cut])
+            self._raw = text[:cut]
+        return self._converted + self._convert(text[len(self._raw):])
+
+
+    def _convert(self, text):
+        self.converted_chars += len(text)
+        return self.convert(text)
+
+
+    def _last_safe_cut(self, text, start):
+        lowest = max(start, len(text) - self.scan_back)
+        newline = text.rfind('\n', lowest, len(text) - 1)
+        while newline != -1:
+            if _is_safe_cut(text, newline + 1):
+                return newline + 1
+            newline = text.rfind('\n', lowest, newline)
+        return start
+
+
+# ----------------------------------------------------------------------------------------------------------------
+# rate limited updates
+# ----------------------------------------------------------------------------------------------------------------
+def retry_after_seconds(error):
+    """The Retry-After of a rate limited Slack API error (SlackApiError with HTTP 429), or None for other errors."""
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    data = getattr(response, 'data', None)
+    if getattr(response, 'status_code', None) != 429 and not (isinstance(data, dict) and data.get('error') == 'ratelimited'):
+        return None
+    headers = getattr(response, 'headers', None) or {}
+    value = headers.get('Retry-After', headers.get('retry-after'))
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return 1.0
+
+
+class SlackUpdateCoalescer:
+    """
+    Rate limited Slack calls of one Slack app.
+
+    submit() queues a chat.update; a queued update of the same message is replaced rather than sent, and an update
+    to the text that was last sent is dropped. A worker thread sends queued updates, at most `updates_per_second`
+    per channel. call() makes any other call (posting, deleting, a final update) right away, within the same per
+    channel limit; it supersedes the queued update of the message it targets and retries rate limited calls.
+    Calls to a message are never reordered.
+    """
+
+    def __init__(self, client, updates_per_second=1.0, max_retries=3):
+        self.client = client
+        self.interval = 1.0 / updates_per_second if updates_per_second > 0 else 0.0
+        self.max_retries = max_retries
+        self.stats = {'submitted': 0, 'coalesced': 0, 'unchanged': 0, 'sent': 0, 'rate_limited': 0}
+        self._pending = {}          # (channel, ts) -> kwargs of the latest chat.update, oldest first
+        self._sent = {}             # (channel, ts) -> text last sent
+        self._next_call = {}        # channel -> monotonic time before which it must not be called
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._send_lock = threading.Lock()
+        self._worker = None
+        self._closed = False
+
+
+    def submit(self, channel, ts, text, **kwargs):
+        key = (channel, ts)
+        with self._cond:
+            self.stats['submitted'] += 1
+            if key in self._pending:
+                self.stats['coalesced'] += 1
+            elif self._sent.get(key) == text:
+                self.stats['unchanged'] += 1
+                return
+            self._pending[key] = dict(kwargs, channel=channel, ts=ts, text=text)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="slack_update_coalescer", daemon=True)
+                self._worker.start()
+            self._cond.notify_all()
+
+
+    def call(self, method, **kwargs):
+        """Calls client.<method>(**kwargs) now, waiting for the channel's next slot. Returns the API response."""
+        channel = kwargs.get('channel')
+        key = (channel, kwargs.get('ts'))
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_slot(channel)
+            with self._send_lock:
+                with self._cond:
+                    if self._next_call.get(channel, 0) > time.monotonic():
+                        continue        # rate limited again in the meantime
+                    if kwargs.get('ts') is not None:
+                        self._pending.pop(key, None)
+                    self._next_call[channel] = time.monotonic() + self.interval
+                try:
+                    response = getattr(self.client, method)(**kwargs)
+                except Exception as e:
+                    retry_after = self._rate_limited(channel, e)
+                    if retry_after is None or attempt == self.max_retries:
+                        raise
+                    continue
+                self._record_sent(method, kwargs, response)
+                return response
+        raise RuntimeError(f"Slack {method} to channel {channel} still rate limited after {self.max_retries} retries")
+
+
+    def discard(self, channel, ts):
+        """Drops the queued update of a message, e.g. before it is deleted."""
+        with self._cond:
+            self._pending.pop((channel, ts), None)
+
+
+    def flush(self, timeout=None):
+        """Waits until all queued updates are sent. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._pending.clear()
+            self._cond.notify_all()
+
+
+    def _wait_for_slot(self, channel):
+        with self._cond:
+            while True:
+                wait = self._next_call.get(channel, 0) - time.monotonic()
+                if wait <= 0:
+                    return
+                self._cond.wait(wait)
+
+
+    def _rate_limited(self, channel, error):
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            with self._cond:
+                self.stats['rate_limited'] += 1
+                self._next_call[channel] = max(self._next_call.get(channel, 0), time.monotonic() + retry_after)
+                self._cond.notify_all()
+            logger.info(f"Slack rate limited channel {channel}, retrying after {retry_after}s")
+        return retry_after
+
+
+    def _record_sent(self, method, kwargs, response):
+        with self._cond:
+            self.stats['sent'] += 1
+            if method == 'chat_update':
+                self._sent[(kwargs.get('channel'), kwargs.get('ts'))] = kwargs.get('text')
+            elif method == 'chat_postMessage':
+                try:
+                    self._sent[(kwargs.get('channel'), response['ts'])] = kwargs.get('text')
+                except (KeyError, TypeError):
+                    pass
+            elif method == 'chat_delete':
+                self._sent.pop((kwargs.get('channel'), kwargs.get('ts')), None)
+            self._cond.notify_all()
+
+
+    def _next_due(self, now):
+        """(key of the oldest queued update whose channel may be called now or None, seconds until one may be)."""
+        wait = None
+        for key in self._pending:
+            channel_wait = self._next_call.get(key[0], 0) - now
+            if channel_wait <= 0:
+                return key, 0
+            wait = channel_wait if wait is None else min(wait, channel_wait)
+        return None, wait
+
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    key, wait = self._next_due(time.monotonic())
+                    if key is not None:
+                        break
+                    self._cond.wait(wait)
+                if self._closed:
+                    return
+            with self._send_lock:
+                with self._cond:
+                    # call() may have sent or superseded it while this thread waited for the lock
+                    key, _ = self._next_due(time.monotonic())
+                    if key is None:
+                        continue
+                    kwargs = self._pending.pop(key)
+                    self._next_call[key[0]] = time.monotonic() + self.interval
+                    self._in_flight += 1
+                try:
+                    response = self.client.chat_update(**kwargs)
+                    self._record_sent('chat_update', kwargs, response)
+                except Exception as e:
+                    if self._rate_limited(key[0], e) is not None:
+                        with self._cond:
+                            self._pending.setdefault(key, kwargs)
+                    else:
+                        logger.debug(f"Slack update of {key} failed: {e}")
+                finally:
+                    with self._cond:
+                        self._in_flight -= 1
+                        self._cond.notify_all()
+
+
+# ----------------------------------------------------------------------------------------------------------------
+# one streamed answer
+# ----------------------------------------------------------------------------------------------------------------
+def split_boundary(text, start, split_at=DEFAULT_SPLIT_AT):
+    """
+    Where the message starting at `start` ends when it is longer than `split_at`, or None when it is not. The last
+    newline (else space) in its final 300 characters, else `split_at`. Only text[start:start + split_at] is looked at,
+    so appending to the text does not move the boundary.
+    """
+    if len(text) - start <= split_at:
+        return None
+    window_start = start + max(0, split_at - 300)
+    window = text[window_start:start + split_at]
+    index = window.rfind("\n")
+    if index == -1:
+        index = window.rfind(" ")
+    boundary = window_start + index if index != -1 else start + split_at
+    return boundary if boundary > start else start + split_at
+
+
+def close_code_block(part):
+    if part.count("```") % 2 != 0:
+        part += "```"
+    return part
+
+
+class _Segment:
+
+    def __init__(self, start, ts, in_code_block):
+        self.start = start
+        self.ts = ts
+        self.in_code_block = in_code_block     # starts inside a ``` block that began in the previous segment
+
+
+class SlackResponseStream:
+    """
+    The Slack messages of one streamed answer: the thinking message it started in, and a message in the thread for
+    every `split_at` characters that did not fit.
+
+    :param fix_fn_calls: display rewrite applied to completed segments (SlackBotAdapter.fix_fn_calls).
+    """
+
+    def __init__(self, coalescer, channel, thread_ts, ts, split_at=DEFAULT_SPLIT_AT, fix_fn_calls=None):
+        self.coalescer = coalescer
+        self.channel = channel
+        self.thread_ts = thread_ts
+        self.split_at = split_at
+        self.fix_fn_calls = fix_fn_calls or (lambda text: text)
+        self.segments = [_Segment(0, ts, False)]
+        self._formatter = IncrementalSlackFormatter()
+        self._last_shown = None
+        self._lock = threading.Lock()
+
+
+    @property
+    def ts(self):
+        """The message the end of the answer is shown in."""
+        return self.segments[-1].ts
+
+
+    def segment_text(self, text, i):
+        i %= len(self.segments)
+        segment = self.segments[i]
+        end = self.segments[i + 1].start if i + 1 < len(self.segments) else len(text)
+        part = text[segment.start:end]
+        return "```" + part if segment.in_code_block else part
+
+
+    def update(self, text, prefix=""):
+        """Shows the answer so far. `prefix` is shown before the text of the current message but is not split."""
+        with self._lock:
+            self._split(text)
+            shown = prefix + self.segment_text(text, -1)
+            if shown == self._last_shown:
+                return
+            self._last_shown = shown
+            self.coalescer.submit(self.channel, self.ts, self._formatter.format(close_code_block(shown)))
+
+
+    def finish(self, text):
+        """
+        Splits off the remaining complete messages of the final answer and drops any queued update of the last one.
+        Returns the text of the last message, which the caller finishes (files, links) and shows.
+        """
+        with self._lock:
+            self._split(text)
+            self.coalescer.discard(self.channel, self.ts)
+            return self.segment_text(text, -1)
+
+
+    def _split(self, text):
+        while True:
+            boundary = split_boundary(text, self.segments[-1].start, self.split_at)
+            if boundary is None:
+                return
+            current = self.segments[-1]
+            part1 = text[current.start:boundary]
+            part1 = "```" + part1 if current.in_code_block else part1
+            in_code_block = part1.count("```") % 2 != 0
+            try:
+                self.coalescer.call('chat_update', channel=self.channel, ts=current.ts,
+                                    text=convert_to_slack_format(self.fix_fn_calls(close_code_block(part1))))
+            except Exception as e:
+                logger.debug(f"Slack update of message {current.ts} failed: {e}")
+            part2 = text[boundary:boundary + self.split_at]
+            part2 = close_code_block("```" + part2 if in_code_block else part2)
+            posted = self.coalescer.call('chat_postMessage', channel=self.channel, thread_ts=self.thread_ts,
+                                         text=convert_to_slack_format(part2) or " ")
+            self.segments.append(_Segment(boundary, posted["ts"], in_code_block))
+            self._formatter = IncrementalSlackFormatter()
+            self._last_shown = None
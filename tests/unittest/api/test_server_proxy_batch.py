@@ -0,0 +1,80 @@
+import json
+import unittest
+import requests
+from flask import Flask
+from genesis_bots.api.server_proxy import EndpointNotFoundError, GenesisServerProxyBase
+from genesis_bots.core.bot_os_udf_proxy_input import UDFBotOsInputAdapter
+
+
+class _InProcessProxy(GenesisServerProxyBase):
+    """Sends lookup requests straight to a UDFBotOsInputAdapter through a Flask request context."""
+
+    def __init__(self, adapter):
+        super().__init__()
+        self.adapter = adapter
+        self.app = Flask(__name__)
+        self.round_trips = 0
+        self.errors = []    # raised by the next requests
+
+    def _connect(self):
+        pass
+
+    def _send_REST_request(self, op_name, endpoint_name, payload, content_type="application/json", extra_headers=None):
+        assert endpoint_name in ("udf_proxy/lookup_udf", "udf_proxy/lookup_stream")
+        self.round_trips += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        with self.app.test_request_context(json=json.loads(payload)):
+            if endpoint_name == "udf_proxy/lookup_stream":
+                flask_response = self.adapter.lookup_stream_fn()
+            else:
+                flask_response = self.adapter.lookup_udf_fn()
+        resp = requests.Response()
+        resp._content = flask_response.get_data()
+        resp.status_code = 200
+        return resp
+
+
+class TestBatchedLookup(unittest.TestCase):
+
+    def setUp(self):
+        self.adapter = UDFBotOsInputAdapter(bot_id="batch-test-bot")
+        self.proxy = _InProcessProxy(self.adapter)
+
+    def test_get_messages_resolves_every_row_in_one_round_trip(self):
+        self.adapter.response_map.update({"a": "answer a", "b": "partial b 💬"})
+        self.adapter.thread_map["a"] = "thread-a"
+        results = self.proxy.get_messages("batch-test-bot", ["a", "b", "c"])
+        self.assertEqual(self.proxy.round_trips, 1)
+        self.assertEqual(results, {"a": ("answer a", "thread-a"), "b": ("partial b 💬", None), "c": (None, None)})
+        self.assertNotIn("a", self.adapter.thread_map)
+
+    def test_get_message_single_request(self):
+        self.adapter.response_map["x"] = "only x"
+        self.assertEqual(self.proxy.get_message("batch-test-bot", "x"), ("only x", None))
+
+
+
+class TestMessageDelta(unittest.TestCase):
+
+    def setUp(self):
+        self.adapter = UDFBotOsInputAdapter(bot_id="stream-test-bot")
+        self.proxy = _InProcessProxy(self.adapter)
+        self.adapter.response_map["r"] = "hello"
+
+    def test_transient_errors_fail_only_the_call(self):
+        self.proxy.errors = [TimeoutError("read timed out"), Exception("Failed to submit message to endpoint: 502")]
+        self.assertIsNone(self.proxy.get_message_delta("stream-test-bot", "r"))
+        self.assertIsNone(self.proxy.get_message_delta("stream-test-bot", "r"))
+        delta = self.proxy.get_message_delta("stream-test-bot", "r")
+        self.assertEqual((delta["text"], delta["done"]), ("hello", True))
+
+    def test_missing_endpoint_disables_streaming(self):
+        self.proxy.errors = [EndpointNotFoundError("udf_proxy/lookup_stream")]
+        self.assertIsNone(self.proxy.get_message_delta("stream-test-bot", "r"))
+        self.assertIsNone(self.proxy.get_message_delta("stream-test-bot", "r"))
+        self.assertEqual(self.proxy.round_trips, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
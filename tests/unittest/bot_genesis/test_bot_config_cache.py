@@ -0,0 +1,101 @@
+import unittest
+from unittest import mock
+
+from genesis_bots.bot_genesis import make_baby_bot
+from genesis_bots.bot_genesis.bot_config_cache import BotConfigCache
+
+
+class _BotServicing:
+    """In-memory BOT_SERVICING table with the connector methods the cache uses; counts the queries."""
+
+    genbot_internal_project_and_schema = 'GENESIS_BOTS.APP1'
+    bot_servicing_table_name = 'GENESIS_BOTS.APP1.BOT_SERVICING'
+
+    def __init__(self, bots):
+        self.bots = bots            # bot_id -> row
+        self.queries = []
+        self.during_bulk_load = None
+
+    def db_get_all_bot_details(self, project_id, dataset_name, bot_servicing_table):
+        self.queries.append('all')
+        if self.during_bulk_load:
+            self.during_bulk_load()
+        return [dict(row) for row in self.bots.values()]
+
+    def db_get_bot_details(self, project_id, dataset_name, bot_servicing_table, bot_id):
+        self.queries.append(bot_id)
+        row = next((r for k, r in self.bots.items() if k.upper() == bot_id.upper()), None)
+        return dict(row) if row else None
+
+    def db_list_all_bots(self, project_id, dataset_name, bot_servicing_table, runner_id=None, full=False,
+                         slack_details=False, with_instructions=False):
+        self.queries.append(('list', runner_id, full))
+        return [{'bot_id': r['bot_id'], 'runner_id': r['runner_id']} for r in self.bots.values()
+                if runner_id is None or r['runner_id'] == runner_id]
+
+    def db_update_bot_details(self, bot_id, bot_slack_user_id, slack_app_token, project_id, dataset_name,
+                              bot_servicing_table):
+        self.bots[bot_id]['bot_slack_user_id'] = bot_slack_user_id
+        return {'success': True}
+
+
+def _bots(n):
+    return {f'bot-{i}': {'bot_id': f'bot-{i}', 'runner_id': 'runner', 'bot_implementation': 'openai',
+                         'bot_slack_user_id': None} for i in range(n)}
+
+
+class TestBotConfigCache(unittest.TestCase):
+
+    def setUp(self):
+        self.db = _BotServicing(_bots(50))
+        self.cache = BotConfigCache(db_adapter=self.db, ttl_seconds=60)
+
+    def test_details_are_loaded_in_bulk(self):
+        for _ in range(3):
+            for i in range(50):
+                self.assertEqual(self.cache.get(f'BOT-{i}')['bot_implementation'], 'openai')
+        self.assertIsNone(self.cache.get('no-such-bot'))
+        self.assertEqual(self.db.queries, ['all', 'no-such-bot'])
+        self.assertEqual(self.cache.stats['hits'], 149)
+        # callers get copies
+        self.cache.get('bot-1')['bot_implementation'] = 'cortex'
+        self.assertEqual(self.cache.get('bot-1')['bot_implementation'], 'openai')
+
+    def test_invalidate_refetches_only_the_modified_bot(self):
+        self.cache.get('bot-1')
+        self.cache.list_bots(runner_id='runner', full=True)
+        self.cache.list_bots(runner_id='runner', full=True)
+        self.db.bots['bot-2']['bot_implementation'] = 'cortex'
+        self.cache.invalidate('bot-2')
+        self.assertEqual(self.cache.get('bot-2')['bot_implementation'], 'cortex')
+        self.cache.get('bot-2')
+        self.cache.get('bot-3')
+        self.cache.list_bots(runner_id='runner', full=True)
+        self.assertEqual(self.db.queries, ['all', ('list', 'runner', True), 'bot-2', ('list', 'runner', True)])
+
+    def test_load_racing_an_invalidation_is_not_kept(self):
+        self.db.during_bulk_load = lambda: self.cache.invalidate()
+        self.cache.get('bot-1')
+        self.db.during_bulk_load = None
+        self.cache.get('bot-1')
+        self.cache.get('bot-1')
+        self.assertEqual(self.db.queries, ['all', 'all'])
+
+    def test_entries_expire(self):
+        self.cache.ttl_seconds = 0
+        self.cache.get('bot-1')
+        self.cache.get('bot-1')
+        self.assertEqual(self.db.queries, ['all', 'all'])
+
+    def test_make_baby_bot_mutations_invalidate(self):
+        with mock.patch.object(make_baby_bot, 'get_global_db_connector', return_value=self.db), \
+             mock.patch.object(make_baby_bot, 'get_bot_config_cache', return_value=self.cache), \
+             mock.patch('genesis_bots.bot_genesis.bot_config_cache._cache', self.cache):
+            self.assertIsNone(make_baby_bot.get_bot_details('bot-4')['bot_slack_user_id'])
+            make_baby_bot.update_bot_details('bot-4', bot_slack_user_id='U123', slack_app_token=None)
+            self.assertEqual(make_baby_bot.get_bot_details('bot-4')['bot_slack_user_id'], 'U123')
+        self.assertEqual(self.cache.stats['invalidations'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from datetime import timedelta
+
+from genesis_bots.connectors.bot_heartbeats import HeartbeatRegistry, TIMESTAMP_FORMAT, utc_now
+from genesis_bots.connectors.snowflake_connector.snowflake_connector import SnowflakeConnector
+from genesis_bots.connectors.sqlite_adapter import SQLiteAdapter
+
+
+def _sqlite_connector(db_path):
+    """A SnowflakeConnector on SQLite with just what the heartbeat methods use."""
+    connector = SnowflakeConnector.__new__(SnowflakeConnector)
+    connector.client = SQLiteAdapter(db_path)
+    connector.source_name = 'SQLite'
+    connector.bot_heartbeats_table_name = 'main.BOT_HEARTBEATS'
+    cursor = connector.client.cursor()
+    cursor.execute("CREATE TABLE IF NOT EXISTS main.BOT_HEARTBEATS (bot_id VARCHAR(255) NOT NULL, "
+                   "runner_id VARCHAR(255) NOT NULL, last_active TIMESTAMP_NTZ NOT NULL)")
+    connector.client.commit()
+    return connector
+
+
+class TestHeartbeatRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.connector = _sqlite_connector(os.path.join(self.tmp.name, 'heartbeats.db'))
+        self.writes = []
+        self.write_lock = threading.Lock()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _write_rows(self, rows):
+        with self.write_lock:
+            self.writes.append(sorted(rows))
+            self.connector._write_bot_heartbeats(rows)
+
+    def test_beats_are_coalesced_into_periodic_upserts(self):
+        registry = HeartbeatRegistry(self._write_rows, runner_id='runner-1', flush_interval=10)
+        deadline = time.monotonic() + 2
+        registry.beat('bot-a')
+        while not self.writes and time.monotonic() < deadline:
+            time.sleep(0.01)
+        for _ in range(1000):
+            registry.beat('bot-a')
+            registry.beat('bot-b')
+        # the first beat is written at once, the rest wait for the flush interval
+        self.assertEqual(len(self.writes), 1)
+        registry.close()
+        self.assertEqual(len(self.writes), 2)
+        self.assertEqual([bot_id for bot_id, _, _ in self.writes[1]], ['bot-a', 'bot-b'])
+        self.assertEqual(registry.stats['beats'], 2001)
+
+        active = self.connector.db_get_active_bots(minutes=5)
+        self.assertEqual(sorted((r['bot_id'], r['runner_id']) for r in active),
+                         [('bot-a', 'runner-1'), ('bot-b', 'runner-1')])
+        self.assertLess(abs(active[0]['last_active'] - registry.last_active()), timedelta(seconds=1))
+
+    def test_active_bots_window(self):
+        old = (utc_now() - timedelta(minutes=10)).strftime(TIMESTAMP_FORMAT)
+        new = utc_now().strftime(TIMESTAMP_FORMAT)
+        self.connector._write_bot_heartbeats([('bot-a', 'runner-1', old), ('bot-b', 'runner-1', old),
+                                              ('bot-b', 'runner-2', new)])
+        self.assertEqual([(r['bot_id'], r['runner_id']) for r in self.connector.db_get_active_bots(minutes=5)],
+                         [('bot-b', 'runner-2')])
+        self.connector._write_bot_heartbeats([('bot-a', 'runner-1', new)])
+        self.assertEqual(len(self.connector.db_get_active_bots(minutes=5)), 2)
+        self.assertEqual(len(self.connector.db_get_active_bots(minutes=60)), 3)
+
+    def test_failed_write_is_retried(self):
+        failures = [RuntimeError('warehouse suspended')]
+
+        def write_rows(rows):
+            if failures:
+                raise failures.pop()
+            self._write_rows(rows)
+
+        registry = HeartbeatRegistry(write_rows, runner_id='runner-1', flush_interval=10)
+        registry.beat('bot-a')
+        deadline = time.monotonic() + 2
+        while not registry.stats['failed_writes'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        registry.close()
+        self.assertEqual(registry.stats['failed_writes'], 1)
+        self.assertEqual([r['bot_id'] for r in self.connector.db_get_active_bots()], ['bot-a'])
+
+
+if __name__ == '__main__':
+    unittest.main()
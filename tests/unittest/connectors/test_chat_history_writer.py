@@ -0,0 +1,87 @@
+import sqlite3
+import threading
+import time
+import unittest
+from genesis_bots.connectors.chat_history_writer import ChatHistoryWriter
+
+
+class TestChatHistoryWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:', check_same_thread=False)
+        self.conn.execute("CREATE TABLE log (id INTEGER, msg TEXT NOT NULL)")
+        self.batches = []
+
+    def tearDown(self):
+        self.conn.close()
+
+    def _write_rows(self, rows):
+        self.batches.append(len(rows))
+        try:
+            self.conn.executemany("INSERT INTO log VALUES (?, ?)", rows)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def _count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM log").fetchone()[0]
+
+    def test_flush_writes_everything_in_batches(self):
+        writer = ChatHistoryWriter(self._write_rows, max_batch_rows=50, flush_interval=10)
+        for i in range(120):
+            writer.enqueue((i, f"m{i}"))
+        self.assertTrue(writer.flush(timeout=5))
+        self.assertEqual(self._count(), 120)
+        self.assertTrue(all(b <= 50 for b in self.batches))
+        self.assertLess(len(self.batches), 120)
+        metrics = writer.metrics()
+        self.assertEqual((metrics['rows_written'], metrics['queued']), (120, 0))
+        writer.close()
+
+    def test_time_based_flush(self):
+        writer = ChatHistoryWriter(self._write_rows, max_batch_rows=1000, flush_interval=0.05)
+        writer.enqueue((1, "a"))
+        deadline = time.monotonic() + 2
+        while self._count() == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self._count(), 1)
+        writer.close()
+
+    def test_bad_row_does_not_lose_batch(self):
+        writer = ChatHistoryWriter(self._write_rows, max_batch_rows=10, flush_interval=10)
+        writer.enqueue((1, "a"))
+        writer.enqueue((2, None))      # violates NOT NULL
+        writer.enqueue((3, "c"))
+        writer.flush(timeout=5)
+        self.assertEqual(self._count(), 2)
+        self.assertEqual(writer.metrics()['rows_failed'], 1)
+        writer.close()
+
+    def test_backpressure_blocks_when_full(self):
+        release = threading.Event()
+
+        def slow_write(rows):
+            release.wait(5)
+            self._write_rows(rows)
+
+        writer = ChatHistoryWriter(slow_write, max_batch_rows=2, flush_interval=0, max_queue_rows=2)
+        producer = threading.Thread(target=lambda: [writer.enqueue((i, "x")) for i in range(8)])
+        producer.start()
+        time.sleep(0.2)
+        self.assertTrue(producer.is_alive())
+        release.set()
+        producer.join(5)
+        writer.close()
+        self.assertEqual(self._count(), 8)
+        self.assertGreater(writer.metrics()['blocked_enqueues'], 0)
+
+    def test_enqueue_after_close_writes_inline(self):
+        writer = ChatHistoryWriter(self._write_rows)
+        writer.close()
+        writer.enqueue((1, "late"))
+        self.assertEqual(self._count(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
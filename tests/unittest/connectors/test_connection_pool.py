@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from sqlalchemy import event, text
+from genesis_bots.connectors.connection_pool import ConnectionPoolRegistry, ConnectionPoolTimeout
+
+
+class TestConnectionPoolRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.url = f"sqlite:///{os.path.join(self.dir, 'test.db')}"
+        self.registry = ConnectionPoolRegistry(pool_size=2, max_overflow=0, pool_timeout=1, max_concurrency=2)
+
+    def tearDown(self):
+        self.registry.dispose_all()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_repeated_queries_reuse_warm_connections(self):
+        engine = self.registry.create_engine(("db", None), self.url)
+        dbapi_connects = []
+        event.listen(engine, "connect", lambda *args: dbapi_connects.append(1))
+        for _ in range(20):
+            self.assertIs(self.registry.get_engine(("db", None)), engine)
+            with self.registry.connect(("db", None)) as conn:
+                self.assertEqual(conn.execute(text("SELECT 1")).scalar(), 1)
+        self.assertEqual(len(dbapi_connects), 1)
+        metrics = self.registry.metrics()["db"]
+        self.assertEqual((metrics["checkouts"], metrics["active"], metrics["errors"]), (20, 0, 0))
+
+    def test_concurrency_is_capped_per_pool(self):
+        self.registry.create_engine(("db", None), self.url)
+        release = threading.Event()
+        holding = threading.Barrier(3)
+
+        def hold():
+            with self.registry.connect(("db", None)):
+                holding.wait()
+                release.wait()
+
+        threads = [threading.Thread(target=hold) for _ in range(2)]
+        for t in threads:
+            t.start()
+        holding.wait()
+        with self.assertRaises(ConnectionPoolTimeout):
+            with self.registry.connect(("db", None)):
+                pass
+        release.set()
+        for t in threads:
+            t.join()
+        self.assertEqual(self.registry.metrics()["db"]["timeouts"], 1)
+        self.assertEqual(self.registry.metrics()["db"]["peak_active"], 2)
+
+    def test_expired_credentials_and_idle_pools_are_evicted(self):
+        self.registry.create_engine(("iam", "dev"), self.url, expires_at=time.time() - 1)
+        self.assertIsNone(self.registry.get_engine(("iam", "dev")))
+        self.assertNotIn(("iam", "dev"), self.registry)
+
+        self.registry.create_engine(("idle", None), self.url)
+        self.registry.idle_timeout = 0
+        time.sleep(0.01)
+        self.assertEqual(self.registry.evict_idle(), 1)
+        self.assertNotIn(("idle", None), self.registry)
+
+    def test_dispose_removes_every_database_of_a_connection(self):
+        self.registry.create_engine(("pg", "a"), self.url)
+        self.registry.create_engine(("pg", "b"), self.url)
+        self.registry.create_engine(("other", None), self.url)
+        self.registry.dispose("pg")
+        self.assertEqual(list(self.registry.metrics()), ["other"])
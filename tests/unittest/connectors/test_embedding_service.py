@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from genesis_bots.connectors.embedding_service import EmbeddingCache, EmbeddingService, FakeEmbeddingProvider
+
+
+class _FailingProvider(FakeEmbeddingProvider):
+    def embed_batch(self, texts):
+        raise RuntimeError("provider down")
+
+
+class TestEmbeddingService(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='test_embedding_')
+        self.cache_path = os.path.join(self.work_dir, 'cache.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def test_batches_and_deduplicates(self):
+        provider = FakeEmbeddingProvider(dimension=4, max_batch_size=3)
+        service = EmbeddingService(provider, cache=None, max_wait_ms=0)
+        texts = ['a', 'b', 'a', 'c', 'd', 'b']
+        vectors = service.embed(texts)
+        self.assertEqual(len(vectors), 6)
+        self.assertEqual(vectors[0], vectors[2])
+        self.assertEqual(vectors[1], vectors[5])
+        self.assertNotEqual(vectors[0], vectors[1])
+        self.assertEqual(sorted(t for batch in provider.calls for t in batch), ['a', 'b', 'c', 'd'])
+        self.assertTrue(all(len(batch) <= 3 for batch in provider.calls))
+        self.assertEqual(len(provider.calls), 2)
+
+    def test_concurrent_requests_are_coalesced(self):
+        provider = FakeEmbeddingProvider(dimension=4, max_batch_size=64, latency_seconds=0.05)
+        service = EmbeddingService(provider, cache=None, max_wait_ms=50)
+        results = [None] * 16
+        barrier = threading.Barrier(16)
+
+        def worker(i):
+            barrier.wait()
+            results[i] = service.embed_one(f"table {i % 8}")
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(16)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertLess(len(provider.calls), 16)
+        self.assertEqual(sum(len(batch) for batch in provider.calls), 8)
+        self.assertEqual(results[0], results[8])
+        self.assertEqual(service.metrics()['provider_texts'], 8)
+
+    def test_cache_persists_across_instances(self):
+        provider = FakeEmbeddingProvider(dimension=4)
+        service = EmbeddingService(provider, cache=EmbeddingCache(self.cache_path), max_wait_ms=0)
+        first = service.embed(['x', 'y'])
+        service.cache.close()
+
+        provider2 = FakeEmbeddingProvider(dimension=4)
+        service2 = EmbeddingService(provider2, cache=EmbeddingCache(self.cache_path), max_wait_ms=0)
+        self.assertEqual(service2.embed(['y', 'x']), [first[1], first[0]])
+        self.assertEqual(provider2.calls, [])
+        metrics = service2.metrics()
+        self.assertEqual(metrics['hit_rate'], 1.0)
+        self.assertEqual(metrics['provider_calls'], 0)
+        service2.cache.close()
+
+    def test_cache_is_keyed_by_model(self):
+        cache = EmbeddingCache(':memory:')
+        EmbeddingService(FakeEmbeddingProvider(model='m1'), cache=cache, max_wait_ms=0).embed_one('t')
+        provider = FakeEmbeddingProvider(model='m2')
+        EmbeddingService(provider, cache=cache, max_wait_ms=0).embed_one('t')
+        self.assertEqual(provider.calls, [['t']])
+
+    def test_lru_eviction(self):
+        cache = EmbeddingCache(':memory:', max_entries=20)
+        service = EmbeddingService(FakeEmbeddingProvider(), cache=cache, max_wait_ms=0)
+        service.embed([f"t{i}" for i in range(20)])
+        service.embed(['t0'])                       # recently used, must survive eviction
+        service.embed([f"new{i}" for i in range(5)])
+        self.assertLessEqual(len(cache), 20)
+        provider = FakeEmbeddingProvider()
+        service.provider = provider
+        service.embed(['t0'])
+        self.assertEqual(provider.calls, [])
+        service.embed(['t1'])
+        self.assertEqual(provider.calls, [['t1']])
+
+    def test_provider_error_is_raised_and_counted(self):
+        service = EmbeddingService(_FailingProvider(), cache=EmbeddingCache(':memory:'), max_wait_ms=0)
+        with self.assertRaises(RuntimeError):
+            service.embed(['a', 'b'])
+        metrics = service.metrics()
+        self.assertEqual(metrics['provider_errors'], 1)
+        self.assertEqual(metrics['cache_entries'], 0)
+        self.assertIn('p95', metrics['provider_latency_ms'])
+
+
+if __name__ == '__main__':
+    unittest.main()
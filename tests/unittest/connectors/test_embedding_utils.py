@@ -0,0 +1,40 @@
+import unittest
+import numpy as np
+from genesis_bots.connectors.embedding_utils import (
+    decode_embedding, embeddings_to_matrix, encode_embedding, normalize_rows
+)
+
+
+class TestEmbeddingUtils(unittest.TestCase):
+
+    def test_blob_roundtrip(self):
+        vec = [0.25, -1.5, 3.0]
+        blob = encode_embedding(vec)
+        self.assertIsInstance(blob, bytes)
+        self.assertEqual(len(blob), 12)
+        np.testing.assert_array_equal(decode_embedding(blob), np.array(vec, dtype=np.float32))
+
+    def test_legacy_text_formats(self):
+        expected = np.array([0.1, 0.2, 0.3], dtype=np.float32)
+        for text in ('0.1,0.2,0.3', '[0.1, 0.2, 0.3]', '[\n  0.1,\n  0.2,\n  0.3\n]', 'array[0.1, 0.2, 0.3]'):
+            np.testing.assert_array_equal(decode_embedding(text), expected)
+        with self.assertRaises(ValueError):
+            decode_embedding('0.1,oops')
+
+    def test_encode_none(self):
+        self.assertIsNone(encode_embedding(None))
+        self.assertIsNone(encode_embedding(''))
+
+    def test_matrix_skips_bad_rows(self):
+        values = [encode_embedding([1, 0]), 'None', '0,2', encode_embedding([1, 2, 3])]
+        matrix, kept = embeddings_to_matrix(values)
+        self.assertEqual(kept, [0, 2])
+        self.assertEqual(matrix.dtype, np.float32)
+        self.assertTrue(matrix.flags['C_CONTIGUOUS'])
+        np.testing.assert_array_equal(matrix, [[1, 0], [0, 2]])
+        np.testing.assert_allclose(np.linalg.norm(normalize_rows(matrix), axis=1), [1, 1], atol=1e-4)
+
+    def test_empty(self):
+        matrix, kept = embeddings_to_matrix([])
+        self.assertEqual(matrix.shape[0], 0)
+        self.assertEqual(kept, [])
@@ -0,0 +1,55 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from types import SimpleNamespace
+from genesis_bots.connectors.connection_pool import ConnectionPoolRegistry
+from genesis_bots.connectors.data_connector import DatabaseConnector
+from genesis_bots.connectors.sqlite_adapter import SQLiteAdapter
+
+
+class TestQueryDatabase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        data_path = os.path.join(self.tmp.name, 'data.db')
+        with sqlite3.connect(data_path) as conn:
+            conn.execute("CREATE TABLE t (id INTEGER)")
+            conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(137)])
+
+        client = SQLiteAdapter(os.path.join(self.tmp.name, 'genesis.db'))
+        cursor = client.cursor()
+        cursor.execute("CREATE TABLE IF NOT EXISTS main.CUST_DB_CONNECTIONS (connection_id VARCHAR(255), owner_bot_id VARCHAR(255), "
+                       "allowed_bot_ids VARCHAR(255), connection_string VARCHAR(255), db_type VARCHAR(255))")
+        cursor.execute("INSERT INTO main.CUST_DB_CONNECTIONS (connection_id, owner_bot_id, allowed_bot_ids, "
+                       "connection_string, db_type) VALUES (%s, %s, %s, %s, %s)",
+                       ('local', 'bot-a', '', f'sqlite:///{data_path}', 'sqlite'))
+        client.commit()
+
+        # a DatabaseConnector without the global connector and table setup (it is a singleton)
+        self.connector = object.__new__(DatabaseConnector)
+        self.connector.db_adapter = SimpleNamespace(client=client, schema='main', source_name='SQLite')
+        self.connector.connections = ConnectionPoolRegistry()
+
+    def tearDown(self):
+        self.connector.connections.dispose_all()
+        self.tmp.cleanup()
+
+    def test_truncated_results_report_total_row_count(self):
+        response = self.connector.query_database('local', 'bot-a', 'SELECT id FROM t ORDER BY id', max_rows=10)
+        self.assertTrue(response['success'])
+        self.assertEqual(response['rows'], [[i] for i in range(10)])
+        self.assertEqual(response['total_row_count'], 137)
+        self.assertEqual(response['message'],
+                         "Results limited to 10 rows out of 137 total rows. Use max_rows parameter to increase limit "
+                         "or set max_rows_override=true to fetch all rows.")
+
+    def test_complete_results(self):
+        response = self.connector.query_database('local', 'bot-a', 'SELECT id FROM t', max_rows_override=True)
+        self.assertEqual(response['row_count'], 137)
+        self.assertNotIn('total_row_count', response)
+        self.assertNotIn('message', response)
+
+
+if __name__ == '__main__':
+    unittest.main()
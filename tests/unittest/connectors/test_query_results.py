@@ -0,0 +1,88 @@
+import sqlite3
+import unittest
+from sqlalchemy import create_engine, text
+from genesis_bots.connectors.query_results import iter_column_batches, stream_result
+
+
+class _CountingCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.fetches = 0
+
+    def fetchmany(self, n):
+        self.fetches += 1
+        return self.cursor.fetchmany(n)
+
+
+class TestQueryResults(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.execute("CREATE TABLE t (id INTEGER, name TEXT)")
+        self.conn.executemany("INSERT INTO t VALUES (?, ?)", [(i, f"name ```{i}```") for i in range(1000)])
+
+    def tearDown(self):
+        self.conn.close()
+
+    def _stream(self, batch_rows=10, **kwargs):
+        cursor = _CountingCursor(self.conn.execute("SELECT id, name FROM t ORDER BY id"))
+        columns = ['ID', 'NAME']
+        return cursor, stream_result(iter_column_batches(cursor, columns, batch_rows), columns, **kwargs)
+
+    def test_max_rows_stops_reading(self):
+        cursor, result = self._stream(max_rows=25)
+        self.assertEqual(len(result.rows), 25)
+        self.assertTrue(result.truncated)
+        self.assertEqual(result.rows[3], {'ID': 3, 'NAME': 'name \\`\\`\\`3\\`\\`\\`'})
+        self.assertLessEqual(cursor.fetches, 3)
+
+    def test_count_rows(self):
+        _, result = self._stream(max_rows=25, count_rows=True)
+        self.assertEqual(len(result.rows), 25)
+        self.assertTrue(result.truncated)
+        self.assertEqual(result.total_rows, 1000)
+        _, result = self._stream(max_rows=25)
+        self.assertIsNone(result.total_rows)
+        _, result = self._stream(max_rows=2000)
+        self.assertFalse(result.truncated)
+        self.assertEqual(result.total_rows, 1000)
+
+    def test_byte_budget(self):
+        cursor, result = self._stream(max_bytes=200)
+        self.assertTrue(result.truncated)
+        self.assertLessEqual(result.preview_bytes, 200)
+        self.assertGreater(len(result.rows), 0)
+        self.assertLess(cursor.fetches, 5)
+
+    def test_complete_result_not_truncated(self):
+        _, result = self._stream(batch_rows=64)
+        self.assertFalse(result.truncated)
+        self.assertEqual(result.rows_read, 1000)
+        self.assertEqual(len(result.rows), 1000)
+
+    def test_spool_keeps_reading_past_preview(self):
+        _, result = self._stream(max_rows=5, escape_backticks=False, spool=True, spool_max_rows=300)
+        try:
+            self.assertEqual(len(result.rows), 5)
+            self.assertEqual(len(result.spool), 300)
+            self.assertEqual(result.spool[-1], {'ID': 299, 'NAME': 'name ```299```'})
+            self.assertEqual([r['ID'] for r in result.spool[10:13]], [10, 11, 12])
+        finally:
+            result.spool.close()
+
+    def test_field_truncation(self):
+        _, result = self._stream(max_rows=1, max_field_size=4, escape_backticks=False)
+        self.assertTrue(result.fields_truncated)
+        self.assertTrue(result.rows[0]['NAME'].startswith('name[!!FIELD OVER 4'))
+
+    def test_sqlalchemy_result(self):
+        engine = create_engine('sqlite://')
+        with engine.connect() as conn:
+            conn.execute(text("CREATE TABLE t (x INTEGER)"))
+            conn.execute(text("INSERT INTO t VALUES (1), (2), (3)"))
+            result = conn.execution_options(stream_results=True).execute(text("SELECT x FROM t"))
+            streamed = stream_result(iter_column_batches(result, ['x'], 2), ['x'], max_rows=2)
+            result.close()
+        engine.dispose()
+        self.assertEqual(streamed.rows, [{'x': 1}, {'x': 2}])
+        self.assertTrue(streamed.truncated)
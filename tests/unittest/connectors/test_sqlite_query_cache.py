@@ -0,0 +1,47 @@
+import os
+import sqlite3
+import unittest
+from unittest import mock
+from genesis_bots.connectors.sqlite_adapter import SQLiteCursorWrapper
+
+
+class TestSQLiteQueryTranslationCache(unittest.TestCase):
+
+    def setUp(self):
+        SQLiteCursorWrapper.clear_translation_cache()
+        self.connection = sqlite3.connect(':memory:')
+        self.connection.execute("CREATE TABLE LLM_RESULTS (uu TEXT, message TEXT, created TEXT)")
+
+    def tearDown(self):
+        self.connection.close()
+        SQLiteCursorWrapper.clear_translation_cache()
+
+    def _cursor(self):
+        return SQLiteCursorWrapper(self.connection.cursor())
+
+    def test_repeated_statements_hit_the_cache(self):
+        insert = "INSERT INTO LLM_RESULTS (uu, message, created) VALUES (%s, %s, CURRENT_TIMESTAMP)"
+        select = "SELECT message FROM LLM_RESULTS WHERE uu = %(uu)s"
+        for i in range(3):
+            self._cursor().execute(insert, (f"u{i}", "hello"))
+        cursor = self._cursor()
+        cursor.execute(select, {"uu": "u2"})
+        self.assertEqual(cursor.fetchone(), ("hello",))
+        info = SQLiteCursorWrapper.translation_cache_info()
+        self.assertEqual((info['hits'], info['misses'], info['size']), (2, 2, 2))
+
+    def test_param_style_and_schema_prefix_are_part_of_the_key(self):
+        wrapper = self._cursor()
+        query = "SELECT * FROM APP.LLM_RESULTS WHERE uu = %(uu)s"
+        self.assertEqual(wrapper._translate(query, True), "SELECT * FROM APP.LLM_RESULTS WHERE uu = :uu")
+        self.assertEqual(wrapper._translate(query, False), "SELECT * FROM APP.LLM_RESULTS WHERE uu = ?")
+        with mock.patch.dict(os.environ, {'GENESIS_INTERNAL_DB_SCHEMA': 'APP'}):
+            self.assertEqual(wrapper._translate(query, False), "SELECT * FROM LLM_RESULTS WHERE uu = ?")
+        self.assertEqual(SQLiteCursorWrapper.translation_cache_info()['misses'], 3)
+
+    def test_cache_is_lru_bounded(self):
+        wrapper = self._cursor()
+        with mock.patch.object(SQLiteCursorWrapper, '_translation_cache_size', 2):
+            for q in ("SELECT 1", "SELECT 2", "SELECT 1", "SELECT 3"):
+                wrapper._translate(q, False)
+            self.assertEqual([k[0] for k in SQLiteCursorWrapper._translation_cache], ["SELECT 1", "SELECT 3"])
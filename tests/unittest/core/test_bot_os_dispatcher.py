@@ -0,0 +1,103 @@
+import threading
+import time
+import unittest
+from genesis_bots.core.bot_os_dispatcher import BotOsSessionDispatcher
+
+
+class _FakeAdapter:
+    def __init__(self):
+        self.events = []
+        self._wakeup_callback = None
+
+    def set_wakeup_callback(self, callback):
+        self._wakeup_callback = callback
+
+    def push(self, event):
+        self.events.append(event)
+        self._wakeup_callback()
+
+    def has_pending_input(self):
+        return len(self.events) > 0
+
+
+class _FakeSession:
+    def __init__(self, name, busy_runs=0):
+        self.session_name = name
+        self.input_adapters = [_FakeAdapter()]
+        self.executions = 0
+        self.consumed = []
+        self.busy_runs = busy_runs  # number of runs after which the session still reports pending work
+        self.concurrent = 0
+        self.max_concurrent = 0
+        self.lock = threading.Lock()
+
+    def execute(self):
+        with self.lock:
+            self.concurrent += 1
+            self.max_concurrent = max(self.max_concurrent, self.concurrent)
+        time.sleep(0.01)
+        self.executions += 1
+        a = self.input_adapters[0]
+        while a.events:
+            self.consumed.append(a.events.pop(0))
+        with self.lock:
+            self.concurrent -= 1
+
+    def has_pending_work(self):
+        if self.busy_runs > 0:
+            self.busy_runs -= 1
+            return True
+        return False
+
+
+def _wait_for(pred, timeout=2.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if pred():
+            return True
+        time.sleep(0.005)
+    return False
+
+
+class TestBotOsSessionDispatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.dispatcher = BotOsSessionDispatcher(execute_fn=lambda s: s.execute(), max_workers=4, busy_poll_seconds=0.02)
+        self.dispatcher.start()
+
+    def tearDown(self):
+        self.dispatcher.stop(wait=True)
+
+    def test_idle_session_runs_only_on_wakeup(self):
+        s = _FakeSession("a")
+        self.dispatcher.register(s)
+        self.assertTrue(_wait_for(lambda: s.executions == 1))
+        time.sleep(0.1)
+        self.assertEqual(s.executions, 1)  # no polling while idle
+
+        s.input_adapters[0].push("hello")
+        self.assertTrue(_wait_for(lambda: s.consumed == ["hello"]))
+
+    def test_busy_session_is_repolled(self):
+        s = _FakeSession("b", busy_runs=3)
+        self.dispatcher.register(s)
+        self.assertTrue(_wait_for(lambda: s.executions == 4))
+        time.sleep(0.1)
+        self.assertEqual(s.executions, 4)
+
+    def test_session_never_runs_concurrently_with_itself(self):
+        s = _FakeSession("c")
+        self.dispatcher.register(s)
+        for i in range(50):
+            s.input_adapters[0].push(i)
+        self.assertTrue(_wait_for(lambda: len(s.consumed) == 50))
+        self.assertEqual(s.max_concurrent, 1)
+
+    def test_unregistered_session_is_not_run(self):
+        s = _FakeSession("d")
+        self.dispatcher.register(s)
+        self.assertTrue(_wait_for(lambda: s.executions == 1))
+        self.dispatcher.unregister(s)
+        s.input_adapters[0].push("ignored")
+        time.sleep(0.1)
+        self.assertEqual(s.executions, 1)
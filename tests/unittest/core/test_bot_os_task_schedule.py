@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+import unittest
+
+from genesis_bots.core.bot_os_task_schedule import TaskSchedule
+
+
+NOW = datetime(2024, 5, 1, 12, 0, 0)
+
+
+def _task(task_id, minutes, active=True, bot_id="bot1"):
+    return {"task_id": task_id, "bot_id": bot_id, "task_active": active,
+            "next_check_ts": (NOW + timedelta(minutes=minutes)).strftime("%Y-%m-%d %H:%M:%S")}
+
+
+class TestTaskSchedule(unittest.TestCase):
+
+    def setUp(self):
+        self.rows = []
+        self.loads = []
+        self.schedule = TaskSchedule(self._load, refresh_seconds=60)
+
+    def _load(self, bot_ids):
+        self.loads.append(list(bot_ids))
+        return [dict(row) for row in self.rows]
+
+    def test_due_tasks_in_order_and_time_until_next(self):
+        self.rows = [_task("t3", 30), _task("t1", -10), _task("t2", -5), _task("off", -20, active=False)]
+        self.assertEqual(self.schedule.refresh(["bot1", "bot2"], NOW), 3)
+        self.assertEqual(self.loads, [["bot1", "bot2"]])
+        self.assertEqual([t["task_id"] for t in self.schedule.pop_due(NOW)], ["t1", "t2"])
+        self.assertEqual(self.schedule.pop_due(NOW), [])
+        self.assertEqual(self.schedule.seconds_until_next(NOW), 30 * 60)
+
+    def test_in_flight_task_is_not_handed_out_again(self):
+        self.rows = [_task("t1", -1)]
+        self.schedule.refresh(["bot1"], NOW)
+        self.assertEqual(len(self.schedule.pop_due(NOW)), 1)
+        self.schedule.mark_submitted("t1", {"task_id": "t1", "bot_id": "bot1", "submited_time": "2024-05-01 12:00:00"})
+        # an unchanged refresh does not reschedule the running task
+        self.assertEqual(self.schedule.refresh(["bot1"], NOW), 0)
+        self.assertEqual(self.schedule.pop_due(NOW + timedelta(hours=1)), [])
+
+        self.schedule.mark_done("t1", "2024-05-01 13:00:00")
+        self.assertNotIn("t1", self.schedule.in_flight)
+        self.assertEqual(self.schedule.seconds_until_next(NOW), 3600)
+        due = self.schedule.pop_due(NOW + timedelta(hours=1))
+        self.assertEqual([(t["task_id"], t["next_check_ts"]) for t in due], [("t1", "2024-05-01 13:00:00")])
+
+    def test_refresh_applies_changes_only(self):
+        self.rows = [_task("t1", 10), _task("t2", 20)]
+        self.schedule.refresh(["bot1"], NOW)
+        self.rows = [_task("t1", 5), _task("t2", 20, active=False), _task("t3", 1)]
+        self.assertEqual(self.schedule.refresh(["bot1"], NOW), 3)
+        self.assertEqual(len(self.schedule), 2)
+        self.assertIsNone(self.schedule.get("t2"))
+        self.assertEqual([t["task_id"] for t in self.schedule.pop_due(NOW + timedelta(hours=1))], ["t3", "t1"])
+
+    def test_stopped_task_is_removed(self):
+        self.rows = [_task("t1", -1)]
+        self.schedule.refresh(["bot1"], NOW)
+        self.schedule.pop_due(NOW)
+        self.schedule.mark_submitted("t1", {"task_id": "t1", "submited_time": "2024-05-01 12:00:00"})
+        self.schedule.mark_done("t1", None)
+        self.assertEqual(len(self.schedule), 0)
+        self.assertIsNone(self.schedule.seconds_until_next(NOW))
+
+    def test_overdue_run_is_released_and_due_again(self):
+        self.rows = [_task("t1", -1)]
+        self.schedule.refresh(["bot1"], NOW)
+        self.schedule.pop_due(NOW)
+        self.schedule.mark_submitted("t1", {"task_id": "t1", "submited_time": "2024-05-01 12:00:00"})
+        later = NOW + timedelta(minutes=31)
+        self.assertEqual([m["task_id"] for m in self.schedule.expire_overdue(later)], ["t1"])
+        self.assertEqual([t["task_id"] for t in self.schedule.pop_due(later)], ["t1"])
+
+    def test_refresh_is_periodic(self):
+        self.assertTrue(self.schedule.needs_refresh(NOW))
+        self.schedule.refresh(["bot1"], NOW)
+        self.assertFalse(self.schedule.needs_refresh(NOW + timedelta(seconds=59)))
+        self.assertEqual(self.schedule.seconds_until_refresh(NOW + timedelta(seconds=45)), 15)
+        self.assertTrue(self.schedule.needs_refresh(NOW + timedelta(seconds=60)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import heapq
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from genesis_bots.core.bot_os_thread_messages import ThreadCatalog, ThreadFileStore, ThreadMessages
+
+
+class _Thread:
+    '''minimal stand-in for BotOsThread (same to_dict layout)'''
+    def __init__(self, messages=()):
+        self.thread_id = 'thread_1'
+        self.messages = ThreadMessages(messages)
+        self.fast_mode = False
+        self.run_messg_count = 0
+
+    def to_dict(self):
+        return {'thread_id': self.thread_id, 'messages': self.messages, 'fast_mode': self.fast_mode,
+                'run_messg_count': self.run_messg_count}
+
+
+class TestThreadMessages(unittest.TestCase):
+
+    def test_sizes_follow_mutations(self):
+        messages = ThreadMessages([{'role': 'system', 'content': 'instructions'}])
+        for i in range(10):
+            messages.append({'role': 'user', 'content': 'x' * i})
+        del messages[1:4]
+        messages.pop()
+        messages.insert(1, {'role': 'assistant', 'content': 'hi'})
+        messages[0]['content'] = 'new instructions'
+        messages.refresh_size(0)
+        self.assertEqual(messages.sizes, [len(json.dumps(m)) for m in messages])
+        self.assertEqual(messages.total_bytes, sum(len(json.dumps(m)) for m in messages))
+        self.assertEqual(json.loads(json.dumps(messages)), list(messages))
+
+    def test_unsaved_tracks_appends_and_rewrites(self):
+        messages = ThreadMessages([{'role': 'system', 'content': 'i'}])
+        self.assertEqual(messages.unsaved(), (True, [{'role': 'system', 'content': 'i'}]))
+        messages.mark_saved()
+        messages.append({'role': 'user', 'content': 'a'})
+        self.assertEqual(messages.unsaved(), (False, [{'role': 'user', 'content': 'a'}]))
+        messages.mark_saved()
+        del messages[0:1]
+        self.assertTrue(messages.unsaved()[0])
+
+
+class TestThreadFileStore(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'thread_1.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_appends_only_new_messages(self):
+        thread = _Thread([{'role': 'system', 'content': 'instructions'}])
+        store = ThreadFileStore(self.path)
+        store.save(thread)
+        snapshot_mtime = os.stat(self.path).st_mtime_ns
+
+        for i in range(5):
+            thread.messages.append({'role': 'user', 'content': f'message {i}'})
+            thread.run_messg_count = len(thread.messages)
+            store.save(thread)
+        self.assertEqual(os.stat(self.path).st_mtime_ns, snapshot_mtime)
+        with open(store.log_path) as f:
+            self.assertEqual(len(f.readlines()), 1 + 5 * 2)   # header + (message, state) per save
+
+        loaded = ThreadFileStore(self.path).load()
+        self.assertEqual(loaded['messages'], list(thread.messages))
+        self.assertEqual(loaded['run_messg_count'], 6)
+
+    def test_rewrite_compacts_and_ignores_stale_log(self):
+        thread = _Thread([{'role': 'system', 'content': 'i'}, {'role': 'user', 'content': 'a'}])
+        store = ThreadFileStore(self.path)
+        store.save(thread)
+        thread.messages.append({'role': 'user', 'content': 'b'})
+        store.save(thread)
+        stale_log = open(store.log_path).read()
+
+        del thread.messages[1:2]    # e.g. trimmed
+        store.save(thread)
+        self.assertEqual(ThreadFileStore(self.path).load()['messages'], list(thread.messages))
+
+        # a log from an older snapshot generation (interrupted compaction) is ignored
+        with open(store.log_path, 'w') as f:
+            f.write(stale_log)
+        self.assertEqual(ThreadFileStore(self.path).load()['messages'], list(thread.messages))
+
+    def test_legacy_snapshot(self):
+        with open(self.path, 'w') as f:
+            json.dump({'thread_id': 'thread_1', 'messages': [{'role': 'user', 'content': 'a'}],
+                       'fast_mode': True, 'run_messg_count': 1}, f, indent=2)
+        loaded = ThreadFileStore(self.path).load()
+        self.assertEqual(loaded['messages'], [{'role': 'user', 'content': 'a'}])
+        self.assertTrue(loaded['fast_mode'])
+
+
+class TestThreadCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_built_from_existing_files_once(self):
+        for name, mtime in (('old.json', 1000), ('new.json', 5000), ('thread_maps.json', 1000)):
+            with open(os.path.join(self.dir, name), 'w') as f:
+                f.write('{}')
+            os.utime(os.path.join(self.dir, name), (mtime, mtime))
+        with open(os.path.join(self.dir, 'new.json.log'), 'w') as f:
+            f.write('{}')
+        catalog = ThreadCatalog(self.dir)
+        self.assertEqual(set(catalog.entries), {'old.json', 'new.json'})
+        self.assertEqual(catalog.expired(4000), ['old.json'])
+        with mock.patch.object(ThreadCatalog, '_scan_directory') as scan:
+            self.assertEqual(ThreadCatalog(self.dir).entries, catalog.entries)
+        scan.assert_not_called()
+
+    def test_expiry_scan_visits_only_expired_threads(self):
+        catalog = ThreadCatalog(self.dir, touch_resolution=60)
+        for i in range(20000):
+            catalog.touch(f't{i}.json', now=100000 + i)
+        catalog.touch('t0.json', now=100030)       # within the resolution, not recorded
+        catalog.touch('t1.json', now=300000)       # touched again since
+        with mock.patch('heapq.heappop', wraps=heapq.heappop) as heappop:
+            expired = catalog.expired(100005)
+        self.assertEqual(expired, ['t0.json', 't2.json', 't3.json', 't4.json'])
+        self.assertEqual(heappop.call_count, 5)
+        catalog.remove(expired)
+
+        reloaded = ThreadCatalog(self.dir)
+        self.assertEqual(reloaded.entries, catalog.entries)
+        self.assertEqual(len(reloaded.entries), 19996)
+        self.assertEqual(reloaded.entries['t1.json'], 300000)
+        self.assertEqual(reloaded.expired(100010), [f't{i}.json' for i in range(5, 10)])
+        # the catalog file is compacted instead of growing with every touch
+        with open(reloaded.catalog_path) as f:
+            self.assertLessEqual(len(f.readlines()), 2 * 19996 + 1000)
+
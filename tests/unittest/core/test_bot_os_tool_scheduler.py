@@ -0,0 +1,93 @@
+import threading
+import time
+import unittest
+
+from genesis_bots.core.bot_os_assistant_base import lookup_function
+from genesis_bots.core.bot_os_tools2 import ToolFuncDescriptor, ToolFuncGroup, gc_tool
+from genesis_bots.core.bot_os_tool_scheduler import ToolCall, ToolCallScheduler
+
+
+class TestToolCallScheduler(unittest.TestCase):
+
+    def test_parallel_results_in_call_order(self):
+        delays = [0.3, 0.1, 0.2]
+        calls = [ToolCall(f"call_{i}", "sleepy", lambda d=d, i=i: time.sleep(d) or i) for i, d in enumerate(delays)]
+        start = time.monotonic()
+        results = ToolCallScheduler(max_parallel=4).run(calls)
+        self.assertLess(time.monotonic() - start, 0.55)
+        self.assertEqual([r.tool_call_id for r in results], ["call_0", "call_1", "call_2"])
+        self.assertEqual([r.response for r in results], [0, 1, 2])
+
+    def test_per_tool_cap_from_descriptor(self):
+        ToolFuncGroup._clear_instances()
+        group = ToolFuncGroup("sched_group", "scheduler test group")
+        active, peak = [0], [0]
+        lock = threading.Lock()
+
+        @gc_tool(_group_tags_=[group], _max_concurrency_=2, x="a number")
+        def capped_tool(x: int):
+            "a tool that may run at most twice at a time"
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            return x
+
+        self.assertEqual(capped_tool.gc_tool_descriptor.max_concurrency, 2)
+        self.assertEqual(ToolFuncDescriptor.from_json(capped_tool.gc_tool_descriptor.to_json()).max_concurrency, 2)
+        calls = [ToolCall(str(i), "capped_tool", lambda i=i: capped_tool(i), func=capped_tool) for i in range(6)]
+        results = ToolCallScheduler(max_parallel=6).run(calls)
+        self.assertEqual([r.response for r in results], list(range(6)))
+        self.assertEqual(peak[0], 2)
+
+    def test_per_tool_cap_without_underscore(self):
+        ToolFuncGroup._clear_instances()
+        group = ToolFuncGroup("sched_group", "scheduler test group")
+        active, peak = [0], [0]
+        lock = threading.Lock()
+
+        @gc_tool(_group_tags_=[group], _max_concurrency_=2, x="a number")
+        def _hidden_tool(x: int):
+            "a tool registered with a leading underscore"
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            return x
+
+        available_functions = {'_hidden_tool': _hidden_tool}
+        self.assertEqual(lookup_function(available_functions, "hidden_tool"), ('_hidden_tool', _hidden_tool))
+        self.assertEqual(lookup_function(available_functions, "missing_tool"), ('missing_tool', None))
+        # the LLM asks for the tool by either name; both share the cap
+        names = ["hidden_tool", "_hidden_tool"] * 3
+        calls = [ToolCall(str(i), name, lambda i=i: _hidden_tool(i), func=lookup_function(available_functions, name)[1])
+                 for i, name in enumerate(names)]
+        results = ToolCallScheduler(max_parallel=6).run(calls)
+        self.assertEqual([r.response for r in results], list(range(6)))
+        self.assertEqual(peak[0], 2)
+
+    def test_timeout_and_errors_are_per_call(self):
+        def boom():
+            raise RuntimeError("boom")
+        calls = [ToolCall("slow", "slow", lambda: time.sleep(1), timeout=0.1),
+                 ToolCall("fast", "fast", lambda: "ok"),
+                 ToolCall("bad", "bad", boom)]
+        slow, fast, bad = ToolCallScheduler().run(calls)
+        self.assertTrue(slow.timed_out)
+        self.assertTrue(fast.ok)
+        self.assertEqual(fast.response, "ok")
+        self.assertIsInstance(bad.error, RuntimeError)
+
+    def test_cancel_pending_calls(self):
+        stop = threading.Event()
+        def first():
+            stop.set()
+            time.sleep(0.1)
+            return "done"
+        calls = [ToolCall("first", "first", first), ToolCall("second", "second", lambda: "never")]
+        results = ToolCallScheduler(max_parallel=1, poll_seconds=0.01).run(calls, should_cancel=stop.is_set)
+        self.assertTrue(results[1].cancelled)
@@ -0,0 +1,123 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from genesis_bots.core.tools.document_ingest import DocumentIngestPipeline, IngestManifest
+
+
+class _FakeCollection:
+    """The subset of the Chroma collection API used by the pipeline, supporting the $and / equality filters."""
+
+    def __init__(self):
+        self.rows = {}
+        self.upserts = []
+
+    def get(self, where, include):
+        conditions = where.get("$and", [where])
+        ids = [cid for cid, (_, _, md) in self.rows.items() if all(md.get(k) == v for c in conditions for k, v in c.items())]
+        return {'ids': ids}
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.upserts.append(len(ids))
+        for cid, vector, text, md in zip(ids, embeddings, documents, metadatas):
+            self.rows[cid] = (vector, text, md)
+
+    def delete(self, ids):
+        for cid in ids:
+            self.rows.pop(cid, None)
+
+
+def _split(docs):
+    # one chunk per paragraph
+    return [(para, {'file_name': os.path.basename(path)}) for path, text in docs for para in text.split("\n\n")]
+
+
+class TestDocumentIngestPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='test_ingest_')
+        self.collection = _FakeCollection()
+        self.embedded = []
+        self.manifest = IngestManifest(':memory:')
+        self.parsed = []
+
+    def tearDown(self):
+        self.manifest.close()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def _write(self, name, text):
+        path = os.path.join(self.work_dir, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def _load(self, path):
+        self.parsed.append(path)
+        with open(path) as f:
+            return [(path, f.read())]
+
+    def _embed(self, texts):
+        self.embedded.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+    def _pipeline(self, **kwargs):
+        return DocumentIngestPipeline(self.collection, self._load, _split, self._embed, manifest=self.manifest,
+                                      max_workers=4, **kwargs)
+
+    def test_batches_embeddings_and_upserts(self):
+        files = [self._write(f"f{i}.txt", f"alpha {i}\n\nbeta {i}\n\nalpha {i}") for i in range(10)]
+        stats = self._pipeline(embed_batch_size=4, upsert_batch_size=8).run("idx", files, {'original_path': 'BOT_GIT:docs'})
+        self.assertEqual(stats['chunks'], 20)             # duplicate paragraph within a file is stored once
+        self.assertEqual(stats['chunks_embedded'], 20)
+        self.assertEqual(len(self.collection.rows), 20)
+        self.assertTrue(all(len(batch) <= 4 for batch in self.embedded))
+        self.assertTrue(all(n <= 8 for n in self.collection.upserts))
+        _, _, metadata = next(iter(self.collection.rows.values()))
+        self.assertEqual(metadata['index_name'], 'idx')
+        self.assertEqual(metadata['original_path'], 'BOT_GIT:docs')
+
+    def test_resync_only_processes_changes(self):
+        a = self._write("a.txt", "one\n\ntwo")
+        b = self._write("b.txt", "three")
+        self._pipeline().run("idx", [a, b])
+        self.parsed, self.embedded = [], []
+
+        stats = self._pipeline().run("idx", [a, b])
+        self.assertEqual(stats['files_unchanged'], 2)
+        self.assertEqual(self.parsed, [])
+        self.assertEqual(self.embedded, [])
+
+        self._write("a.txt", "one\n\ntwo changed")
+        os.utime(a, ns=(os.stat(a).st_atime_ns, os.stat(a).st_mtime_ns + 10**9))
+        stats = self._pipeline().run("idx", [a, b])
+        self.assertEqual(self.parsed, [a])
+        self.assertEqual([t for batch in self.embedded for t in batch], ["two changed"])
+        self.assertEqual((stats['chunks_unchanged'], stats['chunks_deleted']), (1, 1))
+        self.assertEqual(sorted(text for _, text, _ in self.collection.rows.values()), ["one", "three", "two changed"])
+
+    def test_failed_write_is_retried_next_run(self):
+        a = self._write("a.txt", "one")
+        calls = []
+
+        def failing_embed(texts):
+            calls.append(texts)
+            raise RuntimeError("embedding service down")
+
+        stats = DocumentIngestPipeline(self.collection, self._load, _split, failing_embed, manifest=self.manifest).run("idx", [a])
+        self.assertEqual((stats['files_failed'], stats['files_done']), (1, 0))
+        self.assertEqual(self.manifest.get("idx"), {})
+
+        stats = self._pipeline().run("idx", [a])
+        self.assertEqual(stats['chunks_embedded'], 1)
+        self.assertIn(a, self.manifest.get("idx"))
+
+    def test_unreadable_file_does_not_stop_ingest(self):
+        good = self._write("good.txt", "fine")
+        stats = self._pipeline().run("idx", [good, os.path.join(self.work_dir, "missing.txt")])
+        self.assertEqual((stats['files_done'], stats['files_failed']), (1, 1))
+        self.assertEqual(len(self.collection.rows), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
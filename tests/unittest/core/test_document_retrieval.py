@@ -0,0 +1,151 @@
+import importlib.util
+import math
+import unittest
+from unittest import mock
+
+HAVE_CHROMADB = importlib.util.find_spec('chromadb') is not None
+if HAVE_CHROMADB:
+    from genesis_bots.core.tools import document_manager
+
+
+class _FakeCollection:
+    """The Chroma collection query API used by retrieval: cosine distances, equality and $in filters on metadata."""
+
+    def __init__(self, rows):
+        self.rows = rows            # (vector, text, metadata)
+        self.queries = []
+
+    @staticmethod
+    def _matches(metadata, where):
+        for key, cond in where.items():
+            if isinstance(cond, dict):
+                if metadata.get(key) not in cond['$in']:
+                    return False
+            elif metadata.get(key) != cond:
+                return False
+        return True
+
+    @staticmethod
+    def _distance(a, b):
+        dot = sum(x * y for x, y in zip(a, b))
+        return 1.0 - dot / (math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b)))
+
+    def query(self, query_embeddings, n_results, where, include):
+        self.queries.append({'where': where, 'n_results': n_results, 'include': include})
+        hits = sorted((self._distance(query_embeddings[0], vector), text, metadata)
+                      for vector, text, metadata in self.rows if self._matches(metadata, where))[:n_results]
+        return {'documents': [[text for _, text, _ in hits]], 'metadatas': [[md for _, _, md in hits]],
+                'distances': [[d for d, _, _ in hits]]}
+
+
+class _EmbeddingService:
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.calls = []
+
+    def embed_one(self, text):
+        self.calls.append(text)
+        return self.vectors[text]
+
+
+class _IndexManagerDb:
+    index_manager_table_name = 'INDEX_MANAGER'
+
+    def __init__(self, indices):
+        self.indices = indices
+
+    def run_query(self, query):
+        if 'WHERE' in query:
+            name = query.split("index_name = '")[1].rstrip("'")
+            return [{'INDEX_ID': f'id-{name}'}] if name in self.indices else []
+        return [{'INDEX_NAME': name} for name in self.indices]
+
+
+class _Synthesizer:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def synthesize(self, query, nodes):
+        self.calls.append((query, nodes))
+        return mock.Mock(response=f"answer from {len(nodes)} passages")
+
+
+def _row(vector, text, index_name, file_name):
+    return (vector, text, {'index_name': index_name, 'file_name': file_name, 'original_path': f'BOT_GIT:{file_name}',
+                           '_node_content': '{"id_": "n"}', '_node_type': 'TextNode', 'document_id': 'd',
+                           'doc_id': 'd', 'ref_doc_id': 'd'})
+
+
+@unittest.skipUnless(HAVE_CHROMADB, "chromadb is not installed")
+class TestDocumentRetrieval(unittest.TestCase):
+
+    def setUp(self):
+        self.collection = _FakeCollection([
+            _row([1.0, 0.0], "sales report", "finance", "sales.pdf"),
+            _row([0.8, 0.6], "budget plan", "finance", "budget.pdf"),
+            _row([0.6, 0.8], "hiring plan", "hr", "hiring.docx"),
+            _row([0.0, 1.0], "holiday calendar", "hr", "holidays.docx"),
+            _row([0.9, 0.1], "legal memo", "legal", "memo.txt"),
+        ])
+        self.embeddings = _EmbeddingService({"revenue": [1.0, 0.0], "vacation": [0.0, 1.0]})
+        self.synthesized = []
+        # a DocumentManager without chromadb/llama_index initialization (it is a singleton)
+        self.manager = object.__new__(document_manager.DocumentManager)
+        self.manager.db_adapter = _IndexManagerDb(['finance', 'hr'])
+        self.manager.collection = self.collection
+        self.manager._embedding_provider = object()
+        self.manager._llama_components = {
+            'NodeWithScore': lambda node, score: {'node': node, 'score': score},
+            'TextNode': lambda text, metadata: {'text': text, 'metadata': metadata},
+            'OpenAI': lambda model: {'model': model},
+            'get_response_synthesizer': lambda llm, response_mode: self.synthesized.append((llm, response_mode)) or
+                                                                     _Synthesizer(self.synthesized),
+        }
+        patcher = mock.patch.object(document_manager, 'get_embedding_service', return_value=self.embeddings)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_single_index_filter_and_scores(self):
+        hits = self.manager.retrieve("revenue", index_name='finance', top_n=5)
+        self.assertEqual(self.collection.queries[0]['where'], {'index_name': 'finance'})
+        self.assertEqual([h['text'] for h in hits], ["sales report", "budget plan"])
+        self.assertAlmostEqual(hits[0]['score'], 1.0)
+        self.assertAlmostEqual(hits[1]['score'], 0.8)
+        self.assertEqual(self.embeddings.calls, ["revenue"])
+        with self.assertRaises(Exception):
+            self.manager.retrieve("revenue", index_name='missing')
+
+    def test_one_query_ranks_across_indices(self):
+        hits = self.manager.retrieve("vacation", top_n=3)
+        self.assertEqual(len(self.collection.queries), 1)
+        self.assertEqual(self.collection.queries[0]['where'], {'index_name': {'$in': ['finance', 'hr']}})
+        self.assertEqual(self.collection.queries[0]['n_results'], 3)
+        # the legal index is not registered in INDEX_MANAGER, so its rows are not searched
+        self.assertEqual([(h['text'], round(h['score'], 6)) for h in hits],
+                         [("holiday calendar", 1.0), ("hiring plan", 0.8), ("budget plan", 0.6)])
+
+    def test_metadata_without_llama_bookkeeping(self):
+        hit = self.manager.retrieve("revenue", index_name='finance', top_n=1)[0]
+        # as with the llama_index retriever, callers see the document metadata only
+        self.assertEqual(hit['metadata'], {'index_name': 'finance', 'file_name': 'sales.pdf',
+                                           'original_path': 'BOT_GIT:sales.pdf'})
+
+    def test_retrieve_all_indices_synthesizes_from_top_passages(self):
+        result = self.manager.retrieve_all_indices("vacation", top_n=2)
+        self.assertEqual(result, {'answer': "answer from 2 passages", 'references': 'hiring.docx, holidays.docx'})
+        (llm, response_mode), (query, nodes) = self.synthesized
+        self.assertEqual(llm, {'model': "o3-mini"})
+        self.assertEqual(response_mode, "compact")
+        self.assertEqual(query, "vacation")
+        self.assertEqual([n['node']['text'] for n in nodes], ["holiday calendar", "hiring plan"])
+        self.assertAlmostEqual(nodes[1]['score'], 0.8)
+
+    def test_no_indices(self):
+        self.manager.db_adapter = _IndexManagerDb([])
+        self.assertEqual(self.manager.retrieve("revenue"), [])
+        self.assertEqual(self.manager.retrieve_all_indices("revenue"), [])
+        self.assertEqual(self.collection.queries, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
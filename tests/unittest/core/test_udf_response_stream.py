@@ -0,0 +1,122 @@
+import random
+import threading
+import time
+import unittest
+from genesis_bots.core.bot_os_input import BotOsOutputMessage
+from genesis_bots.core.bot_os_udf_proxy_input import ResponseStreamBuffer, UDFBotOsInputAdapter
+
+
+class TestResponseStreamBuffer(unittest.TestCase):
+
+    def test_appends_are_read_as_deltas(self):
+        buf = ResponseStreamBuffer()
+        buf.update("Hello 💬")
+        self.assertEqual(buf.read(0, 0), ("Hello", False))
+        buf.update("Hello world 💬")
+        self.assertEqual(buf.read(5, 0), (" world", False))
+        self.assertFalse(buf.done)
+        buf.update("Hello world!")
+        self.assertTrue(buf.done)
+        self.assertEqual(buf.read(11, 0), ("!", False))
+
+    def test_rewrite_resets_clients(self):
+        buf = ResponseStreamBuffer()
+        buf.update("🧰 running tool 💬")
+        buf.update("The answer is 42")
+        self.assertEqual(buf.epoch, 1)
+        self.assertEqual(buf.read(14, 0), ("The answer is 42", True))
+        self.assertEqual(buf.read(4, 1), ("answer is 42", False))
+
+
+class TestLookupStream(unittest.TestCase):
+
+    def setUp(self):
+        self.adapter = UDFBotOsInputAdapter(bot_id="stream-test-bot")
+
+    def _respond(self, uu, output):
+        self.adapter.response_map[uu] = output
+        self.adapter._update_stream(uu)
+
+    def test_reads_only_new_text(self):
+        self._respond("r1", "part one 💬")
+        d = self.adapter.lookup_stream("r1")
+        self.assertEqual((d["text"], d["offset"], d["done"], d["found"]), ("part one", 8, False, True))
+        self._respond("r1", "part one, part two")
+        d = self.adapter.lookup_stream("r1", offset=d["offset"], epoch=d["epoch"])
+        self.assertEqual((d["text"], d["done"]), (", part two", True))
+        self.assertNotIn("r1", self.adapter.stream_buffers)
+
+    def test_long_poll_wakes_on_update(self):
+        threading.Timer(0.1, self._respond, args=("r2", "late answer")).start()
+        start = time.monotonic()
+        d = self.adapter.lookup_stream("r2", wait_seconds=5)
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertEqual((d["text"], d["done"]), ("late answer", True))
+
+    def test_long_poll_times_out(self):
+        d = self.adapter.lookup_stream("missing", wait_seconds=0.05)
+        self.assertFalse(d["found"])
+        self.assertEqual(d["text"], "")
+
+
+class _LLMResults:
+    def db_insert_llm_results(self, uu, output):
+        pass
+
+    def db_update_llm_results(self, uu, output):
+        pass
+
+
+class TestRequestCompletion(unittest.TestCase):
+
+    def setUp(self):
+        self.adapter = UDFBotOsInputAdapter(bot_id="completion-test-bot")
+        self.adapter.db_connector = _LLMResults()
+
+    def _respond(self, uu, output):
+        message = BotOsOutputMessage(thread_id="delegate_1", status="in_progress", output=output, messages=None,
+                                     input_metadata={"thread_id": "delegate_1"})
+        self.adapter.handle_response("session", message, in_uuid=uu)
+
+    def _work(self, uu, seconds):
+        for i in range(3):
+            time.sleep(seconds / 4)
+            self._respond(uu, f"step {i} 💬")
+        time.sleep(seconds / 4)
+        self._respond(uu, f"answer to {uu}")
+
+    def test_fan_out_completes_with_the_slowest_bot(self):
+        rng = random.Random(0)
+        delays = [rng.uniform(0.1, 0.6) for _ in range(10)]
+        uus = [self.adapter.submit(f"task {i}", thread_id="delegate_1", bot_id={}) for i in range(10)]
+        completions = [self.adapter.completion(uu) for uu in uus]
+        start = time.monotonic()
+        for uu, delay in zip(uus, delays):
+            threading.Thread(target=self._work, args=(uu, delay)).start()
+        results = [completion.result(timeout=5) for completion in completions]
+        elapsed = time.monotonic() - start
+        self.assertEqual(results, [f"answer to {uu}" for uu in uus])
+        self.assertLess(elapsed, max(delays) + 0.25)
+        self.assertEqual(self.adapter.completions, {})
+
+    def test_waiters_see_every_update(self):
+        uu = self.adapter.submit("task", thread_id="delegate_1", bot_id={})
+        completion = self.adapter.completion(uu)
+        threading.Thread(target=self._work, args=(uu, 0.2)).start()
+        version, seen = 0, []
+        while True:
+            version, output, done = completion.wait_update(version, timeout=5)
+            seen.append(output)
+            if done:
+                break
+        self.assertEqual(seen[-1], f"answer to {uu}")
+        self.assertLessEqual(len(seen), 4)
+        # asking after the response was produced, or giving up, leaves nothing behind
+        self.assertEqual(self.adapter.completion(uu).result(timeout=0), f"answer to {uu}")
+        self.assertEqual(self.adapter.completion("no-answer").result(timeout=0.05), None)
+        self.adapter.discard_completion("no-answer")
+        self.assertEqual(self.adapter.completions, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
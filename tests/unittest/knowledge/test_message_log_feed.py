@@ -0,0 +1,67 @@
+import unittest
+from datetime import datetime
+from genesis_bots.knowledge.message_log_feed import MessageLogChangeFeed, INITIAL_WATERMARK
+
+
+class _FakeConnector:
+    def __init__(self):
+        self.rows = []
+        self.since = []
+
+    def query_message_log_changes(self, since):
+        self.since.append(since)
+        return self.rows
+
+
+def _row(thread_id, timestamp, count=10, last_timestamp="2000-01-01 00:00:00"):
+    return {"THREAD_ID": thread_id, "TIMESTAMP": timestamp, "MESSAGE_COUNT": count, "LAST_TIMESTAMP": last_timestamp}
+
+
+class TestMessageLogChangeFeed(unittest.TestCase):
+
+    def setUp(self):
+        self.db = _FakeConnector()
+        self.feed = MessageLogChangeFeed(self.db, idle_minutes=10)
+        self.now = datetime(2024, 5, 1, 12, 0, 0)
+
+    def test_returns_idle_threads_and_advances_watermark_on_commit(self):
+        self.db.rows = [_row("idle", datetime(2024, 5, 1, 11, 30)),
+                        _row("short", datetime(2024, 5, 1, 11, 30), count=3),
+                        _row("active", "2024-05-01 11:58:00")]
+        poll = self.feed.poll(now=self.now)
+        self.assertEqual([t["THREAD_ID"] for t in poll.threads], ["idle"])
+        self.assertEqual(poll.latest_activity, datetime(2024, 5, 1, 11, 58))
+        self.assertEqual(self.db.since, [INITIAL_WATERMARK])
+
+        self.feed.commit(poll)
+        self.db.rows = []
+        self.feed.poll(now=self.now)
+        self.assertEqual(self.db.since[-1], "2024-05-01 11:50:00")
+
+    def test_failed_query_keeps_watermark(self):
+        self.db.rows = {"Success": False, "Error": "boom"}
+        poll = self.feed.poll(now=self.now)
+        self.feed.commit(poll)
+        self.assertEqual(poll.threads, [])
+        self.assertEqual(self.feed.watermark, INITIAL_WATERMARK)
+
+    def test_deferred_thread_holds_back_watermark(self):
+        self.feed.watermark = "2024-05-01 11:00:00"
+        self.db.rows = [_row("busy", datetime(2024, 5, 1, 11, 30), last_timestamp=datetime(2024, 5, 1, 11, 5))]
+        poll = self.feed.poll(now=self.now)
+        poll.defer(poll.threads[0])
+        self.feed.commit(poll)
+        self.assertEqual(self.feed.watermark, "2024-05-01 11:05:00")
+
+    def test_carried_over_threads_are_returned_once(self):
+        self.feed.carry_over("long", "2024-05-01 11:30:00", datetime(2024, 5, 1, 11, 10))
+        self.db.rows = [_row("long", datetime(2024, 5, 1, 11, 30))]
+        threads = self.feed.poll(now=self.now).threads
+        self.assertEqual(len(threads), 1)
+        self.assertEqual(threads[0]["LAST_TIMESTAMP"], "2024-05-01 11:10:00")
+        self.db.rows = []
+        self.assertEqual(self.feed.poll(now=self.now).threads, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import threading
+import unittest
+
+from genesis_bots.llm.llm_cortex.cortex_thread_store import CortexThread, CortexThreadStore, ThreadBusyRegistry
+
+
+def _msg(message_type, content, ts):
+    return {"message_type": message_type, "content": content, "timestamp": ts}
+
+
+def _full_render(messages):
+    rendered, users = [], []
+    for m in messages:
+        if m["message_type"] == "user":
+            users.append(m["content"])
+            continue
+        if users:
+            rendered.append({"role": "user", "content": "\n".join(users)})
+            users = []
+        rendered.append({"role": m["message_type"], "content": m["content"]})
+    if users:
+        rendered.append({"role": "user", "content": "\n".join(users)})
+    return rendered
+
+
+class TestCortexThread(unittest.TestCase):
+
+    def test_incremental_render_matches_full_render(self):
+        thread = CortexThread([_msg("system", "sys", "t0")])
+        script = [("user", "hi"), ("user", "tool output"), ("assistant", "answer"), ("user", "more"),
+                  ("assistant", "done"), ("ipython", "py"), ("user", "a"), ("user", "b")]
+        for i, (message_type, content) in enumerate(script):
+            thread.append(_msg(message_type, content, f"t{i + 1}"))
+            self.assertEqual(thread.render(), _full_render(list(thread)))
+
+    def test_pop_and_replace_keep_render_consistent(self):
+        thread = CortexThread([_msg("system", "sys", "t0"), _msg("user", "q", "t1"), _msg("user", "!model", "t2")])
+        thread.render()
+        thread.pop()
+        self.assertEqual(thread.render(), _full_render(list(thread)))
+        thread.append(_msg("assistant", "a", "t3"))
+        thread.render()
+        thread.pop()
+        self.assertEqual(thread.render(), _full_render(list(thread)))
+        thread.replace([thread[0], _msg("user", "trimmed", "t4")])
+        self.assertEqual(thread.render(), [{"role": "system", "content": "sys"}, {"role": "user", "content": "trimmed"}])
+
+    def test_set_system_prompt_updates_cached_render(self):
+        thread = CortexThread([_msg("system", "old", "t0"), _msg("user", "q", "t1")])
+        thread.render()
+        thread.set_system_prompt("new")
+        self.assertEqual(thread.render()[0], {"role": "system", "content": "new"})
+        self.assertEqual(thread[0]["content"], "new")
+
+    def test_find_by_timestamp(self):
+        thread = CortexThread([_msg("system", "sys", "t0"), _msg("user", "q", "t1"), _msg("assistant", "a1", "t1"),
+                               _msg("assistant", "a2", "t1"), _msg("user", "q2", "t2")])
+        self.assertEqual(thread.find("t1", ("user", "ipython"))["content"], "q")
+        self.assertEqual(thread.find("t1", ("assistant",), last=True)["content"], "a2")
+        self.assertIsNone(thread.find("t2", ("assistant",)))
+        thread.pop()
+        self.assertIsNone(thread.find("t2", ("user",)))
+
+
+class TestCortexThreadStore(unittest.TestCase):
+
+    def test_get_or_create_is_shared(self):
+        store = CortexThreadStore()
+        threads = []
+        workers = [threading.Thread(target=lambda: threads.append(store.get_or_create("th"))) for _ in range(8)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        self.assertEqual(len({id(t) for t in threads}), 1)
+        self.assertIn("th", store)
+
+    def test_busy_registry(self):
+        busy = ThreadBusyRegistry()
+        self.assertTrue(busy.try_acquire("th"))
+        self.assertFalse(busy.try_acquire("th"))
+        self.assertIn("th", busy)
+        busy.release("th")
+        busy.release("th")
+        self.assertNotIn("th", busy)
+        busy.mark_busy("th")
+        self.assertFalse(busy.try_acquire("th"))
+
+
+if __name__ == '__main__':
+    unittest.main()
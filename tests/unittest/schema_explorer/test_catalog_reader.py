@@ -0,0 +1,126 @@
+import sqlite3
+import unittest
+
+from genesis_bots.connectors.snowflake_connector.snowflake_connector import SnowflakeConnector
+from genesis_bots.schema_explorer.catalog_reader import CatalogReader, build_ddl, ddl_hash
+
+
+class TestCatalogReader(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.executescript("""
+            CREATE TABLE orders (id INTEGER PRIMARY KEY, customer TEXT NOT NULL, total NUMERIC DEFAULT 0);
+            CREATE TABLE customers (id INTEGER, name TEXT);
+            CREATE VIEW big_orders AS SELECT id, total FROM orders WHERE total > 100;
+        """)
+        self.queries = []
+
+    def tearDown(self):
+        self.conn.close()
+
+    def _run_sqlite(self, dataset, sql):
+        self.queries.append(sql)
+        cursor = self.conn.execute(sql)
+        columns = [d[0] for d in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def test_sqlite_reads_native_ddl_and_columns_in_one_query(self):
+        reader = CatalogReader(self._run_sqlite)
+        dataset = {'source_name': 'local', 'database_name': 'db', 'schema_name': 'main'}
+        catalog = reader.get_schema(dataset, 'sqlite')
+        self.assertEqual(set(catalog), {'orders', 'customers', 'big_orders'})
+        self.assertEqual(catalog['orders']['columns'], ['id', 'customer', 'total'])
+        self.assertEqual(catalog['big_orders']['columns'], ['id', 'total'])
+        # same text as the per-object get_ddl query of harvester_queries.conf
+        per_object = self.conn.execute("SELECT sql FROM sqlite_master WHERE type='view' AND name='big_orders'").fetchone()[0]
+        self.assertEqual(catalog['big_orders']['ddl'], per_object)
+        self.assertEqual(catalog['big_orders']['ddl_hash'], ddl_hash(per_object))
+        self.assertTrue(catalog['orders']['native_ddl'])
+
+        reader.get_schema(dataset, 'sqlite')
+        self.assertEqual(len(self.queries), 1)
+
+    def test_one_query_per_database_across_schemas(self):
+        rows = [
+            {'TABLE_SCHEMA': 'S1', 'TABLE_NAME': 'T', 'COLUMN_NAME': 'ID', 'DATA_TYPE': 'NUMBER', 'CHARACTER_MAXIMUM_LENGTH': None,
+             'NUMERIC_PRECISION': 38, 'NUMERIC_SCALE': 0, 'IS_NULLABLE': 'NO', 'COLUMN_DEFAULT': None, 'COMMENT': 'key'},
+            {'TABLE_SCHEMA': 'S1', 'TABLE_NAME': 'T', 'COLUMN_NAME': 'NAME', 'DATA_TYPE': 'TEXT', 'CHARACTER_MAXIMUM_LENGTH': 100,
+             'NUMERIC_PRECISION': None, 'NUMERIC_SCALE': None, 'IS_NULLABLE': 'YES', 'COLUMN_DEFAULT': None, 'COMMENT': None},
+            {'TABLE_SCHEMA': 'S2', 'TABLE_NAME': 'U', 'COLUMN_NAME': 'X', 'DATA_TYPE': 'BOOLEAN', 'CHARACTER_MAXIMUM_LENGTH': None,
+             'NUMERIC_PRECISION': None, 'NUMERIC_SCALE': None, 'IS_NULLABLE': 'YES', 'COLUMN_DEFAULT': 'TRUE', 'COMMENT': None},
+        ]
+        queries = []
+
+        def run(dataset, sql):
+            queries.append(sql)
+            return rows
+
+        reader = CatalogReader(run)
+        s1 = reader.get_schema({'source_name': 'Snowflake', 'database_name': 'DB', 'schema_name': 'S1'}, 'snowflake', ['S1', 'S2', 'S3'])
+        s2 = reader.get_schema({'source_name': 'Snowflake', 'database_name': 'DB', 'schema_name': 'S2'}, 'snowflake', ['S1', 'S2', 'S3'])
+        s3 = reader.get_schema({'source_name': 'Snowflake', 'database_name': 'DB', 'schema_name': 'S3'}, 'snowflake', ['S1', 'S2', 'S3'])
+        self.assertEqual(len(queries), 1)
+        self.assertIn("IN ('S1', 'S2', 'S3')", queries[0])
+        self.assertEqual(s1['T']['ddl'], 'CREATE TABLE "DB"."S1"."T" (\n'
+                                         "    ID NUMBER(38,0) COMMENT 'key',\n"
+                                         "    NAME VARCHAR(100)\n);")
+        self.assertEqual(s2['U']['columns'], ['X'])
+        self.assertEqual(s3, {})
+
+    def test_unsupported_dialect_or_failure_falls_back(self):
+        calls = []
+
+        def failing(dataset, sql):
+            calls.append(sql)
+            raise RuntimeError("no access to information_schema")
+
+        reader = CatalogReader(failing)
+        dataset = {'source_name': 'pg', 'database_name': 'db', 'schema_name': 'public'}
+        self.assertIsNone(reader.get_schema(dataset, 'postgresql'))
+        self.assertIsNone(reader.get_schema(dataset, 'postgresql'))
+        self.assertEqual(len(calls), 1)
+        self.assertIsNone(reader.get_schema({'source_name': 'ora', 'database_name': 'db', 'schema_name': 'x'}, 'oracle'))
+        self.assertEqual(len(calls), 1)
+
+    def test_snowflake_ddl_matches_describe(self):
+        # INFORMATION_SCHEMA.COLUMNS and DESCRIBE TABLE rows of the same Snowflake table
+        columns = [
+            ('ID', 'NUMBER', None, 38, 0, None, 'NO', None, 'NUMBER(38,0)', 'N', 'key'),
+            ('NAME', 'TEXT', 16777216, None, None, None, 'YES', None, 'VARCHAR(16777216)', 'Y', None),
+            ('CODE', 'TEXT', 3, None, None, None, 'YES', "'USD'", 'VARCHAR(3)', 'Y', None),
+            ('AMOUNT', 'NUMBER', None, 12, 2, None, 'YES', None, 'NUMBER(12,2)', 'Y', None),
+            ('RATE', 'FLOAT', None, None, None, None, 'YES', None, 'FLOAT', 'Y', None),
+            ('CREATED', 'TIMESTAMP_NTZ', None, None, None, 9, 'NO', None, 'TIMESTAMP_NTZ(9)', 'N', None),
+            ('UPDATED', 'TIMESTAMP_LTZ', None, None, None, 3, 'YES', None, 'TIMESTAMP_LTZ(3)', 'Y', None),
+            ('PAYLOAD', 'VARIANT', None, None, None, None, 'YES', None, 'VARIANT', 'Y', None),
+            ('BLOB', 'BINARY', 8388608, None, None, None, 'YES', None, 'BINARY(8388608)', 'Y', None),
+            ('ACTIVE', 'BOOLEAN', None, None, None, None, 'YES', None, 'BOOLEAN', 'Y', None),
+        ]
+        catalog_rows = [{'TABLE_SCHEMA': 'S', 'TABLE_NAME': 'T', 'COLUMN_NAME': name, 'DATA_TYPE': data_type,
+                         'CHARACTER_MAXIMUM_LENGTH': length, 'NUMERIC_PRECISION': precision, 'NUMERIC_SCALE': scale,
+                         'DATETIME_PRECISION': datetime_precision, 'IS_NULLABLE': is_nullable,
+                         'COLUMN_DEFAULT': default, 'COMMENT': comment}
+                        for (name, data_type, length, precision, scale, datetime_precision, is_nullable, default, _, _,
+                             comment) in columns]
+        describe_rows = [{'NAME': name, 'TYPE': describe_type, 'KIND': 'COLUMN', 'NULL?': null, 'DEFAULT': default,
+                          'PRIMARY KEY': 'Y' if name == 'ID' else 'N', 'UNIQUE KEY': 'N', 'COMMENT': comment}
+                         for (name, _, _, _, _, _, _, default, describe_type, null, comment) in columns]
+
+        connector = SnowflakeConnector.__new__(SnowflakeConnector)
+        connector.run_query = lambda query, max_rows, max_rows_override: describe_rows
+        per_object = connector.alt_get_ddl('"DB"."S"."T"')
+
+        reader = CatalogReader(lambda dataset, sql: catalog_rows)
+        catalog = reader.get_schema({'source_name': 'Snowflake', 'database_name': 'DB', 'schema_name': 'S'}, 'snowflake')
+        self.assertEqual(catalog['T']['ddl'], per_object)
+        self.assertEqual(catalog['T']['ddl_hash'], connector.sha256_hash_hex_string(per_object))
+
+    def test_build_ddl_defaults(self):
+        ddl = build_ddl('"D"."S"."T"', [{'column_name': 'A', 'data_type': 'numeric', 'numeric_precision': 10,
+                                         'numeric_scale': 2, 'is_nullable': 'YES', 'column_default': '0'}])
+        self.assertEqual(ddl, 'CREATE TABLE "D"."S"."T" (\n    A numeric(10,2) DEFAULT 0\n);')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import threading
+import time
+import unittest
+
+from genesis_bots.schema_explorer.harvest_pipeline import AdaptiveLimit, Pipeline, ResourceLimits, Stage
+
+
+class TestPipeline(unittest.TestCase):
+
+    def test_fan_out_through_stages(self):
+        stored = []
+        lock = threading.Lock()
+
+        def store(item):
+            with lock:
+                stored.append(item)
+
+        stages = [Stage('scan', lambda schema: [f"{schema}.t{i}" for i in range(5)], workers=2, queue_size=2),
+                  Stage('summarize', lambda table: [table.upper()], workers=4, queue_size=2),
+                  Stage('store', store, workers=1, queue_size=2)]
+        stats = Pipeline(stages).run(["a", "b", "c"])
+        self.assertEqual(sorted(stored), sorted(f"{s}.T{i}" for s in "ABC" for i in range(5)))
+        self.assertEqual(stats['scan']['emitted'], 15)
+        self.assertEqual(stats['store']['processed'], 15)
+
+    def test_max_emitted_caps_items_per_run(self):
+        stored = []
+        stages = [Stage('scan', lambda schema: [f"{schema}.t{i}" for i in range(5)], workers=2, max_emitted=7),
+                  Stage('store', stored.append)]
+        stats = Pipeline(stages).run(["a", "b", "c", "d"])
+        self.assertEqual(len(stored), 7)
+        self.assertEqual(stats['scan']['emitted'], 7)
+        # the scan that reached the cap drops the rest of its items, later schemas are not scanned
+        self.assertEqual(stats['scan']['emitted'] + stats['scan'].get('dropped', 0), 5 * stats['scan']['processed'])
+        self.assertEqual(stats['scan']['processed'] + stats['scan'].get('skipped', 0), 4)
+        self.assertGreaterEqual(stats['scan'].get('skipped', 0), 1)
+
+    def test_failed_items_go_to_error_handler(self):
+        errors = []
+        stored = []
+
+        def summarize(table):
+            if table == 2:
+                raise ValueError("llm down")
+            return [table]
+
+        stages = [Stage('summarize', summarize, workers=3), Stage('store', stored.append)]
+        stats = Pipeline(stages, on_error=lambda stage, item, e: errors.append((stage, item, str(e)))).run(range(5))
+        self.assertEqual(sorted(stored), [0, 1, 3, 4])
+        self.assertEqual(errors, [('summarize', 2, 'llm down')])
+        self.assertEqual(stats['summarize']['errors'], 1)
+
+    def test_stages_overlap(self):
+        # two stages of 0.05s per item and one worker each: pipelined, 4 items take ~5 steps rather than 8
+        stages = [Stage('fetch', lambda i: (time.sleep(0.05), [i])[1]), Stage('summarize', lambda i: time.sleep(0.05))]
+        start = time.monotonic()
+        Pipeline(stages).run(range(4))
+        self.assertLess(time.monotonic() - start, 0.35)
+
+
+class TestResourceLimits(unittest.TestCase):
+
+    def test_concurrency_cap_per_resource(self):
+        limits = ResourceLimits({'llm': (2, 0)})
+        active, peak = [0], [0]
+        lock = threading.Lock()
+
+        def call():
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+
+        threads = [threading.Thread(target=limits.call, args=('llm', 'openai', call)) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(peak[0], 2)
+
+    def test_throttled_calls_are_retried_and_shrink_the_limit(self):
+        limits = ResourceLimits({'llm': (8, 0)}, retries=3, backoff_seconds=0.001)
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise RuntimeError("Error code: 429 - Rate limit reached")
+            return "summary"
+
+        self.assertEqual(limits.call('llm', 'openai', flaky), "summary")
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual(limits.get('llm', 'openai').limit, 2)
+
+        with self.assertRaises(ValueError):
+            limits.call('llm', 'openai', lambda: (_ for _ in ()).throw(ValueError("bad prompt")))
+
+    def test_limit_grows_back_after_successes(self):
+        limit = AdaptiveLimit(4)
+        limit.acquire()
+        limit.release(throttled=True)
+        self.assertEqual(limit.limit, 2)
+        for _ in range(2 + 3):
+            limit.acquire()
+            limit.release()
+        self.assertEqual(limit.limit, 4)
+
+    def test_rate_limit(self):
+        limits = ResourceLimits({'source': (4, 600)})    # 10 per second, burst of 10
+        start = time.monotonic()
+        for _ in range(15):
+            limits.call('source', 'pg', lambda: None)
+        self.assertGreater(time.monotonic() - start, 0.4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from genesis_bots.schema_explorer import embeddings_index_handler
+from genesis_bots.schema_explorer.metadata_search_service import MetadataSearchService
+
+
+class _HarvestResults:
+    """In-memory harvest results table with the connector methods the service uses."""
+
+    def __init__(self, rows, grants):
+        self.rows = rows            # source_name.qualified_table_name -> (version, vector)
+        self.grants = grants        # bot_id -> source names
+        self.token = 'v1'
+        self.latency = 0
+        self.full_fetches = 0
+        self.visibility_lookups = 0
+        self._lock = threading.Lock()
+
+    def generate_filename_from_last_modified(self, table_id, bot_id=None):
+        time.sleep(self.latency)
+        return self.token, None
+
+    def fetch_embedding_versions(self, table_id, bot_id=None):
+        assert bot_id is None
+        return {k: v for k, (v, _) in self.rows.items()}
+
+    def fetch_embeddings(self, table_id, bot_id=None, keys=None):
+        assert bot_id is None
+        if keys is None:
+            with self._lock:
+                self.full_fetches += 1
+            keys = list(self.rows)
+        return list(keys), np.array([self.rows[k][1] for k in keys], dtype=np.float32)
+
+    def get_embedding_visible_sources(self, bot_id):
+        self.visibility_lookups += 1
+        return self.grants[bot_id]
+
+
+class TestMetadataSearchService(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        patchers = [mock.patch.object(embeddings_index_handler, 'index_file_path', self.dir),
+                    mock.patch.dict(os.environ, {'EMBEDDING_SIZE': ''})]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.rng = np.random.default_rng(0)
+        self.rows = {f"{source}.\"DB\".\"S\".\"T{i}\"": ('v1', self.rng.standard_normal(16))
+                     for source in ('Snowflake', 'pg_sales', 'pg_hr') for i in range(20)}
+        self.harvest = _HarvestResults(self.rows, {'eve': ['Snowflake', 'pg_sales'], 'ada': ['Snowflake', 'pg_hr']})
+        self.service = MetadataSearchService('DB.APP.HARVEST_RESULTS', db_adapter=self.harvest,
+                                             index_dir=os.path.join(self.dir, 'shared'), visibility_ttl_seconds=60)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_results_are_filtered_to_the_bots_connections(self):
+        query = self.rows['pg_hr."DB"."S"."T3"'][1]
+        keys, distances = self.service.search(query, 10, bot_id='eve')
+        self.assertEqual(len(keys), 10)
+        self.assertTrue(all(not k.startswith('pg_hr.') for k in keys))
+        self.assertEqual(distances, sorted(distances))
+
+        keys, _ = self.service.search(query, 10, bot_id='ada')
+        self.assertEqual(keys[0], 'pg_hr."DB"."S"."T3"')
+
+        # everything visible to eve, and nothing more
+        keys, _ = self.service.search(query, 100, bot_id='eve')
+        self.assertEqual(len(keys), 40)
+        self.assertEqual(self.harvest.visibility_lookups, 2)
+
+    def test_concurrent_refreshes_share_one_sync(self):
+        self.harvest.latency = 0.1
+        threads = [threading.Thread(target=self.service.refresh) for _ in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        # the first sync, plus at most one for the callers that arrived while it was running
+        self.assertLessEqual(self.service.sync_count, 2)
+        self.assertEqual(self.harvest.full_fetches, 1)
+
+    def test_swapped_index_stays_loaded_until_released(self):
+        self.service.refresh()
+        with self.service.lease() as old_index:
+            # a re-embedding with another model changes the dimension, the sync returns a new index
+            for key in self.rows:
+                self.rows[key] = ('v2', self.rng.standard_normal(8))
+            self.harvest.token = 'v2'
+            self.service.refresh()
+            with self.service.lease() as new_index:
+                self.assertIsNot(new_index, old_index)
+                self.assertEqual(new_index.dimension, 8)
+            self.assertEqual(old_index._base.get_n_items(), 60)
+        self.assertEqual(old_index._base.get_n_items(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
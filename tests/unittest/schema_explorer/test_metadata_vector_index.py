@@ -0,0 +1,71 @@
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from genesis_bots.schema_explorer.metadata_vector_index import IncrementalAnnoyIndex, EMPTY_INDEX_KEY
+
+
+def _unit(v):
+    v = np.asarray(v, dtype=np.float32)
+    return v / np.linalg.norm(v)
+
+
+class TestIncrementalAnnoyIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        self.vectors = rng.standard_normal((50, 16)).astype(np.float32)
+        self.keys = [f"t{i}" for i in range(50)]
+        index = IncrementalAnnoyIndex(self.dir, 16, n_trees=5)
+        index.upsert(self.keys, self.vectors, versions=['v1'] * 50)
+        self.index = index.compact()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _top_key(self, index, vector):
+        ids = index.get_nns_by_vector(vector, 1)
+        return index.metadata_mapping[ids[0]]
+
+    def test_query_finds_exact_item(self):
+        self.assertEqual(self._top_key(self.index, self.vectors[7]), "t7")
+
+    def test_upsert_replaces_vector(self):
+        new_vec = _unit(np.ones(16))
+        self.index.upsert(["t7"], [new_vec], versions=['v2'])
+        self.assertEqual(self._top_key(self.index, new_vec), "t7")
+        ids = self.index.get_nns_by_vector(self.vectors[7], 50)
+        # the old t7 vector is tombstoned, t7 appears only once
+        self.assertEqual([self.index.metadata_mapping[i] for i in ids].count("t7"), 1)
+        self.assertEqual(self.index.get_n_items(), 50)
+        self.assertEqual(self.index.versions["t7"], 'v2')
+
+    def test_delete_hides_item(self):
+        self.index.delete(["t3"])
+        keys = [self.index.metadata_mapping[i] for i in self.index.get_nns_by_vector(self.vectors[3], 50)]
+        self.assertNotIn("t3", keys)
+        self.assertEqual(self.index.get_n_items(), 49)
+
+    def test_persistence_and_compaction(self):
+        new_vec = _unit(np.arange(16))
+        self.index.upsert(["t_new"], [new_vec])
+        self.index.delete(["t0"])
+        self.index.save()
+
+        reopened = IncrementalAnnoyIndex.open(self.dir, 16)
+        self.assertEqual(self._top_key(reopened, new_vec), "t_new")
+        self.assertEqual(reopened.get_n_items(), 50)
+
+        compacted = reopened.compact()
+        self.assertEqual(compacted.generation, reopened.generation + 1)
+        self.assertEqual(len(compacted.metadata_mapping), 50)
+        self.assertNotIn("t0", compacted.metadata_mapping)
+        self.assertEqual(self._top_key(compacted, new_vec), "t_new")
+
+    def test_empty_index_has_placeholder(self):
+        empty = IncrementalAnnoyIndex(tempfile.mkdtemp(dir=self.dir), 16).compact()
+        self.assertEqual(empty.metadata_mapping, [EMPTY_INDEX_KEY])
+        empty.upsert(["a"], [np.ones(16)])
+        self.assertEqual(self._top_key(empty, np.ones(16)), "a")
+        self.assertEqual(empty.get_n_items(), 1)
@@ -0,0 +1,161 @@
+import random
+import threading
+import time
+import unittest
+
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web import SlackResponse
+
+from genesis_bots.slack.slack_update_coalescer import (IncrementalSlackFormatter, SlackResponseStream,
+                                                        SlackUpdateCoalescer, close_code_block,
+                                                        convert_to_slack_format, split_boundary)
+
+
+class FakeSlackClient:
+    """Records the chat.* calls per message; `rate_limit` makes the next calls fail with HTTP 429 and Retry-After."""
+
+    def __init__(self):
+        self.calls = []
+        self.messages = {}
+        self.rate_limit = []        # Retry-After of the next calls to be rejected
+        self._lock = threading.Lock()
+        self._next_ts = 1000
+
+    def _call(self, method, kwargs):
+        with self._lock:
+            if self.rate_limit:
+                retry_after = self.rate_limit.pop(0)
+                response = SlackResponse(client=self, http_verb='POST', api_url=f'https://slack.com/api/{method}',
+                                         req_args={}, data={'ok': False, 'error': 'ratelimited'},
+                                         headers={'Retry-After': str(retry_after)}, status_code=429)
+                raise SlackApiError('ratelimited', response)
+            self.calls.append((time.monotonic(), method, dict(kwargs)))
+            if method == 'chat_postMessage':
+                self._next_ts += 1
+                ts = str(self._next_ts)
+                self.messages[ts] = kwargs['text']
+                return {'ok': True, 'ts': ts}
+            self.messages[kwargs['ts']] = kwargs['text']
+            return {'ok': True, 'ts': kwargs['ts']}
+
+    def chat_update(self, **kwargs):
+        return self._call('chat_update', kwargs)
+
+    def chat_postMessage(self, **kwargs):
+        return self._call('chat_postMessage', kwargs)
+
+    def count(self, method):
+        return sum(1 for _, m, _ in self.calls if m == method)
+
+
+_ANSWER_LINES = ["# Findings", "Here is what I found in the **orders** table:", "- 1,204 orders", "- 17 refunds",
+                 "| region | total |", "|---|---|", "| EU | 10 |", "| US | 12 |", "```sql", "SELECT * FROM orders;",
+                 "```", "The totals match the finance report for every region except APAC."]
+
+
+def _answer(n_lines, seed=0):
+    rng = random.Random(seed)
+    return "\n".join(rng.choice(_ANSWER_LINES) for _ in range(n_lines))
+
+
+class TestIncrementalSlackFormatter(unittest.TestCase):
+
+    def test_matches_full_conversion_while_streaming(self):
+        text = _answer(200)
+        formatter = IncrementalSlackFormatter()
+        rng = random.Random(1)
+        end = 0
+        while end < len(text):
+            end = min(len(text), end + rng.randint(1, 40))
+            self.assertEqual(formatter.format(text[:end]), convert_to_slack_format(text[:end]))
+        # the stable prefix is converted once, not on every update
+        self.assertLess(formatter.converted_chars, 5 * len(text))
+
+    def test_split_points_do_not_move_as_text_grows(self):
+        text = _answer(400)
+        final = []
+        start = 0
+        while (boundary := split_boundary(text, start, 1000)) is not None:
+            final.append(boundary)
+            start = boundary
+        for end in range(1200, len(text), 97):
+            start, seen = 0, []
+            while (boundary := split_boundary(text[:end], start, 1000)) is not None:
+                seen.append(boundary)
+                start = boundary
+            self.assertEqual(seen, final[:len(seen)])
+
+
+class TestSlackResponseStream(unittest.TestCase):
+
+    def test_api_calls_per_streamed_answer(self):
+        client = FakeSlackClient()
+        coalescer = SlackUpdateCoalescer(client, updates_per_second=20)
+        stream = SlackResponseStream(coalescer, channel='C1', thread_ts='1', ts='1', split_at=1500)
+        text = _answer(300)
+        outputs = [text[:end] for end in range(60, len(text), 60)] + [text]
+
+        start = time.monotonic()
+        for output in outputs:
+            stream.update(output)
+            time.sleep(0.002)
+        last = stream.finish(text)
+        coalescer.call('chat_update', channel='C1', ts=stream.ts, text=convert_to_slack_format(close_code_block(last)))
+        coalescer.flush(timeout=5)
+        elapsed = time.monotonic() - start
+
+        segments = len(stream.segments)
+        self.assertGreater(segments, 2)
+        self.assertEqual(client.count('chat_postMessage'), segments - 1)
+        # one update per outputs chunk before; now bounded by the channel rate plus the final text of each message
+        updates = client.count('chat_update')
+        self.assertLess(updates, len(outputs) / 3)
+        self.assertLessEqual(updates, elapsed * 20 + 2 * segments)
+        # no two calls to the channel closer than its rate allows
+        times = [t for t, _, _ in client.calls]
+        self.assertGreaterEqual(min(b - a for a, b in zip(times, times[1:])), 0.04)
+        # the messages add up to the answer
+        expected = [convert_to_slack_format(close_code_block(stream.segment_text(text, i))) for i in range(segments)]
+        self.assertEqual([client.messages[s.ts] for s in stream.segments], expected)
+        coalescer.close()
+
+
+class TestSlackUpdateCoalescer(unittest.TestCase):
+
+    def test_latest_text_wins_and_unchanged_text_is_not_sent(self):
+        client = FakeSlackClient()
+        coalescer = SlackUpdateCoalescer(client, updates_per_second=5)
+        coalescer.call('chat_update', channel='C1', ts='1', text='a')
+        for text in ('b', 'c', 'd'):
+            coalescer.submit('C1', '1', text)
+        coalescer.flush(timeout=5)
+        coalescer.submit('C1', '1', 'd')
+        self.assertEqual([k['text'] for _, _, k in client.calls], ['a', 'd'])
+        self.assertEqual(coalescer.stats['coalesced'], 2)
+        self.assertEqual(coalescer.stats['unchanged'], 1)
+        coalescer.close()
+
+    def test_retry_after_is_honoured(self):
+        client = FakeSlackClient()
+        client.rate_limit = [0.3]
+        coalescer = SlackUpdateCoalescer(client, updates_per_second=50)
+        start = time.monotonic()
+        coalescer.submit('C1', '1', 'first')
+        time.sleep(0.05)
+        coalescer.submit('C1', '1', 'second')
+        coalescer.submit('C2', '7', 'other channel')
+        coalescer.flush(timeout=5)
+        sent = {k['channel']: (t - start, k['text']) for t, _, k in client.calls}
+        self.assertEqual(sent['C1'][1], 'second')
+        self.assertGreaterEqual(sent['C1'][0], 0.3)
+        self.assertLess(sent['C2'][0], 0.3)          # other channels are not held back
+        self.assertEqual(coalescer.stats['rate_limited'], 1)
+
+        client.rate_limit = [0.1]
+        response = coalescer.call('chat_postMessage', channel='C1', thread_ts='1', text='final')
+        self.assertIn(response['ts'], client.messages)
+        coalescer.close()
+
+
+if __name__ == '__main__':
+    unittest.main()